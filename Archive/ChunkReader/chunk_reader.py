@@ -0,0 +1,28 @@
+from typing import Iterator, Optional
+import io
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks, such as object_stream's,
+    for APIs like tarfile that pull data from a file."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks: Iterator[bytes] = chunks
+        self.pending: memoryview = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        # Fills the whole buffer unless the data runs out: tarfile takes a short read for the end of the data.
+        filled: int = 0
+        while filled < len(buffer):
+            if not self.pending:
+                chunk: Optional[bytes] = next(self.chunks, None)
+                if chunk is None:
+                    break
+                self.pending = memoryview(chunk)
+            n: int = min(len(buffer) - filled, len(self.pending))
+            buffer[filled:filled + n] = self.pending[:n]
+            self.pending = self.pending[n:]
+            filled += n
+        return filled
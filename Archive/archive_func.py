@@ -0,0 +1,120 @@
+from typing import TYPE_CHECKING, BinaryIO, Iterator, Optional
+import tarfile
+import time
+import zipfile
+
+from Archive.ChunkReader.chunk_reader import ChunkReader
+from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
+from Objects.object_func import object_read_raw, object_stream
+from Objects.tree_diff_func import tree_leaves
+
+if TYPE_CHECKING:
+    from GitRepo.git_repository import GitRepository
+
+# Permissions as git archive writes them: 0666 or 0777 masked by git's default tar.umask of 002.
+ARCHIVE_FILE_MODE: int = 0o664
+ARCHIVE_EXEC_MODE: int = 0o775
+
+# Signature: GitRepository, str, str -> Iterator[tuple[str, GitTreeLeaf]]
+# Purpose: Yields (path, leaf) for every entry under a tree, directories before their contents, reading one tree
+#          at a time. A prefix naming a directory ("project/") gets an entry of its own first, as in git archive.
+def archive_entries(repo: 'GitRepository', tree: str, prefix: str = "") -> Iterator[tuple[str, 'GitTreeLeaf']]:
+    if prefix.endswith("/"):
+        yield prefix[:-1], GitTreeLeaf(b'040000', prefix[:-1], tree)
+    yield from archive_tree_entries(repo, tree, prefix)
+
+# Signature: GitRepository, str, str -> Iterator[tuple[str, GitTreeLeaf]]
+def archive_tree_entries(repo: 'GitRepository', tree: str, prefix: str) -> Iterator[tuple[str, 'GitTreeLeaf']]:
+    for leaf in tree_leaves(repo, tree):
+        path: str = prefix + leaf.path
+        yield path, leaf
+        if leaf.mode.startswith(b'04'):
+            yield from archive_tree_entries(repo, leaf.sha, path + "/")
+
+# Signature: GitRepository, str -> tuple[int, Iterator[bytes]]
+# Purpose: Opens a blob for streaming: its size and its payload in chunks.
+def archive_blob(repo: 'GitRepository', sha: str) -> tuple[int, Iterator[bytes]]:
+    stream: Optional[tuple[bytes, int, Iterator[bytes]]] = object_stream(repo, sha)
+    if stream is None:
+        raise Exception(f"Missing object {sha}.")
+    return stream[1], stream[2]
+
+# Signature: GitRepository, str -> str
+# Purpose: A symlink's target, which is its blob's whole (small) payload.
+def archive_link_target(repo: 'GitRepository', sha: str) -> str:
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    return raw[1].decode("utf8", errors="surrogateescape")
+
+# Signature: GitRepository, str, BinaryIO, bool, int, str, Optional[str] -> int
+# Purpose: Writes a tree as a tar stream (gzipped if compress) to out, one blob at a time straight from the object
+#          store. Entries get the commit's mtime; commit, when known, is recorded in a pax global header the way
+#          git archive does, so `git get-tar-commit-id` finds it. Returns the number of entries written.
+def archive_tar(repo: 'GitRepository', tree: str, out: BinaryIO, compress: bool, mtime: int, prefix: str = "", commit: Optional[str] = None) -> int:
+    count: int = 0
+    pax_headers: dict[str, str] = {"comment": commit} if commit else {}
+    with tarfile.open(fileobj=out, mode="w|gz" if compress else "w|", format=tarfile.PAX_FORMAT, pax_headers=pax_headers) as tar:
+        for (path, leaf) in archive_entries(repo, tree, prefix):
+            info: tarfile.TarInfo = tarfile.TarInfo(path)
+            info.mtime = mtime
+            info.uname = info.gname = "root"
+
+            if leaf.mode.startswith(b'04') or leaf.mode.startswith(b'16'):
+                # Submodules are archived as empty directories, like git does.
+                info.type = tarfile.DIRTYPE
+                info.mode = ARCHIVE_EXEC_MODE
+                tar.addfile(info)
+            elif leaf.mode.startswith(b'12'):
+                info.type = tarfile.SYMTYPE
+                info.mode = 0o777
+                info.linkname = archive_link_target(repo, leaf.sha)
+                tar.addfile(info)
+            else:
+                info.mode = ARCHIVE_EXEC_MODE if leaf.mode == b'100755' else ARCHIVE_FILE_MODE
+                info.size, chunks = archive_blob(repo, leaf.sha)
+                tar.addfile(info, ChunkReader(chunks))
+            count += 1
+    return count
+
+# Signature: GitRepository, str, BinaryIO, int, str -> int
+# Purpose: Writes a tree as a zip archive to out, deflating each blob as it streams from the object store.
+#          out need not be seekable. Returns the number of entries written.
+def archive_zip(repo: 'GitRepository', tree: str, out: BinaryIO, mtime: int, prefix: str = "") -> int:
+    count: int = 0
+    date_time: tuple = time.localtime(mtime)[0:6]
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for (path, leaf) in archive_entries(repo, tree, prefix):
+            is_dir: bool = leaf.mode.startswith(b'04') or leaf.mode.startswith(b'16')
+            info: zipfile.ZipInfo = zipfile.ZipInfo(path + "/" if is_dir else path, date_time=date_time)
+            # Unix permissions live in the high half of external_attr.
+            info.create_system = 3
+
+            if is_dir:
+                info.external_attr = (0o040000 | ARCHIVE_EXEC_MODE) << 16 | 0x10
+                archive.writestr(info, b'')
+            elif leaf.mode.startswith(b'12'):
+                info.external_attr = 0o120777 << 16
+                archive.writestr(info, archive_link_target(repo, leaf.sha).encode("utf8", errors="surrogateescape"))
+            else:
+                mode: int = ARCHIVE_EXEC_MODE if leaf.mode == b'100755' else ARCHIVE_FILE_MODE
+                info.external_attr = (0o100000 | mode) << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                size, chunks = archive_blob(repo, leaf.sha)
+                info.file_size = size
+                with archive.open(info, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as dest:
+                    for chunk in chunks:
+                        dest.write(chunk)
+            count += 1
+    return count
+
+# Signature: GitRepository, str, BinaryIO, str, int, str, Optional[str] -> int
+# Purpose: Writes a tree to out as format ("tar", "tar.gz" or "zip"). Nothing is checked out: memory stays flat
+#          whatever the size of the tree or its blobs.
+def archive(repo: 'GitRepository', tree: str, out: BinaryIO, format: str, mtime: int, prefix: str = "", commit: Optional[str] = None) -> int:
+    match format:
+        case "tar":     return archive_tar(repo, tree, out, False, mtime, prefix, commit)
+        case "tar.gz":  return archive_tar(repo, tree, out, True, mtime, prefix, commit)
+        case "zip":     return archive_zip(repo, tree, out, mtime, prefix)
+        case _:
+            raise Exception(f"Unknown archive format {format}.")
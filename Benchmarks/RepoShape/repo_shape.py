@@ -0,0 +1,21 @@
+class RepoShape:
+    def __init__(self, name: str = "custom", files: int = 1000, depth: int = 3, fanout: int = 8, blob_min: int = 64,
+                blob_max: int = 65536, commits: int = 20, branches: int = 2, churn: float = 0.05, seed: int = 0):
+        self.name = name
+        self.files = files
+        # Directories nest at most depth levels, each directory holding up to fanout subdirectories.
+        self.depth = depth
+        self.fanout = fanout
+        # Blob sizes are drawn log-uniformly between blob_min and blob_max bytes, so most files are small
+        # and a few are large, as in real trees.
+        self.blob_min = blob_min
+        self.blob_max = blob_max
+        self.commits = commits
+        # Branches other than master, each forking from a random commit of the history before it.
+        self.branches = branches
+        # Fraction of the files each commit rewrites.
+        self.churn = churn
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
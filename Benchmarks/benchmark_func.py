@@ -0,0 +1,236 @@
+from argparse import Namespace
+from typing import Callable, Optional
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from Benchmarks.RepoShape.repo_shape import RepoShape
+from Benchmarks.generate_func import generate_repo
+from CommitGraph.commit_graph_func import commit_graph_cache
+from CommitGraph.merge_base_func import commit_info_cache
+from Fsck.fsck_func import fsck_pack_indexes
+from GitRepo.git_repository import GitRepository
+from Libraries.Commands.cmd import add, cmd_checkout, cmd_commit, cmd_log, cmd_ls_tree, cmd_status
+import Objects.object_func as object_func
+import Objects.object_index_func as object_index_func
+from Objects.object_func import object_read
+from Grep.grep_func import grep_regexes
+from Packs.bitmap_func import bitmap_cache
+import Packs.pack_func as pack_func
+from Refs.ref_func import ref_cache, ref_packed_cache, ref_resolve
+from StageIndex.stage_index_func import index_cache, index_read, index_shared_cache, index_write
+
+BENCHMARK_SCALES: dict[str, 'RepoShape'] = {
+    "small": RepoShape("small", files=200, depth=2, commits=10, branches=1),
+    "medium": RepoShape("medium", files=2000, depth=3, commits=30, branches=2),
+    "large": RepoShape("large", files=20000, depth=4, fanout=12, blob_max=16384, commits=60, branches=4),
+}
+
+# Blobs object_read is timed over; a sample keeps large scales from timing the same thing for minutes.
+BENCHMARK_OBJECT_SAMPLE: int = 1000
+
+# Files add rewrites and restages per run.
+BENCHMARK_ADD_FILES: int = 10
+
+# Signature: None -> None
+# Purpose: Drops every per-process cache so each run starts as cold as a fresh bootgit process would. A module that
+#          adds a cache must add it here too.
+def benchmark_caches_clear() -> None:
+    GitRepository.repo_cache.clear()
+    index_cache.clear()
+    index_shared_cache.clear()
+    ref_cache.clear()
+    ref_packed_cache.clear()
+    pack_func.pack_index_cache.clear()
+    pack_func.pack_dir_cache.clear()
+    pack_func.pack_base_cache.clear()
+    pack_func.pack_base_cache_size = 0
+    object_func.object_cache.clear()
+    object_func.object_cache_size = 0
+    object_index_func.object_loose_index.clear()
+    bitmap_cache.clear()
+    commit_graph_cache.clear()
+    commit_info_cache.clear()
+    fsck_pack_indexes.clear()
+    grep_regexes.clear()
+
+# Signature: GitRepository, random.Random, int -> list[str]
+# Purpose: Appends a line to count tracked files and returns their paths.
+def benchmark_touch(repo: 'GitRepository', rng: random.Random, count: int) -> list[str]:
+    entries = index_read(repo).entries
+    paths: list[str] = [os.path.join(repo.worktree, e.name) for e in rng.sample(entries, min(count, len(entries)))]
+    for path in paths:
+        with open(path, "a") as f:
+            f.write(f"{rng.random()}\n")
+    return paths
+
+# Signature: GitRepository, random.Random -> list[str]
+# Purpose: Picks up to BENCHMARK_OBJECT_SAMPLE staged blobs to read.
+def benchmark_sample_blobs(repo: 'GitRepository', rng: random.Random) -> list[str]:
+    entries = index_read(repo).entries
+    return [e.sha for e in rng.sample(entries, min(BENCHMARK_OBJECT_SAMPLE, len(entries)))]
+
+# Each operation is (name, setup, run, teardown). setup returns what run needs; only run is timed.
+# They run in this order, read-only ones first, so add and commit do not change what the others see.
+def benchmark_operations(rng: random.Random) -> list[tuple[str, Callable, Callable, Optional[Callable]]]:
+    return [
+        ("index_read", lambda repo: None, lambda repo, _: index_read(repo), None),
+        ("index_write", lambda repo: index_read(repo), lambda repo, index: index_write(repo, index), None),
+        ("object_read", lambda repo: benchmark_sample_blobs(repo, rng), lambda repo, shas: [object_read(repo, sha) for sha in shas], None),
+        ("ls-tree -r", lambda repo: None, lambda repo, _: cmd_ls_tree(Namespace(tree="HEAD", recursive=True)), None),
+        ("log", lambda repo: None, lambda repo, _: cmd_log(Namespace(commit="HEAD", paths=[])), None),
+        ("status", lambda repo: None, lambda repo, _: cmd_status(None), None),
+        ("checkout", lambda repo: tempfile.mkdtemp(prefix="bootgit-bench-checkout-"),
+            lambda repo, dest: cmd_checkout(Namespace(commit="HEAD", path=dest, branch=None)), lambda repo, dest: shutil.rmtree(dest)),
+        ("add", lambda repo: benchmark_touch(repo, rng, BENCHMARK_ADD_FILES), lambda repo, paths: add(repo, paths), None),
+        ("commit", lambda repo: add(repo, benchmark_touch(repo, rng, 1)), lambda repo, _: cmd_commit(Namespace(message="Benchmark")), None),
+    ]
+
+# Signature: list[float] -> dict
+# Purpose: Summarizes one operation's run times, in seconds.
+def benchmark_summary(runs: list[float]) -> dict:
+    return {"runs": runs, "min": min(runs), "median": statistics.median(runs), "mean": statistics.fmean(runs)}
+
+# Signature: RepoShape, int, str -> dict
+# Purpose: Generates a repository of the given shape under workdir and times every operation in it repeat times.
+def benchmark_shape(shape: 'RepoShape', repeat: int, workdir: str) -> dict:
+    path: str = os.path.join(workdir, shape.name)
+    start: float = time.perf_counter()
+    repo: 'GitRepository' = generate_repo(path, shape)
+    generate_seconds: float = time.perf_counter() - start
+
+    rng: random.Random = random.Random(shape.seed)
+    operations: dict[str, dict] = dict()
+    old_cwd: str = os.getcwd()
+    os.chdir(repo.worktree)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for (name, setup, run, teardown) in benchmark_operations(rng):
+                runs: list[float] = []
+                for _ in range(repeat):
+                    state = setup(repo)
+                    benchmark_caches_clear()
+                    start = time.perf_counter()
+                    run(repo, state)
+                    runs.append(time.perf_counter() - start)
+                    if teardown:
+                        teardown(repo, state)
+                operations[name] = benchmark_summary(runs)
+    finally:
+        os.chdir(old_cwd)
+
+    return {"shape": shape.to_dict(), "generate_seconds": generate_seconds, "operations": operations}
+
+# Signature: None -> Optional[str]
+# Purpose: The commit bootgit itself is checked out at, so results can be tied to the code that produced them.
+def benchmark_revision() -> Optional[str]:
+    try:
+        source: 'GitRepository' = GitRepository.repo_find(os.path.dirname(os.path.abspath(__file__)), required=False)
+        return ref_resolve(source, "HEAD") if source else None
+    except Exception:
+        return None
+
+# Signature: list[RepoShape], int, Optional[str] -> dict
+# Purpose: Benchmarks every shape and returns the JSON-ready report. Repositories are built in a temporary
+#          directory that is removed afterwards unless keep names a directory to build them in instead.
+def benchmark_run(shapes: list['RepoShape'], repeat: int = 5, keep: Optional[str] = None) -> dict:
+    report: dict = {"revision": benchmark_revision(), "python": platform.python_version(), "platform": platform.platform(),
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "repeat": repeat, "scales": []}
+
+    workdir: str = keep or tempfile.mkdtemp(prefix="bootgit-bench-")
+    old_config: Optional[str] = os.environ.get("XDG_CONFIG_HOME")
+    # commit needs an identity; give it one that does not depend on who runs the benchmark.
+    config_home: str = os.path.join(workdir, "config")
+    os.makedirs(os.path.join(config_home, "git"), exist_ok=True)
+    with open(os.path.join(config_home, "git", "config"), "w") as f:
+        f.write("[user]\n\tname = Bench\n\temail = bench@example.com\n")
+    os.environ["XDG_CONFIG_HOME"] = config_home
+
+    try:
+        for shape in shapes:
+            report["scales"].append(benchmark_shape(shape, repeat, workdir))
+    finally:
+        if old_config is None:
+            os.environ.pop("XDG_CONFIG_HOME", None)
+        else:
+            os.environ["XDG_CONFIG_HOME"] = old_config
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return report
+
+# Signature: dict, dict -> list[tuple[str, str, float, float, float]]
+# Purpose: Pairs up the operations two reports have in common as (scale, operation, old median, new median, new/old).
+def benchmark_compare(old: dict, new: dict) -> list[tuple[str, str, float, float, float]]:
+    old_scales: dict[str, dict] = {scale["shape"]["name"]: scale for scale in old["scales"]}
+    ret: list[tuple[str, str, float, float, float]] = []
+    for scale in new["scales"]:
+        name: str = scale["shape"]["name"]
+        if name not in old_scales or old_scales[name]["shape"] != scale["shape"]:
+            continue
+        for operation, result in scale["operations"].items():
+            before: Optional[dict] = old_scales[name]["operations"].get(operation)
+            if before:
+                ret.append((name, operation, before["median"], result["median"], result["median"] / before["median"]))
+    return ret
+
+# Signature: str -> RepoShape
+# Purpose: Parses a custom shape given as "files=5000,depth=4,commits=10".
+def benchmark_shape_parse(spec: str) -> 'RepoShape':
+    defaults: dict = RepoShape().to_dict()
+    values: dict = dict()
+    for item in spec.split(","):
+        key, _, value = item.partition("=")
+        if key not in defaults:
+            raise Exception(f"Unknown shape field {key}.")
+        values[key] = value if key == "name" else type(defaults[key])(value)
+    return RepoShape(**values)
+
+benchmark_argparser = argparse.ArgumentParser(description="Times bootgit operations on generated repositories.")
+benchmark_argparser.add_argument("--scales", default="small,medium", help=f"Comma separated presets: {', '.join(BENCHMARK_SCALES)}.")
+benchmark_argparser.add_argument("--shape", action="append", default=[], help="A custom shape, e.g. name=deep,files=5000,depth=8. Repeatable.")
+benchmark_argparser.add_argument("--repeat", type=int, default=5, help="Runs per operation.")
+benchmark_argparser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+benchmark_argparser.add_argument("--keep", help="Build the repositories in this directory and leave them there.")
+benchmark_argparser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two reports instead of running.")
+benchmark_argparser.add_argument("--threshold", type=float, default=1.25, help="With --compare, the slowdown ratio that counts as a regression.")
+
+# Signature: list[str] -> None
+# Purpose: Command line entry point. With --compare, exits with status 1 when any operation regressed.
+def benchmark_main(argv: list[str] = sys.argv[1:]) -> None:
+    args = benchmark_argparser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old: dict = json.load(f)
+        with open(args.compare[1]) as f:
+            new: dict = json.load(f)
+        regressed: bool = False
+        for (scale, operation, before, after, ratio) in benchmark_compare(old, new):
+            flag: str = " REGRESSION" if ratio > args.threshold else ""
+            regressed = regressed or bool(flag)
+            print(f"{scale:>8} {operation:<12} {before * 1000:10.2f}ms -> {after * 1000:10.2f}ms  x{ratio:.2f}{flag}")
+        sys.exit(1 if regressed else 0)
+
+    shapes: list['RepoShape'] = []
+    for name in filter(None, args.scales.split(",")):
+        if name not in BENCHMARK_SCALES:
+            raise Exception(f"Unknown scale {name}.")
+        shapes.append(BENCHMARK_SCALES[name])
+    shapes.extend(benchmark_shape_parse(spec) for spec in args.shape)
+
+    report: dict = benchmark_run(shapes, repeat=args.repeat, keep=args.keep)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
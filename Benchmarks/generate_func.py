@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Optional
+import math
+import os
+import random
+
+from Benchmarks.RepoShape.repo_shape import RepoShape
+from GitRepo.git_repository import GitRepository
+from Libraries.Commands.cmd import create_commit, index_from_checkout, tree_checkout, tree_from_index
+from Objects.Blobs.git_blob import GitBlob
+from Objects.object_func import object_read, object_write
+from StageIndex.GitIndex.git_index import GitIndex
+from StageIndex.IndexEntry.git_index_entry import GitIndexEntry
+from StageIndex.stage_index_func import index_write
+
+if TYPE_CHECKING:
+    from Objects.git_object import GitObject
+
+GENERATE_AUTHOR: str = "Bench <bench@example.com>"
+
+# Random bytes are mapped onto this alphabet so blobs look like text and compress like source code would.
+GENERATE_ALPHABET: bytes = b"abcdefghijklmnopqrstuvwxyz        \n"
+GENERATE_TABLE: bytes = bytes(GENERATE_ALPHABET[i % len(GENERATE_ALPHABET)] for i in range(256))
+
+# Signature: RepoShape, random.Random -> list[str]
+# Purpose: Lays out shape.files file paths over a directory tree at most shape.depth levels deep.
+def generate_paths(shape: 'RepoShape', rng: random.Random) -> list[str]:
+    paths: list[str] = []
+    for i in range(shape.files):
+        parts: list[str] = [f"d{rng.randrange(shape.fanout)}" for _ in range(rng.randint(0, shape.depth))]
+        parts.append(f"f{i}.txt")
+        paths.append("/".join(parts))
+    return paths
+
+# Signature: RepoShape, random.Random -> bytes
+# Purpose: Makes one blob's content with a size drawn from the shape's distribution.
+def generate_blob(shape: 'RepoShape', rng: random.Random) -> bytes:
+    size: int = int(math.exp(rng.uniform(math.log(shape.blob_min), math.log(shape.blob_max))))
+    return rng.randbytes(size).translate(GENERATE_TABLE)
+
+# Signature: GitRepository, dict[str, str], Optional[str], int -> str
+# Purpose: Writes the tree for a path -> blob sha map and a commit of it on top of parent.
+def generate_commit(repo: 'GitRepository', files: dict[str, str], parent: Optional[str], number: int) -> str:
+    entries: list['GitIndexEntry'] = [GitIndexEntry(ctime=(0, 0), mtime=(0, 0), dev=0, ino=0, mode_type=0b1000, mode_perms=0o644, uid=0, gid=0,
+                                                    fsize=0, sha=sha, flag_assume_valid=False, flag_stage=False, name=path)
+                                      for (path, sha) in sorted(files.items())]
+    tree: str = tree_from_index(repo, GitIndex(entries=entries))
+    return create_commit(repo, tree, parent, GENERATE_AUTHOR, generate_timestamp(number), f"Commit {number}")
+
+# Signature: int -> datetime
+# Purpose: Fixed, increasing commit times, so a given seed always produces the same object ids.
+def generate_timestamp(number: int) -> datetime:
+    return datetime.fromtimestamp(1700000000 + number * 60, timezone.utc)
+
+# Signature: str, RepoShape -> GitRepository
+# Purpose: Creates a repository at path shaped like shape: a master history of shape.commits commits, each rewriting
+#          shape.churn of the files, plus shape.branches side branches forking from earlier commits. master is
+#          checked out and staged, so the worktree starts clean.
+def generate_repo(path: str, shape: 'RepoShape') -> 'GitRepository':
+    rng: random.Random = random.Random(shape.seed)
+    repo: 'GitRepository' = GitRepository.repo_create(path)
+
+    paths: list[str] = generate_paths(shape, rng)
+    files: dict[str, str] = {p: object_write(GitBlob(generate_blob(shape, rng)), repo) for p in paths}
+    history: list[tuple[str, dict[str, str]]] = []
+
+    parent: Optional[str] = None
+    for number in range(shape.commits):
+        if number > 0:
+            files = dict(files)
+            for p in rng.sample(paths, max(1, int(len(paths) * shape.churn))):
+                files[p] = object_write(GitBlob(generate_blob(shape, rng)), repo)
+        parent = generate_commit(repo, files, parent, number)
+        history.append((parent, files))
+
+    for branch in range(shape.branches):
+        (tip, branch_files) = history[rng.randrange(len(history))]
+        for number in range(max(1, shape.commits // (shape.branches + 1))):
+            branch_files = dict(branch_files)
+            for p in rng.sample(paths, max(1, int(len(paths) * shape.churn))):
+                branch_files[p] = object_write(GitBlob(generate_blob(shape, rng)), repo)
+            tip = generate_commit(repo, branch_files, tip, shape.commits + branch * shape.commits + number)
+        with open(GitRepository.repo_file(repo, "refs", "heads", f"branch{branch}", mkdir=True), "w") as f:
+            f.write(tip + "\n")
+
+    with open(GitRepository.repo_file(repo, "refs", "heads", "master", mkdir=True), "w") as f:
+        f.write(parent + "\n")
+
+    commit: Optional['GitObject'] = object_read(repo, parent)
+    tree_checkout(repo, object_read(repo, commit.kvlm[b'tree'].decode("ascii")), os.path.realpath(repo.worktree))
+    index_write(repo, index_from_checkout(repo, parent))
+    return repo
@@ -0,0 +1,11 @@
+class GitBlameEntry:
+    def __init__(self, final_start: int, count: int, commit: str, path: str, orig_start: int, boundary: bool = False):
+        # count lines from final_start (0 based, in the blamed file) were last changed by commit, where they were
+        # lines orig_start onwards of path.
+        self.final_start: int = final_start
+        self.count: int = count
+        self.commit: str = commit
+        self.path: str = path
+        self.orig_start: int = orig_start
+        # The commit has no parents: the lines may be older than the history that is there.
+        self.boundary: bool = boundary
@@ -0,0 +1,196 @@
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Optional
+import heapq
+
+from Blame.BlameEntry.git_blame_entry import GitBlameEntry
+from CommitGraph.bloom_func import bloom_filter_contains, bloom_key, bloom_path_and_dirs
+from CommitGraph.commit_graph_func import commit_graph_load
+from CommitGraph.commit_walk_func import commit_node
+from Diff.diff_func import diff_blocks
+from Diff.rename_func import rename_detect
+from Objects.object_func import object_read_raw
+from Objects.tree_diff_func import tree_diff, tree_lookup
+from Trace2.trace2_func import trace2_count
+
+if TYPE_CHECKING:
+    from CommitGraph.GitCommitGraph.git_commit_graph import GitCommitGraph
+    from GitRepo.git_repository import GitRepository
+    from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
+
+# A stretch of lines still looking for its owner: (start in the suspect's version of the file, count, start in the
+# blamed file).
+BlameRange = tuple[int, int, int]
+
+# ------------------------------------------------[lines]--------------------------------------------------
+
+# Signature: GitRepository, str -> list[bytes]
+# Purpose: A blob's lines, without their newlines.
+def blame_lines(repo: 'GitRepository', sha: str) -> list[bytes]:
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    lines: list[bytes] = raw[1].split(b'\n')
+    if lines[-1] == b'':
+        lines.pop()
+    return lines
+
+# Signature: list[BlameRange], list[tuple[int, int, int]] -> tuple[list[BlameRange], list[BlameRange]]
+# Purpose: Splits ranges (sorted, in the suspect's lines) by the blocks the suspect shares with a parent, as
+#          (parent start, suspect start, count) sorted by suspect start. Returns the parts found in the parent,
+#          renumbered to the parent's lines, and the parts that are not.
+def blame_split(ranges: list[BlameRange], blocks: list[tuple[int, int, int]]) -> tuple[list[BlameRange], list[BlameRange]]:
+    passed: list[BlameRange] = []
+    kept: list[BlameRange] = []
+    i: int = 0
+    for (start, count, final) in ranges:
+        pos: int = start
+        end: int = start + count
+        while i < len(blocks) and blocks[i][1] + blocks[i][2] <= pos:
+            i += 1
+        j: int = i
+        while pos < end:
+            if j >= len(blocks) or blocks[j][1] >= end:
+                kept.append((pos, end - pos, final + pos - start))
+                break
+            (a, b, size) = blocks[j]
+            if b > pos:
+                kept.append((pos, b - pos, final + pos - start))
+                pos = b
+            stop: int = min(end, b + size)
+            passed.append((a + pos - b, stop - pos, final + pos - start))
+            pos = stop
+            j += 1
+    return passed, kept
+
+# ------------------------------------------------[walk]--------------------------------------------------
+
+# Signature: GitRepository, str, str, str, str -> tuple[Optional[str], Optional[GitTreeLeaf]]
+# Purpose: Where path in a commit came from in its parent: the same path, or when the parent has nothing there, the
+#          file it was renamed from. The rename search diffs the two trees, which skips every subtree they share.
+def blame_origin(repo: 'GitRepository', parent_tree: str, tree: str, path: str, sha: str) -> tuple[Optional[str], Optional['GitTreeLeaf']]:
+    leaf: Optional['GitTreeLeaf'] = tree_lookup(repo, parent_tree, path)
+    if leaf is not None:
+        return (path, leaf) if not leaf.mode.startswith(b'04') else (None, None)
+    deleted: dict[str, str] = dict()
+    leaves: dict[str, 'GitTreeLeaf'] = dict()
+    for (name, old, new) in tree_diff(repo, parent_tree, tree):
+        if old is not None and new is None and not old.mode.startswith(b'16'):
+            deleted[name] = old.sha
+            leaves[name] = old
+    if not deleted:
+        return None, None
+    pairs, _ = rename_detect(repo, deleted, {path: sha})
+    return (pairs[0].old_path, leaves[pairs[0].old_path]) if pairs else (None, None)
+
+# Signature: GitRepository, str, str -> tuple[list[GitBlameEntry], list[bytes]]
+# Purpose: Which commit last changed each line of path as of commit, as entries in line order, and the lines.
+#          History is walked newest first, carrying only the lines not yet owned. A commit whose changed-path filter
+#          rules the path out, or whose parent has the same blob at the path, hands its lines on without any blob
+#          being read; only commits that changed the file are diffed. The walk ends once every line has an owner.
+def blame(repo: 'GitRepository', commit: str, path: str) -> tuple[list['GitBlameEntry'], list[bytes]]:
+    graph: Optional['GitCommitGraph'] = commit_graph_load(repo)
+    nodes: dict[str, tuple[str, list[str], int, Optional[bytes]]] = {commit: commit_node(repo, graph, commit)}
+    leaf: Optional['GitTreeLeaf'] = tree_lookup(repo, nodes[commit][0], path)
+    if leaf is None or leaf.mode.startswith(b'04'):
+        raise Exception(f"No such file {path} in {commit}.")
+
+    lines: dict[str, list[bytes]] = {leaf.sha: blame_lines(repo, leaf.sha)}
+    entries: list['GitBlameEntry'] = []
+    # Lines still to be owned, per commit and then per path in it (a file and a copy may share a commit), with the
+    # blob at that path.
+    suspects: dict[str, dict[str, tuple[str, list[BlameRange]]]] = dict()
+    heap: list[tuple[int, str]] = []
+    keys: dict[str, list[list[int]]] = dict()
+
+    def suspect(sha: str, at: str, blob: str, ranges: list[BlameRange]) -> None:
+        if not ranges:
+            return
+        if sha not in nodes:
+            nodes[sha] = commit_node(repo, graph, sha)
+        if sha not in suspects:
+            suspects[sha] = dict()
+            heapq.heappush(heap, (-nodes[sha][2], sha))
+        _, pending = suspects[sha].get(at, (blob, []))
+        suspects[sha][at] = (blob, sorted(pending + ranges))
+
+    suspect(commit, path, leaf.sha, [(0, len(lines[leaf.sha]), 0)])
+    compared: int = 0
+    diffs: int = 0
+    while heap:
+        _, sha = heapq.heappop(heap)
+        tree, parents, _, bloom = nodes[sha]
+        for (at, (blob, ranges)) in suspects.pop(sha).items():
+            if parents and bloom is not None:
+                if at not in keys:
+                    keys[at] = [bloom_key(p) for p in bloom_path_and_dirs(at)]
+                if not all(bloom_filter_contains(bloom, key) for key in keys[at]):
+                    suspect(parents[0], at, blob, ranges)
+                    continue
+
+            compared += 1
+            origins: list[tuple[str, str, str]] = []
+            for parent in parents:
+                if parent not in nodes:
+                    nodes[parent] = commit_node(repo, graph, parent)
+                origin_path, origin = blame_origin(repo, nodes[parent][0], tree, at, blob)
+                if origin is None:
+                    continue
+                if origin.sha == blob:
+                    # Unchanged from this parent: every line is older than this commit.
+                    suspect(parent, origin_path, blob, ranges)
+                    break
+                origins.append((parent, origin_path, origin.sha))
+            else:
+                for (parent, origin_path, origin_sha) in origins:
+                    if origin_sha not in lines:
+                        lines[origin_sha] = blame_lines(repo, origin_sha)
+                    diffs += 1
+                    passed, ranges = blame_split(ranges, diff_blocks(lines[origin_sha], lines[blob], "myers"))
+                    suspect(parent, origin_path, origin_sha, passed)
+                    if not ranges:
+                        break
+                for (start, count, final) in ranges:
+                    entries.append(GitBlameEntry(final, count, sha, at, start, boundary=not parents))
+
+    trace2_count("blame_commits_compared", compared)
+    trace2_count("blame_diffs", diffs)
+    entries.sort(key=lambda entry: entry.final_start)
+    return entries, lines[leaf.sha]
+
+# ------------------------------------------------[output]--------------------------------------------------
+
+# Signature: GitRepository, str -> tuple[str, str]
+# Purpose: A commit's author name and date, the date in the author's own timezone as git blame shows it.
+def blame_author(repo: 'GitRepository', sha: str) -> tuple[str, str]:
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    for line in raw[1].split(b'\n'):
+        if line.startswith(b'author '):
+            name, _, rest = line[7:].decode("utf8").partition(" <")
+            timestamp, zone = rest.rpartition("> ")[2].split(" ")
+            offset: int = (-1 if zone.startswith("-") else 1) * (int(zone[1:3]) * 3600 + int(zone[3:5]) * 60)
+            when: datetime = datetime.fromtimestamp(int(timestamp), timezone(timedelta(seconds=offset)))
+            return name, when.strftime("%Y-%m-%d %H:%M:%S ") + zone
+    raise Exception(f"Commit {sha} has no author.")
+
+# Signature: GitRepository, list[GitBlameEntry], list[bytes], str -> list[str]
+# Purpose: The blamed file in git blame's default format: each line with its commit (^ marking one with no
+#          parents), the file it came from when any line came from another name, author, date and line number.
+def blame_format(repo: 'GitRepository', entries: list['GitBlameEntry'], lines: list[bytes], path: str) -> list[str]:
+    authors: dict[str, tuple[str, str]] = {entry.commit: blame_author(repo, entry.commit) for entry in entries}
+    author_width: int = max((len(name) for (name, _) in authors.values()), default=0)
+    number_width: int = len(str(len(lines)))
+    show_path: bool = any(entry.path != path for entry in entries)
+    path_width: int = max((len(entry.path) for entry in entries), default=0)
+
+    ret: list[str] = []
+    for entry in entries:
+        name, date = authors[entry.commit]
+        label: str = "^" + entry.commit[:7] if entry.boundary else entry.commit[:8]
+        if show_path:
+            label += f" {entry.path:<{path_width}}"
+        for n in range(entry.final_start, entry.final_start + entry.count):
+            text: str = lines[n].decode("utf8", errors="replace")
+            ret.append(f"{label} ({name:<{author_width}} {date} {n + 1:>{number_width}}) {text}")
+    return ret
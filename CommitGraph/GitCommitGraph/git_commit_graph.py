@@ -0,0 +1,17 @@
+from typing import Optional
+
+class GitCommitGraph:
+    def __init__(self, path: str, data: bytes, count: int, chunks: dict[bytes, tuple[int, int]]):
+        self.path = path
+        # The whole file; lookups slice it rather than unpacking every commit up front.
+        self.data = data
+        self.count = count
+        # Chunk id -> (start offset, end offset) within data.
+        self.chunks = chunks
+        self.fanout: int = chunks[b'OIDF'][0]
+        self.oids: int = chunks[b'OIDL'][0]
+        self.commits: int = chunks[b'CDAT'][0]
+        self.edges: Optional[int] = chunks[b'EDGE'][0] if b'EDGE' in chunks else None
+        self.bloom_index: Optional[int] = chunks[b'BIDX'][0] if b'BIDX' in chunks else None
+        # Start of the filters themselves, past the BDAT header.
+        self.bloom_data: Optional[int] = chunks[b'BDAT'][0] + 12 if b'BDAT' in chunks else None
@@ -0,0 +1,107 @@
+from typing import Optional
+
+# Changed-path Bloom filters, bit for bit as git stores them in the commit-graph's BIDX/BDAT chunks,
+# so git can use the filters bootgit writes and the other way round.
+
+BLOOM_VERSION: int = 1
+BLOOM_NUM_HASHES: int = 7
+BLOOM_BITS_PER_ENTRY: int = 10
+# Commits changing more files than this get a filter with every bit set, which matches any path.
+BLOOM_MAX_CHANGED_PATHS: int = 512
+
+BLOOM_SEED_0: int = 0x293ae76f
+BLOOM_SEED_1: int = 0x7e646e2c
+
+# Signature: int -> int
+# Purpose: A byte as git's version 1 filters read it: through a signed char, sign extended to 32 bits.
+def bloom_byte_v1(b: int) -> int:
+    return b if b < 0x80 else b | 0xFFFFFF00
+
+def bloom_rotl(x: int, r: int) -> int:
+    return ((x << r) | (x >> (32 - r))) & 0xFFFFFFFF
+
+# Signature: int, bytes -> int
+# Purpose: 32-bit murmur3 as git's version 1 changed-path filters compute it.
+def bloom_murmur3(seed: int, data: bytes) -> int:
+    c1, c2, m, n = 0xcc9e2d51, 0x1b873593, 5, 0xe6546b64
+    length: int = len(data)
+    blocks: int = length // 4
+
+    for i in range(blocks):
+        b = data[4 * i:4 * i + 4]
+        k: int = (bloom_byte_v1(b[0]) | (bloom_byte_v1(b[1]) << 8) | (bloom_byte_v1(b[2]) << 16) | (bloom_byte_v1(b[3]) << 24)) & 0xFFFFFFFF
+        k = (k * c1) & 0xFFFFFFFF
+        k = bloom_rotl(k, 15)
+        k = (k * c2) & 0xFFFFFFFF
+        seed ^= k
+        seed = (bloom_rotl(seed, 13) * m + n) & 0xFFFFFFFF
+
+    tail: bytes = data[4 * blocks:]
+    k1: int = 0
+    if len(tail) == 3:
+        k1 ^= (bloom_byte_v1(tail[2]) << 16) & 0xFFFFFFFF
+    if len(tail) >= 2:
+        k1 ^= (bloom_byte_v1(tail[1]) << 8) & 0xFFFFFFFF
+    if len(tail) >= 1:
+        k1 ^= bloom_byte_v1(tail[0])
+        k1 = (k1 * c1) & 0xFFFFFFFF
+        k1 = bloom_rotl(k1, 15)
+        k1 = (k1 * c2) & 0xFFFFFFFF
+        seed ^= k1
+
+    seed ^= length
+    seed ^= seed >> 16
+    seed = (seed * 0x85ebca6b) & 0xFFFFFFFF
+    seed ^= seed >> 13
+    seed = (seed * 0xc2b2ae35) & 0xFFFFFFFF
+    seed ^= seed >> 16
+    return seed
+
+# Signature: str -> list[int]
+# Purpose: The BLOOM_NUM_HASHES bit hashes of a path, by double hashing.
+def bloom_key(path: str) -> list[int]:
+    data: bytes = path.encode("utf8")
+    hash0: int = bloom_murmur3(BLOOM_SEED_0, data)
+    hash1: int = bloom_murmur3(BLOOM_SEED_1, data)
+    return [(hash0 + i * hash1) & 0xFFFFFFFF for i in range(BLOOM_NUM_HASHES)]
+
+# Signature: str -> list[str]
+# Purpose: A path followed by each of its leading directories: "a/b/c" -> ["a/b/c", "a/b", "a"].
+def bloom_path_and_dirs(path: str) -> list[str]:
+    ret: list[str] = []
+    path = path.strip("/")
+    while path:
+        ret.append(path)
+        path = path.rpartition("/")[0]
+    return ret
+
+# Signature: Optional[list[str]] -> bytes
+# Purpose: Builds the filter of a commit from the files it changed, or the always-matching filter when
+#          there were too many (None).
+def bloom_filter_build(changed: Optional[list[str]]) -> bytes:
+    if changed is None:
+        return b'\xff'
+
+    paths: set[str] = set()
+    for path in changed:
+        paths.update(bloom_path_and_dirs(path))
+
+    length: int = max(1, (len(paths) * BLOOM_BITS_PER_ENTRY + 7) // 8)
+    bits: bytearray = bytearray(length)
+    for path in paths:
+        for h in bloom_key(path):
+            pos: int = h % (length * 8)
+            bits[pos // 8] |= 1 << (pos & 7)
+    return bytes(bits)
+
+# Signature: bytes | memoryview, list[int] -> bool
+# Purpose: False when the filter proves the key's path was not changed; True when it may have been.
+def bloom_filter_contains(bits, key: list[int]) -> bool:
+    total: int = len(bits) * 8
+    if total == 0:
+        return True
+    for h in key:
+        pos: int = h % total
+        if not bits[pos // 8] & (1 << (pos & 7)):
+            return False
+    return True
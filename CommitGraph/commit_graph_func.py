@@ -0,0 +1,305 @@
+from itertools import islice
+from typing import Optional
+import hashlib
+import os
+
+from CommitGraph.GitCommitGraph.git_commit_graph import GitCommitGraph
+from CommitGraph.bloom_func import BLOOM_BITS_PER_ENTRY, BLOOM_MAX_CHANGED_PATHS, BLOOM_NUM_HASHES, BLOOM_VERSION, bloom_filter_build
+from GitRepo.git_repository import GitRepository
+from Objects.kvlm import kvlm_parse
+from Objects.object_func import object_read_raw
+from Objects.tree_diff_func import tree_diff
+from Refs.ref_func import ref_list, ref_resolve, refs_flatten
+
+# The commit-graph file git itself reads: objects/info/commit-graph, format version 1 with SHA-1 ids.
+GRAPH_SIGNATURE: bytes = b'CGPH'
+GRAPH_PARENT_NONE: int = 0x70000000
+GRAPH_EXTRA_EDGES: int = 0x80000000
+GRAPH_LAST_EDGE: int = 0x80000000
+GRAPH_GENERATION_MAX: int = 0x3FFFFFFF
+
+# Maps a commit-graph file to (stat signature, GitCommitGraph).
+commit_graph_cache: dict[str, tuple[tuple, 'GitCommitGraph']] = dict()
+
+# Signature: GitRepository -> str
+def commit_graph_path(repo: 'GitRepository') -> str:
+    return GitRepository.repo_path(repo, "objects", "info", "commit-graph")
+
+# Signature: str -> GitCommitGraph
+# Purpose: Parses a commit-graph file's header and chunk table. Commit data stays in the file's bytes.
+def commit_graph_read(path: str) -> 'GitCommitGraph':
+    with open(path, "rb") as f:
+        data: bytes = f.read()
+
+    if data[0:4] != GRAPH_SIGNATURE:
+        raise Exception(f"Not a commit-graph {path}.")
+    if data[4] != 1 or data[5] != 1:
+        raise Exception(f"Unsupported commit-graph version {data[4]} (hash version {data[5]}) in {path}.")
+    if data[7] != 0:
+        raise Exception(f"Split commit-graphs are not supported: {path}.")
+
+    chunks: dict[bytes, tuple[int, int]] = dict()
+    table: int = 8
+    for i in range(data[6]):
+        entry: int = table + 12 * i
+        chunk_id: bytes = data[entry:entry + 4]
+        start: int = int.from_bytes(data[entry + 4:entry + 12], "big")
+        end: int = int.from_bytes(data[entry + 16:entry + 24], "big")
+        chunks[chunk_id] = (start, end)
+
+    for required in (b'OIDF', b'OIDL', b'CDAT'):
+        if required not in chunks:
+            raise Exception(f"Commit-graph {path} has no {required.decode('ascii')} chunk.")
+
+    fanout: int = chunks[b'OIDF'][0]
+    count: int = int.from_bytes(data[fanout + 4 * 255:fanout + 4 * 256], "big")
+    if not commit_graph_bloom_usable(data, count, chunks):
+        # Filters hashed with other settings would answer wrongly; like git, read the graph without them.
+        chunks.pop(b'BIDX', None)
+        chunks.pop(b'BDAT', None)
+    return GitCommitGraph(path, data, count, chunks)
+
+# Signature: bytes, int, dict[bytes, tuple[int, int]] -> bool
+# Purpose: Whether a graph's changed-path filters (if any) were built with the version, hash count and bits per entry
+#          this module uses, and its BIDX chunk has one offset per commit.
+def commit_graph_bloom_usable(data: bytes, count: int, chunks: dict[bytes, tuple[int, int]]) -> bool:
+    if b'BIDX' not in chunks or b'BDAT' not in chunks:
+        return True
+    start, end = chunks[b'BDAT']
+    header: tuple[int, ...] = tuple(int.from_bytes(data[at:at + 4], "big") for at in range(start, start + 12, 4))
+    return (end - start >= 12 and header == (BLOOM_VERSION, BLOOM_NUM_HASHES, BLOOM_BITS_PER_ENTRY)
+            and chunks[b'BIDX'][1] - chunks[b'BIDX'][0] == 4 * count)
+
+# Signature: GitRepository -> Optional[GitCommitGraph]
+# Purpose: The repository's commit-graph, parsed once per process while the file is unchanged.
+def commit_graph_load(repo: 'GitRepository') -> Optional['GitCommitGraph']:
+    path: str = commit_graph_path(repo)
+    signature: Optional[tuple] = GitRepository.file_signature(path)
+    if signature is None:
+        commit_graph_cache.pop(path, None)
+        return None
+    cached = commit_graph_cache.get(path)
+    if not cached or cached[0] != signature:
+        cached = (signature, commit_graph_read(path))
+        commit_graph_cache[path] = cached
+    return cached[1]
+
+# Signature: GitCommitGraph, str -> Optional[int]
+# Purpose: Binary searches a commit's position within the fanout bucket of its first byte.
+def commit_graph_position(graph: 'GitCommitGraph', sha: str) -> Optional[int]:
+    raw: bytes = bytes.fromhex(sha)
+    data: bytes = graph.data
+    first: int = raw[0]
+    lo: int = int.from_bytes(data[graph.fanout + 4 * (first - 1):graph.fanout + 4 * first], "big") if first else 0
+    hi: int = int.from_bytes(data[graph.fanout + 4 * first:graph.fanout + 4 * (first + 1)], "big")
+    while lo < hi:
+        mid: int = (lo + hi) // 2
+        at: bytes = data[graph.oids + 20 * mid:graph.oids + 20 * mid + 20]
+        if at == raw:
+            return mid
+        if at < raw:
+            lo = mid + 1
+        else:
+            hi = mid
+    return None
+
+def commit_graph_sha(graph: 'GitCommitGraph', pos: int) -> str:
+    return graph.data[graph.oids + 20 * pos:graph.oids + 20 * pos + 20].hex()
+
+def commit_graph_tree(graph: 'GitCommitGraph', pos: int) -> str:
+    at: int = graph.commits + 36 * pos
+    return graph.data[at:at + 20].hex()
+
+# Signature: GitCommitGraph, int -> list[int]
+# Purpose: Positions of a commit's parents, following the EDGE chunk for octopus merges.
+def commit_graph_parents(graph: 'GitCommitGraph', pos: int) -> list[int]:
+    data: bytes = graph.data
+    at: int = graph.commits + 36 * pos + 20
+    first: int = int.from_bytes(data[at:at + 4], "big")
+    second: int = int.from_bytes(data[at + 4:at + 8], "big")
+    if first == GRAPH_PARENT_NONE:
+        return []
+    if second == GRAPH_PARENT_NONE:
+        return [first]
+    if not second & GRAPH_EXTRA_EDGES:
+        return [first, second]
+
+    parents: list[int] = [first]
+    edge: int = graph.edges + 4 * (second & ~GRAPH_EXTRA_EDGES)
+    while True:
+        value: int = int.from_bytes(data[edge:edge + 4], "big")
+        parents.append(value & ~GRAPH_LAST_EDGE)
+        if value & GRAPH_LAST_EDGE:
+            return parents
+        edge += 4
+
+def commit_graph_generation(graph: 'GitCommitGraph', pos: int) -> int:
+    at: int = graph.commits + 36 * pos + 28
+    return int.from_bytes(graph.data[at:at + 4], "big") >> 2
+
+def commit_graph_date(graph: 'GitCommitGraph', pos: int) -> int:
+    at: int = graph.commits + 36 * pos + 28
+    return ((int.from_bytes(graph.data[at:at + 4], "big") & 0b11) << 32) | int.from_bytes(graph.data[at + 4:at + 8], "big")
+
+# Signature: GitCommitGraph, int -> Optional[bytes]
+# Purpose: A commit's changed-path Bloom filter, or None when the graph was written without them.
+def commit_graph_bloom(graph: 'GitCommitGraph', pos: int) -> Optional[bytes]:
+    if graph.bloom_index is None or graph.bloom_data is None:
+        return None
+    data: bytes = graph.data
+    end: int = int.from_bytes(data[graph.bloom_index + 4 * pos:graph.bloom_index + 4 * pos + 4], "big")
+    start: int = int.from_bytes(data[graph.bloom_index + 4 * (pos - 1):graph.bloom_index + 4 * pos], "big") if pos else 0
+    return data[graph.bloom_data + start:graph.bloom_data + end]
+
+# Signature: GitRepository, str -> tuple[str, list[str], int]
+# Purpose: Reads a commit's tree, parents and committer date from the object itself.
+def commit_parse(repo: 'GitRepository', sha: str) -> tuple[str, list[str], int]:
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    if raw[0] != b'commit':
+        raise Exception(f"Not a commit {sha}.")
+    kvlm: dict = kvlm_parse(raw[1])
+    parents = kvlm.get(b'parent', [])
+    if type(parents) != list:
+        parents = [parents]
+    committer: bytes = kvlm[b'committer'] if type(kvlm[b'committer']) != list else kvlm[b'committer'][0]
+    return kvlm[b'tree'].decode("ascii"), [p.decode("ascii") for p in parents], int(committer.split(b' ')[-2])
+
+# Signature: GitRepository -> list[str]
+# Purpose: The commits every ref and HEAD lead to, with tags peeled.
+def commit_graph_tips(repo: 'GitRepository') -> list[str]:
+    tips: set[str] = set(refs_flatten(ref_list(repo)).values())
+    head: Optional[str] = ref_resolve(repo, "HEAD")
+    if head:
+        tips.add(head)
+
+    ret: list[str] = []
+    for sha in tips:
+        while True:
+            raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+            if raw is None or raw[0] != b'tag':
+                break
+            sha = kvlm_parse(raw[1])[b'object'].decode("ascii")
+        if raw is not None and raw[0] == b'commit':
+            ret.append(sha)
+    return ret
+
+# Signature: GitRepository, list[str], Optional[GitCommitGraph] -> dict[str, tuple[str, list[str], int]]
+# Purpose: Maps every commit reachable from tips to (tree, parents, date). Commits already in the old graph
+#          are taken from it instead of being inflated.
+def commit_graph_commits(repo: 'GitRepository', tips: list[str], old: Optional['GitCommitGraph']) -> dict[str, tuple[str, list[str], int]]:
+    commits: dict[str, tuple[str, list[str], int]] = dict()
+    pending: list[str] = list(tips)
+    while pending:
+        sha: str = pending.pop()
+        if sha in commits:
+            continue
+        pos: Optional[int] = commit_graph_position(old, sha) if old else None
+        if pos is not None:
+            info = (commit_graph_tree(old, pos), [commit_graph_sha(old, p) for p in commit_graph_parents(old, pos)], commit_graph_date(old, pos))
+        else:
+            info = commit_parse(repo, sha)
+        commits[sha] = info
+        pending.extend(p for p in info[1] if p not in commits)
+    return commits
+
+# Signature: dict[str, tuple[str, list[str], int]] -> dict[str, int]
+# Purpose: Topological levels: 1 for root commits, else one more than the highest parent, capped as git caps them.
+def commit_graph_generations(commits: dict[str, tuple[str, list[str], int]]) -> dict[str, int]:
+    generations: dict[str, int] = dict()
+    for tip in commits:
+        stack: list[str] = [tip]
+        while stack:
+            sha: str = stack[-1]
+            if sha in generations:
+                stack.pop()
+                continue
+            missing: list[str] = [p for p in commits[sha][1] if p not in generations]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            generations[sha] = min(GRAPH_GENERATION_MAX, 1 + max((generations[p] for p in commits[sha][1]), default=0))
+    return generations
+
+# Signature: GitRepository, dict[str, tuple[str, list[str], int]], str -> Optional[list[str]]
+# Purpose: The files a commit changed relative to its first parent, or None past BLOOM_MAX_CHANGED_PATHS.
+def commit_graph_changed_paths(repo: 'GitRepository', commits: dict[str, tuple[str, list[str], int]], sha: str) -> Optional[list[str]]:
+    tree, parents, _ = commits[sha]
+    parent_tree: Optional[str] = commits[parents[0]][0] if parents else None
+    changed: list[str] = [path for (path, _, _) in islice(tree_diff(repo, parent_tree, tree), BLOOM_MAX_CHANGED_PATHS + 1)]
+    return changed if len(changed) <= BLOOM_MAX_CHANGED_PATHS else None
+
+# Signature: GitRepository, bool -> int
+# Purpose: Writes objects/info/commit-graph for every commit reachable from the refs, with changed-path
+#          Bloom filters when changed_paths is set. Data and filters of commits already in the old graph are
+#          reused, so rewriting after a few new commits only diffs those. Returns the number of commits.
+def commit_graph_write(repo: 'GitRepository', changed_paths: bool = False) -> int:
+    old: Optional['GitCommitGraph'] = commit_graph_load(repo)
+    commits: dict[str, tuple[str, list[str], int]] = commit_graph_commits(repo, commit_graph_tips(repo), old)
+    shas: list[str] = sorted(commits)
+    positions: dict[str, int] = {sha: i for (i, sha) in enumerate(shas)}
+    generations: dict[str, int] = commit_graph_generations(commits)
+
+    fanout: bytearray = bytearray()
+    counts: list[int] = [0] * 256
+    for sha in shas:
+        counts[int(sha[0:2], 16)] += 1
+    total: int = 0
+    for count in counts:
+        total += count
+        fanout += total.to_bytes(4, "big")
+
+    oids: bytes = b''.join(bytes.fromhex(sha) for sha in shas)
+
+    cdat: bytearray = bytearray()
+    edges: bytearray = bytearray()
+    for sha in shas:
+        tree, parents, date = commits[sha]
+        cdat += bytes.fromhex(tree)
+        first: int = positions[parents[0]] if parents else GRAPH_PARENT_NONE
+        if len(parents) < 2:
+            second: int = GRAPH_PARENT_NONE
+        elif len(parents) == 2:
+            second = positions[parents[1]]
+        else:
+            second = GRAPH_EXTRA_EDGES | (len(edges) // 4)
+            for (i, parent) in enumerate(parents[1:]):
+                edges += (positions[parent] | (GRAPH_LAST_EDGE if i == len(parents) - 2 else 0)).to_bytes(4, "big")
+        cdat += first.to_bytes(4, "big") + second.to_bytes(4, "big")
+        cdat += ((generations[sha] << 2) | ((date >> 32) & 0b11)).to_bytes(4, "big") + (date & 0xFFFFFFFF).to_bytes(4, "big")
+
+    chunks: list[tuple[bytes, bytes]] = [(b'OIDF', bytes(fanout)), (b'OIDL', oids), (b'CDAT', bytes(cdat))]
+    if edges:
+        chunks.append((b'EDGE', bytes(edges)))
+
+    if changed_paths:
+        bidx: bytearray = bytearray()
+        bdat: bytearray = bytearray(BLOOM_VERSION.to_bytes(4, "big") + BLOOM_NUM_HASHES.to_bytes(4, "big") + BLOOM_BITS_PER_ENTRY.to_bytes(4, "big"))
+        for sha in shas:
+            pos: Optional[int] = commit_graph_position(old, sha) if old else None
+            bits: Optional[bytes] = commit_graph_bloom(old, pos) if pos is not None else None
+            if bits is None:
+                bits = bloom_filter_build(commit_graph_changed_paths(repo, commits, sha))
+            bdat += bits
+            bidx += (len(bdat) - 12).to_bytes(4, "big")
+        chunks.append((b'BIDX', bytes(bidx)))
+        chunks.append((b'BDAT', bytes(bdat)))
+
+    out: bytearray = bytearray(GRAPH_SIGNATURE + bytes([1, 1, len(chunks), 0]))
+    offset: int = len(out) + 12 * (len(chunks) + 1)
+    for (chunk_id, chunk) in chunks:
+        out += chunk_id + offset.to_bytes(8, "big")
+        offset += len(chunk)
+    out += (0).to_bytes(4, "big") + offset.to_bytes(8, "big")
+    for (_, chunk) in chunks:
+        out += chunk
+    out += hashlib.sha1(out).digest()
+
+    path: str = commit_graph_path(repo)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".lock", "wb") as f:
+        f.write(out)
+    os.replace(path + ".lock", path)
+    return len(shas)
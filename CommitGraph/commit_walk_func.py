@@ -0,0 +1,115 @@
+from typing import TYPE_CHECKING, Optional
+import heapq
+
+from CommitGraph.bloom_func import bloom_filter_contains, bloom_key, bloom_path_and_dirs
+from CommitGraph.commit_graph_func import commit_graph_bloom, commit_graph_date, commit_graph_load, commit_graph_parents, commit_graph_position, commit_graph_sha, commit_graph_tree, commit_parse
+from Objects.tree_diff_func import tree_lookup
+
+if TYPE_CHECKING:
+    from CommitGraph.GitCommitGraph.git_commit_graph import GitCommitGraph
+    from GitRepo.git_repository import GitRepository
+    from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
+
+# Signature: GitRepository, Optional[GitCommitGraph], str -> tuple[str, list[str], int, Optional[bytes]]
+# Purpose: A commit's tree, parents, date and changed-path filter, from the commit-graph when it holds the commit
+#          (no object is read) and from the commit object otherwise (no filter).
+def commit_node(repo: 'GitRepository', graph: Optional['GitCommitGraph'], sha: str) -> tuple[str, list[str], int, Optional[bytes]]:
+    pos: Optional[int] = commit_graph_position(graph, sha) if graph else None
+    if pos is None:
+        tree, parents, date = commit_parse(repo, sha)
+        return tree, parents, date, None
+    return (commit_graph_tree(graph, pos), [commit_graph_sha(graph, p) for p in commit_graph_parents(graph, pos)],
+            commit_graph_date(graph, pos), commit_graph_bloom(graph, pos))
+
+# Signature: GitRepository, str, Optional[str], list[str] -> bool
+# Purpose: Whether any of paths differs between a commit's tree and one parent's (None for a root commit),
+#          comparing only the entries at those paths.
+def commit_touches(repo: 'GitRepository', tree: str, parent_tree: Optional[str], paths: list[str]) -> bool:
+    for path in paths:
+        before: Optional['GitTreeLeaf'] = tree_lookup(repo, parent_tree, path) if parent_tree else None
+        after: Optional['GitTreeLeaf'] = tree_lookup(repo, tree, path)
+        if ((before.sha, before.mode) if before else None) != ((after.sha, after.mode) if after else None):
+            return True
+    return False
+
+# Signature: GitRepository, str, list[str] -> tuple[list[str], dict[str, list[str]]]
+# Purpose: Walks the history of start newest first and returns the commits that changed any of paths, with each
+#          one's nearest such ancestors. As in git's default history simplification, a merge that leaves paths as
+#          one of its parents had them (TREESAME) is not shown and only that parent is followed; any other commit
+#          is shown when it differs from all of its parents. Commits whose Bloom filter rules every path out are
+#          TREESAME to their first parent without reading a tree; the rest are confirmed by comparing just those paths.
+def log_path_walk(repo: 'GitRepository', start: str, paths: list[str]) -> tuple[list[str], dict[str, list[str]]]:
+    graph: Optional['GitCommitGraph'] = commit_graph_load(repo)
+    paths = [path.strip("/") for path in paths]
+    # A path may have changed only if the filter may contain it and every one of its leading directories.
+    keys: list[list[list[int]]] = [[bloom_key(p) for p in bloom_path_and_dirs(path)] for path in paths]
+
+    nodes: dict[str, tuple[str, list[str], int, Optional[bytes]]] = {start: commit_node(repo, graph, start)}
+    heap: list[tuple[int, str]] = [(-nodes[start][2], start)]
+    queued: set[str] = {start}
+    # The parents the walk followed from each commit it visited.
+    followed: dict[str, list[str]] = dict()
+    matches: list[str] = []
+
+    while heap:
+        _, sha = heapq.heappop(heap)
+        tree, parents, _, bloom = nodes[sha]
+        for parent in parents:
+            if parent not in nodes:
+                nodes[parent] = commit_node(repo, graph, parent)
+
+        treesame: Optional[str] = None
+        if parents and bloom is not None and not any(all(bloom_filter_contains(bloom, key) for key in path_keys) for path_keys in keys):
+            treesame = parents[0]
+        else:
+            treesame = next((parent for parent in parents if not commit_touches(repo, tree, nodes[parent][0], paths)), None)
+        if treesame is None and (parents or commit_touches(repo, tree, None, paths)):
+            matches.append(sha)
+
+        followed[sha] = [treesame] if treesame is not None else parents
+        for parent in followed[sha]:
+            if parent not in queued:
+                queued.add(parent)
+                heapq.heappush(heap, (-nodes[parent][2], parent))
+
+    return matches, log_simplify(followed, matches)
+
+# Signature: dict[str, list[str]], list[str] -> dict[str, list[str]]
+# Purpose: Rewrites the parents of each match to its nearest matching ancestors along the followed edges, skipping
+#          the commits in between.
+def log_simplify(followed: dict[str, list[str]], matches: list[str]) -> dict[str, list[str]]:
+    matching: set[str] = set(matches)
+
+    # Parents before children.
+    order: list[str] = []
+    visited: set[str] = set()
+    for root in followed:
+        stack: list[tuple[str, bool]] = [(root, False)]
+        while stack:
+            sha, done = stack.pop()
+            if done:
+                order.append(sha)
+                continue
+            if sha in visited:
+                continue
+            visited.add(sha)
+            stack.append((sha, True))
+            stack.extend((p, False) for p in followed[sha] if p not in visited)
+
+    # For each commit, the matching commits reachable from it without passing through another match.
+    nearest: dict[str, frozenset[str]] = dict()
+    for sha in order:
+        if sha in matching:
+            nearest[sha] = frozenset([sha])
+            continue
+        parents: list[str] = followed[sha]
+        # Linear stretches share their parent's set rather than copying it.
+        nearest[sha] = nearest[parents[0]] if len(parents) == 1 else frozenset().union(*(nearest[p] for p in parents))
+
+    ret: dict[str, list[str]] = dict()
+    for sha in matches:
+        ancestors: set[str] = set()
+        for parent in followed[sha]:
+            ancestors |= nearest[parent]
+        ret[sha] = sorted(ancestors)
+    return ret
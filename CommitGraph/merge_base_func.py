@@ -0,0 +1,142 @@
+from typing import TYPE_CHECKING, Optional
+import heapq
+
+from CommitGraph.commit_graph_func import commit_graph_date, commit_graph_generation, commit_graph_load, commit_graph_parents, commit_graph_position, commit_graph_sha, commit_parse
+
+if TYPE_CHECKING:
+    from CommitGraph.GitCommitGraph.git_commit_graph import GitCommitGraph
+    from GitRepo.git_repository import GitRepository
+
+# Paint flags of the merge-base walk.
+PARENT1: int = 1
+PARENT2: int = 2
+STALE: int = 4
+RESULT: int = 8
+
+# Maps a commit to (parents, committer date, generation). A commit's ancestry never changes, so entries are
+# valid for every repository and never need invalidating; a long-lived process pays for each commit once.
+commit_info_cache: dict[str, tuple[list[str], int, int]] = dict()
+
+# Signature: GitRepository, str -> tuple[list[str], int, int]
+# Purpose: A commit's parents, date and generation number (1 for a root, else one more than its highest parent).
+#          Commits in the commit-graph take theirs from it; for the others it is computed on first use by walking
+#          down until every ancestor's generation is known, then cached.
+def commit_info(repo: 'GitRepository', sha: str) -> tuple[list[str], int, int]:
+    info: Optional[tuple[list[str], int, int]] = commit_info_cache.get(sha)
+    if info:
+        return info
+
+    graph: Optional['GitCommitGraph'] = commit_graph_load(repo)
+    parsed: dict[str, tuple[list[str], int]] = dict()
+    stack: list[str] = [sha]
+    while stack:
+        current: str = stack[-1]
+        if current in commit_info_cache:
+            stack.pop()
+            continue
+
+        pos: Optional[int] = commit_graph_position(graph, current) if graph else None
+        # Graphs written before generation numbers existed store zero; compute those instead.
+        if pos is not None and commit_graph_generation(graph, pos):
+            parents: list[str] = [commit_graph_sha(graph, p) for p in commit_graph_parents(graph, pos)]
+            commit_info_cache[current] = (parents, commit_graph_date(graph, pos), commit_graph_generation(graph, pos))
+            stack.pop()
+            continue
+
+        if current not in parsed:
+            _, parents, date = commit_parse(repo, current)
+            parsed[current] = (parents, date)
+        parents, date = parsed[current]
+        unknown: list[str] = [p for p in parents if p not in commit_info_cache]
+        if unknown:
+            stack.extend(unknown)
+            continue
+
+        generation: int = 1 + max((commit_info_cache[p][2] for p in parents), default=0)
+        commit_info_cache[current] = (parents, date, generation)
+        stack.pop()
+
+    return commit_info_cache[sha]
+
+# Signature: GitRepository, str, list[str] -> list[str]
+# Purpose: Paints the ancestors of one with PARENT1 and those of twos with PARENT2, highest generation first.
+#          A commit reached from both sides is a candidate and its ancestors are STALE: they can only be worse
+#          answers. The walk stops as soon as every commit left in the queue is STALE. Returns the candidates,
+#          newest first; one may be an ancestor of another.
+def merge_base_paint(repo: 'GitRepository', one: str, twos: list[str]) -> list[str]:
+    flags: dict[str, int] = {one: PARENT1}
+    for two in twos:
+        flags[two] = flags.get(two, 0) | PARENT2
+
+    # Every child has a higher generation than its parents, so a commit is popped only once all its children
+    # have been, with its flags final; it therefore enters the queue once.
+    heap: list[tuple[int, int, str]] = []
+    queued: set[str] = set()
+    nonstale: int = 0
+    for sha in flags:
+        _, date, generation = commit_info(repo, sha)
+        heapq.heappush(heap, (-generation, -date, sha))
+        queued.add(sha)
+        nonstale += 1
+
+    results: list[str] = []
+    while nonstale:
+        _, _, sha = heapq.heappop(heap)
+        queued.discard(sha)
+        paint: int = flags[sha] & (PARENT1 | PARENT2 | STALE)
+        if not paint & STALE:
+            nonstale -= 1
+        if paint == PARENT1 | PARENT2:
+            if not flags[sha] & RESULT:
+                flags[sha] |= RESULT
+                results.append(sha)
+            paint |= STALE
+
+        for parent in commit_info(repo, sha)[0]:
+            old: int = flags.get(parent, 0)
+            if old & paint == paint:
+                continue
+            flags[parent] = old | paint
+            if parent in queued:
+                if paint & STALE and not old & STALE:
+                    nonstale -= 1
+            else:
+                _, date, generation = commit_info(repo, parent)
+                heapq.heappush(heap, (-generation, -date, parent))
+                queued.add(parent)
+                if not paint & STALE:
+                    nonstale += 1
+
+    results = [sha for sha in results if not flags[sha] & STALE]
+    results.sort(key=lambda sha: -commit_info(repo, sha)[1])
+    return results
+
+# Signature: GitRepository, str, str -> bool
+# Purpose: Whether ancestor is reachable from descendant. Parents whose generation is below ancestor's cannot lead
+#          to it, so the walk never goes further down than ancestor itself.
+def commit_is_ancestor(repo: 'GitRepository', ancestor: str, descendant: str) -> bool:
+    if ancestor == descendant:
+        return True
+    min_generation: int = commit_info(repo, ancestor)[2]
+    if commit_info(repo, descendant)[2] <= min_generation:
+        return False
+
+    seen: set[str] = {descendant}
+    stack: list[str] = [descendant]
+    while stack:
+        for parent in commit_info(repo, stack.pop())[0]:
+            if parent == ancestor:
+                return True
+            if parent not in seen and commit_info(repo, parent)[2] > min_generation:
+                seen.add(parent)
+                stack.append(parent)
+    return False
+
+# Signature: GitRepository, str, list[str], bool -> list[str]
+# Purpose: The best common ancestors of one and (a merge of) twos, newest first: those that are not an ancestor
+#          of another common ancestor. Only the first is returned unless all is set.
+def merge_base(repo: 'GitRepository', one: str, twos: list[str], all: bool = False) -> list[str]:
+    candidates: list[str] = merge_base_paint(repo, one, twos)
+    if len(candidates) > 1:
+        candidates = [c for c in candidates if not any(other != c and commit_is_ancestor(repo, c, other) for other in candidates)]
+    return candidates if all else candidates[:1]
@@ -0,0 +1,26 @@
+import io
+import socket
+
+class FrameWriter(io.RawIOBase):
+    """Write-only file object that sends everything written to it over a daemon connection as length-prefixed
+    frames of one kind (stdout or stderr), so a command's output reaches the client as it is produced.
+    Once the client has gone, the first failed send raises and later writes are dropped."""
+
+    def __init__(self, conn: socket.socket, kind: int):
+        self.conn: socket.socket = conn
+        self.kind: int = kind
+        self.broken: bool = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.broken or not data:
+            return len(data)
+        try:
+            self.conn.sendall(bytes([self.kind]) + len(data).to_bytes(4, "big"))
+            self.conn.sendall(data)
+        except OSError:
+            self.broken = True
+            raise
+        return len(data)
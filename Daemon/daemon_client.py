@@ -0,0 +1,102 @@
+from typing import BinaryIO, Optional
+import json
+import os
+import socket
+import sys
+
+# Kept free of bootgit imports: forwarding a command must not pay for loading the whole library.
+
+DAEMON_SOCKET: str = "bootgit-daemon.sock"
+
+# A response is a sequence of frames: a kind byte, a 4 byte length, then the payload. Output frames carry the
+# command's stdout or stderr as it is written; the exit frame, carrying the exit status, is always last.
+DAEMON_FRAME_EXIT: int = 0
+DAEMON_FRAME_STDOUT: int = 1
+DAEMON_FRAME_STDERR: int = 2
+
+# Commands that are never forwarded: they manage the daemon itself, work outside an existing repository or read
+# stdin, which is not forwarded.
+DAEMON_LOCAL_COMMANDS: set[str] = {"daemon", "init", "clone", "fast-import"}
+
+# Signature: str -> Optional[str]
+# Purpose: Finds the daemon socket of the repository containing path, if a daemon was started there.
+def daemon_socket_find(path: str = ".") -> Optional[str]:
+    path = os.path.realpath(path)
+    while True:
+        if os.path.isdir(os.path.join(path, ".git")):
+            sock_path: str = os.path.join(path, ".git", DAEMON_SOCKET)
+            return sock_path if os.path.exists(sock_path) else None
+        parent: str = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+# Signature: socket, int -> bytes
+# Purpose: Reads exactly size bytes from a connection.
+def daemon_recv(conn: socket.socket, size: int) -> bytes:
+    data: bytearray = bytearray()
+    while len(data) < size:
+        chunk: bytes = conn.recv(min(size - len(data), 1 << 16))
+        if not chunk:
+            raise ConnectionError("Daemon connection closed early.")
+        data += chunk
+    return bytes(data)
+
+# Signature: socket, dict -> None
+# Purpose: Sends a length-prefixed JSON request.
+def daemon_send_request(conn: socket.socket, request: dict) -> None:
+    payload: bytes = json.dumps(request).encode("utf8")
+    conn.sendall(len(payload).to_bytes(4, "big") + payload)
+
+# Signature: socket, BinaryIO, BinaryIO -> int
+# Purpose: Reads a response frame by frame, writing the command's stdout and stderr to out and err as they arrive,
+#          and returns its exit status, which comes last.
+def daemon_recv_response(conn: socket.socket, out: BinaryIO, err: BinaryIO) -> int:
+    while True:
+        header: bytes = daemon_recv(conn, 5)
+        payload: bytes = daemon_recv(conn, int.from_bytes(header[1:5], "big"))
+        if header[0] == DAEMON_FRAME_EXIT:
+            return int.from_bytes(payload, "big", signed=True)
+        stream: BinaryIO = out if header[0] == DAEMON_FRAME_STDOUT else err
+        stream.write(payload)
+        stream.flush()
+
+# Signature: str, dict, BinaryIO, BinaryIO -> int
+# Purpose: Sends one request to the daemon listening on sock_path, streams its output to out and err, and returns
+#          its exit status.
+def daemon_call(sock_path: str, request: dict, out: BinaryIO, err: BinaryIO) -> int:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(sock_path)
+        daemon_send_request(conn, request)
+        return daemon_recv_response(conn, out, err)
+
+# Signature: list[str] -> bool
+# Purpose: Runs the command on the repository's daemon when one is listening, replaying its output and
+#          exiting with its status. Returns False, having done nothing, when the command must run locally.
+def daemon_forward(argv: list[str]) -> bool:
+    if not argv or argv[0] in DAEMON_LOCAL_COMMANDS or os.environ.get("BOOTGIT_NO_DAEMON"):
+        return False
+
+    sock_path: Optional[str] = daemon_socket_find()
+    if not sock_path:
+        return False
+
+    try:
+        conn: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(sock_path)
+    except OSError:
+        # A socket left behind by a daemon that died; run locally.
+        conn.close()
+        return False
+
+    with conn:
+        # The daemon traces the command to wherever this client was asked to.
+        daemon_send_request(conn, {"argv": argv, "cwd": os.getcwd(), "trace2": os.environ.get("BOOTGIT_TRACE2_PERF")})
+        try:
+            status: int = daemon_recv_response(conn, sys.stdout.buffer, sys.stderr.buffer)
+        except BrokenPipeError:
+            # Our reader went away (e.g. `| head`). Hanging up stops the daemon's command; point stdout at devnull
+            # so the interpreter's own flush at exit does not fail again.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            status = 141
+    sys.exit(status)
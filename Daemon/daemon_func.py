@@ -0,0 +1,131 @@
+from typing import BinaryIO, Callable, Optional
+import io
+import json
+import os
+import socket
+import sys
+import traceback
+
+from Daemon.FrameWriter.frame_writer import FrameWriter
+from Daemon.daemon_client import DAEMON_FRAME_EXIT, DAEMON_FRAME_STDERR, DAEMON_FRAME_STDOUT, DAEMON_SOCKET, daemon_call, daemon_recv
+from GitRepo.git_repository import GitRepository
+from Objects.object_func import object_cache_enable
+from Trace2.trace2_func import TRACE2_ENV
+
+# Inflated objects the daemon keeps in memory between requests.
+DAEMON_OBJECT_CACHE_BYTES: int = 256 * 1024 * 1024
+
+# Output is buffered up to this much before it is sent to the client as one frame.
+DAEMON_FRAME_BYTES: int = 64 * 1024
+
+# Signature: Callable[[list[str]], None], list[str], str, BinaryIO, BinaryIO, Optional[str] -> int
+# Purpose: Runs one command in-process from cwd, traced to trace2 if given, with its stdout and stderr written to out
+#          and err. Returns its exit status.
+def daemon_run(run: Callable[[list[str]], None], argv: list[str], cwd: str, out: BinaryIO, err: BinaryIO, trace2: Optional[str] = None) -> int:
+    old_stdout, old_stderr, old_cwd, old_argv = sys.stdout, sys.stderr, os.getcwd(), sys.argv
+    out_text: io.TextIOWrapper = io.TextIOWrapper(out, encoding="utf8", write_through=True)
+    err_text: io.TextIOWrapper = io.TextIOWrapper(err, encoding="utf8", write_through=True)
+    sys.stdout, sys.stderr = out_text, err_text
+    sys.argv = [old_argv[0]] + argv
+    old_trace2: Optional[str] = os.environ.pop(TRACE2_ENV, None)
+    if trace2:
+        os.environ[TRACE2_ENV] = trace2
+
+    status: int = 0
+    try:
+        os.chdir(cwd)
+        run(argv)
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    finally:
+        try:
+            out_text.flush()
+            err_text.flush()
+        except OSError:
+            # The client hung up; what is left to send has nowhere to go.
+            pass
+        sys.stdout, sys.stderr, sys.argv = old_stdout, old_stderr, old_argv
+        # Detach so collecting the wrappers does not close the streams.
+        out_text.detach()
+        err_text.detach()
+        os.chdir(old_cwd)
+        os.environ.pop(TRACE2_ENV, None)
+        if old_trace2:
+            os.environ[TRACE2_ENV] = old_trace2
+
+    return status
+
+# Signature: socket, Callable[[list[str]], None] -> bool
+# Purpose: Serves one connection, streaming the command's output to the client in frames of up to
+#          DAEMON_FRAME_BYTES as it is written, so memory stays flat however much a command prints. Returns False
+#          when the client asked the daemon to stop.
+def daemon_handle(conn: socket.socket, run: Callable[[list[str]], None]) -> bool:
+    size: int = int.from_bytes(daemon_recv(conn, 4), "big")
+    request: dict = json.loads(daemon_recv(conn, size))
+
+    out: io.BufferedWriter = io.BufferedWriter(FrameWriter(conn, DAEMON_FRAME_STDOUT), DAEMON_FRAME_BYTES)
+    err: io.BufferedWriter = io.BufferedWriter(FrameWriter(conn, DAEMON_FRAME_STDERR), DAEMON_FRAME_BYTES)
+    if request.get("stop"):
+        status: int = 0
+        out.write(b"Daemon stopped.\n")
+    else:
+        status = daemon_run(run, request["argv"], request["cwd"], out, err, request.get("trace2"))
+
+    # The exit frame goes last: the client hangs up as soon as it has it, so nothing may follow it.
+    try:
+        out.flush()
+        err.flush()
+        conn.sendall(bytes([DAEMON_FRAME_EXIT]) + (4).to_bytes(4, "big") + status.to_bytes(4, "big", signed=True))
+    except OSError:
+        pass
+    return not request.get("stop")
+
+# Signature: GitRepository, Callable[[list[str]], None] -> None
+# Purpose: Serves bootgit commands for repo over .git/bootgit-daemon.sock until stopped. Requests are handled
+#          one at a time in this process, so the repository, index, ref and object caches stay warm; each cache
+#          entry is checked against its file's stat before reuse.
+def daemon_serve(repo: 'GitRepository', run: Callable[[list[str]], None]) -> None:
+    sock_path: str = GitRepository.repo_path(repo, DAEMON_SOCKET)
+    if os.path.exists(sock_path):
+        try:
+            daemon_call(sock_path, {"argv": ["rev-parse", "HEAD"], "cwd": repo.worktree}, io.BytesIO(), io.BytesIO())
+            raise Exception(f"A daemon is already serving {repo.worktree}.")
+        except OSError:
+            os.unlink(sock_path)
+
+    object_cache_enable(DAEMON_OBJECT_CACHE_BYTES)
+
+    server: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(sock_path)
+        server.listen()
+        print(f"Serving {repo.worktree} on {sock_path}", flush=True)
+        serving: bool = True
+        while serving:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    serving = daemon_handle(conn, run)
+                except (OSError, ValueError):
+                    # A client that went away mid-request must not take the daemon down.
+                    continue
+    finally:
+        server.close()
+        if os.path.exists(sock_path):
+            os.unlink(sock_path)
+
+# Signature: GitRepository -> bool
+# Purpose: Asks the daemon serving repo to exit. Returns False if none is running.
+def daemon_stop(repo: 'GitRepository') -> bool:
+    sock_path: str = GitRepository.repo_path(repo, DAEMON_SOCKET)
+    if not os.path.exists(sock_path):
+        return False
+    try:
+        daemon_call(sock_path, {"stop": True}, io.BytesIO(), io.BytesIO())
+    except OSError:
+        os.unlink(sock_path)
+        return False
+    return True
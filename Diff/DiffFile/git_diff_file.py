@@ -0,0 +1,11 @@
+from typing import Optional
+
+class GitDiffFile:
+    def __init__(self, path: str, mode: bytes, sha: str, worktree: Optional[str] = None):
+        self.path: str = path
+        # As in a tree: b'100644', b'100755', b'120000' or b'160000'.
+        self.mode: bytes = mode
+        self.sha: str = sha
+        # The file to read the content from when it is not in the object store: a worktree file changed since it
+        # was staged. None reads the blob sha.
+        self.worktree: Optional[str] = worktree
@@ -0,0 +1,10 @@
+class GitRenamePair:
+    def __init__(self, status: str, old_path: str, new_path: str, old_sha: str, new_sha: str, score: int):
+        # "R" when old_path is gone, "C" when it is still there (or was already the source of a rename).
+        self.status: str = status
+        self.old_path: str = old_path
+        self.new_path: str = new_path
+        self.old_sha: str = old_sha
+        self.new_sha: str = new_sha
+        # Similarity in percent: 100 for an exact match.
+        self.score: int = score
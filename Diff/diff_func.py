@@ -0,0 +1,788 @@
+from collections import Counter
+from typing import TYPE_CHECKING, BinaryIO, Iterator, Optional
+import os
+import stat
+
+from Diff.DiffFile.git_diff_file import GitDiffFile
+from Diff.rename_func import RENAME_LIMIT, rename_detect
+from Objects.Blobs.git_blob import GitBlob
+from Objects.object_func import object_read_raw, object_write
+from Objects.tree_diff_func import tree_diff, tree_entries_raw, tree_leaf_from_raw
+from Trace2.trace2_func import trace2_count, trace2_region
+
+if TYPE_CHECKING:
+    from Diff.RenamePair.git_rename_pair import GitRenamePair
+    from GitRepo.git_repository import GitRepository
+    from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
+    from StageIndex.GitIndex.git_index import GitIndex
+    from StageIndex.IndexEntry.git_index_entry import GitIndexEntry
+
+DIFF_ALGORITHMS: tuple[str, ...] = ("histogram", "myers")
+
+# Lines of context around each change, as git's -U default.
+DIFF_CONTEXT: int = 3
+
+# Like git, a NUL byte among the first 8000 marks a file as binary: only the fact that it changed is shown.
+DIFF_BINARY_PROBE: int = 8000
+
+# Like git's histogram diff, a line occurring more often than this on the old side is never used as an anchor;
+# a stretch with no other common line falls back to Myers.
+DIFF_HISTOGRAM_MAX_CHAIN: int = 64
+
+# Like git's default function name rule, a line starting with a letter, '_' or '$' is shown after a hunk header,
+# cut to this many bytes.
+DIFF_FUNCNAME_MAX: int = 80
+
+DIFF_NULL_SHA: str = "0" * 40
+
+# A block of lines both sides share: (old start, new start, count).
+DiffBlock = tuple[int, int, int]
+
+# ------------------------------------------------[lines]--------------------------------------------------
+
+# Signature: bytes -> list[bytes]
+# Purpose: A file's lines, each with its newline. Only a last line may lack one.
+def diff_lines(data: bytes) -> list[bytes]:
+    lines: list[bytes] = data.split(b'\n')
+    last: bytes = lines.pop()
+    ret: list[bytes] = [line + b'\n' for line in lines]
+    if last:
+        ret.append(last)
+    return ret
+
+# Signature: list[bytes], list[bytes] -> tuple[list[int], list[int]]
+# Purpose: Numbers the lines of both sides so equal lines get equal numbers: the diff then compares small ints
+#          instead of bytes, and hashes each line once.
+def diff_intern(a: list[bytes], b: list[bytes]) -> tuple[list[int], list[int]]:
+    table: dict[bytes, int] = dict()
+    return [table.setdefault(line, len(table)) for line in a], [table.setdefault(line, len(table)) for line in b]
+
+# Signature: list[int], list[int], int, int, int, int, list[DiffBlock] -> tuple[int, int, int, int]
+# Purpose: Strips the lines a[a0:a1] and b[b0:b1] share at their start and end, recording them as blocks, and
+#          returns what is left.
+def diff_trim(a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int, blocks: list[DiffBlock]) -> tuple[int, int, int, int]:
+    start: int = a0
+    while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+        a0 += 1
+        b0 += 1
+    if a0 > start:
+        blocks.append((start, b0 - (a0 - start), a0 - start))
+    end: int = a1
+    while a0 < a1 and b0 < b1 and a[a1 - 1] == b[b1 - 1]:
+        a1 -= 1
+        b1 -= 1
+    if a1 < end:
+        blocks.append((a1, b1, end - a1))
+    return a0, a1, b0, b1
+
+# Signature: list[DiffBlock] -> list[DiffBlock]
+# Purpose: Sorts blocks and joins those that touch.
+def diff_blocks_join(blocks: list[DiffBlock]) -> list[DiffBlock]:
+    ret: list[DiffBlock] = []
+    for (i, j, n) in sorted(blocks):
+        if ret and ret[-1][0] + ret[-1][2] == i and ret[-1][1] + ret[-1][2] == j:
+            ret[-1] = (ret[-1][0], ret[-1][1], ret[-1][2] + n)
+        elif n:
+            ret.append((i, j, n))
+    return ret
+
+# ------------------------------------------------[compaction]--------------------------------------------------
+
+# A change can often be shown at several places: a run of added or removed lines may slide up or down while the
+# lines it passes repeat it. The functions below pick the place the way git's xdl_change_compact does with the
+# indent heuristic (git's default since 2.14), so hunks come out as git's do.
+#
+# Each side is a list of line numbers (interned lines) with a change flag per line, kept with a 0 sentinel at both
+# ends: changed[i + 1] is line i's flag. A group is a maximal run of changed lines [start, end), possibly empty.
+
+# Like git, indentation is counted up to this width and blank lines up to this many.
+DIFF_MAX_INDENT: int = 200
+DIFF_MAX_BLANKS: int = 20
+
+# git's indent heuristic weights, tuned there on a corpus of human-written diffs.
+DIFF_START_OF_FILE_PENALTY: int = 1
+DIFF_END_OF_FILE_PENALTY: int = 21
+DIFF_TOTAL_BLANK_WEIGHT: int = -30
+DIFF_POST_BLANK_WEIGHT: int = 6
+DIFF_RELATIVE_INDENT_PENALTY: int = -4
+DIFF_RELATIVE_INDENT_WITH_BLANK_PENALTY: int = 10
+DIFF_RELATIVE_OUTDENT_PENALTY: int = 24
+DIFF_RELATIVE_OUTDENT_WITH_BLANK_PENALTY: int = 17
+DIFF_RELATIVE_DEDENT_PENALTY: int = 23
+DIFF_RELATIVE_DEDENT_WITH_BLANK_PENALTY: int = 17
+DIFF_INDENT_WEIGHT: int = 60
+DIFF_INDENT_MAX_SLIDING: int = 100
+
+# Signature: list[DiffBlock], int, int -> tuple[bytearray, bytearray]
+# Purpose: The change flags of both sides, with their sentinels, for the lines no block covers.
+def diff_changed(blocks: list[DiffBlock], n: int, m: int) -> tuple[bytearray, bytearray]:
+    a_changed: bytearray = bytearray(b'\x00') + bytearray(b'\x01') * n + bytearray(b'\x00')
+    b_changed: bytearray = bytearray(b'\x00') + bytearray(b'\x01') * m + bytearray(b'\x00')
+    for (i, j, k) in blocks:
+        a_changed[i + 1:i + k + 1] = bytes(k)
+        b_changed[j + 1:j + k + 1] = bytes(k)
+    return a_changed, b_changed
+
+# Signature: bytearray, bytearray -> list[DiffBlock]
+# Purpose: The blocks of unchanged lines the two sides' flags leave, which pair up in order.
+def diff_unchanged_blocks(a_changed: bytearray, b_changed: bytearray) -> list[DiffBlock]:
+    blocks: list[DiffBlock] = []
+    i: int = 0
+    j: int = 0
+    n: int = len(a_changed) - 2
+    m: int = len(b_changed) - 2
+    while i < n and j < m:
+        if a_changed[i + 1]:
+            i += 1
+        elif b_changed[j + 1]:
+            j += 1
+        else:
+            if blocks and blocks[-1][0] + blocks[-1][2] == i and blocks[-1][1] + blocks[-1][2] == j:
+                blocks[-1] = (blocks[-1][0], blocks[-1][1], blocks[-1][2] + 1)
+            else:
+                blocks.append((i, j, 1))
+            i += 1
+            j += 1
+    return blocks
+
+# Signature: bytearray, int -> int
+# Purpose: Where the group after the one ending at end finishes (the next group starts at end + 1).
+def diff_group_end(changed: bytearray, start: int) -> int:
+    end: int = start
+    while changed[end + 1]:
+        end += 1
+    return end
+
+# Signature: bytearray, int -> int
+# Purpose: Where the group before the one starting at start begins (it ends at start - 1).
+def diff_group_start(changed: bytearray, end: int) -> int:
+    start: int = end
+    while changed[start]:
+        start -= 1
+    return start
+
+# Signature: bytes -> int
+# Purpose: A line's indentation width, tabs to multiples of 8, or -1 for a line of only whitespace.
+def diff_indent(line: bytes) -> int:
+    ret: int = 0
+    for c in line:
+        if c == 0x20:
+            ret += 1
+        elif c == 0x09:
+            ret += 8 - ret % 8
+        elif c not in b'\n\v\f\r':
+            return ret
+        if ret >= DIFF_MAX_INDENT:
+            return DIFF_MAX_INDENT
+    return -1
+
+# Signature: list[bytes], int, dict[int, int] -> tuple[int, int]
+# Purpose: git's score for splitting lines just before line split, as (effective indent, penalty): lower is better.
+#          Splits next to blank lines and before lines no deeper than the ones above score well.
+def diff_split_score(lines: list[bytes], split: int, indents: dict[int, int]) -> tuple[int, int]:
+    def indent(i: int) -> int:
+        if i not in indents:
+            indents[i] = diff_indent(lines[i])
+        return indents[i]
+
+    end_of_file: bool = split >= len(lines)
+    split_indent: int = -1 if end_of_file else indent(split)
+    pre_blank: int = 0
+    pre_indent: int = -1
+    for i in range(split - 1, -1, -1):
+        pre_indent = indent(i)
+        if pre_indent != -1:
+            break
+        pre_blank += 1
+        if pre_blank == DIFF_MAX_BLANKS:
+            pre_indent = 0
+            break
+    post_blank: int = 0
+    post_indent: int = -1
+    for i in range(split + 1, len(lines)):
+        post_indent = indent(i)
+        if post_indent != -1:
+            break
+        post_blank += 1
+        if post_blank == DIFF_MAX_BLANKS:
+            post_indent = 0
+            break
+
+    penalty: int = 0
+    if pre_indent == -1 and pre_blank == 0:
+        penalty += DIFF_START_OF_FILE_PENALTY
+    if end_of_file:
+        penalty += DIFF_END_OF_FILE_PENALTY
+    blank_after: int = 1 + post_blank if split_indent == -1 else 0
+    total_blank: int = pre_blank + blank_after
+    penalty += DIFF_TOTAL_BLANK_WEIGHT * total_blank + DIFF_POST_BLANK_WEIGHT * blank_after
+
+    effective: int = split_indent if split_indent != -1 else post_indent
+    if effective != -1 and pre_indent != -1:
+        if effective > pre_indent:
+            penalty += DIFF_RELATIVE_INDENT_WITH_BLANK_PENALTY if total_blank else DIFF_RELATIVE_INDENT_PENALTY
+        elif effective < pre_indent:
+            if post_indent != -1 and post_indent > effective:
+                penalty += DIFF_RELATIVE_OUTDENT_WITH_BLANK_PENALTY if total_blank else DIFF_RELATIVE_OUTDENT_PENALTY
+            else:
+                penalty += DIFF_RELATIVE_DEDENT_WITH_BLANK_PENALTY if total_blank else DIFF_RELATIVE_DEDENT_PENALTY
+    return effective, penalty
+
+# Signature: list[int], list[bytes], bytearray, bytearray -> None
+# Purpose: git's xdl_change_compact for one side. Each group of changed lines is slid up as far as it goes, then
+#          down as far as it goes (merging with groups it meets), and left where it lines up with a change on the
+#          other side if it can, else where the indent heuristic scores best. other is the other side's flags,
+#          walked in step so each group is paired with the other side's group at the same place.
+def diff_compact(recs: list[int], lines: list[bytes], changed: bytearray, other: bytearray) -> None:
+    n: int = len(recs)
+    indents: dict[int, int] = dict()
+    start: int = 0
+    end: int = diff_group_end(changed, 0)
+    other_start: int = 0
+    other_end: int = diff_group_end(other, 0)
+
+    while True:
+        if end != start:
+            while True:
+                size: int = end - start
+                end_matching_other: int = -1
+
+                # Up as far as it goes; the other side's group moves back in step.
+                while start > 0 and recs[start - 1] == recs[end - 1]:
+                    start -= 1
+                    end -= 1
+                    changed[start + 1] = 1
+                    changed[end + 1] = 0
+                    start = diff_group_start(changed, start)
+                    other_end = other_start - 1
+                    other_start = diff_group_start(other, other_end)
+                earliest_end: int = end
+                if other_end > other_start:
+                    end_matching_other = end
+
+                # Then down as far as it goes.
+                while end < n and recs[start] == recs[end]:
+                    changed[start + 1] = 0
+                    changed[end + 1] = 1
+                    start += 1
+                    end = diff_group_end(changed, end + 1)
+                    other_start = other_end + 1
+                    other_end = diff_group_end(other, other_start)
+                    if other_end > other_start:
+                        end_matching_other = end
+
+                # Sliding may have merged groups; go again until the group stops growing.
+                if size == end - start:
+                    break
+
+            if end == earliest_end:
+                pass
+            elif end_matching_other != -1:
+                while other_end == other_start:
+                    start, end = diff_slide_up(recs, changed, start, end)
+                    other_end = other_start - 1
+                    other_start = diff_group_start(other, other_end)
+            else:
+                shift: int = max(earliest_end, end - size - 1, end - DIFF_INDENT_MAX_SLIDING)
+                best_shift: int = -1
+                best_score: tuple[int, int] = (0, 0)
+                while shift <= end:
+                    above: tuple[int, int] = diff_split_score(lines, shift, indents)
+                    below: tuple[int, int] = diff_split_score(lines, shift - size, indents)
+                    score: tuple[int, int] = (above[0] + below[0], above[1] + below[1])
+                    if best_shift == -1 or diff_score_cmp(score, best_score) <= 0:
+                        best_score = score
+                        best_shift = shift
+                    shift += 1
+                while end > best_shift:
+                    start, end = diff_slide_up(recs, changed, start, end)
+                    other_end = other_start - 1
+                    other_start = diff_group_start(other, other_end)
+
+        if end == n:
+            break
+        start = end + 1
+        end = diff_group_end(changed, start)
+        other_start = other_end + 1
+        other_end = diff_group_end(other, other_start)
+
+# Signature: list[int], bytearray, int, int -> tuple[int, int]
+# Purpose: Slides the group [start, end) up one line, which must be possible, absorbing a group it then touches.
+def diff_slide_up(recs: list[int], changed: bytearray, start: int, end: int) -> tuple[int, int]:
+    if start == 0 or recs[start - 1] != recs[end - 1]:
+        raise Exception("Diff compaction lost its place.")
+    changed[start] = 1
+    changed[end] = 0
+    return diff_group_start(changed, start - 1), end - 1
+
+# Signature: tuple[int, int], tuple[int, int] -> int
+# Purpose: Compares two split scores, indentation weighing most.
+def diff_score_cmp(s1: tuple[int, int], s2: tuple[int, int]) -> int:
+    return DIFF_INDENT_WEIGHT * ((s1[0] > s2[0]) - (s1[0] < s2[0])) + (s1[1] - s2[1])
+
+# ------------------------------------------------[myers]--------------------------------------------------
+
+# Signature: list[int], list[int], int, int, int, int -> Optional[tuple[int, int]]
+# Purpose: The middle of a shortest edit script from a[a0:a1] to b[b0:b1], found by running Myers' search from
+#          both ends until they meet, in space linear in the input. None if the two have nothing in common.
+#          Both stretches must be non-empty and differ at both ends: the split is then strictly inside them.
+def diff_bisect(a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int) -> Optional[tuple[int, int]]:
+    n: int = a1 - a0
+    m: int = b1 - b0
+    max_d: int = (n + m + 1) // 2
+    offset: int = max_d
+    forward: list[int] = [-1] * (2 * max_d + 2)
+    forward[offset + 1] = 0
+    backward: list[int] = forward[:]
+    delta: int = n - m
+    # With an odd delta the searches meet while extending forward, with an even one while extending backward.
+    odd: bool = delta % 2 != 0
+    k1_start = k1_end = k2_start = k2_end = 0
+    for d in range(max_d):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            if k1 == -d or (k1 != d and forward[offset + k1 - 1] < forward[offset + k1 + 1]):
+                x1: int = forward[offset + k1 + 1]
+            else:
+                x1 = forward[offset + k1 - 1] + 1
+            y1: int = x1 - k1
+            while x1 < n and y1 < m and a[a0 + x1] == b[b0 + y1]:
+                x1 += 1
+                y1 += 1
+            forward[offset + k1] = x1
+            if x1 > n:
+                k1_end += 2
+            elif y1 > m:
+                k1_start += 2
+            elif odd:
+                k2: int = offset + delta - k1
+                if 0 <= k2 < len(backward) and backward[k2] != -1 and x1 >= n - backward[k2]:
+                    return a0 + x1, b0 + y1
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            if k2 == -d or (k2 != d and backward[offset + k2 - 1] < backward[offset + k2 + 1]):
+                x2: int = backward[offset + k2 + 1]
+            else:
+                x2 = backward[offset + k2 - 1] + 1
+            y2: int = x2 - k2
+            while x2 < n and y2 < m and a[a1 - 1 - x2] == b[b1 - 1 - y2]:
+                x2 += 1
+                y2 += 1
+            backward[offset + k2] = x2
+            if x2 > n:
+                k2_end += 2
+            elif y2 > m:
+                k2_start += 2
+            elif not odd:
+                k1: int = offset + delta - k2
+                if 0 <= k1 < len(forward) and forward[k1] != -1:
+                    x1 = forward[k1]
+                    if x1 >= n - x2:
+                        return a0 + x1, b0 + offset + x1 - k1
+    return None
+
+# Signature: list[int], list[int], int, int, int, int, list[DiffBlock] -> None
+# Purpose: Myers' diff of a[a0:a1] against b[b0:b1], linear space: splits at the middle of the edit script again
+#          and again, each half trimmed of its common ends, which are the blocks appended to blocks. This is the
+#          textbook algorithm. git's xdiff also sets aside lines found on one side only before searching, and it
+#          breaks ties between equally short scripts its own way. Where several shortest scripts exist, the hunks
+#          can therefore differ from git's --diff-algorithm=myers (and from histogram's fallback to it), while
+#          still being a minimal diff.
+def diff_myers(a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int, blocks: list[DiffBlock]) -> None:
+    stack: list[tuple[int, int, int, int]] = [(a0, a1, b0, b1)]
+    while stack:
+        a0, a1, b0, b1 = diff_trim(a, b, *stack.pop(), blocks)
+        if a0 == a1 or b0 == b1:
+            continue
+        split: Optional[tuple[int, int]] = diff_bisect(a, b, a0, a1, b0, b1)
+        if split is not None:
+            stack.append((split[0], a1, split[1], b1))
+            stack.append((a0, split[0], b0, split[1]))
+
+# ------------------------------------------------[histogram]--------------------------------------------------
+
+# Signature: list[int], list[int], int, int, int, int -> int
+# Purpose: How many lines a[i:a1] and b[j:b1] share at their start. Compares slices of doubling, then halving,
+#          size, so a long run costs a few comparisons done in C rather than one Python step per line.
+def diff_extend(a: list[int], b: list[int], i: int, a1: int, j: int, b1: int) -> int:
+    start: int = i
+    step: int = 1
+    while step:
+        if i + step <= a1 and j + step <= b1 and a[i:i + step] == b[j:j + step]:
+            i += step
+            j += step
+            step *= 2
+        else:
+            step //= 2
+    return i - start
+
+# Signature: list[int], list[int], int, int, int, int -> int
+# Purpose: How many lines a[a0:i] and b[b0:j] share at their end, as diff_extend.
+def diff_extend_back(a: list[int], b: list[int], a0: int, i: int, b0: int, j: int) -> int:
+    end: int = i
+    step: int = 1
+    while step:
+        if i - step >= a0 and j - step >= b0 and a[i - step:i] == b[j - step:j]:
+            i -= step
+            j -= step
+            step *= 2
+        else:
+            step //= 2
+    return end - i
+
+# Signature: list[int], list[int], int, int, int, int -> Optional[DiffBlock]
+# Purpose: The block to split a[a0:a1] and b[b0:b1] around, as git's histogram diff picks it: the longest common
+#          run around a line that is rare on the old side, though a run of rarer lines wins even when shorter.
+#          None if no line of b occurs on the old side at most DIFF_HISTOGRAM_MAX_CHAIN times.
+def diff_histogram_anchor(a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int) -> Optional[DiffBlock]:
+    # Counts and last positions are built by C loops; the positions of a line found more than once are only looked
+    # up (a few list.index calls) if it is ever a candidate.
+    region: list[int] = a[a0:a1]
+    counts: Counter[int] = Counter(region)
+    last: dict[int, int] = dict(zip(region, range(a0, a1)))
+    repeated: dict[int, list[int]] = dict()
+
+    best: Optional[DiffBlock] = None
+    best_count: int = DIFF_HISTOGRAM_MAX_CHAIN + 1
+    j: int = b0
+    while j < b1:
+        line: int = b[j]
+        total: int = counts.get(line, 0)
+        if total == 0 or total > best_count:
+            j += 1
+            continue
+        if total == 1:
+            occurrences: list[int] = [last[line]]
+        else:
+            if line not in repeated:
+                found: list[int] = [a.index(line, a0, a1)]
+                while len(found) < total:
+                    found.append(a.index(line, found[-1] + 1, a1))
+                repeated[line] = found
+            occurrences = repeated[line]
+        next_j: int = j + 1
+        skip_below: int = a0
+        for i in occurrences:
+            # Like git, an occurrence inside the run just found is not tried again.
+            if i < skip_below:
+                continue
+            count: int = total
+            start_a, start_b = i, j
+            end_a, end_b = i + 1, j + 1
+            if count == 1:
+                # Nothing can make the run rarer: only its length matters, found in bulk.
+                n: int = diff_extend_back(a, b, a0, start_a, b0, start_b)
+                start_a, start_b = start_a - n, start_b - n
+                n = diff_extend(a, b, end_a, a1, end_b, b1)
+                end_a, end_b = end_a + n, end_b + n
+            else:
+                while start_a > a0 and start_b > b0 and a[start_a - 1] == b[start_b - 1]:
+                    start_a -= 1
+                    start_b -= 1
+                    count = min(count, counts[a[start_a]])
+                while end_a < a1 and end_b < b1 and a[end_a] == b[end_b]:
+                    count = min(count, counts[a[end_a]])
+                    end_a += 1
+                    end_b += 1
+            if best is None or end_a - start_a > best[2] or count < best_count:
+                best = (start_a, start_b, end_a - start_a)
+                best_count = count
+            next_j = max(next_j, end_b)
+            skip_below = end_a
+        j = next_j
+    return best if best_count <= DIFF_HISTOGRAM_MAX_CHAIN else None
+
+# Signature: list[int], list[int], list[DiffBlock] -> None
+# Purpose: git's histogram diff: splits both sides around the best anchor, then each side of it in turn. Runs on
+#          an explicit stack, so no input is too long for it. The blocks found are appended to blocks.
+def diff_histogram(a: list[int], b: list[int], blocks: list[DiffBlock]) -> None:
+    # Like git's, stretches are not trimmed of their common ends first: that would change which anchors are found.
+    stack: list[tuple[int, int, int, int]] = [(0, len(a), 0, len(b))]
+    while stack:
+        a0, a1, b0, b1 = stack.pop()
+        if a0 == a1 or b0 == b1:
+            continue
+        anchor: Optional[DiffBlock] = diff_histogram_anchor(a, b, a0, a1, b0, b1)
+        if anchor is None:
+            diff_myers(a, b, a0, a1, b0, b1, blocks)
+            continue
+        (i, j, n) = anchor
+        blocks.append(anchor)
+        stack.append((i + n, a1, j + n, b1))
+        stack.append((a0, i, b0, j))
+
+# Signature: list[bytes], list[bytes], str -> list[DiffBlock]
+# Purpose: The blocks of lines a and b share, in order, by the named algorithm.
+def diff_blocks(a: list[bytes], b: list[bytes], algorithm: str = "histogram") -> list[DiffBlock]:
+    x, y = diff_intern(a, b)
+    blocks: list[DiffBlock] = []
+    if algorithm == "myers":
+        diff_myers(x, y, 0, len(x), 0, len(y), blocks)
+    elif algorithm == "histogram":
+        diff_histogram(x, y, blocks)
+    else:
+        raise Exception(f"Unknown diff algorithm {algorithm}.")
+    a_changed, b_changed = diff_changed(diff_blocks_join(blocks), len(x), len(y))
+    diff_compact(x, a, a_changed, b_changed)
+    diff_compact(y, b, b_changed, a_changed)
+    return diff_unchanged_blocks(a_changed, b_changed)
+
+# ------------------------------------------------[hunks]--------------------------------------------------
+
+# Signature: int, int -> bytes
+# Purpose: One side's range in a hunk header: the start line and, unless it is 1, the count. An empty range
+#          starts at the line before it.
+def diff_range(start: int, count: int) -> bytes:
+    if count == 0:
+        return b'%d,0' % start
+    return b'%d' % (start + 1) if count == 1 else b'%d,%d' % (start + 1, count)
+
+# Signature: list[bytes], int, int, Optional[bytes] -> tuple[int, Optional[bytes]]
+# Purpose: The function line shown after a hunk starting at line start of a: the nearest line at or before
+#          start - 1 starting with a letter, '_' or '$'. Lines before limit were searched for the hunk before,
+#          whose answer is found, so the search stops there.
+def diff_funcname(a: list[bytes], start: int, limit: int, found: Optional[bytes]) -> Optional[bytes]:
+    for i in range(start - 1, limit - 1, -1):
+        line: bytes = a[i]
+        if line[:1].isalpha() or line[:1] in (b'_', b'$'):
+            return line[:DIFF_FUNCNAME_MAX].rstrip()
+    return found
+
+# Signature: list[bytes], list[bytes], list[DiffBlock], int -> Iterator[bytes]
+# Purpose: The unified diff hunks of a against b, one at a time, changes less than twice context lines apart
+#          sharing a hunk.
+def diff_hunks(a: list[bytes], b: list[bytes], blocks: list[DiffBlock], context: int = DIFF_CONTEXT) -> Iterator[bytes]:
+    # The changed stretches between blocks: (old start, old end, new start, new end).
+    changes: list[tuple[int, int, int, int]] = []
+    i: int = 0
+    j: int = 0
+    for (start_a, start_b, n) in blocks + [(len(a), len(b), 0)]:
+        if start_a > i or start_b > j:
+            changes.append((i, start_a, j, start_b))
+        i, j = start_a + n, start_b + n
+
+    funcname: Optional[bytes] = None
+    searched: int = 0
+    first: int = 0
+    while first < len(changes):
+        last: int = first
+        while last + 1 < len(changes) and changes[last + 1][0] - changes[last][1] <= 2 * context:
+            last += 1
+        a_start: int = max(0, changes[first][0] - context)
+        b_start: int = changes[first][2] - (changes[first][0] - a_start)
+        a_end: int = min(len(a), changes[last][1] + context)
+        b_end: int = changes[last][3] + (a_end - changes[last][1])
+
+        funcname = diff_funcname(a, a_start, searched, funcname)
+        searched = max(searched, a_start)
+        out: list[bytes] = [b'@@ -' + diff_range(a_start, a_end - a_start) + b' +' + diff_range(b_start, b_end - b_start) + b' @@']
+        out.append(b' ' + funcname + b'\n' if funcname else b'\n')
+        pos: int = a_start
+        for (old_start, old_end, new_start, new_end) in changes[first:last + 1]:
+            out.extend(diff_line(b' ', line) for line in a[pos:old_start])
+            out.extend(diff_line(b'-', line) for line in a[old_start:old_end])
+            out.extend(diff_line(b'+', line) for line in b[new_start:new_end])
+            pos = old_end
+        out.extend(diff_line(b' ', line) for line in a[pos:a_end])
+        yield b''.join(out)
+        first = last + 1
+
+# Signature: bytes, bytes -> bytes
+def diff_line(sign: bytes, line: bytes) -> bytes:
+    return sign + line if line.endswith(b'\n') else sign + line + b'\n\\ No newline at end of file\n'
+
+# ------------------------------------------------[files]--------------------------------------------------
+
+# Signature: bytes -> bool
+def diff_is_binary(data: bytes) -> bool:
+    return b'\x00' in data[:DIFF_BINARY_PROBE]
+
+# Signature: GitRepository, GitDiffFile -> bytes
+# Purpose: A file's content: its blob, its worktree file, or for a submodule the line git shows for it.
+def diff_content(repo: 'GitRepository', file: 'GitDiffFile') -> bytes:
+    if file.mode == b'160000':
+        return b'Subproject commit ' + file.sha.encode("ascii") + b'\n'
+    if file.worktree is not None:
+        if file.mode == b'120000':
+            return os.readlink(file.worktree).encode("utf8")
+        with open(file.worktree, "rb") as f:
+            return f.read()
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, file.sha)
+    if raw is None:
+        raise Exception(f"Missing object {file.sha}.")
+    return raw[1]
+
+# Signature: GitRepository, Optional[GitDiffFile], Optional[GitDiffFile], Optional[GitRenamePair], BinaryIO, int, str -> None
+# Purpose: Writes one file's diff in git's format: the header, then "Binary files ... differ" or the hunks as
+#          they are produced.
+def diff_file(repo: 'GitRepository', old: Optional['GitDiffFile'], new: Optional['GitDiffFile'], rename: Optional['GitRenamePair'],
+              out: BinaryIO, context: int = DIFF_CONTEXT, algorithm: str = "histogram") -> None:
+    old_path: bytes = (old or new).path.encode("utf8")
+    new_path: bytes = (new or old).path.encode("utf8")
+    out.write(b'diff --git a/' + old_path + b' b/' + new_path + b'\n')
+    if old is None:
+        out.write(b'new file mode ' + new.mode + b'\n')
+    elif new is None:
+        out.write(b'deleted file mode ' + old.mode + b'\n')
+    elif old.mode != new.mode:
+        out.write(b'old mode ' + old.mode + b'\nnew mode ' + new.mode + b'\n')
+    if rename is not None:
+        verb: bytes = b'rename' if rename.status == "R" else b'copy'
+        out.write(b'similarity index %d%%\n' % rename.score + verb + b' from ' + old_path + b'\n' + verb + b' to ' + new_path + b'\n')
+    old_sha: str = old.sha if old else DIFF_NULL_SHA
+    new_sha: str = new.sha if new else DIFF_NULL_SHA
+    if old_sha == new_sha:
+        return
+    out.write(b'index ' + old_sha[:7].encode("ascii") + b'..' + new_sha[:7].encode("ascii"))
+    out.write(b' ' + old.mode + b'\n' if old and new and old.mode == new.mode else b'\n')
+
+    a: bytes = diff_content(repo, old) if old else b''
+    b: bytes = diff_content(repo, new) if new else b''
+    a_label: bytes = b'a/' + old_path if old else b'/dev/null'
+    b_label: bytes = b'b/' + new_path if new else b'/dev/null'
+    if diff_is_binary(a) or diff_is_binary(b):
+        out.write(b'Binary files ' + a_label + b' and ' + b_label + b' differ\n')
+        return
+    a_lines: list[bytes] = diff_lines(a)
+    b_lines: list[bytes] = diff_lines(b)
+    if not a_lines and not b_lines:
+        return
+    out.write(b'--- ' + a_label + b'\n+++ ' + b_label + b'\n')
+    for hunk in diff_hunks(a_lines, b_lines, diff_blocks(a_lines, b_lines, algorithm), context):
+        out.write(hunk)
+
+# Signature: GitRepository, list[tuple[str, Optional[GitDiffFile], Optional[GitDiffFile]]], BinaryIO, int, str, bool, Optional[dict[str, GitDiffFile]], int -> bool
+# Purpose: Writes the diff of every changed file ([(path, old, new)] in path order), renamed files paired up with
+#          rename_detect first, and added files with the copy_sources ({path: file} of files that still exist) they
+#          were copied from, if given. Contents are read one file at a time, as its diff is written. Returns whether
+#          similarity detection was skipped for having more than limit sources times limit destinations.
+def diff_write(repo: 'GitRepository', changes: list[tuple[str, Optional['GitDiffFile'], Optional['GitDiffFile']]], out: BinaryIO,
+               context: int = DIFF_CONTEXT, algorithm: str = "histogram", renames: bool = True,
+               copy_sources: Optional[dict[str, 'GitDiffFile']] = None, limit: int = RENAME_LIMIT) -> bool:
+    pairs: dict[str, 'GitRenamePair'] = dict()
+    skipped: bool = False
+    sources: dict[str, 'GitDiffFile'] = {path: old for (path, old, new) in changes if old is not None and new is None}
+    if renames:
+        # Only files whose content is in the object store can be compared; worktree changes are not hashed in.
+        deleted: dict[str, str] = {path: old.sha for (path, old) in sources.items()}
+        added: dict[str, str] = {path: new.sha for (path, old, new) in changes if old is None and new.worktree is None}
+        copies: Optional[dict[str, str]] = {path: file.sha for (path, file) in copy_sources.items()} if copy_sources is not None else None
+        if added and (deleted or copies):
+            with trace2_region("renames"):
+                found, skipped = rename_detect(repo, deleted, added, copies, limit=limit)
+            pairs = {pair.new_path: pair for pair in found}
+            if copy_sources is not None:
+                sources = {**copy_sources, **sources}
+    taken: set[str] = {pair.old_path for pair in pairs.values() if pair.status == "R"}
+
+    trace2_count("diff_files", len(changes))
+    for (path, old, new) in changes:
+        if old is not None and new is None and path in taken:
+            continue
+        rename: Optional['GitRenamePair'] = pairs.get(path) if old is None else None
+        if rename is not None:
+            old = sources[rename.old_path]
+        diff_file(repo, old, new, rename, out, context, algorithm)
+    return skipped
+
+# ------------------------------------------------[sides]--------------------------------------------------
+
+# Signature: GitTreeLeaf, str -> GitDiffFile
+def diff_file_from_leaf(leaf: 'GitTreeLeaf', path: str) -> 'GitDiffFile':
+    return GitDiffFile(path, leaf.mode, leaf.sha)
+
+# Signature: GitRepository, Optional[str], Optional[str] -> list[tuple[str, Optional[GitDiffFile], Optional[GitDiffFile]]]
+# Purpose: The files that differ between two trees. Subtrees with the same sha are skipped without being read.
+def diff_trees(repo: 'GitRepository', old: Optional[str], new: Optional[str]) -> list[tuple[str, Optional['GitDiffFile'], Optional['GitDiffFile']]]:
+    return [(path, diff_file_from_leaf(a, path) if a else None, diff_file_from_leaf(b, path) if b else None) for (path, a, b) in tree_diff(repo, old, new)]
+
+# Signature: GitRepository, Optional[str], str -> dict[str, GitDiffFile]
+# Purpose: Every file under a tree (None is empty), by path.
+def diff_tree_files(repo: 'GitRepository', tree: Optional[str], prefix: str = "") -> dict[str, 'GitDiffFile']:
+    ret: dict[str, 'GitDiffFile'] = dict()
+    for (name, entry) in sorted(tree_entries_raw(repo, tree).items()):
+        leaf: 'GitTreeLeaf' = tree_leaf_from_raw(name, entry)
+        path: str = prefix + leaf.path
+        if leaf.mode.startswith(b'04'):
+            ret.update(diff_tree_files(repo, leaf.sha, path + "/"))
+        else:
+            ret[path] = diff_file_from_leaf(leaf, path)
+    return ret
+
+# Signature: GitIndexEntry -> bytes
+def diff_index_mode(entry: 'GitIndexEntry') -> bytes:
+    return f"{(entry.mode_type << 12) | entry.mode_perms:06o}".encode("ascii")
+
+# Signature: GitIndex -> dict[str, GitDiffFile]
+# Purpose: The staged files by path. Conflicted paths are left out: they have no single staged version.
+def diff_index_files(index: 'GitIndex') -> dict[str, 'GitDiffFile']:
+    return {entry.name: GitDiffFile(entry.name, diff_index_mode(entry), entry.sha) for entry in index.entries if entry.flag_stage == 0}
+
+# Signature: GitIndexEntry, str -> tuple[Optional[int], Optional[str]]
+# Purpose: The mode and sha of a staged file as it is in the worktree, (None, None) if it was deleted. A file
+#          whose stat data matches its entry is taken to be what was staged without being read; others are hashed.
+def diff_worktree_entry(entry: 'GitIndexEntry', full_path: str) -> tuple[Optional[int], Optional[str]]:
+    try:
+        st: os.stat_result = os.lstat(full_path)
+    except FileNotFoundError:
+        return None, None
+    if stat.S_ISLNK(st.st_mode):
+        mode: int = 0o120000
+    else:
+        mode = 0o100755 if st.st_mode & 0o100 else 0o100644
+    if (st.st_mtime_ns == entry.mtime[0] * 10**9 + entry.mtime[1] and st.st_ctime_ns == entry.ctime[0] * 10**9 + entry.ctime[1]
+            and st.st_size == entry.fsize):
+        return mode, entry.sha
+    trace2_count("files_hashed")
+    if mode == 0o120000:
+        data: bytes = os.readlink(full_path).encode("utf8")
+    else:
+        with open(full_path, "rb") as f:
+            data = f.read()
+    return mode, object_write(GitBlob(data), None)
+
+# Signature: GitIndexEntry, str, int, str -> GitDiffFile
+def diff_worktree_file(entry: 'GitIndexEntry', full_path: str, mode: int, sha: str) -> 'GitDiffFile':
+    return GitDiffFile(entry.name, f"{mode:06o}".encode("ascii"), sha, full_path if sha != entry.sha else None)
+
+# Signature: GitRepository, GitIndex -> dict[str, GitDiffFile]
+# Purpose: The worktree's tracked files by path. Deleted files are left out, and files outside the sparse
+#          checkout keep their staged version.
+def diff_worktree_files(repo: 'GitRepository', index: 'GitIndex') -> dict[str, 'GitDiffFile']:
+    ret: dict[str, 'GitDiffFile'] = dict()
+    prefix: str = os.path.join(repo.worktree, "")
+    for entry in index.entries:
+        if entry.flag_stage != 0:
+            continue
+        if entry.flag_skip_worktree:
+            ret[entry.name] = GitDiffFile(entry.name, diff_index_mode(entry), entry.sha)
+            continue
+        mode, sha = diff_worktree_entry(entry, prefix + entry.name)
+        if mode is not None:
+            ret[entry.name] = diff_worktree_file(entry, prefix + entry.name, mode, sha)
+    return ret
+
+# Signature: GitRepository, GitIndex -> list[tuple[str, Optional[GitDiffFile], Optional[GitDiffFile]]]
+# Purpose: The staged files that differ in the worktree, in path order. Unlike diffing diff_index_files against
+#          diff_worktree_files, nothing is built for the files that did not change, which are nearly all of them.
+def diff_index_worktree(repo: 'GitRepository', index: 'GitIndex') -> list[tuple[str, Optional['GitDiffFile'], Optional['GitDiffFile']]]:
+    ret: list[tuple[str, Optional['GitDiffFile'], Optional['GitDiffFile']]] = []
+    prefix: str = os.path.join(repo.worktree, "")
+    for entry in index.entries:
+        if entry.flag_stage != 0 or entry.flag_skip_worktree:
+            continue
+        mode, sha = diff_worktree_entry(entry, prefix + entry.name)
+        if mode is not None and sha == entry.sha and mode == (entry.mode_type << 12) | entry.mode_perms:
+            continue
+        staged: 'GitDiffFile' = GitDiffFile(entry.name, diff_index_mode(entry), entry.sha)
+        ret.append((entry.name, staged, diff_worktree_file(entry, prefix + entry.name, mode, sha) if mode is not None else None))
+    return ret
+
+# Signature: dict[str, GitDiffFile], dict[str, GitDiffFile] -> list[tuple[str, Optional[GitDiffFile], Optional[GitDiffFile]]]
+# Purpose: The files that differ between two sides, in path order.
+def diff_sides(old: dict[str, 'GitDiffFile'], new: dict[str, 'GitDiffFile']) -> list[tuple[str, Optional['GitDiffFile'], Optional['GitDiffFile']]]:
+    ret: list[tuple[str, Optional['GitDiffFile'], Optional['GitDiffFile']]] = []
+    for path in sorted(old.keys() | new.keys()):
+        a: Optional['GitDiffFile'] = old.get(path)
+        b: Optional['GitDiffFile'] = new.get(path)
+        if a is None or b is None or a.sha != b.sha or a.mode != b.mode:
+            ret.append((path, a, b))
+    return ret
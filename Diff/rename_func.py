@@ -0,0 +1,214 @@
+from collections import Counter
+from typing import TYPE_CHECKING, Optional
+import posixpath
+
+from Diff.RenamePair.git_rename_pair import GitRenamePair
+from Objects.object_func import object_read_raw
+from Trace2.trace2_func import trace2_count
+
+if TYPE_CHECKING:
+    from GitRepo.git_repository import GitRepository
+
+# Like git's default -M50%: the least similarity, in percent, for two different files to count as a rename.
+RENAME_THRESHOLD: int = 50
+
+# Like git's diff.renameLimit: similarity detection is skipped, and only exact renames found, when there are more
+# than this many sources times this many destinations. 0 means no limit.
+RENAME_LIMIT: int = 1000
+
+# Files are cut into chunks at each newline and every this many bytes, as git's span hashing does.
+RENAME_CHUNK: int = 64
+
+# A chunk found in more sources than this (blank lines, closing braces, license headers) says little about which
+# one a file came from: it still counts towards similarity, but is not used to look candidates up.
+RENAME_COMMON_CHUNK: int = 32
+
+# ------------------------------------------------[fingerprints]--------------------------------------------------
+
+# Signature: bytes -> dict[bytes, int]
+# Purpose: The file's chunks and how many of its bytes each accounts for. Two files share as many bytes as the
+#          counts of their common chunks allow, wherever in the file the chunks are.
+def rename_fingerprint(data: bytes) -> dict[bytes, int]:
+    ret: dict[bytes, int] = dict()
+    lines: list[bytes] = data.split(b'\n')
+    # The last piece has no newline of its own, and is empty when the file ends with one.
+    last: bytes = lines.pop()
+    for (line, count) in Counter(lines).items():
+        if len(line) < RENAME_CHUNK:
+            ret[line] = ret.get(line, 0) + count * (len(line) + 1)
+            continue
+        for start in range(0, len(line), RENAME_CHUNK):
+            chunk: bytes = line[start:start + RENAME_CHUNK]
+            ret[chunk] = ret.get(chunk, 0) + count * len(chunk)
+        ret[b'\n'] = ret.get(b'\n', 0) + count
+    for start in range(0, len(last), RENAME_CHUNK):
+        chunk = last[start:start + RENAME_CHUNK]
+        ret[chunk] = ret.get(chunk, 0) + len(chunk)
+    return ret
+
+# Signature: dict[bytes, int], int, dict[bytes, int], int -> int
+# Purpose: How similar two files are, in percent: the bytes they have in common over the size of the larger one.
+def rename_similarity(a: dict[bytes, int], a_size: int, b: dict[bytes, int], b_size: int) -> int:
+    if len(a) > len(b):
+        a, b = b, a
+    common: int = 0
+    for (chunk, size) in a.items():
+        other: Optional[int] = b.get(chunk)
+        if other:
+            common += size if size < other else other
+    return common * 100 // max(a_size, b_size)
+
+# Signature: GitRepository, str -> bytes
+def rename_blob(repo: 'GitRepository', sha: str) -> bytes:
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    return raw[1]
+
+# ------------------------------------------------[detection]--------------------------------------------------
+
+# Signature: GitRepository, str -> int
+# Purpose: The rename limit for a command: <section>.renameLimit, else diff.renameLimit, else RENAME_LIMIT.
+def rename_limit(repo: 'GitRepository', section: str = "diff") -> int:
+    for name in (section, "diff"):
+        if repo.config.has_option(name, "renamelimit"):
+            return repo.config.getint(name, "renamelimit")
+    return RENAME_LIMIT
+
+# Signature: GitRepository, str -> bool
+# Purpose: Whether a command looks for copies as well as renames: <section>.renames, else diff.renames, set to
+#          "copies" (or "copy").
+def rename_copies(repo: 'GitRepository', section: str = "diff") -> bool:
+    for name in (section, "diff"):
+        if repo.config.has_option(name, "renames"):
+            return repo.config.get(name, "renames").lower() in ("copies", "copy")
+    return False
+
+# Signature: str, list[str], set[str] -> str
+# Purpose: Of several sources with the same content, the one to pair with path: preferably one with the same file
+#          name, and one not already taken by another rename.
+def rename_pick(path: str, sources: list[str], renamed: set[str]) -> str:
+    name: str = posixpath.basename(path)
+    return min(sources, key=lambda source: (source in renamed, posixpath.basename(source) != name))
+
+# Signature: GitRepository, dict[str, str], dict[str, str], Optional[dict[str, str]], int, int -> tuple[list[GitRenamePair], bool]
+# Purpose: Pairs the added files ({path: sha}) with deleted ones they were renamed from and, when copy_sources is
+#          given ({path: sha} of files that still exist), with files they were copied from. Exact matches come
+#          first, found by joining on sha, then files that kept their name; the rest are compared by fingerprint.
+#          Each added file gets at most one pair and each deleted file is renamed at most once. Returns the pairs by
+#          new path, and whether similarity detection was skipped because there were more than limit sources times
+#          limit destinations left after the exact and same name matches.
+def rename_detect(repo: 'GitRepository', deleted: dict[str, str], added: dict[str, str], copy_sources: Optional[dict[str, str]] = None,
+                  threshold: int = RENAME_THRESHOLD, limit: int = RENAME_LIMIT) -> tuple[list['GitRenamePair'], bool]:
+    copies: bool = copy_sources is not None
+    sources: dict[str, str] = dict(deleted)
+    if copies:
+        sources.update(copy_sources)
+    pairs: list['GitRenamePair'] = []
+    renamed: set[str] = set()
+
+    def pair(source: str, path: str, score: int) -> None:
+        status: str = "R" if source in deleted and source not in renamed else "C"
+        if status == "R":
+            renamed.add(source)
+        pairs.append(GitRenamePair(status, source, path, sources[source], added[path], score))
+
+    by_sha: dict[str, list[str]] = dict()
+    for (path, sha) in sources.items():
+        by_sha.setdefault(sha, []).append(path)
+    left: list[str] = []
+    for path in sorted(added):
+        candidates: list[str] = [source for source in by_sha.get(added[path], ()) if copies or source not in renamed]
+        if candidates:
+            pair(rename_pick(path, candidates, renamed), path, 100)
+        else:
+            left.append(path)
+    trace2_count("renames_exact", len(pairs))
+
+    remaining: list[str] = [path for path in sources if copies or path not in renamed]
+    if left and remaining:
+        for (source, path, score) in rename_basenames(repo, {path: sources[path] for path in remaining}, {path: added[path] for path in left}, threshold):
+            pair(source, path, score)
+        named: set[str] = {p.new_path for p in pairs}
+        left = [path for path in left if path not in named]
+        remaining = [path for path in sources if copies or path not in renamed]
+    if not left or not remaining:
+        return sorted(pairs, key=lambda p: p.new_path), False
+    if limit and len(left) * len(remaining) > limit * limit:
+        return sorted(pairs, key=lambda p: p.new_path), True
+
+    # Candidates come best first, so each file takes the most similar source still free.
+    paired: set[str] = set()
+    for (score, source, path) in rename_candidates(repo, {path: sources[path] for path in remaining}, {path: added[path] for path in left}, threshold):
+        if path in paired or (not copies and source in renamed):
+            continue
+        paired.add(path)
+        pair(source, path, score)
+    return sorted(pairs, key=lambda p: p.new_path), False
+
+# Signature: GitRepository, dict[str, str], dict[str, str], int -> list[tuple[str, str, int]]
+# Purpose: A file moved to another directory usually keeps its name. Pairs each destination whose file name no
+#          other destination and exactly one source has with that source, if they are at least threshold similar:
+#          one comparison per file, so moving a whole tree costs no more than its size, whatever the rename limit.
+def rename_basenames(repo: 'GitRepository', sources: dict[str, str], destinations: dict[str, str], threshold: int) -> list[tuple[str, str, int]]:
+    by_name: dict[str, list[str]] = dict()
+    for path in sources:
+        by_name.setdefault(posixpath.basename(path), []).append(path)
+    destination_names: Counter[str] = Counter(posixpath.basename(path) for path in destinations)
+
+    ret: list[tuple[str, str, int]] = []
+    for path in sorted(destinations):
+        name: str = posixpath.basename(path)
+        candidates: Optional[list[str]] = by_name.get(name)
+        if destination_names[name] != 1 or candidates is None or len(candidates) != 1:
+            continue
+        a: bytes = rename_blob(repo, sources[candidates[0]])
+        b: bytes = rename_blob(repo, destinations[path])
+        if not a or not b or min(len(a), len(b)) * 100 < threshold * max(len(a), len(b)):
+            continue
+        score: int = rename_similarity(rename_fingerprint(a), len(a), rename_fingerprint(b), len(b))
+        if score >= threshold:
+            ret.append((candidates[0], path, score))
+    trace2_count("renames_basename", len(ret))
+    return ret
+
+# Signature: GitRepository, dict[str, str], dict[str, str], int -> list[tuple[int, str, str]]
+# Purpose: Every (score, source, destination) at least threshold similar, best first. Sources are found through
+#          an inverted index from chunk to the sources holding it, so only files sharing some uncommon chunk are
+#          ever compared, and files whose sizes alone rule out the threshold are not compared at all.
+def rename_candidates(repo: 'GitRepository', sources: dict[str, str], destinations: dict[str, str], threshold: int) -> list[tuple[int, str, str]]:
+    fingerprints: list[tuple[str, int, dict[bytes, int]]] = []
+    postings: dict[bytes, list[int]] = dict()
+    for (path, sha) in sorted(sources.items()):
+        data: bytes = rename_blob(repo, sha)
+        if not data:
+            continue
+        fingerprint: dict[bytes, int] = rename_fingerprint(data)
+        for chunk in fingerprint:
+            postings.setdefault(chunk, []).append(len(fingerprints))
+        fingerprints.append((path, len(data), fingerprint))
+
+    candidates: list[tuple[int, str, str]] = []
+    compared: int = 0
+    for (path, sha) in sorted(destinations.items()):
+        data = rename_blob(repo, sha)
+        if not data:
+            continue
+        fingerprint = rename_fingerprint(data)
+        found: set[int] = set()
+        for chunk in fingerprint:
+            posting: Optional[list[int]] = postings.get(chunk)
+            if posting and len(posting) <= RENAME_COMMON_CHUNK:
+                found.update(posting)
+        for i in found:
+            (source, size, source_fingerprint) = fingerprints[i]
+            if min(size, len(data)) * 100 < threshold * max(size, len(data)):
+                continue
+            compared += 1
+            score: int = rename_similarity(source_fingerprint, size, fingerprint, len(data))
+            if score >= threshold:
+                candidates.append((score, source, path))
+    trace2_count("rename_pairs_compared", compared)
+
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[2], candidate[1]))
+    return candidates
@@ -0,0 +1,10 @@
+from typing import BinaryIO
+
+class GitFastExportState:
+    def __init__(self, out: BinaryIO):
+        self.out: BinaryIO = out
+        # object id -> mark, for every blob and commit exported so far (or imported from a marks file).
+        self.marks: dict[str, int] = dict()
+        self.next_mark: int = 1
+        # commit -> its tree, for commits walked this run, so diffing against a parent does not re-read it.
+        self.trees: dict[str, str] = dict()
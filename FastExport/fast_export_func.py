@@ -0,0 +1,205 @@
+from typing import TYPE_CHECKING, BinaryIO, Iterator, Optional
+
+from CommitGraph.commit_graph_func import commit_graph_load
+from CommitGraph.commit_walk_func import commit_node
+from FastExport.FastExportState.git_fast_export_state import GitFastExportState
+from Objects.object_func import object_read_raw, object_stream
+from Objects.tree_diff_func import tree_diff
+
+if TYPE_CHECKING:
+    from CommitGraph.GitCommitGraph.git_commit_graph import GitCommitGraph
+    from GitRepo.git_repository import GitRepository
+    from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
+
+# Bytes a path must be quoted for, as git's quote_c_style decides: controls, '"', '\' and anything non-ASCII.
+FAST_EXPORT_ESCAPES: dict[int, bytes] = {0x07: b'\\a', 0x08: b'\\b', 0x09: b'\\t', 0x0a: b'\\n', 0x0b: b'\\v', 0x0c: b'\\f',
+                                         0x0d: b'\\r', 0x22: b'\\"', 0x5c: b'\\\\'}
+
+# ------------------------------------------------[walk]--------------------------------------------------
+
+# Signature: GitRepository, list[tuple[str, str]], GitFastExportState -> list[tuple[str, str]]
+# Purpose: Orders the commits reachable from tips ([(ref, commit)]) and not yet exported so that parents come before
+#          children, each paired with the ref of the first tip that reaches it. Only commit headers are read (from
+#          the commit-graph when there is one); the walk is iterative, so long histories do not hit the recursion limit.
+def fast_export_order(repo: 'GitRepository', tips: list[tuple[str, str]], state: 'GitFastExportState') -> list[tuple[str, str]]:
+    graph: Optional['GitCommitGraph'] = commit_graph_load(repo)
+    parents: dict[str, list[str]] = dict()
+    order: list[tuple[str, str]] = []
+
+    def visit(sha: str) -> Iterator[str]:
+        tree, commit_parents, _, _ = commit_node(repo, graph, sha)
+        state.trees[sha] = tree
+        parents[sha] = commit_parents
+        return iter(commit_parents)
+
+    for (ref, tip) in tips:
+        if tip in parents or tip in state.marks:
+            continue
+        stack: list[tuple[str, Iterator[str]]] = [(tip, visit(tip))]
+        while stack:
+            sha, pending = stack[-1]
+            for parent in pending:
+                if parent not in parents and parent not in state.marks:
+                    stack.append((parent, visit(parent)))
+                    break
+            else:
+                stack.pop()
+                order.append((ref, sha))
+    return order
+
+# ------------------------------------------------[output]--------------------------------------------------
+
+# Signature: str -> bytes
+# Purpose: A path as fast-export writes it: C-style quoted (octal escapes for non-ASCII bytes) only when needed.
+def fast_export_path(path: str) -> bytes:
+    raw: bytes = path.encode("utf8")
+    if not any(byte < 0x20 or byte >= 0x7f or byte in (0x22, 0x5c) for byte in raw):
+        return raw
+    ret: bytearray = bytearray(b'"')
+    for byte in raw:
+        if byte in FAST_EXPORT_ESCAPES:
+            ret += FAST_EXPORT_ESCAPES[byte]
+        elif byte < 0x20 or byte >= 0x7f:
+            ret += b'\\%03o' % byte
+        else:
+            ret.append(byte)
+    return bytes(ret + b'"')
+
+# Signature: GitFastExportState, str -> int
+def fast_export_mark(state: 'GitFastExportState', sha: str) -> int:
+    state.marks[sha] = state.next_mark
+    state.next_mark += 1
+    return state.marks[sha]
+
+# Signature: GitFastExportState, str -> bytes
+# Purpose: How a commit is referred to: by its mark once exported, else (exported by an earlier run without marks)
+#          by its id.
+def fast_export_commit_ref(state: 'GitFastExportState', sha: str) -> bytes:
+    mark: Optional[int] = state.marks.get(sha)
+    return f":{mark}".encode("ascii") if mark else sha.encode("ascii")
+
+# Signature: GitRepository, GitFastExportState, str -> None
+# Purpose: Writes a blob command, streaming the payload so memory stays flat however large the blob is.
+def fast_export_blob(repo: 'GitRepository', state: 'GitFastExportState', sha: str) -> None:
+    stream: Optional[tuple[bytes, int, Iterator[bytes]]] = object_stream(repo, sha)
+    if stream is None:
+        raise Exception(f"Missing object {sha}.")
+    state.out.write(b'blob\nmark :%d\ndata %d\n' % (fast_export_mark(state, sha), stream[1]))
+    for chunk in stream[2]:
+        state.out.write(chunk)
+    state.out.write(b'\n')
+
+# Signature: GitRepository, str -> tuple[dict[bytes, bytes], list[str], bytes]
+# Purpose: A commit's (or tag's) single-line headers, its parents and its message. Signatures and other multi-line
+#          headers are dropped: they would not match the object fast-import recreates.
+def fast_export_object_read(repo: 'GitRepository', sha: str) -> tuple[dict[bytes, bytes], list[str], bytes]:
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    header, _, message = raw[1].partition(b'\n\n')
+    fields: dict[bytes, bytes] = dict()
+    parents: list[str] = []
+    for line in header.split(b'\n'):
+        key, _, value = line.partition(b' ')
+        if key == b'parent':
+            parents.append(value.decode("ascii"))
+        elif key in (b'tree', b'author', b'committer', b'encoding', b'tagger'):
+            fields[key] = value
+    return fields, parents, message
+
+# Signature: GitRepository, GitFastExportState, str, str -> None
+# Purpose: Writes one commit on ref: the blobs it introduces, then the commit with its changes against its first
+#          parent, found by a tree diff that skips every subtree the two share.
+def fast_export_commit(repo: 'GitRepository', state: 'GitFastExportState', ref: str, sha: str) -> None:
+    fields, parents, message = fast_export_object_read(repo, sha)
+    parent_tree: Optional[str] = None
+    if parents:
+        parent_tree = state.trees.get(parents[0]) or fast_export_object_read(repo, parents[0])[0][b'tree'].decode("ascii")
+
+    changes: list[tuple[str, Optional['GitTreeLeaf'], Optional['GitTreeLeaf']]] = list(tree_diff(repo, parent_tree, fields[b'tree'].decode("ascii")))
+    for (_, _, new) in changes:
+        if new and not new.mode.startswith(b'16') and new.sha not in state.marks:
+            fast_export_blob(repo, state, new.sha)
+
+    out: BinaryIO = state.out
+    if not parents:
+        out.write(b'reset ' + ref.encode("utf8") + b'\n')
+    out.write(b'commit ' + ref.encode("utf8") + b'\nmark :%d\n' % fast_export_mark(state, sha))
+    out.write(b'author ' + fields.get(b'author', fields[b'committer']) + b'\ncommitter ' + fields[b'committer'] + b'\n')
+    if b'encoding' in fields:
+        out.write(b'encoding ' + fields[b'encoding'] + b'\n')
+    out.write(b'data %d\n' % len(message) + message)
+    for (i, parent) in enumerate(parents):
+        out.write((b'from ' if i == 0 else b'merge ') + fast_export_commit_ref(state, parent) + b'\n')
+
+    for (path, _, new) in changes:
+        if new is None:
+            out.write(b'D ' + fast_export_path(path) + b'\n')
+        elif new.mode.startswith(b'16'):
+            out.write(b'M 160000 ' + new.sha.encode("ascii") + b' ' + fast_export_path(path) + b'\n')
+        else:
+            out.write(b'M ' + new.mode + b' :%d ' % state.marks[new.sha] + fast_export_path(path) + b'\n')
+    out.write(b'\n')
+
+# Signature: GitRepository, GitFastExportState, str, str -> bool
+# Purpose: Writes an annotated tag of an exported commit. Returns False, writing nothing, if the tag points at
+#          something else, which a fast-import stream cannot express by mark.
+def fast_export_tag(repo: 'GitRepository', state: 'GitFastExportState', name: str, sha: str, target: str) -> bool:
+    if target not in state.marks:
+        return False
+    fields, _, message = fast_export_object_read(repo, sha)
+    state.out.write(b'tag ' + name.encode("utf8") + b'\nfrom ' + fast_export_commit_ref(state, target) + b'\n')
+    if b'tagger' in fields:
+        state.out.write(b'tagger ' + fields[b'tagger'] + b'\n')
+    state.out.write(b'data %d\n' % len(message) + message + b'\n')
+    return True
+
+# Signature: GitRepository, str -> tuple[str, Optional[str]]
+# Purpose: Peels a ref's target down to a commit: returns the commit and the annotated tag on the way, if any.
+def fast_export_peel(repo: 'GitRepository', sha: str) -> tuple[Optional[str], Optional[str]]:
+    tag: Optional[str] = None
+    while True:
+        raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+        if raw is None:
+            raise Exception(f"Missing object {sha}.")
+        if raw[0] == b'commit':
+            return sha, tag
+        if raw[0] != b'tag':
+            return None, tag
+        tag = tag or sha
+        sha = raw[1][7:47].decode("ascii")
+
+# Signature: GitRepository, list[tuple[str, str]], BinaryIO, dict[str, int] -> GitFastExportState
+# Purpose: Writes the history of refs ([(ref name, object id)]) to out as a fast-export stream, oldest commits first.
+#          Commits already in marks (from an earlier run) are not written again. Output is written as it is produced:
+#          besides the marks, only the commit currently being exported is held in memory.
+def fast_export(repo: 'GitRepository', refs: list[tuple[str, str]], out: BinaryIO, marks: Optional[dict[str, int]] = None) -> 'GitFastExportState':
+    state: 'GitFastExportState' = GitFastExportState(out)
+    if marks:
+        state.marks.update(marks)
+        state.next_mark = max(marks.values()) + 1
+
+    tips: list[tuple[str, str]] = []
+    tags: list[tuple[str, str, str]] = []
+    for (ref, sha) in refs:
+        commit, tag = fast_export_peel(repo, sha)
+        if commit is None:
+            continue
+        if tag and ref.startswith("refs/tags/"):
+            tags.append((ref[len("refs/tags/"):], tag, commit))
+        tips.append((ref, commit))
+
+    labels: dict[str, str] = dict()
+    for (ref, sha) in fast_export_order(repo, tips, state):
+        fast_export_commit(repo, state, ref, sha)
+        labels[sha] = ref
+
+    # A ref whose tip went out under another ref's name (or in an earlier run) still has to be set. Annotated tags
+    # are set by their tag command instead.
+    tagged: set[str] = {f"refs/tags/{name}" for (name, _, _) in tags}
+    for (ref, sha) in tips:
+        if labels.get(sha) != ref and ref not in tagged:
+            out.write(b'reset ' + ref.encode("utf8") + b'\nfrom ' + fast_export_commit_ref(state, sha) + b'\n\n')
+    for (name, tag, commit) in tags:
+        fast_export_tag(repo, state, name, tag, commit)
+    return state
@@ -0,0 +1,29 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING, BinaryIO, Optional
+
+if TYPE_CHECKING:
+    from FastImport.FastImportTree.git_fast_import_tree import GitFastImportTree
+    from GitRepo.git_repository import GitRepository
+
+class GitFastImportState:
+    def __init__(self, repo: 'GitRepository', force: bool = False):
+        self.repo: 'GitRepository' = repo
+        # Update refs even when the new tip does not contain the old one.
+        self.force: bool = force
+        # mark number -> object id
+        self.marks: dict[int, str] = dict()
+        # ref -> (tip commit or None for a branch with no commits yet, the tree of its next commit)
+        self.branches: dict[str, tuple[Optional[str], 'GitFastImportTree']] = dict()
+        # tag ref -> tag object id
+        self.tags: dict[str, str] = dict()
+        # The pack being written, its temporary path and what it holds so far: {sha: (offset, crc32)}.
+        self.pack: Optional[BinaryIO] = None
+        self.pack_path: Optional[str] = None
+        self.pack_entries: dict[str, tuple[int, int]] = dict()
+        # Recently written or read trees as lists of (mode, name, sha), least recently used first.
+        self.tree_cache: OrderedDict[str, list[tuple[bytes, str, str]]] = OrderedDict()
+        # Objects written per type, and objects skipped because the repository already had them.
+        self.counts: dict[bytes, int] = {b'blob': 0, b'tree': 0, b'commit': 0, b'tag': 0}
+        self.duplicates: int = 0
+        # Refs that were not updated because that would have lost commits.
+        self.refused: list[str] = []
@@ -0,0 +1,9 @@
+from typing import Optional
+
+class GitFastImportTree:
+    def __init__(self, sha: Optional[str] = None, entries: Optional[dict[str, tuple[bytes, Optional[str], Optional['GitFastImportTree']]]] = None):
+        # The tree's object id; None while it has changes that are not written yet.
+        self.sha: Optional[str] = sha
+        # name -> (mode, blob or gitlink sha, None) for files and (040000, None, subtree) for directories.
+        # None until first needed, then read from sha: untouched directories are never loaded.
+        self.entries: Optional[dict[str, tuple[bytes, Optional[str], Optional['GitFastImportTree']]]] = entries
@@ -0,0 +1,503 @@
+from typing import BinaryIO, Optional
+import os
+import re
+import sys
+
+from CommitGraph.merge_base_func import commit_is_ancestor
+from FastImport.FastImportState.git_fast_import_state import GitFastImportState
+from FastImport.FastImportTree.git_fast_import_tree import GitFastImportTree
+from GitRepo.git_repository import GitRepository
+from Objects.object_func import object_exists, object_read_raw
+from Objects.object_index_func import object_known
+from Objects.tree_func import tree_parse
+from Packs.pack_func import PACK_TYPES, object_sha, pack_append, pack_append_finish, pack_append_open, pack_entry_read
+from Refs.ref_func import ref_resolve
+from Trace2.trace2_func import trace2_count
+
+# Trees kept parsed in memory. Consecutive commits mostly touch the same directories, so a few thousand go a long way.
+FAST_IMPORT_TREE_CACHE: int = 4096
+
+# The file modes a stream may give, and how git writes them.
+FAST_IMPORT_MODES: dict[bytes, bytes] = {b'644': b'100644', b'100644': b'100644', b'755': b'100755', b'100755': b'100755',
+                                         b'120000': b'120000', b'160000': b'160000', b'040000': b'040000', b'40000': b'040000'}
+
+# The escapes of a C-style quoted path.
+FAST_IMPORT_ESCAPES: dict[int, int] = {ord(c): ord(v) for c, v in
+                                       (("a", "\a"), ("b", "\b"), ("f", "\f"), ("n", "\n"), ("r", "\r"), ("t", "\t"), ("v", "\v"), ('"', '"'), ("\\", "\\"))}
+
+FAST_IMPORT_NULL_SHA: str = "0" * 40
+
+# ------------------------------------------------[objects]--------------------------------------------------
+
+# Signature: GitFastImportState, bytes, bytes -> str
+# Purpose: Stores an object in the import's pack, unless the pack or the repository already has it, and returns its id.
+def fast_import_write(state: 'GitFastImportState', object_type: bytes, data: bytes) -> str:
+    sha: str = object_sha(object_type, data)
+    if sha in state.pack_entries or object_known(state.repo, sha):
+        state.duplicates += 1
+        return sha
+    if state.pack is None:
+        state.pack, state.pack_path = pack_append_open(state.repo)
+    state.pack_entries[sha] = pack_append(state.pack, object_type, data)
+    state.counts[object_type] += 1
+    trace2_count("objects_written")
+    return sha
+
+# Signature: GitFastImportState, str -> tuple[bytes, bytes]
+# Purpose: Reads an object back, from the pack being written if it is there, else from the repository.
+def fast_import_read(state: 'GitFastImportState', sha: str) -> tuple[bytes, bytes]:
+    entry: Optional[tuple[int, int]] = state.pack_entries.get(sha)
+    if entry:
+        type_id, data, _, _ = pack_entry_read(state.pack, entry[0])
+        return PACK_TYPES[type_id], data
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(state.repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    return raw
+
+# Signature: GitFastImportState, str -> str
+# Purpose: The tree of a commit.
+def fast_import_commit_tree(state: 'GitFastImportState', commit: str) -> str:
+    object_type, data = fast_import_read(state, commit)
+    if object_type != b'commit':
+        raise Exception(f"{commit} is a {object_type.decode('ascii')}, not a commit.")
+    return data[5:45].decode("ascii")
+
+# ------------------------------------------------[trees]--------------------------------------------------
+
+# Signature: GitFastImportState, str, list[tuple[bytes, str, str]] -> None
+def fast_import_tree_cache_put(state: 'GitFastImportState', sha: str, leaves: list[tuple[bytes, str, str]]) -> None:
+    state.tree_cache[sha] = leaves
+    state.tree_cache.move_to_end(sha)
+    while len(state.tree_cache) > FAST_IMPORT_TREE_CACHE:
+        state.tree_cache.popitem(last=False)
+
+# Signature: GitFastImportState, GitFastImportTree -> dict[str, tuple[bytes, Optional[str], Optional[GitFastImportTree]]]
+# Purpose: The entries of a tree, loading them from its sha on first use. Subdirectories load lazily in turn.
+def fast_import_tree_entries(state: 'GitFastImportState', tree: 'GitFastImportTree') -> dict[str, tuple[bytes, Optional[str], Optional['GitFastImportTree']]]:
+    if tree.entries is not None:
+        return tree.entries
+
+    leaves: Optional[list[tuple[bytes, str, str]]] = state.tree_cache.get(tree.sha)
+    if leaves is None:
+        object_type, data = fast_import_read(state, tree.sha)
+        if object_type != b'tree':
+            raise Exception(f"{tree.sha} is a {object_type.decode('ascii')}, not a tree.")
+        leaves = [(leaf.mode, leaf.path, leaf.sha) for leaf in tree_parse(data)]
+    fast_import_tree_cache_put(state, tree.sha, leaves)
+
+    tree.entries = {name: (b'040000', None, GitFastImportTree(sha=sha)) if mode.startswith(b'04') else (mode, sha, None)
+                    for (mode, name, sha) in leaves}
+    return tree.entries
+
+# Signature: GitFastImportState, GitFastImportTree, str -> Optional[tuple[bytes, Optional[str], Optional[GitFastImportTree]]]
+# Purpose: The entry at path under root, or None.
+def fast_import_tree_get(state: 'GitFastImportState', root: 'GitFastImportTree', path: str) -> Optional[tuple[bytes, Optional[str], Optional['GitFastImportTree']]]:
+    tree: 'GitFastImportTree' = root
+    parts: list[str] = path.split("/")
+    for name in parts[:-1]:
+        entry = fast_import_tree_entries(state, tree).get(name)
+        if entry is None or entry[2] is None:
+            return None
+        tree = entry[2]
+    return fast_import_tree_entries(state, tree).get(parts[-1])
+
+# Signature: GitFastImportState, GitFastImportTree, str, Optional[tuple[bytes, Optional[str], Optional[GitFastImportTree]]] -> None
+# Purpose: Sets the entry at path under root, or deletes it when entry is None, creating missing directories on the
+#          way. Every tree from root down to the change is marked dirty; the rest keep their sha and are not rewritten.
+def fast_import_tree_set(state: 'GitFastImportState', root: 'GitFastImportTree', path: str,
+                         entry: Optional[tuple[bytes, Optional[str], Optional['GitFastImportTree']]]) -> None:
+    parts: list[str] = path.split("/")
+    trees: list['GitFastImportTree'] = [root]
+    for name in parts[:-1]:
+        entries = fast_import_tree_entries(state, trees[-1])
+        current = entries.get(name)
+        if current is None or current[2] is None:
+            if entry is None:
+                return
+            # A file in the way of a directory is replaced by it, as in git.
+            current = (b'040000', None, GitFastImportTree(entries=dict()))
+            entries[name] = current
+        trees.append(current[2])
+
+    entries = fast_import_tree_entries(state, trees[-1])
+    if entry is None:
+        if entries.pop(parts[-1], None) is None:
+            return
+    else:
+        entries[parts[-1]] = entry
+    for tree in trees:
+        tree.sha = None
+
+# Signature: GitFastImportState, GitFastImportTree -> Optional[str]
+# Purpose: Writes the dirty trees under tree, children first, and returns its sha; None if it ended up empty.
+def fast_import_tree_write(state: 'GitFastImportState', tree: 'GitFastImportTree') -> Optional[str]:
+    if tree.sha:
+        return tree.sha
+
+    entries = fast_import_tree_entries(state, tree)
+    leaves: list[tuple[bytes, str, str]] = []
+    for name, (mode, sha, subtree) in list(entries.items()):
+        if subtree is not None:
+            sha = fast_import_tree_write(state, subtree)
+            if sha is None:
+                # Git has no empty directories: one emptied by deletions goes.
+                del entries[name]
+                continue
+        leaves.append((mode, name, sha))
+    if not leaves:
+        return None
+
+    # The same bytes as GitTree.serialize, without building a GitTreeLeaf per entry: every commit rewrites the
+    # directories it touches in full, so this is the import's innermost loop.
+    leaves.sort(key=lambda leaf: leaf[1] + "/" if leaf[0] == b'040000' else leaf[1])
+    data: bytes = b''.join(mode.lstrip(b'0') + b' ' + name.encode("utf8") + b'\x00' + bytes.fromhex(sha) for (mode, name, sha) in leaves)
+    tree.sha = fast_import_write(state, b'tree', data)
+    fast_import_tree_cache_put(state, tree.sha, leaves)
+    return tree.sha
+
+# ------------------------------------------------[stream]--------------------------------------------------
+
+# Signature: BinaryIO -> Optional[bytes]
+# Purpose: The next command line without its newline, skipping blank lines and comments; None at the end.
+def fast_import_line(stream: BinaryIO) -> Optional[bytes]:
+    while True:
+        line: bytes = stream.readline()
+        if not line:
+            return None
+        line = line.rstrip(b'\n')
+        if line and not line.startswith(b'#'):
+            return line
+
+# Signature: BinaryIO, Optional[bytes] -> bytes
+# Purpose: Reads the payload announced by a data line: an exact byte count ("data 12") or a delimited
+#          block ("data <<EOF").
+def fast_import_data(stream: BinaryIO, line: Optional[bytes]) -> bytes:
+    if line is None or not line.startswith(b'data '):
+        raise Exception(f"Expected a data command, got {line!r}.")
+    spec: bytes = line[5:]
+    if spec.startswith(b'<<'):
+        delimiter: bytes = spec[2:]
+        lines: list[bytes] = []
+        while True:
+            raw: bytes = stream.readline()
+            if not raw:
+                raise Exception(f"Missing data delimiter {delimiter!r}.")
+            if raw.rstrip(b'\n') == delimiter:
+                return b''.join(lines)
+            lines.append(raw)
+
+    size: int = int(spec)
+    data: bytes = stream.read(size)
+    if len(data) != size:
+        raise Exception(f"Data ended after {len(data)} of {size} bytes.")
+    return data
+
+# Signature: bytes, bool -> tuple[str, bytes]
+# Purpose: Parses the path at the start of raw, C-style quoted or not, and returns it with what follows it.
+#          An unquoted path runs to the end of the line if last, else to the first space.
+def fast_import_path(raw: bytes, last: bool) -> tuple[str, bytes]:
+    if not raw.startswith(b'"'):
+        if last:
+            return raw.decode("utf8"), b''
+        path, _, rest = raw.partition(b' ')
+        return path.decode("utf8"), rest
+
+    ret: bytearray = bytearray()
+    i: int = 1
+    while raw[i] != ord('"'):
+        if raw[i] != ord('\\'):
+            ret.append(raw[i])
+            i += 1
+        elif raw[i + 1] in b'01234567':
+            ret.append(int(raw[i + 1:i + 4], 8))
+            i += 4
+        else:
+            ret.append(FAST_IMPORT_ESCAPES[raw[i + 1]])
+            i += 2
+    return ret.decode("utf8"), raw[i + 1:].lstrip(b' ')
+
+# Signature: GitFastImportState, bytes -> Optional[str]
+# Purpose: Resolves a commit-ish: a mark, a branch of the import, a ref of the repository or an object id.
+#          The null id stands for no commit.
+def fast_import_commitish(state: 'GitFastImportState', raw: bytes) -> Optional[str]:
+    name: str = raw.decode("utf8")
+    if name.startswith(":"):
+        return fast_import_mark(state, name)
+    if name.endswith("^0"):
+        name = name[:-2]
+    if name in state.branches:
+        return state.branches[name][0]
+    if re.fullmatch(r"[0-9a-f]{40}", name):
+        return None if name == FAST_IMPORT_NULL_SHA else name
+    for ref in (name, f"refs/heads/{name}"):
+        sha: Optional[str] = ref_resolve(state.repo, ref)
+        if sha:
+            return sha
+    raise Exception(f"Not a valid commit: {name}.")
+
+# Signature: GitFastImportState, str -> str
+def fast_import_mark(state: 'GitFastImportState', mark: str) -> str:
+    sha: Optional[str] = state.marks.get(int(mark[1:]))
+    if sha is None:
+        raise Exception(f"Unknown mark {mark}.")
+    return sha
+
+# ------------------------------------------------[commands]--------------------------------------------------
+
+# Signature: GitFastImportState, BinaryIO, GitFastImportTree, bytes -> None
+# Purpose: Applies one filemodify (M), filedelete (D), filecopy (C), filerename (R) or deleteall command to root.
+def fast_import_file_command(state: 'GitFastImportState', stream: BinaryIO, root: 'GitFastImportTree', line: bytes) -> None:
+    if line == b'deleteall':
+        root.entries = dict()
+        root.sha = None
+    elif line.startswith(b'M '):
+        mode, dataref, rest = line[2:].split(b' ', 2)
+        path, _ = fast_import_path(rest, last=True)
+        if mode not in FAST_IMPORT_MODES:
+            raise Exception(f"Unsupported file mode {mode.decode('ascii')} for {path}.")
+        mode = FAST_IMPORT_MODES[mode]
+        if dataref == b'inline':
+            sha: str = fast_import_write(state, b'blob', fast_import_data(stream, stream.readline().rstrip(b'\n')))
+        elif dataref.startswith(b':'):
+            sha = fast_import_mark(state, dataref.decode("ascii"))
+        else:
+            sha = dataref.decode("ascii")
+        if mode == b'040000':
+            if not path:
+                root.sha, root.entries = sha, None
+                return
+            fast_import_tree_set(state, root, path, (mode, None, GitFastImportTree(sha=sha)))
+        else:
+            fast_import_tree_set(state, root, path, (mode, sha, None))
+    elif line.startswith(b'D '):
+        fast_import_tree_set(state, root, fast_import_path(line[2:], last=True)[0], None)
+    elif line.startswith((b'C ', b'R ')):
+        source, rest = fast_import_path(line[2:], last=False)
+        destination, _ = fast_import_path(rest, last=True)
+        entry = fast_import_tree_get(state, root, source)
+        if entry is None:
+            raise Exception(f"Path {source} not in branch.")
+        if entry[2] is not None:
+            # Copies share nothing: the directory is written and copied by its sha.
+            sha = fast_import_tree_write(state, entry[2])
+            entry = (entry[0], None, GitFastImportTree(sha=sha))
+        if line.startswith(b'R '):
+            fast_import_tree_set(state, root, source, None)
+        fast_import_tree_set(state, root, destination, entry)
+    else:
+        raise Exception(f"Unsupported command in commit: {line.decode('utf8', errors='replace')}")
+
+# Signature: GitFastImportState, BinaryIO, str -> Optional[bytes]
+# Purpose: Imports one commit onto ref. Only the trees along changed paths are rewritten. Returns the first line
+#          after the commit, which belongs to the next command.
+def fast_import_commit(state: 'GitFastImportState', stream: BinaryIO, ref: str) -> Optional[bytes]:
+    line: Optional[bytes] = fast_import_line(stream)
+    mark: Optional[int] = None
+    if line and line.startswith(b'mark :'):
+        mark = int(line[6:])
+        line = fast_import_line(stream)
+    if line and line.startswith(b'original-oid '):
+        line = fast_import_line(stream)
+    author: Optional[bytes] = None
+    if line and line.startswith(b'author '):
+        author = line[7:]
+        line = fast_import_line(stream)
+    if not line or not line.startswith(b'committer '):
+        raise Exception(f"Commit on {ref} has no committer.")
+    committer: bytes = line[10:]
+    line = fast_import_line(stream)
+    encoding: Optional[bytes] = None
+    if line and line.startswith(b'encoding '):
+        encoding = line[9:]
+        line = fast_import_line(stream)
+    message: bytes = fast_import_data(stream, line)
+    line = fast_import_line(stream)
+
+    tip, root = state.branches.get(ref, (None, None))
+    if root is None:
+        root = GitFastImportTree(entries=dict())
+    parents: list[str] = [tip] if tip else []
+    if line and line.startswith(b'from '):
+        parent: Optional[str] = fast_import_commitish(state, line[5:])
+        if parent != tip:
+            root = GitFastImportTree(sha=fast_import_commit_tree(state, parent)) if parent else GitFastImportTree(entries=dict())
+        parents = [parent] if parent else []
+        line = fast_import_line(stream)
+    while line and line.startswith(b'merge '):
+        parents.append(fast_import_commitish(state, line[6:]))
+        line = fast_import_line(stream)
+
+    while line and (line == b'deleteall' or line[:2] in (b'M ', b'D ', b'C ', b'R ')):
+        fast_import_file_command(state, stream, root, line)
+        line = fast_import_line(stream)
+
+    tree: str = fast_import_tree_write(state, root) or fast_import_write(state, b'tree', b'')
+    if root.sha is None:
+        root.sha, root.entries = tree, dict()
+
+    data: bytes = b'tree ' + tree.encode("ascii") + b'\n'
+    for parent in parents:
+        data += b'parent ' + parent.encode("ascii") + b'\n'
+    data += b'author ' + (author or committer) + b'\n' + b'committer ' + committer + b'\n'
+    if encoding:
+        data += b'encoding ' + encoding + b'\n'
+    data += b'\n' + message
+
+    sha: str = fast_import_write(state, b'commit', data)
+    state.branches[ref] = (sha, root)
+    if mark is not None:
+        state.marks[mark] = sha
+    return line
+
+# Signature: GitFastImportState, BinaryIO, str -> Optional[bytes]
+# Purpose: Imports an annotated tag. Returns the first line after it.
+def fast_import_tag(state: 'GitFastImportState', stream: BinaryIO, name: str) -> Optional[bytes]:
+    line: Optional[bytes] = fast_import_line(stream)
+    mark: Optional[int] = None
+    if line and line.startswith(b'mark :'):
+        mark = int(line[6:])
+        line = fast_import_line(stream)
+    if not line or not line.startswith(b'from '):
+        raise Exception(f"Tag {name} has no from command.")
+    target: Optional[str] = fast_import_commitish(state, line[5:])
+    line = fast_import_line(stream)
+    if line and line.startswith(b'original-oid '):
+        line = fast_import_line(stream)
+    tagger: Optional[bytes] = None
+    if line and line.startswith(b'tagger '):
+        tagger = line[7:]
+        line = fast_import_line(stream)
+    message: bytes = fast_import_data(stream, line)
+
+    target_type, _ = fast_import_read(state, target)
+    data: bytes = b'object ' + target.encode("ascii") + b'\ntype ' + target_type + b'\ntag ' + name.encode("utf8") + b'\n'
+    if tagger:
+        data += b'tagger ' + tagger + b'\n'
+    data += b'\n' + message
+
+    sha: str = fast_import_write(state, b'tag', data)
+    state.tags[f"refs/tags/{name}"] = sha
+    if mark is not None:
+        state.marks[mark] = sha
+    return fast_import_line(stream)
+
+# Signature: GitFastImportState, BinaryIO, str -> Optional[bytes]
+# Purpose: Handles reset: points ref at the given commit, or makes it a branch with no commits yet.
+def fast_import_reset(state: 'GitFastImportState', stream: BinaryIO, ref: str) -> Optional[bytes]:
+    line: Optional[bytes] = fast_import_line(stream)
+    tip: Optional[str] = None
+    if line and line.startswith(b'from '):
+        tip = fast_import_commitish(state, line[5:])
+        line = fast_import_line(stream)
+    root: 'GitFastImportTree' = GitFastImportTree(sha=fast_import_commit_tree(state, tip)) if tip else GitFastImportTree(entries=dict())
+    state.branches[ref] = (tip, root)
+    return line
+
+# ------------------------------------------------[checkpoints]--------------------------------------------------
+
+# Signature: GitFastImportState -> None
+# Purpose: Updates the refs of every imported branch and tag. A branch whose new tip does not contain its current
+#          one is left alone and reported, unless the import is forced.
+def fast_import_refs_update(state: 'GitFastImportState') -> None:
+    updates: dict[str, str] = {ref: tip for ref, (tip, _) in state.branches.items() if tip}
+    updates.update(state.tags)
+    for ref, sha in updates.items():
+        old: Optional[str] = ref_resolve(state.repo, ref)
+        if old == sha:
+            continue
+        if old and not state.force and ref.startswith("refs/heads/") and object_exists(state.repo, old) \
+                and not commit_is_ancestor(state.repo, old, sha):
+            if ref not in state.refused:
+                state.refused.append(ref)
+                print(f"warning: Not updating {ref} (new tip {sha} does not contain {old})", file=sys.stderr)
+            continue
+        with open(GitRepository.repo_file(state.repo, *ref.split("/"), mkdir=True), "w") as f:
+            f.write(sha + "\n")
+
+# Signature: GitFastImportState, Optional[str] -> None
+# Purpose: Makes everything imported so far durable and visible: completes the pack, updates refs and writes the
+#          marks file. The next object starts a new pack.
+def fast_import_checkpoint(state: 'GitFastImportState', export_marks: Optional[str] = None) -> None:
+    if state.pack is not None:
+        pack_append_finish(state.repo, state.pack, state.pack_path, state.pack_entries)
+        state.pack, state.pack_path = None, None
+        state.pack_entries = dict()
+    fast_import_refs_update(state)
+    if export_marks:
+        with open(export_marks, "w") as f:
+            for mark, sha in sorted(state.marks.items()):
+                f.write(f":{mark} {sha}\n")
+
+# Signature: GitFastImportState, str -> None
+def fast_import_marks_read(state: 'GitFastImportState', path: str) -> None:
+    with open(path) as f:
+        for line in f:
+            mark, _, sha = line.strip().partition(" ")
+            if mark:
+                state.marks[int(mark[1:])] = sha
+
+# Signature: GitRepository, BinaryIO, bool, Optional[str], Optional[str] -> GitFastImportState
+# Purpose: Imports a git fast-import stream into repo. Objects go straight into a pack, written as they come;
+#          each branch's tree is kept in memory and only the directories a commit touches are rewritten.
+#          Refs and marks are updated at each checkpoint command and at the end.
+def fast_import(repo: 'GitRepository', stream: BinaryIO, force: bool = False, import_marks: Optional[str] = None,
+                export_marks: Optional[str] = None) -> 'GitFastImportState':
+    state: 'GitFastImportState' = GitFastImportState(repo, force=force)
+    if import_marks:
+        fast_import_marks_read(state, import_marks)
+
+    try:
+        line: Optional[bytes] = fast_import_line(stream)
+        while line is not None:
+            if line == b'blob':
+                line = fast_import_line(stream)
+                mark: Optional[int] = None
+                if line and line.startswith(b'mark :'):
+                    mark = int(line[6:])
+                    line = fast_import_line(stream)
+                if line and line.startswith(b'original-oid '):
+                    line = fast_import_line(stream)
+                sha: str = fast_import_write(state, b'blob', fast_import_data(stream, line))
+                if mark is not None:
+                    state.marks[mark] = sha
+                line = fast_import_line(stream)
+            elif line.startswith(b'commit '):
+                line = fast_import_commit(state, stream, line[7:].decode("utf8"))
+            elif line.startswith(b'tag '):
+                line = fast_import_tag(state, stream, line[4:].decode("utf8"))
+            elif line.startswith(b'reset '):
+                line = fast_import_reset(state, stream, line[6:].decode("utf8"))
+            elif line == b'checkpoint':
+                fast_import_checkpoint(state, export_marks)
+                line = fast_import_line(stream)
+            elif line.startswith(b'progress '):
+                sys.stdout.write(line.decode("utf8", errors="replace") + "\n")
+                sys.stdout.flush()
+                line = fast_import_line(stream)
+            elif line.startswith(b'get-mark '):
+                sys.stdout.write(fast_import_mark(state, line[9:].decode("ascii")) + "\n")
+                sys.stdout.flush()
+                line = fast_import_line(stream)
+            elif line == b'done':
+                break
+            elif line.startswith(b'feature '):
+                if line[8:] not in (b'done', b'date-format=raw', b'date-format=raw-permissive', b'force'):
+                    raise Exception(f"Unsupported feature: {line[8:].decode('utf8', errors='replace')}")
+                state.force = state.force or line[8:] == b'force'
+                line = fast_import_line(stream)
+            elif line.startswith(b'option '):
+                # Options are for whichever importer they name; none change what is imported here.
+                line = fast_import_line(stream)
+            else:
+                raise Exception(f"Unsupported command: {line.decode('utf8', errors='replace')}")
+    except BaseException:
+        # Nothing is published from a failed import, but what was already checkpointed stays.
+        if state.pack is not None:
+            state.pack.close()
+            os.unlink(state.pack_path)
+            state.pack = None
+        raise
+
+    fast_import_checkpoint(state, export_marks)
+    return state
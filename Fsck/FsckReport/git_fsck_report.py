@@ -0,0 +1,9 @@
+class GitFsckReport:
+    def __init__(self):
+        self.checked: int = 0
+        # (sha, reason)
+        self.corrupt: list[tuple[str, str]] = []
+        # (missing sha, sha of the object or ref that points at it)
+        self.missing: list[tuple[str, str]] = []
+        # (sha, type)
+        self.dangling: list[tuple[str, bytes]] = []
@@ -0,0 +1,204 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Optional
+import hashlib
+import os
+import re
+import zlib
+
+from Fsck.FsckReport.git_fsck_report import GitFsckReport
+from GitRepo.git_repository import GitRepository
+from Objects.kvlm import kvlm_parse
+from Objects.tree_func import tree_parse
+from Packs.pack_func import object_sha, pack_index_read, pack_indexes, pack_object_at
+from Refs.ref_func import ref_list, ref_resolve, refs_flatten
+from StageIndex.stage_index_func import index_read
+
+if TYPE_CHECKING:
+    from Packs.PackIndex.git_pack_index import GitPackIndex
+
+# Objects handed to a worker at once; large enough to amortize the inter-process round trip.
+FSCK_BATCH_SIZE: int = 512
+
+SHA_RE: re.Pattern = re.compile(rb"^[0-9a-f]{40}$")
+
+# Per worker process: pack indexes already parsed, keyed by .idx path.
+fsck_pack_indexes: dict[str, 'GitPackIndex'] = dict()
+
+# Signature: bytes, bytes -> list[str]
+# Purpose: Checks that a commit, tag or tree parses and returns the objects it points at.
+#          Raises with the reason when the object is malformed.
+def fsck_object_links(object_type: bytes, data: bytes) -> list[str]:
+    match object_type:
+        case b'blob':
+            return []
+        case b'tree':
+            links: list[str] = []
+            for leaf in tree_parse(data):
+                if not leaf.mode.startswith(b'16'):
+                    links.append(leaf.sha)
+            return links
+        case b'commit' | b'tag':
+            kvlm: dict = kvlm_parse(data)
+            keys: list[bytes] = [b'tree', b'parent'] if object_type == b'commit' else [b'object']
+            required: bytes = keys[0]
+            if required not in kvlm:
+                raise Exception(f"missing {required.decode('ascii')} header")
+            links = []
+            for key in keys:
+                values = kvlm.get(key, [])
+                if type(values) != list:
+                    values = [values]
+                for value in values:
+                    if not SHA_RE.match(value):
+                        raise Exception(f"invalid {key.decode('ascii')} {value!r}")
+                    links.append(value.decode("ascii"))
+            return links
+        case _:
+            raise Exception(f"unknown type {object_type!r}")
+
+# Signature: tuple[Optional[str], list[tuple[str, str | int]]] -> list[tuple[str, Optional[bytes], Optional[str], list[str]]]
+# Purpose: Worker entry point. Re-hashes a batch of objects, all loose (pack is None, locations are file paths)
+#          or all from one pack (locations are offsets), and parses their structure. Returns, per object,
+#          its sha, its type, the reason it is corrupt (or None) and the objects it links to.
+def fsck_check_batch(batch: tuple[Optional[str], list[tuple[str, str | int]]]) -> list[tuple[str, Optional[bytes], Optional[str], list[str]]]:
+    pack_path, objects = batch
+    ret: list[tuple[str, Optional[bytes], Optional[str], list[str]]] = []
+
+    pack = None
+    index: Optional['GitPackIndex'] = None
+    if pack_path:
+        idx_path: str = pack_path[:-5] + ".idx"
+        if idx_path not in fsck_pack_indexes:
+            fsck_pack_indexes[idx_path] = pack_index_read(idx_path)
+        index = fsck_pack_indexes[idx_path]
+        pack = open(pack_path, "rb")
+
+    try:
+        for (sha, location) in objects:
+            object_type: Optional[bytes] = None
+            try:
+                if pack:
+                    object_type, data = pack_object_at(pack, location, index)
+                    actual: str = object_sha(object_type, data)
+                else:
+                    with open(location, "rb") as f:
+                        raw: bytes = zlib.decompress(f.read())
+                    actual = hashlib.sha1(raw).hexdigest()
+                    space_index: int = raw.find(b' ')
+                    null_index: int = raw.find(b'\x00', space_index)
+                    object_type = raw[0:space_index]
+                    data = raw[null_index + 1:]
+                    if int(raw[space_index:null_index].decode("ascii")) != len(data):
+                        raise Exception("bad length")
+
+                if actual != sha:
+                    raise Exception(f"hash mismatch, content hashes to {actual}")
+                ret.append((sha, object_type, None, fsck_object_links(object_type, data)))
+            except Exception as e:
+                ret.append((sha, object_type, str(e) or e.__class__.__name__, []))
+    finally:
+        if pack:
+            pack.close()
+
+    return ret
+
+# Signature: GitRepository -> list[tuple[Optional[str], list[tuple[str, str | int]]]]
+# Purpose: Enumerates every loose and packed object, grouped into worker batches.
+def fsck_batches(repo: 'GitRepository') -> list[tuple[Optional[str], list[tuple[str, str | int]]]]:
+    batches: list[tuple[Optional[str], list[tuple[str, str | int]]]] = []
+
+    loose: list[tuple[str, str | int]] = []
+    objects_dir: str = GitRepository.repo_path(repo, "objects")
+    for prefix in sorted(os.listdir(objects_dir)):
+        if len(prefix) != 2:
+            continue
+        for name in sorted(os.listdir(os.path.join(objects_dir, prefix))):
+            loose.append((prefix + name, os.path.join(objects_dir, prefix, name)))
+    for i in range(0, len(loose), FSCK_BATCH_SIZE):
+        batches.append((None, loose[i:i + FSCK_BATCH_SIZE]))
+
+    for index in pack_indexes(repo):
+        # Offset order keeps each worker's reads sequential within the pack.
+        packed: list[tuple[str, str | int]] = sorted(zip(index.shas, index.offsets), key=lambda e: e[1])
+        for i in range(0, len(packed), FSCK_BATCH_SIZE):
+            batches.append((index.pack_path, packed[i:i + FSCK_BATCH_SIZE]))
+
+    return batches
+
+# Signature: str -> Optional[str]
+# Purpose: Verifies a pack's trailing checksum. Returns the problem, or None.
+def fsck_pack_checksum(pack_path: str) -> Optional[str]:
+    checksum = hashlib.sha1()
+    with open(pack_path, "rb") as f:
+        size: int = os.fstat(f.fileno()).st_size
+        remaining: int = size - 20
+        while remaining > 0:
+            chunk: bytes = f.read(min(remaining, 1 << 20))
+            checksum.update(chunk)
+            remaining -= len(chunk)
+        if checksum.digest() != f.read(20):
+            return "pack checksum mismatch"
+    return None
+
+# Signature: GitRepository -> list[tuple[str, str]]
+# Purpose: Returns the connectivity roots as (sha, name): every ref, HEAD and every staged blob.
+def fsck_roots(repo: 'GitRepository') -> list[tuple[str, str]]:
+    roots: list[tuple[str, str]] = [(sha, ref) for ref, sha in refs_flatten(ref_list(repo)).items()]
+    head: Optional[str] = ref_resolve(repo, "HEAD")
+    if head:
+        roots.append((head, "HEAD"))
+    for entry in index_read(repo).entries:
+        if entry.mode_type != 0b1110:
+            roots.append((entry.sha, f"index:{entry.name}"))
+    return roots
+
+# Signature: GitRepository, Optional[int] -> GitFsckReport
+# Purpose: Re-hashes and parses every object across a process pool (one worker per core by default),
+#          then checks that everything reachable from the roots exists and finds the dangling objects.
+def fsck(repo: 'GitRepository', jobs: Optional[int] = None) -> 'GitFsckReport':
+    report: 'GitFsckReport' = GitFsckReport()
+    types: dict[str, bytes] = dict()
+    links: dict[str, list[str]] = dict()
+
+    batches = fsck_batches(repo)
+    pack_paths: list[str] = [index.pack_path for index in pack_indexes(repo)]
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        for (pack_path, problem) in zip(pack_paths, pool.map(fsck_pack_checksum, pack_paths)):
+            if problem:
+                report.corrupt.append((os.path.basename(pack_path), problem))
+        for results in pool.map(fsck_check_batch, batches):
+            for (sha, object_type, problem, targets) in results:
+                report.checked += 1
+                if problem:
+                    report.corrupt.append((sha, problem))
+                    continue
+                # A sha may be both loose and packed; either copy is as good.
+                types[sha] = object_type
+                links[sha] = targets
+
+    referenced: set[str] = set()
+    for sha, targets in links.items():
+        for target in targets:
+            referenced.add(target)
+            if target not in types:
+                report.missing.append((target, sha))
+
+    reachable: set[str] = set()
+    stack: list[str] = []
+    for (sha, name) in fsck_roots(repo):
+        if sha in types:
+            stack.append(sha)
+        else:
+            report.missing.append((sha, name))
+    while stack:
+        sha = stack.pop()
+        if sha in reachable:
+            continue
+        reachable.add(sha)
+        stack.extend(target for target in links.get(sha, []) if target in types)
+
+    for sha in sorted(types):
+        if sha not in reachable and sha not in referenced:
+            report.dangling.append((sha, types[sha]))
+
+    return report
@@ -5,6 +5,7 @@ import os
 from GitIgnore.Ignore.git_ignore import GitIgnore
 from Objects.object_func import object_read
 from StageIndex.stage_index_func import index_read
+from Trace2.trace2_func import trace2_count, trace2_region
 
 if TYPE_CHECKING:
     from GitRepo.git_repository import GitRepository
@@ -30,9 +31,14 @@ def gitignore_parse(lines: list[str]) -> list[tuple[str, bool]]:
         if parsed:
             ret.append(parsed)
 
+    trace2_count("ignore_rules_loaded", len(ret))
     return ret
 
 def gitignore_read(repo: 'GitRepository') -> 'GitIgnore':
+    with trace2_region("gitignore_read"):
+        return gitignore_read_files(repo)
+
+def gitignore_read_files(repo: 'GitRepository') -> 'GitIgnore':
     ret: 'GitIgnore' = GitIgnore(absolute=[], scoped=dict())
 
     repo_file: str = os.path.join(repo.gitdir, "info/exclude")
@@ -63,6 +69,8 @@ def gitignore_read(repo: 'GitRepository') -> 'GitIgnore':
 
 def check_ignore1(rules: list[tuple[str, bool]], path: str) -> Optional[bool]:
     result: Optional[bool] = None
+    # Every rule is matched against path, the last match winning, so each one counts as an evaluation.
+    trace2_count("ignore_rules_evaluated", len(rules))
     for (pattern, value) in rules:
         if fnmatch.fnmatch(path, pattern):
             result = value
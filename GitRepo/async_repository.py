@@ -0,0 +1,127 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Optional, TypeVar
+import asyncio
+import functools
+import os
+
+from GitRepo.git_repository import GitRepository
+from Libraries.Commands.cmd import leaf_checkout
+from Objects.object_func import object_exists, object_read, object_read_raw, object_write
+from Refs.ref_func import ref_list, ref_resolve, refs_flatten
+from StageIndex.stage_index_func import index_read, index_write
+
+if TYPE_CHECKING:
+    from Objects.git_object import GitObject
+    from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
+    from StageIndex.GitIndex.git_index import GitIndex
+
+T = TypeVar("T")
+
+# Shared by every AsyncRepository that is not given its own executor, so browsing many repositories
+# does not multiply threads. File reads and zlib inflation release the GIL, so the workers overlap; the
+# module-level caches they share (objects, delta bases, loose object listings, refs, the index) each
+# take their own lock around lookups and updates.
+async_default_executor: Optional[ThreadPoolExecutor] = None
+
+def async_executor_default() -> ThreadPoolExecutor:
+    global async_default_executor
+    if async_default_executor is None:
+        async_default_executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4), thread_name_prefix="bootgit")
+    return async_default_executor
+
+class AsyncRepository:
+    """asyncio facade over a GitRepository.
+    Every blocking operation runs on a bounded executor and at most max_concurrency of them
+    run at once for this repository, so a slow walk never stalls the event loop."""
+
+    def __init__(self, repo: 'GitRepository', executor: Optional[Executor] = None, max_concurrency: int = 8):
+        self.repo: 'GitRepository' = repo
+        self.executor: Executor = executor or async_executor_default()
+        self.semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+
+    def __str__(self):
+        return f"<AsyncRepository path={self.repo.worktree}>"
+
+    @classmethod
+    async def open(cls, path: str = ".", executor: Optional[Executor] = None, max_concurrency: int = 8) -> 'AsyncRepository':
+        """Finds the repository containing path without blocking the loop."""
+        loop = asyncio.get_running_loop()
+        repo: 'GitRepository' = await loop.run_in_executor(executor or async_executor_default(), GitRepository.repo_find, path)
+        return cls(repo, executor=executor, max_concurrency=max_concurrency)
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Runs a blocking bootgit function on the executor, within this repository's concurrency limit."""
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    # ------------------------------------------------[objects]--------------------------------------------------
+
+    async def object_read(self, sha: str) -> Optional['GitObject']:
+        return await self.run(object_read, self.repo, sha)
+
+    async def object_read_raw(self, sha: str) -> Optional[tuple[bytes, bytes]]:
+        return await self.run(object_read_raw, self.repo, sha)
+
+    async def object_exists(self, sha: str) -> bool:
+        return await self.run(object_exists, self.repo, sha)
+
+    async def object_write(self, obj: 'GitObject') -> str:
+        return await self.run(object_write, obj, self.repo)
+
+    # ------------------------------------------------[refs]--------------------------------------------------
+
+    async def ref_resolve(self, ref: str) -> Optional[str]:
+        return await self.run(ref_resolve, self.repo, ref)
+
+    async def ref_list(self) -> dict[str, str]:
+        """All refs, flattened to {"refs/heads/master": sha, ...}."""
+        return await self.run(lambda: refs_flatten(ref_list(self.repo)))
+
+    # ------------------------------------------------[index]--------------------------------------------------
+
+    async def index_read(self) -> 'GitIndex':
+        return await self.run(index_read, self.repo)
+
+    async def index_write(self, index: 'GitIndex') -> None:
+        await self.run(index_write, self.repo, index)
+
+    # ------------------------------------------------[trees]--------------------------------------------------
+
+    async def tree_items(self, sha: str) -> list['GitTreeLeaf']:
+        """The entries of a tree, or of a commit's root tree."""
+        obj: Optional['GitObject'] = await self.object_read(sha)
+        if obj is None:
+            raise Exception(f"Missing object {sha}.")
+        if obj.object_type == b'commit':
+            obj = await self.object_read(obj.kvlm[b'tree'].decode("ascii"))
+        if obj.object_type != b'tree':
+            raise Exception(f"Not a tree-ish {sha}.")
+        return obj.items
+
+    async def tree_walk(self, sha: str, prefix: str = "") -> AsyncIterator[tuple[str, 'GitTreeLeaf']]:
+        """Yields (path, leaf) for every blob under a tree-ish, reading one tree per executor job."""
+        for leaf in await self.tree_items(sha):
+            path: str = os.path.join(prefix, leaf.path)
+            if leaf.mode.startswith(b'04'):
+                async for item in self.tree_walk(leaf.sha, path):
+                    yield item
+            else:
+                yield path, leaf
+
+    async def tree_to_dict(self, sha: str) -> dict[str, str]:
+        """Maps every path under a tree-ish to its blob sha."""
+        return {path: leaf.sha async for (path, leaf) in self.tree_walk(sha)}
+
+    async def tree_checkout(self, sha: str, path: str) -> None:
+        """Writes a tree-ish into the directory path, as the checkout command does (symlinks as symlinks,
+        executables with their bit set). Sibling entries are checked out concurrently."""
+        jobs: list = []
+        for leaf in await self.tree_items(sha):
+            dest: str = os.path.join(path, leaf.path)
+            if leaf.mode.startswith(b'04'):
+                await self.run(os.makedirs, dest, exist_ok=True)
+                jobs.append(self.tree_checkout(leaf.sha, dest))
+            elif not leaf.mode.startswith(b'16'):
+                jobs.append(self.run(leaf_checkout, self.repo, leaf.mode, leaf.sha, dest))
+        await asyncio.gather(*jobs)
@@ -4,6 +4,10 @@ from typing import Optional
 
 class GitRepository:
     """To represent a git repository"""
+
+    # Maps a worktree to (config file signature, GitRepository) so repeated lookups skip re-reading the config.
+    repo_cache: dict[str, tuple[Optional[tuple], 'GitRepository']] = dict()
+
     def __init__(self, path: str, force: bool = False):
         self.worktree: str = path
         self.gitdir: str = os.path.join(path, ".git")
@@ -106,7 +110,13 @@ class GitRepository:
         path: str = os.path.realpath(path)
 
         if os.path.isdir(os.path.join(path, ".git")):
-            return cls(path)
+            signature: Optional[tuple] = cls.file_signature(os.path.join(path, ".git", "config"))
+            cached = cls.repo_cache.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+            repo: 'GitRepository' = cls(path)
+            cls.repo_cache[path] = (signature, repo)
+            return repo
         
         parent: str = os.path.realpath(os.path.join(path, ".."))
         
@@ -117,3 +127,12 @@ class GitRepository:
                 return None
             
         return cls.repo_find(parent, required)
+
+    @staticmethod
+    def file_signature(path: str) -> Optional[tuple]:
+        """Stat fields that change whenever a file is rewritten, or None if it is absent"""
+        try:
+            st: os.stat_result = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ctime_ns, st.st_size, st.st_ino)
@@ -0,0 +1,119 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterator, Optional
+import errno
+import os
+import re
+
+from GitRepo.git_repository import GitRepository
+from Objects.object_func import object_read_raw
+from Objects.tree_diff_func import tree_leaves
+from StageIndex.stage_index_func import index_read
+
+if TYPE_CHECKING:
+    from StageIndex.GitIndex.git_index import GitIndex
+
+# Files handed to a worker at once. Searches smaller than two batches run in-process: starting the pool would
+# cost more than it saves.
+GREP_BATCH_SIZE: int = 256
+
+# Like git, a NUL byte among the first 8000 marks a file as binary; binary files are never searched.
+GREP_BINARY_PROBE: int = 8000
+
+# Per worker process: the compiled regex for the search in progress, keyed by (pattern, flags).
+grep_regexes: dict[tuple[bytes, int], re.Pattern] = dict()
+
+# Signature: bytes, int -> re.Pattern
+# Purpose: Compiles the search's one regex, once per process. MULTILINE lets a whole file be tested in one search
+#          before it is split into lines.
+def grep_regex(pattern: bytes, flags: int) -> re.Pattern:
+    regex: Optional[re.Pattern] = grep_regexes.get((pattern, flags))
+    if regex is None:
+        regex = re.compile(pattern, flags | re.MULTILINE)
+        grep_regexes[(pattern, flags)] = regex
+    return regex
+
+# Signature: re.Pattern, bytes -> list[tuple[int, bytes]]
+# Purpose: The (line number, line) of every matching line of a file, or nothing for a binary file.
+def grep_data(regex: re.Pattern, data: bytes) -> list[tuple[int, bytes]]:
+    if b'\x00' in data[:GREP_BINARY_PROBE] or not regex.search(data):
+        return []
+    lines: list[bytes] = data.split(b'\n')
+    if data.endswith(b'\n'):
+        lines.pop()
+    return [(number, line) for (number, line) in enumerate(lines, start=1) if regex.search(line)]
+
+# Signature: tuple[str, bytes, int, list[tuple[str, Optional[str]]]] -> list[tuple[str, list[tuple[int, bytes]]]]
+# Purpose: Worker entry point. Searches a batch of files of the repository at worktree, each given as (path, blob sha)
+#          to read it from the object store, or (path, None) to read it from the worktree. Returns the matching lines
+#          of each file that has any, in batch order.
+def grep_batch(batch: tuple[str, bytes, int, list[tuple[str, Optional[str]]]]) -> list[tuple[str, list[tuple[int, bytes]]]]:
+    worktree, pattern, flags, files = batch
+    repo: 'GitRepository' = GitRepository.repo_find(worktree)
+    regex: re.Pattern = grep_regex(pattern, flags)
+
+    ret: list[tuple[str, list[tuple[int, bytes]]]] = []
+    for (path, sha) in files:
+        if sha:
+            raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+            if raw is None:
+                raise Exception(f"Missing object {sha}.")
+            data: bytes = raw[1]
+        else:
+            # Like git, only regular files are searched in the worktree: O_NOFOLLOW refuses a symlink (ELOOP)
+            # rather than reading whatever it points at, which may be outside the repository or nowhere.
+            try:
+                with open(os.open(os.path.join(repo.worktree, path), os.O_RDONLY | os.O_NOFOLLOW), "rb") as f:
+                    data = f.read()
+            except (FileNotFoundError, IsADirectoryError):
+                continue
+            except OSError as e:
+                if e.errno == errno.ELOOP:
+                    continue
+                raise
+        lines: list[tuple[int, bytes]] = grep_data(regex, data)
+        if lines:
+            ret.append((path, lines))
+    return ret
+
+# Signature: GitRepository, str, str -> Iterator[tuple[str, str]]
+# Purpose: Yields (path, blob sha) for every file under a tree, in path order (the order trees are stored in), reading
+#          only trees.
+def grep_tree_files(repo: 'GitRepository', tree: str, prefix: str = "") -> Iterator[tuple[str, str]]:
+    for leaf in tree_leaves(repo, tree):
+        path: str = prefix + leaf.path
+        if leaf.mode.startswith(b'04'):
+            yield from grep_tree_files(repo, leaf.sha, path + "/")
+        elif not leaf.mode.startswith(b'16'):
+            yield path, leaf.sha
+
+# Signature: GitRepository, Optional[str], bool -> list[tuple[str, Optional[str]]]
+# Purpose: The files to search: a tree's blobs when tree is given, else the staged blobs when cached,
+#          else the tracked files as they are in the worktree.
+def grep_files(repo: 'GitRepository', tree: Optional[str], cached: bool) -> list[tuple[str, Optional[str]]]:
+    if tree:
+        return list(grep_tree_files(repo, tree))
+    index: 'GitIndex' = index_read(repo)
+    # Submodules are gitlinks (mode 1110) and have no blob to search.
+    return [(entry.name, entry.sha if cached else None) for entry in index.entries if entry.mode_type != 0b1110 and not entry.flag_stage]
+
+# Signature: GitRepository, bytes, int, Optional[str], bool, Optional[int] -> Iterator[tuple[str, list[tuple[int, bytes]]]]
+# Purpose: Searches the worktree, the index (cached) or a tree for lines matching pattern, with blob inflation and
+#          matching fanned out across worker processes. Yields (path, [(line number, line)]) per matching file in path
+#          order as soon as each batch is done, without writing anything to disk.
+def grep(repo: 'GitRepository', pattern: bytes, flags: int = 0, tree: Optional[str] = None, cached: bool = False,
+         jobs: Optional[int] = None) -> Iterator[tuple[str, list[tuple[int, bytes]]]]:
+    # Compiling up front reports a bad pattern before any worker starts.
+    grep_regex(pattern, flags)
+
+    files: list[tuple[str, Optional[str]]] = grep_files(repo, tree, cached)
+    batches: list[tuple[str, bytes, int, list[tuple[str, Optional[str]]]]] = [
+        (repo.worktree, pattern, flags, files[i:i + GREP_BATCH_SIZE]) for i in range(0, len(files), GREP_BATCH_SIZE)]
+
+    if jobs == 1 or len(batches) < 2:
+        for batch in batches:
+            yield from grep_batch(batch)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        for results in pool.map(grep_batch, batches):
+            yield from results
@@ -19,16 +19,31 @@ argsp.add_argument("-t", metavar="type", dest="type", choices=["blob", "commit",
 argsp.add_argument("-w", dest="write", action="store_true", help="Actually write the object into the database.")
 argsp.add_argument("path", help="Read objects from <file>.")
 
+# Splits log's arguments as git does: the commit before "--" (HEAD if there is none) and the paths after it. Without
+# "--", the first argument is the commit and the rest are paths.
+class LogRevisionsAction(argparse.Action):
+    def __call__(self, parser, namespace, values, option_string=None):
+        if "--" in values:
+            commits, paths = values[:values.index("--")], values[values.index("--") + 1:]
+        else:
+            commits, paths = values[:1], values[1:]
+        if len(commits) > 1:
+            parser.error("log takes a single commit.")
+        namespace.commit = commits[0] if commits else "HEAD"
+        namespace.paths = paths
+
 argsp = argsubparsers.add_parser("log", help="Display history of a given commit.")
-argsp.add_argument("commit", default="HEAD", nargs="?", help="Commit to start at.")
+argsp.add_argument("paths", metavar="[commit] [-- path...]", nargs=argparse.REMAINDER, action=LogRevisionsAction,
+                   help="Commit to start at (HEAD by default), then only show commits that changed these paths.")
 
 argsp = argsubparsers.add_parser("ls-tree", help="Pretty-print a tree object.")
 argsp.add_argument("-r", dest="recursive", action="store_true", help="Recurse into sub-trees.")
 argsp.add_argument("tree", help="A tree-ish object.")
 
-argsp = argsubparsers.add_parser("checkout", help="Checkout a commit inside of a directory.")
+argsp = argsubparsers.add_parser("checkout", help="Checkout a commit inside of a directory, or switch the worktree to it.")
+argsp.add_argument("-b", dest="branch", default=None, help="Create a branch of this name at the commit and switch to it.")
 argsp.add_argument("commit", help="The commit or tree to checkout.")
-argsp.add_argument("path", help="The EMPTY directory to checkout on.")
+argsp.add_argument("path", nargs="?", help="The EMPTY directory to checkout on. Without it, the worktree is switched in place.")
 
 argsp = argsubparsers.add_parser("show-ref", help="List references.")
 
@@ -50,10 +65,102 @@ argsp.add_argument("path", nargs="+", help="Paths to check.")
 arpsp = argsubparsers.add_parser("status", help="Show the working tree status.")
 
 argsp = argsubparsers.add_parser("rm", help="Remove files from the working tree and the index.")
+argsp.add_argument("-r", dest="recursive", action="store_true", help="Remove directories, with every tracked file under them.")
 argsp.add_argument("path", nargs="+", help="Files to remove.")
 
 argsp = argsubparsers.add_parser("add", help="Add file contents to the index.")
-argsp.add_argument("path", nargs="+", help="Files to add.")
+argsp.add_argument("path", nargs="+", help="Files or directories to add.")
 
 argsp = argsubparsers.add_parser("commit", help="Records the changes to the repository.")
 argsp.add_argument("-m", metavar="message", dest="message", help="Message to associate with this commit.")
+
+argsp = argsubparsers.add_parser("fetch", help="Download objects and refs from another repository.")
+argsp.add_argument("remote", default="origin", nargs="?", help="The remote to fetch from.")
+
+argsp = argsubparsers.add_parser("clone", help="Clone a repository into a new directory.")
+argsp.add_argument("url", help="The repository to clone from, as a path or a file:// url.")
+argsp.add_argument("path", nargs="?", help="The EMPTY directory to clone into.")
+argsp.add_argument("--sparse", action="store_true", help="Start with a sparse checkout of only the files at the root.")
+
+argsp = argsubparsers.add_parser("repack", help="Pack everything reachable into a single pack.")
+argsp.add_argument("-d", dest="delete", action="store_true", help="Remove the loose objects and packs made redundant.")
+argsp.add_argument("-b", "--write-bitmap-index", dest="write_bitmap", action="store_true", help="Write a reachability bitmap next to the pack.")
+
+argsp = argsubparsers.add_parser("rev-list", help="List the commits (and objects) reachable from revisions.")
+argsp.add_argument("--objects", action="store_true", help="Also list the trees and blobs the commits reference.")
+argsp.add_argument("--count", action="store_true", help="Print only the number of objects.")
+argsp.add_argument("revisions", nargs="+", help="Revisions to start at, or to exclude when prefixed with ^.")
+
+argsp = argsubparsers.add_parser("fsck", help="Verify the connectivity and validity of the objects in the database.")
+argsp.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes to hash with (defaults to one per core).")
+
+argsp = argsubparsers.add_parser("daemon", help="Serve this repository's commands from a warm process over a Unix socket.")
+argsp.add_argument("--stop", action="store_true", help="Stop the running daemon.")
+
+argsp = argsubparsers.add_parser("commit-graph", help="Write the commit-graph file that speeds up history walks.")
+argsp.add_argument("action", choices=["write"], help="What to do with the commit-graph.")
+argsp.add_argument("--changed-paths", dest="changed_paths", action="store_true", help="Also store changed-path Bloom filters for path-limited log.")
+
+argsp = argsubparsers.add_parser("merge-base", help="Find the best common ancestors of commits.")
+argsp.add_argument("-a", "--all", action="store_true", help="Print every best common ancestor, not just one.")
+argsp.add_argument("--is-ancestor", dest="is_ancestor", action="store_true", help="Exit 0 if the first commit is an ancestor of the second, 1 otherwise.")
+argsp.add_argument("commits", nargs="+", help="The commits to compare.")
+
+argsp = argsubparsers.add_parser("merge", help="Join another commit's history into the current branch.")
+argsp.add_argument("-m", metavar="message", dest="message", default=None, help="Message of the merge commit.")
+argsp.add_argument("commit", help="The commit to merge.")
+
+argsp = argsubparsers.add_parser("grep", help="Print lines matching a pattern in tracked files, the index or a tree-ish.")
+argsp.add_argument("-i", "--ignore-case", dest="ignore_case", action="store_true", help="Match case insensitively.")
+argsp.add_argument("-n", "--line-number", dest="line_number", action="store_true", help="Prefix each line with its number.")
+argsp.add_argument("-l", "--files-with-matches", dest="files_with_matches", action="store_true", help="Print only the names of matching files.")
+argsp.add_argument("-E", "--extended-regexp", dest="extended_regexp", action="store_true", help="Accepted for compatibility: patterns are always extended (Python) regexes.")
+argsp.add_argument("-F", "--fixed-strings", dest="fixed_strings", action="store_true", help="Match the pattern literally rather than as a regex.")
+argsp.add_argument("--cached", action="store_true", help="Search the staged blobs instead of the worktree.")
+argsp.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes to search with (defaults to one per core).")
+argsp.add_argument("pattern", help="The regular expression to look for.")
+argsp.add_argument("tree", nargs="?", help="A tree-ish to search instead of the worktree, read straight from the object store.")
+
+argsp = argsubparsers.add_parser("archive", help="Export a tree-ish as a tar or zip archive without checking it out.")
+argsp.add_argument("--format", choices=["tar", "tar.gz", "zip"], default=None, help="Archive format (defaults to the output file's extension, else tar).")
+argsp.add_argument("-o", "--output", default=None, help="Write the archive to this file instead of stdout.")
+argsp.add_argument("--prefix", default="", help="Prepend this to every path in the archive, e.g. project/.")
+argsp.add_argument("tree", help="The commit or tree to archive.")
+
+argsp = argsubparsers.add_parser("fast-import", help="Import history from a git fast-import stream on stdin.")
+argsp.add_argument("--force", action="store_true", help="Update branches even when that loses commits.")
+argsp.add_argument("--import-marks", dest="import_marks", default=None, help="Load marks from this file before importing.")
+argsp.add_argument("--export-marks", dest="export_marks", default=None, help="Write marks to this file at each checkpoint and at the end.")
+argsp.add_argument("--quiet", action="store_true", help="Do not print statistics when done.")
+
+argsp = argsubparsers.add_parser("fast-export", help="Write the history of refs to stdout as a git fast-import stream.")
+argsp.add_argument("--all", action="store_true", help="Export every ref.")
+argsp.add_argument("--import-marks", dest="import_marks", default=None, help="Load marks from this file; commits and blobs in it are not exported again.")
+argsp.add_argument("--export-marks", dest="export_marks", default=None, help="Write marks to this file when done.")
+argsp.add_argument("refs", nargs="*", help="The refs to export, e.g. main or refs/tags/v1.")
+
+argsp = argsubparsers.add_parser("sparse-checkout", help="Check out only some directories of the worktree (cone mode).")
+argsp.add_argument("action", choices=["set", "add", "list", "disable"], help="Replace or extend the checked out directories, list them, or check out everything again.")
+argsp.add_argument("directories", nargs="*", help="With set and add, the directories to check out with everything under them.")
+
+argsp = argsubparsers.add_parser("blame", help="Show which commit last changed each line of a file.")
+argsp.add_argument("file", help="The file to blame.")
+argsp.add_argument("rev", nargs="?", default="HEAD", help="The commit to blame the file as of.")
+
+argsp = argsubparsers.add_parser("diff", help="Show changes between the worktree, the index and commits as unified diffs.")
+argsp.add_argument("--cached", action="store_true", help="Compare the index with a commit (HEAD by default) instead of the worktree.")
+argsp.add_argument("-U", "--unified", type=int, default=3, help="Lines of context around each change.")
+argsp.add_argument("--diff-algorithm", dest="diff_algorithm", default=None, choices=["histogram", "myers"], help="Line diff to use; defaults to diff.algorithm, else histogram.")
+argsp.add_argument("--no-renames", dest="renames", action="store_false", help="Show renamed files as a deletion and an addition.")
+argsp.add_argument("-C", "--find-copies", dest="find_copies", action="store_true", help="Also detect copies of modified files; defaults to diff.renames=copies.")
+argsp.add_argument("--find-copies-harder", dest="find_copies_harder", action="store_true", help="Also detect copies of unchanged files, which reads every file of the old side.")
+argsp.add_argument("commits", nargs="*", help="No commit: the index against the worktree. One: it against the worktree (or the index with --cached). Two: one against the other.")
+
+argsp = argsubparsers.add_parser("maintenance", help="Pack loose objects and refs, consolidate packs and refresh the commit-graph.")
+argsp.add_argument("action", choices=["run", "auto"], help="Run the tasks, or only those whose threshold is crossed.")
+argsp.add_argument("--task", action="append", default=None, choices=["pack-refs", "loose-objects", "incremental-repack", "commit-graph"], help="Only this task; may be given more than once.")
+
+argsp = argsubparsers.add_parser("count-objects", help="Count objects and their disk usage, or report on what makes the repository slow.")
+argsp.add_argument("-v", "--verbose", action="store_true", help="Also count packed objects, packs and garbage.")
+argsp.add_argument("--report", action="store_true", help="Size up every object, ref and the index in one pass and point out the hotspots.")
+argsp.add_argument("--top", type=int, default=10, help="How many entries each list of the report shows.")
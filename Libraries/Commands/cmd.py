@@ -1,10 +1,11 @@
 import configparser
 import grp
 from os import stat_result
+from stat import S_ISLNK
 from posixpath import abspath
 import pwd
 import sys
-from typing import TYPE_CHECKING, BinaryIO, Optional
+from typing import TYPE_CHECKING, BinaryIO, Callable, Iterator, Optional
 from venv import create
 from blinker import Namespace
 import re
@@ -18,23 +19,56 @@ from Objects.Trees.git_tree import GitTree
 from Objects.object_func import *
 from Refs.ref_func import *
 from Objects.Tags.git_tag import GitTag
-from StageIndex.stage_index_func import index_read, index_write
+from StageIndex.stage_index_func import index_apply, index_entries_under, index_find, index_read, index_write
 from GitIgnore.git_ignore_func import check_ignored_absolute, check_ignored_scoped, gitignore_read
 from GitIgnore.Ignore.git_ignore import GitIgnore
+from Remotes.remote_func import clone, fetch
+from Packs.pack_func import pack_resolve_prefix
+from Packs.repack_func import repack
+from Packs.bitmap_func import bitmap_load, bitmap_rev_list, bitmap_shas
+from Packs.Bitmaps.git_bitmap_index import GitBitmapIndex
+from Objects.reachable_func import objects_reachable
+from Fsck.fsck_func import fsck
+from Fsck.FsckReport.git_fsck_report import GitFsckReport
+from Daemon.daemon_func import daemon_serve, daemon_stop
+from StageIndex.GitIndex.git_index import GitIndex
+from CommitGraph.commit_graph_func import commit_graph_write
+from CommitGraph.commit_walk_func import log_path_walk
+from CommitGraph.merge_base_func import commit_is_ancestor, merge_base
+from CommitGraph.commit_graph_func import commit_parse
+from Maintenance.maintenance_func import maintenance_auto, maintenance_run
+from Merge.merge_func import merge_trees
+from Objects.tree_diff_func import tree_diff
+from Merge.MergeConflict.git_merge_conflict import GitMergeConflict
+from Grep.grep_func import grep
+from Archive.archive_func import archive
+from Blame.blame_func import blame, blame_format
+from Diff.diff_func import DIFF_ALGORITHMS, diff_index_files, diff_index_worktree, diff_sides, diff_tree_files, diff_trees, diff_worktree_files, diff_write
+from Diff.rename_func import rename_copies, rename_detect, rename_limit
+from FastExport.fast_export_func import fast_export
+from FastExport.FastExportState.git_fast_export_state import GitFastExportState
+from FastImport.fast_import_func import fast_import
+from FastImport.FastImportState.git_fast_import_state import GitFastImportState
+from Sizing.sizing_func import sizing_count_objects, sizing_format, sizing_report
+from Sparse.sparse_func import sparse_cone_from_dirs, sparse_dir_included, sparse_path_included, sparse_read, sparse_write
+from Sparse.SparseCone.git_sparse_cone import GitSparseCone
+from Trace2.trace2_func import trace2_command, trace2_count, trace2_region, trace2_timer
 
 if TYPE_CHECKING:
+    from Diff.DiffFile.git_diff_file import GitDiffFile
     from Objects.git_object import GitObject
-    from StageIndex.GitIndex.git_index import GitIndex
 
 DictRefs = dict[str, Union[str, 'DictRefs']]
 
 
 # ------------------------------------------------[init]--------------------------------------------------
 
+@trace2_command("init")
 def cmd_init(args: argparse.Namespace) -> None:
     repo = GitRepository.repo_create(args.path)
     print(f"Initialized empty Git repository in {repo.gitdir}")
 
+@trace2_command("find")
 def find(args: argparse.Namespace) -> None:
     try:
         repo: 'GitRepository' = GitRepository.repo_find(args.path)
@@ -44,13 +78,18 @@ def find(args: argparse.Namespace) -> None:
 
 # ------------------------------------------------[cat-file]--------------------------------------------------
 
+@trace2_command("cat-file")
 def cmd_cat_file(args: argparse.Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
     cat_file(repo, args.object, object_type=args.type.encode())
 
 def cat_file(repo: 'GitRepository', obj: str, object_type: Optional[bytes] = None) -> None:
-    obj = object_read(repo, object_find(repo, obj, object_type=object_type))
-    sys.stdout.buffer.write(obj.serialize())
+    sha: str = object_find(repo, obj, object_type=object_type)
+    stream: Optional[tuple[bytes, int, Iterator[bytes]]] = object_stream(repo, sha)
+    if stream is None:
+        raise Exception(f"Missing object {sha}.")
+    for chunk in stream[2]:
+        sys.stdout.buffer.write(chunk)
 
 def object_find(repo: 'GitRepository', name: str, object_type: 'GitObject' = None, follow: bool = True) -> str:
     sha: list[str] = object_resolve(repo, name)
@@ -66,13 +105,17 @@ def object_find(repo: 'GitRepository', name: str, object_type: 'GitObject' = Non
         return sha
     
     while True:
-        obj: 'GitObject' = object_read(repo, sha)
-        if obj.object_type == object_type:
+        # The header is enough to tell the type, so a large blob is never inflated here.
+        header: Optional[tuple[bytes, int]] = object_header(repo, sha)
+        if header is None:
+            raise Exception(f"Missing object {sha}.")
+        if header[0] == object_type:
             return sha
         
         if not follow:
             return None
         
+        obj: 'GitObject' = object_read(repo, sha)
         if obj.object_type == b'tag':
             sha = obj.kvlm[b'object'].decode("ascii")
         elif obj.object_type == b'commit' and object_type == b'tree':
@@ -83,6 +126,7 @@ def object_find(repo: 'GitRepository', name: str, object_type: 'GitObject' = Non
 
 # # ------------------------------------------------[hash-object]--------------------------------------------------
 
+@trace2_command("hash-object")
 def cmd_hash_object(args: argparse.Namespace) -> None:
     if args.write:
         repo: 'GitRepository' = GitRepository.repo_find()
@@ -107,18 +151,21 @@ def object_hash(file_desc: BinaryIO, object_type: bytes, repo: 'GitRepository' =
 
 # ------------------------------------------------[log]--------------------------------------------------
 
+@trace2_command("log")
 def cmd_log(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
     print("digraph wyaglog{")
     print("  node[shape=rect]")
-    log_graphviz(repo, object_find(repo, args.commit), set())
+    if args.paths:
+        paths: list[str] = [os.path.relpath(os.path.abspath(path), repo.worktree) for path in args.paths]
+        log_graphviz_paths(repo, object_find(repo, args.commit, object_type=b'commit'), paths)
+    else:
+        log_graphviz(repo, object_find(repo, args.commit), set())
     print("}")
 
-def log_graphviz(repo: 'GitRepository', sha: str, seen: set) -> None:
-    if sha in seen:
-        return
-    seen.add(sha)
-
+# Signature: GitRepository, str -> GitObject
+# Purpose: Prints a commit's node, labelled with its short sha and first message line.
+def log_graphviz_node(repo: 'GitRepository', sha: str) -> 'GitObject':
     commit = object_read(repo, sha)
     message = commit.kvlm[None].decode("utf8").strip()
     message = message.replace("\\", "\\\\")
@@ -128,6 +175,23 @@ def log_graphviz(repo: 'GitRepository', sha: str, seen: set) -> None:
         message = message[:message.index("\n")]
 
     print(f"  c_{sha} [label=\"{sha[0:7]}: {message}\"]")
+    return commit
+
+# Signature: GitRepository, str, list[str] -> None
+# Purpose: Prints only the commits that changed one of paths, each linked to its nearest such ancestors.
+def log_graphviz_paths(repo: 'GitRepository', sha: str, paths: list[str]) -> None:
+    matches, parents = log_path_walk(repo, sha, paths)
+    for match in matches:
+        log_graphviz_node(repo, match)
+        for parent in parents[match]:
+            print(f"  c_{match} -> c_{parent};")
+
+def log_graphviz(repo: 'GitRepository', sha: str, seen: set) -> None:
+    if sha in seen:
+        return
+    seen.add(sha)
+
+    commit = log_graphviz_node(repo, sha)
     assert commit.object_type == b"commit"
 
     if not b'parent' in commit.kvlm.keys():
@@ -145,6 +209,7 @@ def log_graphviz(repo: 'GitRepository', sha: str, seen: set) -> None:
 
 # ------------------------------------------------[ls-tree]--------------------------------------------------
 
+@trace2_command("ls-tree")
 def cmd_ls_tree(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
     ls_tree(repo, args.tree, args.recursive)
@@ -172,8 +237,12 @@ def ls_tree(repo: 'GitRepository', ref, recursive=None, prefix="") -> None:
 
 # ------------------------------------------------[checkout]--------------------------------------------------
 
+@trace2_command("checkout")
 def cmd_checkout(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
+    if args.path is None:
+        checkout_switch(repo, args.commit, args.branch)
+        return
 
     obj: Optional['GitObject'] = object_read(repo, object_find(repo, args.commit))
 
@@ -188,22 +257,199 @@ def cmd_checkout(args: Namespace) -> None:
     else:
         os.makedirs(args.path)
 
-    tree_checkout(repo, obj, os.path.realpath(args.path))
-
-def tree_checkout(repo: 'GitRepository', tree, path: str) -> None:
+    tree_checkout(repo, obj, os.path.realpath(args.path), sparse_read(repo))
+
+# Signature: GitRepository, str, Optional[str] -> None
+# Purpose: Switches the worktree in place to name: a branch, which HEAD then points to, or any other commit, which
+#          detaches HEAD. With new_branch, a branch of that name is created at name first and switched to. Only the
+#          files that differ between the two commits are rewritten.
+def checkout_switch(repo: 'GitRepository', name: str, new_branch: Optional[str] = None) -> None:
+    if ref_resolve(repo, "MERGE_HEAD"):
+        raise Exception("You have not concluded your merge (MERGE_HEAD exists).")
+    if new_branch and ref_resolve(repo, f"refs/heads/{new_branch}"):
+        raise Exception(f"A branch named {new_branch} already exists.")
+
+    target: str = object_find(repo, name, object_type=b'commit')
+    branch: Optional[str] = new_branch or (name if ref_resolve(repo, f"refs/heads/{name}") else None)
+    head: Optional[str] = ref_resolve(repo, "HEAD")
+    if head != target:
+        with trace2_region("switch"):
+            tree_switch(repo, commit_parse(repo, head)[0] if head else None, commit_parse(repo, target)[0])
+
+    if new_branch:
+        ref_create(repo, f"heads/{new_branch}", target)
+    with open(GitRepository.repo_file(repo, "HEAD"), "w") as fd:
+        fd.write(f"ref: refs/heads/{branch}\n" if branch else f"{target}\n")
+    print(f"Switched to branch {branch}." if branch else f"HEAD is now at {target}.")
+
+# Signature: GitRepository, GitTree, str, Optional[GitSparseCone], str -> None
+# Purpose: Writes tree's files under path. With a sparse cone, subtrees outside it are skipped without being read;
+#          prefix is tree's own path in the cone's terms, and the cone is dropped below a recursively included one.
+def tree_checkout(repo: 'GitRepository', tree, path: str, cone: Optional['GitSparseCone'] = None, prefix: str = "") -> None:
     for item in tree.items:
-        obj: Optional['GitObject'] = object_read(repo, item.sha)
         dest: str = os.path.join(path, item.path)
 
-        if obj.object_type == b'tree':
+        if item.mode.startswith(b'04'):
+            directory: str = prefix + item.path
+            if cone is not None and directory not in cone.parents and directory not in cone.recursive:
+                continue
             os.mkdir(dest)
-            tree_checkout(repo, obj, dest)
-        elif obj.object_type == b'blob':
-            with open(dest, 'wb') as f:
-                f.write(obj.blobdata)
+            tree_checkout(repo, object_read(repo, item.sha), dest, None if cone is None or directory in cone.recursive else cone, directory + "/")
+        elif not item.mode.startswith(b'16'):
+            leaf_checkout(repo, item.mode, item.sha, dest)
+
+# Signature: GitRepository, str, str -> None
+# Purpose: Writes a blob to dest chunk by chunk, so memory stays flat however large the blob is.
+def blob_checkout(repo: 'GitRepository', sha: str, dest: str) -> None:
+    stream: Optional[tuple[bytes, int, Iterator[bytes]]] = object_stream(repo, sha)
+    if stream is None:
+        raise Exception(f"Missing object {sha}.")
+    with open(dest, 'wb') as f:
+        for chunk in stream[2]:
+            f.write(chunk)
+
+# Signature: GitRepository, bytes, str, str -> None
+# Purpose: Writes a tree entry of the given mode to dest: a symlink to the blob's contents, or a file with the
+#          executable bit set when mode says so. Whatever was at dest is replaced, never followed.
+def leaf_checkout(repo: 'GitRepository', mode: bytes, sha: str, dest: str) -> None:
+    if os.path.islink(dest) or (mode.startswith(b'12') and os.path.lexists(dest)):
+        os.unlink(dest)
+    if mode.startswith(b'12'):
+        raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+        if raw is None:
+            raise Exception(f"Missing object {sha}.")
+        os.symlink(os.fsdecode(raw[1]), dest)
+        return
+    blob_checkout(repo, sha, dest)
+    os.chmod(dest, 0o755 if mode == b'100755' else 0o644)
+
+# Signature: GitRepository, Optional[str], str, list[GitMergeConflict], str -> None
+# Purpose: Moves the worktree and index from old_tree (None for an unborn branch) to new_tree, touching only the
+#          paths that differ between them, then stages each conflict's versions when new_tree is a merge result.
+#          Paths outside the sparse checkout only have their index entries updated. Refuses before writing anything
+#          if that would overwrite local changes; operation names what would, in the error.
+def tree_switch(repo: 'GitRepository', old_tree: Optional[str], new_tree: str, conflicts: list['GitMergeConflict'] = (),
+                operation: str = "checkout") -> None:
+    index: 'GitIndex' = index_read(repo)
+    changes: list[tuple[str, Optional['GitTreeLeaf'], Optional['GitTreeLeaf']]] = list(tree_diff(repo, old_tree, new_tree))
+    trace2_count("paths_changed", len(changes))
+    cone: Optional['GitSparseCone'] = sparse_read(repo)
+    cone_cache: dict[str, bool] = dict()
+    conflicted: set[str] = {conflict.path for conflict in conflicts}
+
+    deleted: set[str] = {path for (path, _, new) in changes if new is None}
+    for (path, old, _) in changes:
+        entry: Optional['GitIndexEntry'] = next(iter(index_find(index, path)), None)
+        full_path: str = os.path.join(repo.worktree, path)
+        if (entry.sha if entry else None) != (old.sha if old else None) or worktree_dirty(full_path, entry):
+            # A directory becoming a file (a/b -> a) is in the way only if it holds something the switch keeps.
+            if old is None and worktree_dir_deleted(repo, path, deleted):
+                continue
+            raise Exception(f"Your local changes to {path} would be overwritten by {operation}.")
+
+    # A file where an added path needs a directory (a for a/b) is in the way unless the switch deletes it; it may not
+    # be among the changes at all, if untracked.
+    leading: set[str] = set()
+    for (path, _, new) in changes:
+        if new is None:
+            continue
+        directory: str = os.path.dirname(path)
+        while directory and directory not in leading:
+            leading.add(directory)
+            directory = os.path.dirname(directory)
+    for directory in sorted(leading):
+        full_path = os.path.join(repo.worktree, directory)
+        if directory not in deleted and os.path.lexists(full_path) and (os.path.islink(full_path) or not os.path.isdir(full_path)):
+            if not index_find(index, directory):
+                raise Exception(f"The untracked working tree file {directory} would be overwritten by {operation}.")
+            raise Exception(f"Your local changes to {directory} would be overwritten by {operation}.")
+
+    # Deletions go first: a file can only become a directory (a -> a/b), or the reverse, once the old path is gone.
+    adds: list['GitIndexEntry'] = []
+    removes: list[str] = []
+    for (path, _, new) in changes:
+        if new is not None:
+            continue
+        full_path = os.path.join(repo.worktree, path)
+        if os.path.lexists(full_path):
+            os.unlink(full_path)
+        removes.append(path)
+        directory = os.path.dirname(full_path)
+        while directory != repo.worktree and not os.listdir(directory):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+    for (path, _, new) in changes:
+        if new is None:
+            continue
+        full_path = os.path.join(repo.worktree, path)
+        if (cone is not None and path not in conflicted and not os.path.lexists(full_path)
+                and not sparse_path_included(cone, path, cone_cache)):
+            skipped: 'GitIndexEntry' = index_entry_from_leaf(repo, path, new, 0)
+            skipped.flag_skip_worktree = True
+            adds.append(skipped)
+            continue
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if not new.mode.startswith(b'16'):
+            leaf_checkout(repo, new.mode, new.sha, full_path)
+        adds.append(index_entry_from_leaf(repo, path, new, 0))
+
+    adds = [entry for entry in adds if entry.name not in conflicted]
+    for conflict in conflicts:
+        removes.append(conflict.path)
+        for (stage, leaf) in enumerate((conflict.base, conflict.ours, conflict.theirs), start=1):
+            if leaf:
+                adds.append(index_entry_from_leaf(repo, conflict.path, leaf, stage))
+
+    index_apply(index, adds, removes)
+    index_write(repo, index)
+
+# Signature: str, Optional[GitIndexEntry] -> bool
+# Purpose: Whether the file at full_path differs from its index entry (or exists untracked, without one). A symlink
+#          is compared by its target, never followed.
+def worktree_dirty(full_path: str, entry: Optional['GitIndexEntry']) -> bool:
+    if not os.path.lexists(full_path):
+        return False
+    if entry is None:
+        return True
+    stat: stat_result = os.lstat(full_path)
+    if stat.st_mtime_ns == entry.mtime[0] * 10**9 + entry.mtime[1] and stat.st_size == entry.fsize:
+        return False
+    if S_ISLNK(stat.st_mode):
+        return object_write(GitBlob(os.fsencode(os.readlink(full_path)))) != entry.sha
+    with open(full_path, "rb") as fd:
+        return object_hash(fd, b'blob', None) != entry.sha
+
+# Signature: GitRepository, str, set[str] -> bool
+# Purpose: Whether path is a real directory whose files are all among deleted, so it is gone once they are removed.
+def worktree_dir_deleted(repo: 'GitRepository', path: str, deleted: set[str]) -> bool:
+    full_path: str = os.path.join(repo.worktree, path)
+    if os.path.islink(full_path) or not os.path.isdir(full_path):
+        return False
+    for (root, dirs, files) in os.walk(full_path):
+        # Symlinks to directories are listed among dirs, but are tracked like files.
+        for name in files + [name for name in dirs if os.path.islink(os.path.join(root, name))]:
+            if os.path.relpath(os.path.join(root, name), repo.worktree) not in deleted:
+                return False
+    return True
+
+# Signature: GitRepository, str, GitTreeLeaf, int -> GitIndexEntry
+# Purpose: The index entry for a file just checked out. Stage 0 entries carry the stat of the file just written; conflict
+#          stages have no file of their own.
+def index_entry_from_leaf(repo: 'GitRepository', path: str, leaf: 'GitTreeLeaf', stage: int) -> 'GitIndexEntry':
+    mode: int = int(leaf.mode, 8)
+    full_path: str = os.path.join(repo.worktree, path)
+    if stage == 0 and os.path.lexists(full_path):
+        stat: stat_result = os.lstat(full_path)
+        return GitIndexEntry(ctime=(int(stat.st_ctime), stat.st_ctime_ns % 10**9), mtime=(int(stat.st_mtime), stat.st_mtime_ns % 10**9),
+                             dev=stat.st_dev, ino=stat.st_ino, mode_type=mode >> 12, mode_perms=mode & 0o777, uid=stat.st_uid, gid=stat.st_gid,
+                             fsize=stat.st_size, sha=leaf.sha, flag_assume_valid=False, flag_stage=0, name=path)
+    return GitIndexEntry(ctime=(0, 0), mtime=(0, 0), dev=0, ino=0, mode_type=mode >> 12, mode_perms=mode & 0o777, uid=0, gid=0,
+                         fsize=0, sha=leaf.sha, flag_assume_valid=False, flag_stage=stage << 12, name=path)
 
 # ------------------------------------------------[show-ref]--------------------------------------------------
 
+@trace2_command("show-ref")
 def cmd_show_ref(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
     refs = ref_list(repo)
@@ -222,6 +468,7 @@ def show_ref(repo: 'GitRepository', refs: dict, with_hash: bool = True, prefix:
 
 # ------------------------------------------------[tag]--------------------------------------------------
 
+@trace2_command("tag")
 def cmd_tag(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
 
@@ -248,7 +495,7 @@ def tag_create(repo: 'GitRepository', name: str, ref: str, create_tag_object: bo
         ref_create(repo, "tags/" + name, sha)
 
 def ref_create(repo: 'GitRepository', ref_name: str, sha: str) -> None:
-    filename: str = GitRepository.repo_file(repo, "refs/" + ref_name)
+    filename: str = GitRepository.repo_file(repo, "refs", *ref_name.split("/"), mkdir=True)
     with open(filename, "w") as f:
         f.write(sha + "\n")
 
@@ -273,21 +520,25 @@ def object_resolve(repo: 'GitRepository', name: str) -> list[str]:
             for file in os.listdir(path):
                 if file.startswith(remaining):
                     candidates.append(prefix + file)
+        for packed in pack_resolve_prefix(repo, name):
+            if packed not in candidates:
+                candidates.append(packed)
 
-    as_tag: str = ref_resolve(repo, "ref/tags/" + name)
+    as_tag: str = ref_resolve(repo, "refs/tags/" + name)
     if as_tag:
         candidates.append(as_tag)
 
-    as_branch: str = ref_resolve(repo, "ref/heads/" + name)
+    as_branch: str = ref_resolve(repo, "refs/heads/" + name)
     if as_branch:
         candidates.append(as_branch)
 
-    as_remote_branch: str = ref_resolve(repo, "ref/remotes/" + name)
+    as_remote_branch: str = ref_resolve(repo, "refs/remotes/" + name)
     if as_remote_branch:
         candidates.append(as_remote_branch)
 
     return candidates
 
+@trace2_command("rev-parse")
 def cmd_rev_parse(args: Namespace) -> None:
     if args.type:
         object_type: bytes = args.type.encode()
@@ -300,6 +551,7 @@ def cmd_rev_parse(args: Namespace) -> None:
 
 # ------------------------------------------------[ls-files]--------------------------------------------------
 
+@trace2_command("ls-files")
 def cmd_ls_files(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
     index: 'GitIndex' = index_read(repo)
@@ -325,6 +577,7 @@ def cmd_ls_files(args: Namespace) -> None:
 
 # ------------------------------------------------[check-ignore]--------------------------------------------------
 
+@trace2_command("check-ignore")
 def cmd_check_ignore(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
     rules = gitignore_read(repo)
@@ -344,20 +597,24 @@ def check_ignore(rules: 'GitIgnore', path: str) -> Optional[bool]:
 
 # ------------------------------------------------[status]--------------------------------------------------
 
+@trace2_command("status")
 def cmd_status(_) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
     index: 'GitIndex' = index_read(repo)
 
-    cmd_status_branch(repo)
-    cmd_status_head_index(repo, index)
+    with trace2_region("branch"):
+        cmd_status_branch(repo)
+    with trace2_region("head_index"):
+        cmd_status_head_index(repo, index)
     print()
-    cmd_status_index_work_tree(repo, index)
+    with trace2_region("index_worktree"):
+        cmd_status_index_work_tree(repo, index)
 
 def branch_get_active(repo: 'GitRepository') -> Union[bool, str]:
     with open(GitRepository.repo_file(repo, "HEAD"), "r") as f:
         head = f.read()
 
-    if head.startswith("ref: ref/heads/"):
+    if head.startswith("ref: refs/heads/"):
         return head[16:-1]
     else:
         return False
@@ -391,15 +648,35 @@ def tree_to_dict(repo: 'GitRepository', ref: str, prefix: str = "") -> dict:
 def cmd_status_head_index(repo: 'GitRepository', index: 'GitIndex') -> None:
     print("Changes to be commmited:")
 
-    head = tree_to_dict(repo, "HEAD")
+    head = tree_to_dict(repo, "HEAD") if ref_resolve(repo, "HEAD") else dict()
+    added: dict[str, str] = dict()
+    # With status.renames=copies, the HEAD files still staged are where added ones may have been copied from.
+    kept: Optional[dict[str, str]] = dict() if rename_copies(repo, "status") else None
     for entry in index.entries:
-        if entry in head:
+        if entry.name in head:
             if head[entry.name] != entry.sha:
                 print(f"\t modified {entry.name}")
+            if kept is not None:
+                kept[entry.name] = head[entry.name]
             del head[entry.name]
         else:
-            print(f"\t added {entry.name}")
+            added[entry.name] = entry.sha
+
+    # What is left of head was removed; pair the removals up with additions that are really renames.
+    with trace2_region("renames"):
+        pairs, skipped = rename_detect(repo, head, added, kept, limit=rename_limit(repo, "status"))
+    if skipped:
+        print("warning: inexact rename detection was skipped due to too many files; set status.renameLimit higher.", file=sys.stderr)
+    for pair in pairs:
+        if pair.status == "R":
+            print(f"\t renamed {pair.old_path} -> {pair.new_path}")
+            del head[pair.old_path]
+        else:
+            print(f"\t copied {pair.old_path} -> {pair.new_path}")
+        del added[pair.new_path]
 
+    for item in added.keys():
+        print(f"\t added {item}")
     for item in head.keys():
         print(f"\t removed {item}")
 
@@ -412,127 +689,203 @@ def cmd_status_index_work_tree(repo: 'GitRepository', index: 'GitIndex') -> None
     ignore: 'GitIgnore' = gitignore_read(repo)
     
     gitdir_prefix: str = repo.gitdir + os.path.sep
+    cone: Optional['GitSparseCone'] = sparse_read(repo)
+    cone_cache: dict[str, bool] = dict()
+
+    # Insertion ordered, so untracked files are listed in walk order, with constant time removal.
+    all_files: dict[str, None] = dict()
+
+    with trace2_region("walk"):
+        for (root, dirs, files) in os.walk(repo.worktree, True):
+            if root == repo.gitdir or root.startswith(gitdir_prefix):
+                continue
+            rel_root: str = os.path.relpath(root, repo.worktree)
+            rel_root = "" if rel_root == "." else rel_root
+            if cone is not None:
+                # Directories outside the sparse checkout are not descended into.
+                dirs[:] = [d for d in dirs if sparse_dir_included(cone, os.path.join(rel_root, d), cone_cache)]
+            for f in files:
+                all_files[os.path.join(rel_root, f)] = None
+        trace2_count("files_walked", len(all_files))
+
+    with trace2_region("compare"):
+        for entry in index.entries:
+            if entry.flag_skip_worktree:
+                continue
+            full_path: str = os.path.join(repo.worktree, entry.name)
+
+            if not os.path.exists(full_path):
+                print(f"\t deleted {entry.name}")
+            else:
+                stat: stat_result = os.stat(full_path)
+                trace2_count("files_statted")
 
-    all_files: list[str] = []
-
-    for (root, _, files) in os.walk(repo.worktree, True):
-        if root == repo.gitdir or root.startswith(gitdir_prefix):
-            continue
-        for f in files:
-            full_path: str = os.path.join(root, f)
-            rel_path: str = os.path.relpath(full_path, repo.worktree)
-            all_files.append(rel_path)
-
-    for entry in index.entries:
-        full_path: str = os.path.join(repo.worktree, entry.name)
-
-        if not os.path.exists(full_path):
-            print(f"\t deleted {entry.name}")
-        else:
-            stat: stat_result = os.stat(full_path)
-
-            ctime_ns = entry.ctime[0] * 10**9 + entry.ctime[1]
-            mtime_ns = entry.mtime[0] * 10**9 + entry.mtime[1]
-            if (stat.st_ctime_ns != ctime_ns) or (stat.st_mtime_ns != mtime_ns):
-                with open(full_path, "rb") as fd:
-                    new_sha = object_hash(fd, b'blob', None)
-                    same = entry.sha == new_sha
-                if not same:
-                    print(f"\t modified {entry.name}")
+                ctime_ns = entry.ctime[0] * 10**9 + entry.ctime[1]
+                mtime_ns = entry.mtime[0] * 10**9 + entry.mtime[1]
+                if (stat.st_ctime_ns != ctime_ns) or (stat.st_mtime_ns != mtime_ns):
+                    with trace2_timer("hash"), open(full_path, "rb") as fd:
+                        new_sha = object_hash(fd, b'blob', None)
+                        same = entry.sha == new_sha
+                    trace2_count("files_hashed")
+                    if not same:
+                        print(f"\t modified {entry.name}")
 
-        if entry.name in all_files:
-            all_files.remove(entry.name)
+            all_files.pop(entry.name, None)
 
     print()
     print("Untracked files:")
 
-    for f in all_files:
-        if not check_ignore(ignore, f):
-            print(f"\t{f}")
+    with trace2_region("untracked"):
+        for f in all_files:
+            with trace2_timer("ignore"):
+                ignored: bool = check_ignore(ignore, f)
+            if not ignored:
+                print(f"\t{f}")
         
 # ------------------------------------------------[rm]--------------------------------------------------
 
 # Signature: Namespace -> None
 # Purpose: Extracts the argument from the CLI and delegates to the rm function.
+@trace2_command("rm")
 def cmd_rm(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
-    rm(repo, args.path)
+    rm(repo, args.path, recursive=args.recursive)
 
-# Signature: GitRepository, list[str], bool, bool -> None
+# Signature: GitRepository, list[str], bool, bool, bool -> None
 # Purpose: Gets the a repo and a list of paths, reads that repo index and removes entries that matches that list of paths.
-def rm(repo: 'GitRepository', paths: list[str], delete: bool = True, skip_missing: bool = False) -> None:
+#          With recursive, a directory removes every entry under it, found by one range query on the sorted index.
+def rm(repo: 'GitRepository', paths: list[str], delete: bool = True, skip_missing: bool = False, recursive: bool = False) -> None:
     index: 'GitIndex' = index_read(repo)
-    worktree: str = repo.worktree + os.sep
-    absolute_paths: set = {}
-    
+    names: set[str] = set()
+    missing: set[str] = set()
     for path in paths:
-        absolute_path: str = os.path.abspath(path)
-        if absolute_path.startswith(worktree):
-            absolute_paths.add(path)
+        name: str = index_relative_path(repo, path, "Cannot remove paths outside of the worktree.")
+        if index_find(index, name):
+            names.add(name)
+            continue
+        under: list['GitIndexEntry'] = index_entries_under(index, name)
+        if under and not recursive:
+            raise Exception(f"Not removing '{name or '.'}' recursively without -r.")
+        if under:
+            names.update(entry.name for entry in under)
         else:
-            raise Exception("Cannot remove paths outside of the worktree.")
-    
-    kept_entries: list = []
-    removed_entries: list = []
+            missing.add(name)
+
+    if missing and not skip_missing:
+        raise Exception(f"Cannot remove paths not in the index: {missing}")
+
+    # A conflicted path has one entry per stage; all of them go.
+    removed: list[str] = index_apply(index, [], names)
 
-    for e in index.entries:
-        full_path: str = os.path.join(repo.worktree, e.name)
-        if full_path in absolute_paths:
-            removed_entries.append(full_path)
-            absolute_paths.remove(full_path)
-        else:
-            kept_entries.append(e)
-    
-    if len(absolute_paths) > 0 and not skip_missing:
-        raise Exception(f"Cannot remove paths not in the index: {absolute_paths}")
-    
     if delete:
-        for path in removed_entries:
-            os.unlink(path)
+        for name in removed:
+            full_path: str = os.path.join(repo.worktree, name)
+            if os.path.lexists(full_path):
+                os.unlink(full_path)
+            directory: str = os.path.dirname(full_path)
+            while directory != repo.worktree and os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
 
-    index.entries = kept_entries
     index_write(repo, index)
 
+# Signature: GitRepository, str, str -> str
+# Purpose: The index name of path, which must be inside the worktree ("" for the worktree itself); error is raised
+#          otherwise.
+def index_relative_path(repo: 'GitRepository', path: str, error: str) -> str:
+    absolute_path: str = os.path.abspath(path)
+    if absolute_path == repo.worktree:
+        return ""
+    if not absolute_path.startswith(repo.worktree + os.sep):
+        raise Exception(error)
+    return os.path.relpath(absolute_path, repo.worktree)
+
 # ------------------------------------------------[add]--------------------------------------------------
 
 # Signature: Namespace -> None
 # Purpose: Extracts the argument from the CLI and delegates to the add function.
+@trace2_command("add")
 def cmd_add(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
     add(repo, args.path)
 
 # Signature: GitRepository, list[str], bool, bool -> None
-# Purpose: Removes the existing index entry (if there's one) and modifies it with the add changes and writes it back.
+# Purpose: Hashes each file and stages it in place of its existing entries, if any (all stages, which resolves a
+#          conflict). A directory stages its untracked files that are not ignored and its tracked ones, found by one
+#          range query on the sorted index, and unstages those gone from the worktree, as git add does. Tracked files
+#          whose stat matches their entry are not hashed again. The index is read, merged with the new entries and
+#          written once, whatever the number of paths.
 def add(repo: 'GitRepository', paths: list[str], delete: bool = True, skip_missing: bool = False) -> None:
-    rm(repo, paths, delete=False, skip_missing=True)
-    
-    worktree: str = repo.worktree + os.sep
-
-    clean_paths: set = {}
-    for path in paths:
-        absolute_path: str = os.path.abspath(path)
-        if not (absolute_path.startswith(worktree) and os.path.isfile(absolute_path)):
-            raise Exception(f"Not a file, or outside the worktree: {paths}")
-        relative_path: str = os.path.relpath(absolute_path, repo.worktree)
-        clean_paths.add((absolute_path, relative_path))
-
     index: 'GitIndex' = index_read(repo)
+    ignore: Optional['GitIgnore'] = None
 
-    for (abspath, relpath) in clean_paths:
-        with open(abspath, "rb") as fd:
-            sha: str = object_hash(fd, b"blob", repo)
-            stat: stat_result = os.stat(abspath)
-            ctime_s: int = int(stat.st_ctime)
-            ctime_ns: int = stat.st_ctime_ns * 10**9
-            mtime_s: int = int(stat.st_mtime)
-            mtime_ns: int = stat.st_mtime_ns * 10**9
-            entry: 'GitIndexEntry' = GitIndexEntry(ctime=(ctime_s, ctime_ns), mtime=(mtime_s, mtime_ns), dev=stat.st_dev,
-                                                    mode_type=0b1000, mode_perms=0o644, uid=stat.st_uid, gid=stat.st_gid, fsize=stat.st_size, sha=sha,
-                                                    flag_assume_valid=False, flag_stage=False, name=relpath)
-            index.append(entry)
-    
+    files: dict[str, str] = dict()
+    removes: set[str] = set()
+    for path in paths:
+        relative_path: str = index_relative_path(repo, path, f"Not a file, or outside the worktree: {path}")
+        absolute_path: str = os.path.join(repo.worktree, relative_path)
+        if os.path.isdir(absolute_path) and not os.path.islink(absolute_path):
+            if ignore is None:
+                ignore = gitignore_read(repo)
+            tracked: set[str] = set()
+            for entry in index_entries_under(index, relative_path):
+                tracked.add(entry.name)
+                if not entry.flag_skip_worktree and not os.path.lexists(os.path.join(repo.worktree, entry.name)):
+                    removes.add(entry.name)
+            for name in add_walk(repo, relative_path):
+                if name in tracked or not check_ignore(ignore, name):
+                    files[name] = os.path.join(repo.worktree, name)
+        elif os.path.lexists(absolute_path):
+            files[relative_path] = absolute_path
+        elif index_find(index, relative_path):
+            removes.add(relative_path)
+        else:
+            raise Exception(f"Not a file, or outside the worktree: {path}")
+
+    entries: list['GitIndexEntry'] = []
+    for (relpath, abspath) in files.items():
+        stat: stat_result = os.lstat(abspath)
+        trace2_count("files_statted")
+        mode_type, mode_perms = add_mode(stat)
+        current: Optional['GitIndexEntry'] = next(iter(index_find(index, relpath)), None)
+        if (current is not None and not current.flag_stage and (current.mode_type, current.mode_perms) == (mode_type, mode_perms)
+                and stat.st_size == current.fsize and stat.st_mtime_ns == current.mtime[0] * 10**9 + current.mtime[1]
+                and stat.st_ctime_ns == current.ctime[0] * 10**9 + current.ctime[1]):
+            continue
+        with trace2_timer("hash"):
+            if S_ISLNK(stat.st_mode):
+                sha: str = object_write(GitBlob(os.fsencode(os.readlink(abspath))), repo)
+            else:
+                with open(abspath, "rb") as fd:
+                    sha = object_hash(fd, b"blob", repo)
+        trace2_count("files_hashed")
+        entries.append(GitIndexEntry(ctime=(int(stat.st_ctime), stat.st_ctime_ns % 10**9), mtime=(int(stat.st_mtime), stat.st_mtime_ns % 10**9),
+                                     dev=stat.st_dev, ino=stat.st_ino, mode_type=mode_type, mode_perms=mode_perms, uid=stat.st_uid,
+                                     gid=stat.st_gid, fsize=stat.st_size, sha=sha, flag_assume_valid=False, flag_stage=False, name=relpath))
+
+    index_apply(index, entries, removes)
     index_write(repo, index)
 
+# Signature: stat_result -> tuple[int, int]
+# Purpose: The index mode (type, permissions) of a worktree file: a symlink, or a regular file that is executable
+#          or not.
+def add_mode(stat: stat_result) -> tuple[int, int]:
+    if S_ISLNK(stat.st_mode):
+        return 0b1010, 0
+    return 0b1000, 0o755 if stat.st_mode & 0o100 else 0o644
+
+# Signature: GitRepository, str -> Iterator[str]
+# Purpose: The index names of the files and symlinks under a worktree directory ("" for all of it), skipping
+#          repositories' .git directories.
+def add_walk(repo: 'GitRepository', directory: str) -> Iterator[str]:
+    for (root, dirs, files) in os.walk(os.path.join(repo.worktree, directory)):
+        rel_root: str = os.path.relpath(root, repo.worktree)
+        rel_root = "" if rel_root == "." else rel_root
+        # Symlinks to directories are listed among dirs, but are tracked like files; os.walk does not enter them.
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            yield os.path.join(rel_root, name)
+
 # ------------------------------------------------[commit]--------------------------------------------------
 
 # Signature: None -> configparser
@@ -591,11 +944,13 @@ def tree_from_index(repo: 'GitRepository', index: 'GitIndex') -> str:
     return sha
 
 # Signature: GitRepository -> str
-# Purpose: To create a commit object.
-def create_commit(repo: GitRepository, tree: str, parent: str, author: str, timestamp: datetime, message: str) -> str:
+# Purpose: To create a commit object. parent is a single sha, or a list of them for a merge.
+def create_commit(repo: GitRepository, tree: str, parent: Union[str, list[str]], author: str, timestamp: datetime, message: str) -> str:
     commit: GitCommit = GitCommit()
     commit.kvlm[b'tree'] = tree.encode("ascii")
-    if parent:
+    if isinstance(parent, list):
+        commit.kvlm[b'parent'] = [p.encode("ascii") for p in parent]
+    elif parent:
         commit.kvlm[b'parent'] = parent.encode("ascii")
     
     message = message.strip() + "\n"
@@ -606,22 +961,536 @@ def create_commit(repo: GitRepository, tree: str, parent: str, author: str, time
     author = author + timestamp.strftime(" %s ") + timezone
 
     commit.kvlm[b'author'] = author.encode("utf8")
-    commit.kvlm[b'committer'] = author.encode("uft8")
+    commit.kvlm[b'committer'] = author.encode("utf8")
     commit.kvlm[None] = message.encode("utf8")
 
     return object_write(commit, repo)
 
 # Signature: Namespace -> None
 # Purpose: Extracts the argument from the CLI and delegates to the commit function.
+@trace2_command("commit")
 def cmd_commit(args: Namespace) -> None:
     repo: 'GitRepository' = GitRepository.repo_find()
     index: 'GitIndex' = index_read(repo)
+    if any(entry.flag_stage for entry in index.entries):
+        raise Exception("Committing is not possible because you have unmerged files.")
     tree: 'GitTree' = tree_from_index(repo, index)
-    commit: str = create_commit(repo, tree, object_find(repo, "HEAD"), gitconfig_user_get(gitconfig_read()), datetime.now(), args.message)
+
+    # Concluding a merge that stopped on conflicts.
+    parent: Union[str, list[str]] = object_find(repo, "HEAD")
+    merge_head: Optional[str] = ref_resolve(repo, "MERGE_HEAD")
+    if merge_head:
+        parent = [parent, merge_head]
+
+    commit: str = create_commit(repo, tree, parent, gitconfig_user_get(gitconfig_read()), datetime.now(), args.message)
+    head_update(repo, commit)
+    if merge_head:
+        os.unlink(GitRepository.repo_path(repo, "MERGE_HEAD"))
+    maintenance_auto(repo)
+
+# Signature: GitRepository, str -> None
+# Purpose: Points the active branch, or a detached HEAD, at commit.
+def head_update(repo: 'GitRepository', commit: str) -> None:
     active_branch: Union[bool, str] = branch_get_active(repo)
     if active_branch:
-        with open(GitRepository.repo_find(repo, os.path.join("refs/heads", active_branch)), "w") as fd:
+        with open(GitRepository.repo_file(repo, "refs", "heads", active_branch), "w") as fd:
+            fd.write(commit + "\n")
+    else:
+        with open(GitRepository.repo_file(repo, "HEAD"), "w") as fd:
             fd.write(commit + "\n")
+
+# ------------------------------------------------[fetch]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Extracts the argument from the CLI and delegates to the fetch function.
+@trace2_command("fetch")
+def cmd_fetch(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    updates: dict[str, str] = fetch(repo, args.remote)
+    for ref, sha in updates.items():
+        print(f"{sha} {ref}")
+
+# ------------------------------------------------[clone]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Clones the repository, then checks out HEAD and stages what was checked out.
+@trace2_command("clone")
+def cmd_clone(args: Namespace) -> None:
+    path: str = args.path if args.path else os.path.basename(os.path.normpath(args.url))
+    if os.path.exists(path) and os.listdir(path):
+        raise Exception(f"Not empty {path}!")
+
+    repo: 'GitRepository' = clone(args.url, path)
+    print(f"Cloned into {repo.worktree}")
+
+    head: Optional[str] = ref_resolve(repo, "HEAD")
+    if not head:
+        return
+
+    # With --sparse, only the files at the root are checked out until sparse-checkout adds directories.
+    cone: Optional['GitSparseCone'] = GitSparseCone() if args.sparse else None
+    if cone is not None:
+        sparse_write(repo, cone)
+
+    commit: Optional['GitObject'] = object_read(repo, head)
+    tree: Optional['GitObject'] = object_read(repo, commit.kvlm[b'tree'].decode("ascii"))
+    tree_checkout(repo, tree, os.path.realpath(repo.worktree), cone)
+    index_write(repo, index_from_checkout(repo, head, cone))
+
+# Signature: GitRepository, str, Optional[GitSparseCone] -> GitIndex
+# Purpose: Builds the index matching a freshly checked out tree-ish. Files outside cone were not checked out and
+#          are marked skip-worktree.
+def index_from_checkout(repo: 'GitRepository', ref: str, cone: Optional['GitSparseCone'] = None) -> 'GitIndex':
+    entries: list['GitIndexEntry'] = []
+    cone_cache: dict[str, bool] = dict()
+    tree: str = object_find(repo, ref, object_type=b'tree')
+    # Each entry keeps its tree mode, so symlinks and executables are not recorded as plain files.
+    for (relpath, _, leaf) in sorted(tree_diff(repo, None, tree), key=lambda change: change[0]):
+        entry: 'GitIndexEntry' = index_entry_from_leaf(repo, relpath, leaf, 0)
+        entry.flag_skip_worktree = cone is not None and not sparse_path_included(cone, relpath, cone_cache)
+        entries.append(entry)
+    return GitIndex(entries=entries)
+
+# ------------------------------------------------[repack]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Extracts the argument from the CLI and delegates to the repack function.
+@trace2_command("repack")
+def cmd_repack(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    pack_sha: Optional[str] = repack(repo, delete_redundant=args.delete, write_bitmap=args.write_bitmap)
+    if pack_sha:
+        print(f"Packed into pack-{pack_sha}.pack")
     else:
-        with open(GitRepository.repo_find(repo, "HEAD"), "w") as fd:
-            fd.write("\n")
\ No newline at end of file
+        print("Nothing to pack.")
+
+# ------------------------------------------------[rev-list]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Lists (or counts) the commits, and with --objects every object, reachable from the given revisions
+#          but not from the ones prefixed with ^. A reachability bitmap answers it when there is one.
+@trace2_command("rev-list")
+def cmd_rev_list(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    include: list[str] = [object_find(repo, rev) for rev in args.revisions if not rev.startswith("^")]
+    exclude: list[str] = [object_find(repo, rev[1:]) for rev in args.revisions if rev.startswith("^")]
+
+    bitmap: Optional['GitBitmapIndex'] = bitmap_load(repo)
+    if bitmap:
+        bits: int = bitmap_rev_list(repo, bitmap, include, exclude, objects=args.objects)
+        if args.count:
+            print(bits.bit_count())
+        else:
+            for sha in bitmap_shas(bitmap, bits):
+                print(sha)
+        return
+
+    excluded: set[str] = {sha for (sha, _) in objects_reachable(repo, exclude)}
+    found: list[tuple[str, bytes]] = objects_reachable(repo, include, stop=lambda sha: sha in excluded)
+    if not args.objects:
+        found = [(sha, object_type) for (sha, object_type) in found if object_type == b'commit']
+    if args.count:
+        print(len(found))
+    else:
+        for (sha, _) in found:
+            print(sha)
+
+# ------------------------------------------------[fsck]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Verifies the object store and prints what is corrupt, missing or dangling.
+@trace2_command("fsck")
+def cmd_fsck(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    report: 'GitFsckReport' = fsck(repo, jobs=args.jobs)
+
+    for (sha, reason) in report.corrupt:
+        print(f"error: {sha}: {reason}")
+    for (sha, referrer) in report.missing:
+        print(f"missing {sha} (referenced by {referrer})")
+    for (sha, object_type) in report.dangling:
+        print(f"dangling {object_type.decode('ascii')} {sha}")
+    print(f"Checked {report.checked} objects.")
+
+    if report.corrupt or report.missing:
+        sys.exit(1)
+
+# ------------------------------------------------[daemon]--------------------------------------------------
+
+# Signature: Namespace, Callable[[list[str]], None] -> None
+# Purpose: Serves this repository's commands over a Unix socket with warm caches, or stops the daemon.
+#          run is the command dispatcher the daemon executes requests with.
+def cmd_daemon(args: Namespace, run: Callable[[list[str]], None]) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    if args.stop:
+        print("Daemon stopped." if daemon_stop(repo) else "No daemon is running.")
+    else:
+        daemon_serve(repo, run)
+
+# ------------------------------------------------[commit-graph]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Writes the commit-graph file, with changed-path Bloom filters when asked, for path-limited log.
+@trace2_command("commit-graph")
+def cmd_commit_graph(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    count: int = commit_graph_write(repo, changed_paths=args.changed_paths)
+    print(f"Wrote commit-graph with {count} commits.")
+
+# ------------------------------------------------[merge-base]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Prints the best common ancestor of the commits (every one with --all), or with --is-ancestor exits 0
+#          when the first commit is an ancestor of the second and 1 otherwise. Exits 1 when there is no answer.
+@trace2_command("merge-base")
+def cmd_merge_base(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    if args.is_ancestor and len(args.commits) != 2:
+        raise Exception("--is-ancestor takes exactly two commits.")
+    if len(args.commits) < 2:
+        raise Exception("merge-base needs at least two commits.")
+    shas: list[str] = [object_find(repo, name, object_type=b'commit') for name in args.commits]
+
+    if args.is_ancestor:
+        sys.exit(0 if commit_is_ancestor(repo, shas[0], shas[1]) else 1)
+
+    bases: list[str] = merge_base(repo, shas[0], shas[1:], all=args.all)
+    if not bases:
+        sys.exit(1)
+    for sha in bases:
+        print(sha)
+
+# ------------------------------------------------[merge]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Merges a commit into HEAD: fast-forwards when HEAD is its ancestor, otherwise three-way merges the trees
+#          against their merge base and commits the result. On conflicts, the conflicted files are left in the
+#          worktree with markers, their versions are staged as stages 1, 2 and 3, MERGE_HEAD is written and the
+#          merge is concluded by a later commit.
+@trace2_command("merge")
+def cmd_merge(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    if ref_resolve(repo, "MERGE_HEAD"):
+        raise Exception("You have not concluded your merge (MERGE_HEAD exists).")
+    head: Optional[str] = ref_resolve(repo, "HEAD")
+    if not head:
+        raise Exception("Cannot merge into an unborn branch.")
+    theirs: str = object_find(repo, args.commit, object_type=b'commit')
+
+    with trace2_region("merge_base"):
+        bases: list[str] = merge_base(repo, head, [theirs])
+    if theirs in bases:
+        print("Already up to date.")
+        return
+
+    ours_tree: str = commit_parse(repo, head)[0]
+    theirs_tree: str = commit_parse(repo, theirs)[0]
+    conflicts: list['GitMergeConflict'] = []
+    if head in bases:
+        result_tree: Optional[str] = theirs_tree
+    else:
+        # With several best common ancestors (criss-cross merges) the newest one is used as the base.
+        base_tree: Optional[str] = commit_parse(repo, bases[0])[0] if bases else None
+        with trace2_region("trees"):
+            result_tree = merge_trees(repo, base_tree, ours_tree, theirs_tree, conflicts, ("HEAD", args.commit))
+        if result_tree is None:
+            result_tree = object_write(GitTree(), repo)
+
+    with trace2_region("checkout"):
+        tree_switch(repo, ours_tree, result_tree, conflicts, operation="merge")
+
+    if head in bases:
+        head_update(repo, theirs)
+        print(f"Fast-forward to {theirs}")
+        return
+
+    for conflict in conflicts:
+        print(f"CONFLICT ({conflict.reason}): Merge conflict in {conflict.path}")
+    if conflicts:
+        with open(GitRepository.repo_file(repo, "MERGE_HEAD"), "w") as fd:
+            fd.write(theirs + "\n")
+        print("Automatic merge failed; fix conflicts and then commit the result.")
+        sys.exit(1)
+
+    message: str = args.message or f"Merge {args.commit}"
+    commit: str = create_commit(repo, result_tree, [head, theirs], gitconfig_user_get(gitconfig_read()), datetime.now(), message)
+    head_update(repo, commit)
+    print(f"Merge made: {commit}")
+
+# ------------------------------------------------[grep]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Prints the lines matching a pattern in the tracked worktree files, the index (--cached) or a tree-ish,
+#          as path:line (tree-ish:path:line for a tree-ish), in path order. Exits 1 when nothing matches.
+@trace2_command("grep")
+def cmd_grep(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    pattern: bytes = args.pattern.encode("utf8")
+    if args.fixed_strings:
+        pattern = re.escape(pattern)
+    tree: Optional[str] = object_find(repo, args.tree, object_type=b'tree') if args.tree else None
+    prefix: str = f"{args.tree}:" if args.tree else ""
+
+    found: bool = False
+    for (path, lines) in grep(repo, pattern, re.IGNORECASE if args.ignore_case else 0, tree=tree, cached=args.cached, jobs=args.jobs):
+        found = True
+        if args.files_with_matches:
+            print(f"{prefix}{path}")
+            continue
+        for (number, line) in lines:
+            text: str = line.decode("utf8", errors="replace")
+            print(f"{prefix}{path}:{number}:{text}" if args.line_number else f"{prefix}{path}:{text}")
+
+    if not found:
+        sys.exit(1)
+
+# ------------------------------------------------[archive]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Writes a tree-ish as a tar, tar.gz or zip archive to a file or stdout, streaming blobs from the object
+#          store instead of checking them out. The format defaults to the output file's extension, else tar.
+@trace2_command("archive")
+def cmd_archive(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    commit: Optional[str] = object_find(repo, args.tree, object_type=b'commit')
+    if commit:
+        tree, _, mtime = commit_parse(repo, commit)
+    else:
+        tree = object_find(repo, args.tree, object_type=b'tree')
+        mtime = int(datetime.now().timestamp())
+    if not tree:
+        raise Exception(f"Not a tree-ish {args.tree}.")
+
+    format: str = args.format
+    if not format:
+        output: str = (args.output or "").lower()
+        format = "zip" if output.endswith(".zip") else "tar.gz" if output.endswith((".tar.gz", ".tgz")) else "tar"
+
+    if args.output:
+        with open(args.output, "wb") as out:
+            archive(repo, tree, out, format, mtime, prefix=args.prefix, commit=commit)
+    else:
+        sys.stdout.flush()
+        archive(repo, tree, sys.stdout.buffer, format, mtime, prefix=args.prefix, commit=commit)
+        sys.stdout.buffer.flush()
+
+# ------------------------------------------------[fast-import]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Imports a fast-import stream read from stdin, then reports what was written. Exits with status 1 if
+#          some branch was left alone because updating it would have lost commits.
+@trace2_command("fast-import")
+def cmd_fast_import(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    state: 'GitFastImportState' = fast_import(repo, sys.stdin.buffer, force=args.force, import_marks=args.import_marks,
+                                              export_marks=args.export_marks)
+    if not args.quiet:
+        written: str = ", ".join(f"{count} {object_type.decode('ascii')}s" for object_type, count in state.counts.items())
+        print(f"fast-import: {written} written, {state.duplicates} duplicates, {len(state.marks)} marks.", file=sys.stderr)
+    if state.refused:
+        sys.exit(1)
+
+# ------------------------------------------------[fast-export]--------------------------------------------------
+
+# Signature: GitRepository, str -> tuple[str, str]
+# Purpose: Resolves a ref name as fast-export is given it (main, tags/v1, refs/heads/main or HEAD) to its full name
+#          and the object it points at.
+def fast_export_ref(repo: 'GitRepository', name: str) -> tuple[str, str]:
+    if name == "HEAD":
+        active_branch: Union[bool, str] = branch_get_active(repo)
+        name = f"refs/heads/{active_branch}" if active_branch else "HEAD"
+    for candidate in ([name] if name.startswith("refs/") or name == "HEAD" else [f"refs/{name}", f"refs/heads/{name}", f"refs/tags/{name}"]):
+        sha: Optional[str] = ref_resolve(repo, candidate)
+        if sha:
+            return candidate, sha
+    raise Exception(f"No such reference {name}.")
+
+# Signature: Namespace -> None
+# Purpose: Writes the history of the given refs (or of every ref, with --all) to stdout as a fast-export stream.
+@trace2_command("fast-export")
+def cmd_fast_export(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    refs: list[tuple[str, str]] = sorted(refs_flatten(ref_list(repo)).items()) if args.all else [fast_export_ref(repo, name) for name in args.refs]
+
+    marks: dict[str, int] = dict()
+    if args.import_marks:
+        with open(args.import_marks) as f:
+            for line in f:
+                mark, _, sha = line.strip().partition(" ")
+                if mark:
+                    marks[sha] = int(mark[1:])
+
+    sys.stdout.flush()
+    state: 'GitFastExportState' = fast_export(repo, refs, sys.stdout.buffer, marks)
+    sys.stdout.buffer.flush()
+
+    if args.export_marks:
+        with open(args.export_marks, "w") as f:
+            for (sha, mark) in sorted(state.marks.items(), key=lambda item: item[1]):
+                f.write(f":{mark} {sha}\n")
+
+# ------------------------------------------------[sparse-checkout]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Lists, sets, extends or disables the cone mode sparse checkout, then brings the worktree and the
+#          skip-worktree bits of the index in line with it.
+@trace2_command("sparse-checkout")
+def cmd_sparse_checkout(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    cone: Optional['GitSparseCone'] = sparse_read(repo)
+
+    if args.action == "list":
+        if cone is None:
+            raise Exception("This worktree is not sparse.")
+        for directory in sorted(cone.recursive):
+            print(directory)
+        return
+
+    if args.action == "set":
+        cone = sparse_cone_from_dirs(args.directories)
+    elif args.action == "add":
+        if cone is None:
+            raise Exception("This worktree is not sparse; use sparse-checkout set first.")
+        parents: set[str] = cone.parents
+        cone = sparse_cone_from_dirs(cone.recursive | set(args.directories))
+        cone.parents |= parents
+    else:
+        cone = None
+
+    sparse_write(repo, cone)
+    for path in sparse_checkout_apply(repo, cone):
+        print(f"Kept {path}: it has local changes.", file=sys.stderr)
+
+# Signature: GitRepository, Optional[GitSparseCone] -> list[str]
+# Purpose: Checks out the files that cone (everything, if None) now includes and removes those it no longer does,
+#          flipping their skip-worktree bits. Only entries whose side of the cone changed are touched. Files with
+#          local changes are left in place, still tracked; their paths are returned.
+def sparse_checkout_apply(repo: 'GitRepository', cone: Optional['GitSparseCone']) -> list[str]:
+    index: 'GitIndex' = index_read(repo)
+    cone_cache: dict[str, bool] = dict()
+    kept: list[str] = []
+    adds: list['GitIndexEntry'] = []
+
+    for entry in index.entries:
+        if entry.flag_stage:
+            continue
+        included: bool = cone is None or sparse_path_included(cone, entry.name, cone_cache)
+        if included != entry.flag_skip_worktree:
+            continue
+
+        full_path: str = os.path.join(repo.worktree, entry.name)
+        if included:
+            mode: bytes = f"{(entry.mode_type << 12) | entry.mode_perms:06o}".encode("ascii")
+            if not os.path.lexists(full_path):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                leaf_checkout(repo, mode, entry.sha, full_path)
+            adds.append(index_entry_from_leaf(repo, entry.name, GitTreeLeaf(mode, entry.name, entry.sha), 0))
+        elif worktree_dirty(full_path, entry):
+            kept.append(entry.name)
+        else:
+            if os.path.lexists(full_path):
+                os.unlink(full_path)
+            directory: str = os.path.dirname(full_path)
+            while directory != repo.worktree and not os.listdir(directory):
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
+            adds.append(GitIndexEntry(ctime=(0, 0), mtime=(0, 0), dev=0, ino=0, mode_type=entry.mode_type, mode_perms=entry.mode_perms,
+                                      uid=0, gid=0, fsize=0, sha=entry.sha, flag_assume_valid=False, flag_stage=0, name=entry.name,
+                                      flag_skip_worktree=True))
+
+    if adds:
+        index_apply(index, adds)
+        index_write(repo, index)
+    return kept
+
+# ------------------------------------------------[blame]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Prints each line of a file as of a commit with the commit that last changed it.
+@trace2_command("blame")
+def cmd_blame(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    commit: str = object_find(repo, args.rev, object_type=b'commit')
+    path: str = os.path.relpath(os.path.abspath(args.file), repo.worktree)
+    entries, lines = blame(repo, commit, path)
+    for line in blame_format(repo, entries, lines, path):
+        print(line)
+
+# ------------------------------------------------[diff]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Writes unified diffs between two of: a commit, the index and the worktree. Output goes to stdout as
+#          each file's diff is produced.
+@trace2_command("diff")
+def cmd_diff(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    algorithm: str = args.diff_algorithm or (repo.config.get("diff", "algorithm") if repo.config.has_option("diff", "algorithm") else "histogram")
+    if algorithm not in DIFF_ALGORITHMS:
+        raise Exception(f"Unknown diff algorithm {algorithm}.")
+    if len(args.commits) > 2 or (args.cached and len(args.commits) > 1):
+        raise Exception("Too many commits to compare.")
+
+    trees: list[str] = [object_find(repo, commit, object_type=b'tree') for commit in args.commits]
+    # Every file of the old side, unchanged ones included, is only listed for --find-copies-harder.
+    old_files: Optional[dict[str, 'GitDiffFile']] = None
+    with trace2_region("changes"):
+        if len(trees) == 2:
+            changes = diff_trees(repo, trees[0], trees[1])
+            if args.find_copies_harder:
+                old_files = diff_tree_files(repo, trees[0])
+        elif args.cached:
+            head: Optional[str] = trees[0] if trees else (object_find(repo, "HEAD", object_type=b'tree') if ref_resolve(repo, "HEAD") else None)
+            old_files = diff_tree_files(repo, head)
+            changes = diff_sides(old_files, diff_index_files(index_read(repo)))
+        elif trees:
+            old_files = diff_tree_files(repo, trees[0])
+            changes = diff_sides(old_files, diff_worktree_files(repo, index_read(repo)))
+        else:
+            index: 'GitIndex' = index_read(repo)
+            changes = diff_index_worktree(repo, index)
+            if args.find_copies_harder:
+                old_files = diff_index_files(index)
+
+    # Copies are looked for among the modified files, as their old version is read anyway, or among all of them.
+    copy_sources: Optional[dict[str, 'GitDiffFile']] = None
+    if args.find_copies_harder:
+        copy_sources = old_files
+    elif args.find_copies or rename_copies(repo, "diff"):
+        copy_sources = {path: old for (path, old, new) in changes if old is not None and new is not None}
+
+    sys.stdout.flush()
+    skipped: bool = diff_write(repo, changes, sys.stdout.buffer, context=args.unified, algorithm=algorithm, renames=args.renames,
+                               copy_sources=copy_sources, limit=rename_limit(repo, "diff"))
+    sys.stdout.buffer.flush()
+    if skipped:
+        print("warning: inexact rename detection was skipped due to too many files; set diff.renameLimit higher.", file=sys.stderr)
+
+# ------------------------------------------------[maintenance]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Runs the maintenance tasks: all (or those given with --task) with run, only those past their threshold
+#          with auto. Prints what each task that ran did.
+@trace2_command("maintenance")
+def cmd_maintenance(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    for (task, summary) in maintenance_run(repo, args.task, auto=args.action == "auto"):
+        print(f"{task}: {summary}.")
+
+# ------------------------------------------------[count-objects]--------------------------------------------------
+
+# Signature: Namespace -> None
+# Purpose: Prints the loose object count and disk usage as git count-objects does (-v for its full listing), or with
+#          --report sizes up the whole repository and points out what makes it slow.
+@trace2_command("count-objects")
+def cmd_count_objects(args: Namespace) -> None:
+    repo: 'GitRepository' = GitRepository.repo_find()
+    if args.report:
+        for line in sizing_format(sizing_report(repo, args.top)):
+            print(line)
+        return
+    counts: dict[str, int] = sizing_count_objects(repo)
+    if not args.verbose:
+        print(f"{counts['count']} objects, {counts['size']} kilobytes")
+        return
+    for (name, value) in counts.items():
+        print(f"{name}: {value}")
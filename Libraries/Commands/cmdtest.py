@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from GitRepo.git_repository import GitRepository
+from Libraries.Commands.cmd import add, tree_from_index, tree_switch
+from StageIndex.stage_index_func import index_read
+
+def write_files(root: str, files: dict[str, str]) -> None:
+    for (name, data) in files.items():
+        os.makedirs(os.path.dirname(os.path.join(root, name)), exist_ok=True)
+        with open(os.path.join(root, name), "w") as fd:
+            fd.write(data)
+
+def test_tree_switch_refuses_untracked_file_in_the_way_of_a_directory(tmp_path):
+    repo: GitRepository = GitRepository.repo_create(str(tmp_path))
+    write_files(repo.worktree, {"big.txt": "old\n", "d1/sub/f.txt": "old\n"})
+    add(repo, [repo.worktree])
+    old_tree: str = tree_from_index(repo, index_read(repo))
+    write_files(repo.worktree, {"big.txt": "new\n", "d1/sub/f.txt": "new\n", "d4/sub/f.txt": "new\n"})
+    add(repo, [repo.worktree])
+    new_tree: str = tree_from_index(repo, index_read(repo))
+    tree_switch(repo, new_tree, old_tree)
+
+    write_files(repo.worktree, {"d4": "untracked\n"})
+    with pytest.raises(Exception, match="untracked working tree file d4"):
+        tree_switch(repo, old_tree, new_tree)
+
+    # Nothing was written: the worktree still matches the index, so the switch goes through once d4 is moved.
+    with open(os.path.join(repo.worktree, "big.txt")) as fd:
+        assert fd.read() == "old\n"
+    os.unlink(os.path.join(repo.worktree, "d4"))
+    tree_switch(repo, old_tree, new_tree)
+    with open(os.path.join(repo.worktree, "d4", "sub", "f.txt")) as fd:
+        assert fd.read() == "new\n"
@@ -18,9 +18,27 @@ def main(argv: list[str] = sys.argv[1:]) -> None:
         case "ls-files":        cmd_ls_files(args)
         case "check-ignore":    cmd_check_ignore(args)
         case "status":          cmd_status(_=args)
-        case "rm":              cmd_status(args)
+        case "rm":              cmd_rm(args)
         case "add":             cmd_add(args)
         case "commit":          cmd_commit(args)
+        case "fetch":           cmd_fetch(args)
+        case "clone":           cmd_clone(args)
+        case "repack":          cmd_repack(args)
+        case "rev-list":        cmd_rev_list(args)
+        case "fsck":            cmd_fsck(args)
+        case "daemon":          cmd_daemon(args, run=main)
+        case "commit-graph":    cmd_commit_graph(args)
+        case "merge-base":      cmd_merge_base(args)
+        case "merge":           cmd_merge(args)
+        case "grep":            cmd_grep(args)
+        case "archive":         cmd_archive(args)
+        case "fast-import":     cmd_fast_import(args)
+        case "fast-export":     cmd_fast_export(args)
+        case "sparse-checkout": cmd_sparse_checkout(args)
+        case "blame":           cmd_blame(args)
+        case "diff":            cmd_diff(args)
+        case "maintenance":     cmd_maintenance(args)
+        case "count-objects":   cmd_count_objects(args)
         case _:                 print("Invalid command.")
 
 if __name__ == "__main__":
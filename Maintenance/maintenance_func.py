@@ -0,0 +1,203 @@
+from typing import TYPE_CHECKING, Callable, Optional
+import os
+
+from CommitGraph.commit_graph_func import commit_graph_load, commit_graph_position, commit_graph_tips, commit_graph_write, commit_parse
+from GitRepo.git_repository import GitRepository
+from Objects.object_func import object_read_raw
+from Objects.object_index_func import object_loose_index_clear
+from Packs.pack_func import pack_append, pack_append_finish, pack_append_open, pack_contains, pack_index_cache, pack_index_find, pack_indexes
+from Refs.ref_func import ref_pack
+from Trace2.trace2_func import trace2_count, trace2_region
+
+if TYPE_CHECKING:
+    from CommitGraph.GitCommitGraph.git_commit_graph import GitCommitGraph
+    from Packs.PackIndex.git_pack_index import GitPackIndex
+
+# Thresholds for maintenance auto, each read from the config key git uses for it. 0 disables a task in auto mode; a
+# negative value runs it every time.
+#   gc.auto:                         loose objects, estimated from one fanout directory as git gc --auto does.
+#   gc.autoPackLimit:                packs.
+#   maintenance.pack-refs.auto:      loose refs.
+#   maintenance.commit-graph.auto:   reachable commits the commit-graph does not have.
+MAINTENANCE_LOOSE_OBJECTS: int = 6700
+MAINTENANCE_PACKS: int = 50
+MAINTENANCE_LOOSE_REFS: int = 100
+MAINTENANCE_COMMIT_GRAPH: int = 100
+
+# The fanout directory sampled for the loose object estimate. Object ids are uniformly distributed, so any one holds
+# about 1/256th of the loose objects; git samples this one too.
+MAINTENANCE_SAMPLE_FANOUT: str = "17"
+
+# ------------------------------------------------[thresholds]--------------------------------------------------
+
+# Signature: GitRepository, str, str, int -> int
+def maintenance_threshold(repo: 'GitRepository', section: str, key: str, default: int) -> int:
+    if repo.config.has_option(section, key):
+        return repo.config.getint(section, key)
+    return default
+
+# Signature: GitRepository, int -> bool
+# Purpose: Whether there are more than about threshold loose objects, from a single directory listing.
+def maintenance_loose_objects_due(repo: 'GitRepository', threshold: int) -> bool:
+    try:
+        names: list[str] = os.listdir(GitRepository.repo_path(repo, "objects", MAINTENANCE_SAMPLE_FANOUT))
+    except FileNotFoundError:
+        return False
+    return sum(1 for name in names if len(name) == 38) > (threshold + 255) // 256
+
+# Signature: GitRepository, int -> bool
+# Purpose: Whether there are more than threshold packs, counted from the pack directory listing without reading any
+#          of their indexes.
+def maintenance_packs_due(repo: 'GitRepository', threshold: int) -> bool:
+    try:
+        names: list[str] = os.listdir(GitRepository.repo_path(repo, "objects", "pack"))
+    except FileNotFoundError:
+        return False
+    return sum(1 for name in names if name.endswith(".pack")) > threshold
+
+# Signature: GitRepository, int -> bool
+# Purpose: Whether there are more than threshold loose ref files. Counting stops as soon as there are.
+def maintenance_loose_refs_due(repo: 'GitRepository', threshold: int) -> bool:
+    count: int = 0
+    for (_, _, files) in os.walk(GitRepository.repo_path(repo, "refs")):
+        count += len(files)
+        if count > threshold:
+            return True
+    return False
+
+# Signature: GitRepository, int -> bool
+# Purpose: Whether more than threshold commits reachable from the refs are missing from the commit-graph. The walk
+#          stops at every commit the graph has, so after a commit it reads just that one.
+def maintenance_commit_graph_due(repo: 'GitRepository', threshold: int) -> bool:
+    graph: Optional['GitCommitGraph'] = commit_graph_load(repo)
+    seen: set[str] = set()
+    pending: list[str] = commit_graph_tips(repo)
+    while pending:
+        sha: str = pending.pop()
+        if sha in seen or (graph is not None and commit_graph_position(graph, sha) is not None):
+            continue
+        seen.add(sha)
+        if len(seen) > threshold:
+            return True
+        pending.extend(commit_parse(repo, sha)[1])
+    return False
+
+# ------------------------------------------------[tasks]--------------------------------------------------
+
+# Signature: GitRepository -> str
+# Purpose: Gathers every loose object into one new pack, then deletes the loose files, along with those of objects
+#          some pack already had. Objects are copied one at a time, so memory does not grow with their number.
+def maintenance_loose_objects(repo: 'GitRepository') -> str:
+    objects_dir: str = GitRepository.repo_path(repo, "objects")
+    loose: list[str] = []
+    for prefix in sorted(os.listdir(objects_dir)):
+        if len(prefix) == 2 and os.path.isdir(os.path.join(objects_dir, prefix)):
+            loose.extend(prefix + name for name in sorted(os.listdir(os.path.join(objects_dir, prefix))) if len(name) == 38)
+    if not loose:
+        return "no loose objects"
+
+    f, tmp_path = pack_append_open(repo)
+    entries: dict[str, tuple[int, int]] = dict()
+    for sha in loose:
+        if pack_contains(repo, sha):
+            continue
+        raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+        if raw is None:
+            raise Exception(f"Missing object {sha}.")
+        entries[sha] = pack_append(f, raw[0], raw[1])
+    pack_append_finish(repo, f, tmp_path, entries)
+
+    # Only once the pack is in place are the loose copies removed.
+    for sha in loose:
+        os.unlink(os.path.join(objects_dir, sha[0:2], sha[2:]))
+    for prefix in {sha[0:2] for sha in loose}:
+        if not os.listdir(os.path.join(objects_dir, prefix)):
+            os.rmdir(os.path.join(objects_dir, prefix))
+    object_loose_index_clear(repo)
+    trace2_count("maintenance_loose_objects_packed", len(entries))
+    return f"packed {len(entries)} loose objects, removed {len(loose)} loose files"
+
+# Signature: GitRepository -> str
+# Purpose: Consolidates the packs: every pack but the largest is copied into one new pack and deleted. The largest,
+#          typically the product of a full repack, is left alone (bitmap included), so the work done is proportional
+#          to what was added since, not to the size of the repository.
+def maintenance_incremental_repack(repo: 'GitRepository') -> str:
+    indexes: list['GitPackIndex'] = sorted(pack_indexes(repo), key=lambda index: os.path.getsize(index.pack_path))
+    if len(indexes) < 3:
+        return "nothing to consolidate"
+    largest: 'GitPackIndex' = indexes.pop()
+
+    f, tmp_path = pack_append_open(repo)
+    entries: dict[str, tuple[int, int]] = dict()
+    for index in indexes:
+        for sha in index.shas:
+            if sha in entries or pack_index_find(largest, sha) is not None:
+                continue
+            raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+            if raw is None:
+                raise Exception(f"Missing object {sha}.")
+            entries[sha] = pack_append(f, raw[0], raw[1])
+    pack_sha: Optional[str] = pack_append_finish(repo, f, tmp_path, entries)
+
+    for index in indexes:
+        if index.pack_sha == pack_sha:
+            continue
+        base: str = index.pack_path[:-5]
+        for ext in (".pack", ".idx", ".bitmap"):
+            if os.path.exists(base + ext):
+                os.unlink(base + ext)
+        pack_index_cache.pop(base + ".idx", None)
+    trace2_count("maintenance_packs_consolidated", len(indexes))
+    return f"consolidated {len(indexes)} packs into one of {len(entries)} objects"
+
+# Signature: GitRepository -> str
+def maintenance_pack_refs(repo: 'GitRepository') -> str:
+    return f"packed {ref_pack(repo)} refs"
+
+# Signature: GitRepository -> str
+# Purpose: Rewrites the commit-graph over the current refs. Commits the old graph has are copied from it rather than
+#          re-read, and so are their changed-path filters, which are kept when the old graph had them.
+def maintenance_commit_graph(repo: 'GitRepository') -> str:
+    graph: Optional['GitCommitGraph'] = commit_graph_load(repo)
+    count: int = commit_graph_write(repo, changed_paths=graph is not None and graph.bloom_index is not None)
+    return f"wrote commit-graph with {count} commits"
+
+# name: (threshold config section, key, default, check, task), in the order the tasks run. Refs are packed first and
+# the commit-graph written last, over the final refs; loose objects are packed before packs are consolidated, so
+# the new pack can be folded in the same run.
+MAINTENANCE_TASKS: dict[str, tuple[str, str, int, Callable[['GitRepository', int], bool], Callable[['GitRepository'], str]]] = {
+    "pack-refs": ('maintenance "pack-refs"', "auto", MAINTENANCE_LOOSE_REFS, maintenance_loose_refs_due, maintenance_pack_refs),
+    "loose-objects": ("gc", "auto", MAINTENANCE_LOOSE_OBJECTS, maintenance_loose_objects_due, maintenance_loose_objects),
+    "incremental-repack": ("gc", "autopacklimit", MAINTENANCE_PACKS, maintenance_packs_due, maintenance_incremental_repack),
+    "commit-graph": ('maintenance "commit-graph"', "auto", MAINTENANCE_COMMIT_GRAPH, maintenance_commit_graph_due, maintenance_commit_graph),
+}
+
+# ------------------------------------------------[run]--------------------------------------------------
+
+# Signature: GitRepository, Optional[list[str]], bool -> list[tuple[str, str]]
+# Purpose: Runs the named tasks (all of them by default), in MAINTENANCE_TASKS order. With auto, a task only runs when
+#          its threshold is crossed; the checks are a directory listing or two, so with nothing to do this costs
+#          next to nothing. Returns (task, what it did) for each task run.
+def maintenance_run(repo: 'GitRepository', tasks: Optional[list[str]] = None, auto: bool = False) -> list[tuple[str, str]]:
+    for name in tasks or []:
+        if name not in MAINTENANCE_TASKS:
+            raise Exception(f"Unknown maintenance task {name}.")
+
+    ret: list[tuple[str, str]] = []
+    for (name, (section, key, default, due, task)) in MAINTENANCE_TASKS.items():
+        if tasks and name not in tasks:
+            continue
+        if auto:
+            threshold: int = maintenance_threshold(repo, section, key, default)
+            if threshold == 0 or (threshold > 0 and not due(repo, threshold)):
+                continue
+        with trace2_region(f"maintenance_{name}"):
+            ret.append((name, task(repo)))
+    return ret
+
+# Signature: GitRepository -> list[tuple[str, str]]
+# Purpose: maintenance auto as commands run it after they write, unless maintenance.auto is false.
+def maintenance_auto(repo: 'GitRepository') -> list[tuple[str, str]]:
+    if repo.config.has_option("maintenance", "auto") and not repo.config.getboolean("maintenance", "auto"):
+        return []
+    return maintenance_run(repo, auto=True)
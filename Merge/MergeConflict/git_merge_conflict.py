@@ -0,0 +1,14 @@
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
+
+class GitMergeConflict:
+    def __init__(self, path: str, reason: str, base: Optional['GitTreeLeaf'], ours: Optional['GitTreeLeaf'], theirs: Optional['GitTreeLeaf']):
+        self.path: str = path
+        # "content", "add/add", "modify/delete" or "mode"
+        self.reason: str = reason
+        # The file's version on each side, None where it does not exist. They become index stages 1, 2 and 3.
+        self.base: Optional['GitTreeLeaf'] = base
+        self.ours: Optional['GitTreeLeaf'] = ours
+        self.theirs: Optional['GitTreeLeaf'] = theirs
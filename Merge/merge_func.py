@@ -0,0 +1,192 @@
+from difflib import SequenceMatcher
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from Merge.MergeConflict.git_merge_conflict import GitMergeConflict
+from Objects.Blobs.git_blob import GitBlob
+from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
+from Objects.Trees.git_tree import GitTree
+from Objects.object_func import object_read_raw, object_write
+from Objects.tree_diff_func import tree_leaves
+
+if TYPE_CHECKING:
+    from GitRepo.git_repository import GitRepository
+
+MERGE_MARKER_SIZE: int = 7
+
+# Like git, a NUL byte among the first 8000 marks a file as binary: it is never merged line by line.
+MERGE_BINARY_PROBE: int = 8000
+
+# ------------------------------------------------[lines]--------------------------------------------------
+
+# Signature: list[bytes], list[bytes], list[bytes] -> list[tuple[int, int, int, int, int, int]]
+# Purpose: The stretches of base left unchanged on both sides, as (base start, base end, ours start, ours end,
+#          theirs start, theirs end), ending with an empty stretch at the end of all three.
+def merge_sync_regions(base: list[bytes], ours: list[bytes], theirs: list[bytes]) -> list[tuple[int, int, int, int, int, int]]:
+    ours_matches = SequenceMatcher(None, base, ours, autojunk=False).get_matching_blocks()
+    theirs_matches = SequenceMatcher(None, base, theirs, autojunk=False).get_matching_blocks()
+
+    regions: list[tuple[int, int, int, int, int, int]] = []
+    i: int = 0
+    j: int = 0
+    while i < len(ours_matches) and j < len(theirs_matches):
+        ours_base, ours_start, ours_len = ours_matches[i]
+        theirs_base, theirs_start, theirs_len = theirs_matches[j]
+        start: int = max(ours_base, theirs_base)
+        end: int = min(ours_base + ours_len, theirs_base + theirs_len)
+        if start < end:
+            o: int = ours_start + start - ours_base
+            t: int = theirs_start + start - theirs_base
+            regions.append((start, end, o, o + end - start, t, t + end - start))
+        if ours_base + ours_len < theirs_base + theirs_len:
+            i += 1
+        else:
+            j += 1
+
+    regions.append((len(base), len(base), len(ours), len(ours), len(theirs), len(theirs)))
+    return regions
+
+# Signature: list[bytes], list[bytes], list[bytes] -> Iterator[tuple[list[bytes], Optional[list[bytes]]]]
+# Purpose: Three-way merges lines. Yields (lines, None) for merged stretches and (ours, theirs) where both sides
+#          changed the same stretch of base differently.
+def merge_lines(base: list[bytes], ours: list[bytes], theirs: list[bytes]) -> Iterator[tuple[list[bytes], Optional[list[bytes]]]]:
+    b: int = 0
+    o: int = 0
+    t: int = 0
+    for (base_start, base_end, ours_start, ours_end, theirs_start, theirs_end) in merge_sync_regions(base, ours, theirs):
+        if ours_start > o or theirs_start > t:
+            base_chunk: list[bytes] = base[b:base_start]
+            ours_chunk: list[bytes] = ours[o:ours_start]
+            theirs_chunk: list[bytes] = theirs[t:theirs_start]
+            if ours_chunk == theirs_chunk or theirs_chunk == base_chunk:
+                yield ours_chunk, None
+            elif ours_chunk == base_chunk:
+                yield theirs_chunk, None
+            else:
+                yield ours_chunk, theirs_chunk
+        if base_end > base_start:
+            yield base[base_start:base_end], None
+        b, o, t = base_end, ours_end, theirs_end
+
+# Signature: bytes -> bool
+def merge_is_binary(data: bytes) -> bool:
+    return b'\x00' in data[:MERGE_BINARY_PROBE]
+
+# Signature: Optional[bytes], bytes, bytes, str, str -> tuple[bytes, bool]
+# Purpose: Three-way merges file contents (base None for a file added on both sides). Returns the merged contents
+#          and whether they are clean; conflicting stretches are written between conflict markers. Binary files
+#          are not merged: a conflict keeps ours.
+def merge_blob(base: Optional[bytes], ours: bytes, theirs: bytes, ours_label: str, theirs_label: str) -> tuple[bytes, bool]:
+    if merge_is_binary(ours) or merge_is_binary(theirs) or (base and merge_is_binary(base)):
+        return ours, False
+
+    clean: bool = True
+    ret: list[bytes] = []
+    for (chunk, other) in merge_lines((base or b'').splitlines(keepends=True), ours.splitlines(keepends=True), theirs.splitlines(keepends=True)):
+        if other is None:
+            ret.extend(chunk)
+            continue
+        clean = False
+        ret.append(b'<' * MERGE_MARKER_SIZE + b' ' + ours_label.encode("utf8") + b'\n')
+        ret.extend(chunk)
+        if chunk and not chunk[-1].endswith(b'\n'):
+            ret.append(b'\n')
+        ret.append(b'=' * MERGE_MARKER_SIZE + b'\n')
+        ret.extend(other)
+        if other and not other[-1].endswith(b'\n'):
+            ret.append(b'\n')
+        ret.append(b'>' * MERGE_MARKER_SIZE + b' ' + theirs_label.encode("utf8") + b'\n')
+    return b''.join(ret), clean
+
+# ------------------------------------------------[trees]--------------------------------------------------
+
+# Signature: Optional[GitTreeLeaf] -> Optional[tuple[bytes, str]]
+def merge_leaf_key(leaf: Optional['GitTreeLeaf']) -> Optional[tuple[bytes, str]]:
+    return (leaf.mode, leaf.sha) if leaf else None
+
+# Signature: Optional[GitTreeLeaf] -> bool
+def merge_leaf_is_tree(leaf: Optional['GitTreeLeaf']) -> bool:
+    return leaf is not None and leaf.mode.startswith(b'04')
+
+# Signature: GitRepository, str -> bytes
+def merge_blob_read(repo: 'GitRepository', sha: str) -> bytes:
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    return raw[1]
+
+# Signature: GitRepository, Optional[str], Optional[str], Optional[str], list[GitMergeConflict], tuple[str, str], str -> Optional[str]
+# Purpose: Three-way merges trees (None is an empty tree) and returns the merged tree's sha, or None if it is empty.
+#          A tree equal on two sides is resolved by its sha alone, without being read, so the cost follows the size
+#          of the changes rather than of the trees. Conflicts are appended to conflicts; their paths hold the
+#          contents with conflict markers (or the surviving side) in the returned tree.
+def merge_trees(repo: 'GitRepository', base: Optional[str], ours: Optional[str], theirs: Optional[str],
+                conflicts: list['GitMergeConflict'], labels: tuple[str, str], prefix: str = "") -> Optional[str]:
+    if ours == theirs or base == theirs:
+        return ours
+    if base == ours:
+        return theirs
+
+    base_leaves: dict[str, 'GitTreeLeaf'] = {leaf.path: leaf for leaf in tree_leaves(repo, base)} if base else dict()
+    ours_leaves: dict[str, 'GitTreeLeaf'] = {leaf.path: leaf for leaf in tree_leaves(repo, ours)} if ours else dict()
+    theirs_leaves: dict[str, 'GitTreeLeaf'] = {leaf.path: leaf for leaf in tree_leaves(repo, theirs)} if theirs else dict()
+
+    tree: GitTree = GitTree()
+    for name in sorted(base_leaves.keys() | ours_leaves.keys() | theirs_leaves.keys()):
+        leaf: Optional['GitTreeLeaf'] = merge_entry(repo, prefix + name, base_leaves.get(name), ours_leaves.get(name), theirs_leaves.get(name), conflicts, labels)
+        if leaf:
+            tree.items.append(GitTreeLeaf(leaf.mode, name, leaf.sha))
+
+    if not tree.items:
+        return None
+    return object_write(tree, repo)
+
+# Signature: GitRepository, str, Optional[GitTreeLeaf], Optional[GitTreeLeaf], Optional[GitTreeLeaf], list[GitMergeConflict], tuple[str, str] -> Optional[GitTreeLeaf]
+# Purpose: Merges one tree entry: takes whichever side changed it, recurses into directories changed on both sides
+#          and merges the contents of files changed on both sides.
+def merge_entry(repo: 'GitRepository', path: str, base: Optional['GitTreeLeaf'], ours: Optional['GitTreeLeaf'], theirs: Optional['GitTreeLeaf'],
+                conflicts: list['GitMergeConflict'], labels: tuple[str, str]) -> Optional['GitTreeLeaf']:
+    base_key, ours_key, theirs_key = merge_leaf_key(base), merge_leaf_key(ours), merge_leaf_key(theirs)
+    if ours_key == theirs_key or base_key == theirs_key:
+        return ours
+    if base_key == ours_key:
+        return theirs
+
+    present: list['GitTreeLeaf'] = [leaf for leaf in (base, ours, theirs) if leaf]
+    if all(merge_leaf_is_tree(leaf) for leaf in present):
+        sha: Optional[str] = merge_trees(repo, base.sha if base else None, ours.sha if ours else None, theirs.sha if theirs else None,
+                                         conflicts, labels, path + "/")
+        return GitTreeLeaf(b'040000', path, sha) if sha else None
+    if any(merge_leaf_is_tree(leaf) for leaf in present):
+        raise Exception(f"Cannot merge {path}: it is a file on one side and a directory on the other.")
+
+    if ours is None or theirs is None:
+        conflicts.append(GitMergeConflict(path, "modify/delete", base, ours, theirs))
+        return ours or theirs
+
+    clean: bool = True
+    if ours.mode == theirs.mode or (base and base.mode == theirs.mode):
+        mode: bytes = ours.mode
+    elif base and base.mode == ours.mode:
+        mode = theirs.mode
+    else:
+        mode, clean = ours.mode, False
+
+    if ours.sha == theirs.sha or (base and base.sha == theirs.sha):
+        sha = ours.sha
+    elif base and base.sha == ours.sha:
+        sha = theirs.sha
+    elif ours.mode.startswith(b'16') or theirs.mode.startswith(b'16'):
+        # Submodule commits cannot be merged here.
+        sha, clean = ours.sha, False
+    else:
+        data, merged = merge_blob(merge_blob_read(repo, base.sha) if base else None, merge_blob_read(repo, ours.sha),
+                                  merge_blob_read(repo, theirs.sha), *labels)
+        sha = object_write(GitBlob(data), repo)
+        clean = clean and merged
+        if not merged:
+            conflicts.append(GitMergeConflict(path, "content" if base else "add/add", base, ours, theirs))
+            return GitTreeLeaf(mode, path, sha)
+
+    if not clean:
+        conflicts.append(GitMergeConflict(path, "mode", base, ours, theirs))
+    return GitTreeLeaf(mode, path, sha)
@@ -1,5 +1,7 @@
-from typing import TYPE_CHECKING, Optional
+from collections import OrderedDict
+from typing import TYPE_CHECKING, BinaryIO, Iterator, Optional
 import os
+import threading
 import zlib
 import hashlib
 
@@ -8,21 +10,73 @@ from Objects.Commits.git_commit import GitCommit
 from Objects.Trees.git_tree import GitTree
 from GitRepo.git_repository import GitRepository
 from Objects.Tags.git_tag import GitTag
+from Objects.object_index_func import object_known, object_loose_add, object_loose_forget, object_loose_freshen, object_loose_known, object_loose_names, object_loose_recheck
+from Packs.pack_func import inflate_stream, pack_contains, pack_object_header, pack_object_read, pack_object_stream
+from Trace2.trace2_func import trace2_count, trace2_timer
 
 if TYPE_CHECKING:
     from git_object import GitObject
 
-def object_read(repo: 'GitRepository', sha: str) -> Optional['GitObject']:
-    """Read object sha from Git repository repo. 
-    Return a GitObject whose exact type depends on the object."""
+# Inflated objects by sha, least recently used first. Objects never change, so entries need no invalidation.
+# Disabled (limit 0) unless a long-lived process such as the daemon turns it on. Reordering and evicting are not
+# atomic, so threads (AsyncRepository's executor) go through object_cache_lock; the object itself is read outside it.
+object_cache: OrderedDict[str, tuple[bytes, bytes]] = OrderedDict()
+object_cache_limit: int = 0
+object_cache_size: int = 0
+object_cache_lock: threading.Lock = threading.Lock()
 
-    path: str = GitRepository.repo_file(repo, "objects", sha[0:2], sha[2:])
+def object_cache_enable(limit: int) -> None:
+    """Keep up to limit bytes of inflated objects in memory."""
+    global object_cache_limit
+    object_cache_limit = limit
 
-    if not os.path.isfile(path):
-        return None
+def object_cache_put(sha: str, raw: tuple[bytes, bytes]) -> None:
+    """Remember an inflated object, evicting the least recently used ones past the limit."""
+    global object_cache_size
+    with object_cache_lock:
+        if sha in object_cache or len(raw[1]) > object_cache_limit // 4:
+            return
+        object_cache[sha] = raw
+        object_cache_size += len(raw[1])
+        while object_cache_size > object_cache_limit:
+            _, evicted = object_cache.popitem(last=False)
+            object_cache_size -= len(evicted[1])
+
+def object_read_raw(repo: 'GitRepository', sha: str) -> Optional[tuple[bytes, bytes]]:
+    """Read object sha from Git repository repo, loose or packed.
+    Return its type and payload without building a GitObject."""
 
-    with open(path, "rb") as f:
-        raw: bytes = zlib.decompress(f.read())
+    if object_cache_limit:
+        with object_cache_lock:
+            cached: Optional[tuple[bytes, bytes]] = object_cache.get(sha)
+            if cached:
+                object_cache.move_to_end(sha)
+        if cached:
+            trace2_count("object_cache_hits")
+            return cached
+        raw: Optional[tuple[bytes, bytes]] = object_read_uncached(repo, sha)
+        if raw:
+            object_cache_put(sha, raw)
+        return raw
+
+    return object_read_uncached(repo, sha)
+
+def object_read_uncached(repo: 'GitRepository', sha: str) -> Optional[tuple[bytes, bytes]]:
+    """Read object sha from disk, bypassing the object cache."""
+
+    with trace2_timer("object_read"):
+        # Packs first: their indexes are in memory, so a packed object costs no stat of a loose path.
+        packed: Optional[tuple[bytes, bytes]] = pack_object_read(repo, sha)
+        if packed:
+            trace2_count("objects_read")
+            trace2_count("bytes_inflated", len(packed[1]))
+            return packed
+
+        f: Optional[BinaryIO] = object_loose_open(repo, sha)
+        if f is None:
+            return None
+        with f:
+            raw: bytes = zlib.decompress(f.read())
 
         space_index: int = raw.find(b' ') 
         object_type: bytes = raw[0:space_index] 
@@ -31,28 +85,149 @@ def object_read(repo: 'GitRepository', sha: str) -> Optional['GitObject']:
         size: int = int(raw[space_index:null_index].decode("ascii")) 
         if size != len(raw) - null_index - 1:
             raise Exception(f"Malformed object {sha}: bad length")
-        
-        match object_type:
-            case b'commit': c=GitCommit
-            case b'tree': c=GitTree
-            case b'tag': c=GitTag
-            case b'blob': c=GitBlob
-            case _:
-                raise Exception(f"Unknown type {object_type.decode('ascii')} for object {sha}")
-            
-        return c(raw[null_index + 1:])
+
+        trace2_count("objects_read")
+        trace2_count("bytes_inflated", len(raw))
+        return object_type, raw[null_index + 1:]
+
+def object_read(repo: 'GitRepository', sha: str) -> Optional['GitObject']:
+    """Read object sha from Git repository repo. 
+    Return a GitObject whose exact type depends on the object."""
+
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        return None
+
+    object_type, data = raw
+
+    match object_type:
+        case b'commit': c=GitCommit
+        case b'tree': c=GitTree
+        case b'tag': c=GitTag
+        case b'blob': c=GitBlob
+        case _:
+            raise Exception(f"Unknown type {object_type.decode('ascii')} for object {sha}")
+
+    return c(data)
+
+def object_stream(repo: 'GitRepository', sha: str) -> Optional[tuple[bytes, int, Iterator[bytes]]]:
+    """Open object sha for streaming. Return its type, its size and an iterator over its payload
+    in chunks of at most CHUNK_SIZE bytes, so memory stays flat however large the object is."""
+
+    stream: Optional[tuple[bytes, int, Iterator[bytes]]] = object_stream_open(repo, sha)
+    if stream:
+        trace2_count("objects_read")
+        trace2_count("bytes_inflated", stream[1])
+    return stream
+
+def object_stream_open(repo: 'GitRepository', sha: str) -> Optional[tuple[bytes, int, Iterator[bytes]]]:
+    """object_stream without the trace counters, which would count object_header's reads as full ones."""
+
+    packed: Optional[tuple[bytes, int, Iterator[bytes]]] = pack_object_stream(repo, sha)
+    if packed:
+        return packed
+
+    f: Optional[BinaryIO] = object_loose_open(repo, sha)
+    if f is None:
+        return None
+    chunks: Iterator[bytes] = inflate_stream(f)
+    try:
+        object_type, size, first = object_loose_head(chunks, sha)
+    except Exception:
+        f.close()
+        raise
+    return object_type, size, object_stream_payload(f, first, chunks, size, sha)
+
+def object_loose_head(chunks: Iterator[bytes], sha: str) -> tuple[bytes, int, bytes]:
+    """Inflate a loose object until its header is complete. Return its type, its size and the payload
+    bytes inflated along with the header."""
+    head: bytes = b''
+    while b'\x00' not in head:
+        chunk: Optional[bytes] = next(chunks, None)
+        if chunk is None:
+            raise Exception(f"Malformed object {sha}: no header")
+        head += chunk
+
+    space_index: int = head.find(b' ')
+    null_index: int = head.find(b'\x00', space_index)
+    return head[0:space_index], int(head[space_index:null_index].decode("ascii")), head[null_index + 1:]
+
+def object_stream_payload(f: BinaryIO, first: bytes, chunks: Iterator[bytes], size: int, sha: str) -> Iterator[bytes]:
+    """Yield the rest of a loose object's payload, then check its length and close the file."""
+    with f:
+        total: int = len(first)
+        if first:
+            yield first
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    if total != size:
+        raise Exception(f"Malformed object {sha}: bad length")
+
+def object_header(repo: 'GitRepository', sha: str) -> Optional[tuple[bytes, int]]:
+    """Return the type and size of object sha without inflating its payload."""
+    packed: Optional[tuple[bytes, int]] = pack_object_header(repo, sha)
+    if packed:
+        return packed
+
+    # The header is read straight from the file rather than through object_stream_open: closing a payload
+    # generator that never started would not run its cleanup, and the file would stay open.
+    f: Optional[BinaryIO] = object_loose_open(repo, sha)
+    if f is None:
+        return None
+    with f:
+        object_type, size, _ = object_loose_head(inflate_stream(f), sha)
+    return object_type, size
+
+def objects_raw(repo: 'GitRepository', shas: list[str]) -> Iterator[tuple[bytes, bytes]]:
+    """Lazily read the (type, payload) of each of shas, in order."""
+    for sha in shas:
+        yield object_read_raw(repo, sha)
+
+def object_exists(repo: 'GitRepository', sha: str) -> bool:
+    """Whether sha is stored in repo, either as a loose object or in a pack.
+    Answered from memory (see object_index_func), so asking about many absent objects costs no syscalls."""
+    return object_known(repo, sha)
+
+def object_loose_open(repo: 'GitRepository', sha: str) -> Optional[BinaryIO]:
+    """Open the loose file of sha, or return None if it is not stored loose.
+    An object missing from the loose index gets its fanout directory re-listed once before giving up,
+    in case another process wrote it since."""
+    if object_loose_known(repo, sha) or object_loose_recheck(repo, sha):
+        try:
+            return open(GitRepository.repo_path(repo, "objects", sha[0:2], sha[2:]), "rb")
+        except FileNotFoundError:
+            object_loose_forget(repo, sha)
+    return None
+
+def object_loose_write(repo: 'GitRepository', sha: str, data: bytes) -> None:
+    """Write a compressed loose object. The file is written aside and renamed into place, so a reader
+    never sees a partial object, even when a stale index has us rewrite one that exists."""
+    objects_dir: str = GitRepository.repo_path(repo, "objects")
+    if not object_loose_names(repo, sha[0:2]):
+        os.makedirs(os.path.join(objects_dir, sha[0:2]), exist_ok=True)
+    tmp_path: str = os.path.join(objects_dir, f"tmp_obj_{os.getpid()}_{sha}")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    try:
+        os.replace(tmp_path, os.path.join(objects_dir, sha[0:2], sha[2:]))
+    except FileNotFoundError:
+        # The listing predates a prune that removed the fanout directory.
+        os.makedirs(os.path.join(objects_dir, sha[0:2]), exist_ok=True)
+        os.replace(tmp_path, os.path.join(objects_dir, sha[0:2], sha[2:]))
+    object_loose_add(repo, sha)
 
 def object_write(obj: 'GitObject', repo: 'GitRepository' = None) -> str:
-    data: bytes = obj.serialize()
-    result: bytes = obj.object_type + b' ' + str(len(data)).encode() + b'\x00' + data
-    sha: str = hashlib.sha1(result).hexdigest()
-    
-    if repo:
-        path: str = GitRepository.repo_file(repo, "objects", sha[0:2], sha[2:], mkdir=True)
-
-        if not os.path.exists(path):
-            with open(path, 'wb') as f:
-                f.write(zlib.compress(result))
-    
-    return sha
+    with trace2_timer("object_write"):
+        data: bytes = obj.serialize()
+        result: bytes = obj.object_type + b' ' + str(len(data)).encode() + b'\x00' + data
+        sha: str = hashlib.sha1(result).hexdigest()
+        trace2_count("objects_hashed")
+        
+        # A loose hit is confirmed on disk: trusting a stale listing would skip writing an object a prune removed.
+        if repo and not object_loose_freshen(repo, sha) and not pack_contains(repo, sha):
+            object_loose_write(repo, sha, zlib.compress(result))
+            trace2_count("objects_written")
+        
+        return sha
 
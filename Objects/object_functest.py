@@ -0,0 +1,18 @@
+import os
+import shutil
+
+from GitRepo.git_repository import GitRepository
+from Objects.Blobs.git_blob import GitBlob
+from Objects.object_func import object_read, object_write
+
+def test_object_write_rewrites_object_pruned_behind_loose_index(tmp_path):
+    repo: GitRepository = GitRepository.repo_create(str(tmp_path))
+    sha: str = object_write(GitBlob(b"pruned\n"), repo)
+    assert object_read(repo, sha).blobdata == b"pruned\n"
+
+    # Another process prunes the object, fanout directory and all, after this one listed it.
+    shutil.rmtree(GitRepository.repo_path(repo, "objects", sha[0:2]))
+
+    assert object_write(GitBlob(b"pruned\n"), repo) == sha
+    assert os.path.isfile(GitRepository.repo_path(repo, "objects", sha[0:2], sha[2:]))
+    assert object_read(repo, sha).blobdata == b"pruned\n"
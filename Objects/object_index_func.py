@@ -0,0 +1,84 @@
+from typing import Optional
+import os
+import threading
+
+from GitRepo.git_repository import GitRepository
+from Packs.pack_func import pack_contains
+from Trace2.trace2_func import trace2_count
+
+# Maps an objects directory to {fanout prefix: names of the loose objects under it}. Each fanout directory is listed
+# once, the first time an object in it is looked up, and object_write adds what it writes. Together with the pack
+# indexes, which stay in memory, this answers "do we have this object?" without a stat per object, and a miss
+# without touching the filesystem at all.
+#
+# A listing can go stale when another process adds or prunes loose objects. A stale "present" is caught when the
+# file fails to open, or, for writes, when freshening its mtime fails; a stale "absent" costs at most a redundant write (object_write replaces files atomically)
+# or, for reads, one re-listing of the fanout directory before the object is declared missing.
+#
+# Threads (AsyncRepository's executor) list, add and forget under object_loose_lock, so a fanout is listed once and no
+# update is lost to a listing that replaces its set.
+object_loose_index: dict[str, dict[str, set[str]]] = dict()
+object_loose_lock: threading.RLock = threading.RLock()
+
+# Signature: GitRepository, str, bool -> set[str]
+# Purpose: The names of the loose objects under one fanout directory, listing it on first use (or again if refresh).
+def object_loose_names(repo: 'GitRepository', prefix: str, refresh: bool = False) -> set[str]:
+    objects_dir: str = GitRepository.repo_path(repo, "objects")
+    with object_loose_lock:
+        fanouts: dict[str, set[str]] = object_loose_index.setdefault(objects_dir, dict())
+        names: Optional[set[str]] = fanouts.get(prefix)
+        if names is None or refresh:
+            try:
+                names = {name for name in os.listdir(os.path.join(objects_dir, prefix)) if len(name) == 38}
+            except FileNotFoundError:
+                names = set()
+            trace2_count("loose_dirs_listed")
+            fanouts[prefix] = names
+        return names
+
+# Signature: GitRepository, str -> bool
+# Purpose: Whether sha is known to be stored loose.
+def object_loose_known(repo: 'GitRepository', sha: str) -> bool:
+    return sha[2:] in object_loose_names(repo, sha[0:2])
+
+# Signature: GitRepository, str -> None
+def object_loose_add(repo: 'GitRepository', sha: str) -> None:
+    with object_loose_lock:
+        object_loose_names(repo, sha[0:2]).add(sha[2:])
+
+# Signature: GitRepository, str -> None
+# Purpose: Forgets a loose object whose file turned out to be gone, e.g. pruned by a repack.
+def object_loose_forget(repo: 'GitRepository', sha: str) -> None:
+    with object_loose_lock:
+        object_loose_names(repo, sha[0:2]).discard(sha[2:])
+
+# Signature: GitRepository, str -> bool
+# Purpose: Whether sha is stored loose, confirmed by touching its file so a concurrent prune sees it as recent, as
+#          git does before skipping a write. A file that has gone is forgotten and reported absent.
+def object_loose_freshen(repo: 'GitRepository', sha: str) -> bool:
+    if not object_loose_known(repo, sha):
+        return False
+    try:
+        os.utime(GitRepository.repo_path(repo, "objects", sha[0:2], sha[2:]))
+    except FileNotFoundError:
+        object_loose_forget(repo, sha)
+        return False
+    return True
+
+# Signature: GitRepository -> None
+# Purpose: Drops repo's listings, after something rewrote its loose objects wholesale.
+def object_loose_index_clear(repo: 'GitRepository') -> None:
+    with object_loose_lock:
+        object_loose_index.pop(GitRepository.repo_path(repo, "objects"), None)
+
+# Signature: GitRepository, str -> bool
+# Purpose: Whether sha is stored in repo, loose or packed, answered from memory once its fanout directory has been
+#          listed. May say False for an object another process wrote since; never costs a stat per object.
+def object_known(repo: 'GitRepository', sha: str) -> bool:
+    return object_loose_known(repo, sha) or pack_contains(repo, sha)
+
+# Signature: GitRepository, str -> bool
+# Purpose: Like object_known, but a miss re-lists sha's fanout directory once, for callers to whom a missing object is
+#          an error rather than an expected answer.
+def object_loose_recheck(repo: 'GitRepository', sha: str) -> bool:
+    return sha[2:] in object_loose_names(repo, sha[0:2], refresh=True)
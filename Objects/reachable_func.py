@@ -0,0 +1,73 @@
+from typing import TYPE_CHECKING, Callable, Optional
+
+from Objects.object_func import object_read
+
+if TYPE_CHECKING:
+    from GitRepo.git_repository import GitRepository
+    from Objects.git_object import GitObject
+
+# Signature: GitRepository, list[str], Optional[Callable[[str], bool]] -> list[tuple[str, bytes]]
+# Purpose: Lists every object reachable from tips as (sha, type), commits and tags first, then trees and blobs.
+#          Objects for which stop returns True are left out together with everything only reachable through them.
+#          Blobs are typed from their tree entry, so they are never read.
+def objects_reachable(repo: 'GitRepository', tips: list[str], stop: Optional[Callable[[str], bool]] = None) -> list[tuple[str, bytes]]:
+    ret: list[tuple[str, bytes]] = []
+    seen: set[str] = set()
+    pending: list[str] = list(tips)
+    trees: list[str] = []
+
+    while pending:
+        sha: str = pending.pop()
+        if sha in seen:
+            continue
+        seen.add(sha)
+        if stop and stop(sha):
+            continue
+
+        obj: Optional['GitObject'] = object_read(repo, sha)
+        if obj is None:
+            raise Exception(f"Missing object {sha}.")
+
+        match obj.object_type:
+            case b'commit':
+                ret.append((sha, b'commit'))
+                trees.append(obj.kvlm[b'tree'].decode("ascii"))
+                parents = obj.kvlm.get(b'parent', [])
+                if type(parents) != list:
+                    parents = [parents]
+                for p in parents:
+                    pending.append(p.decode("ascii"))
+            case b'tag':
+                ret.append((sha, b'tag'))
+                pending.append(obj.kvlm[b'object'].decode("ascii"))
+            case b'tree':
+                seen.discard(sha)
+                trees.append(sha)
+            case b'blob':
+                ret.append((sha, b'blob'))
+
+    while trees:
+        sha = trees.pop()
+        if sha in seen:
+            continue
+        seen.add(sha)
+        if stop and stop(sha):
+            continue
+
+        tree: Optional['GitObject'] = object_read(repo, sha)
+        if tree is None:
+            raise Exception(f"Missing object {sha}.")
+        ret.append((sha, b'tree'))
+
+        for leaf in tree.items:
+            if leaf.mode.startswith(b'04'):
+                trees.append(leaf.sha)
+            elif leaf.mode.startswith(b'16'):
+                # Submodule commits live in another repository.
+                continue
+            elif leaf.sha not in seen:
+                seen.add(leaf.sha)
+                if not (stop and stop(leaf.sha)):
+                    ret.append((leaf.sha, b'blob'))
+
+    return ret
@@ -0,0 +1,82 @@
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from Objects.object_func import object_read_raw
+from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
+from Objects.tree_func import tree_entry_find, tree_parse, tree_parse_raw
+
+if TYPE_CHECKING:
+    from GitRepo.git_repository import GitRepository
+
+# Signature: GitRepository, str -> list[GitTreeLeaf]
+# Purpose: Parses a tree's entries without building a GitTree.
+def tree_leaves(repo: 'GitRepository', sha: str) -> list['GitTreeLeaf']:
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    if raw[0] != b'tree':
+        raise Exception(f"Not a tree {sha}.")
+    return tree_parse(raw[1])
+
+# Signature: GitRepository, Optional[str] -> dict[bytes, tuple[bytes, bytes]]
+# Purpose: A tree's entries as tree_parse_raw returns them; a missing tree (None) is empty.
+def tree_entries_raw(repo: 'GitRepository', sha: Optional[str]) -> dict[bytes, tuple[bytes, bytes]]:
+    if sha is None:
+        return dict()
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, sha)
+    if raw is None:
+        raise Exception(f"Missing object {sha}.")
+    if raw[0] != b'tree':
+        raise Exception(f"Not a tree {sha}.")
+    return tree_parse_raw(raw[1])
+
+# Signature: bytes, tuple[bytes, bytes] -> GitTreeLeaf
+def tree_leaf_from_raw(name: bytes, entry: tuple[bytes, bytes]) -> 'GitTreeLeaf':
+    mode: bytes = entry[0] if len(entry[0]) == 6 else b'0' + entry[0]
+    return GitTreeLeaf(mode, name.decode("utf8"), entry[1].hex())
+
+# Signature: GitRepository, Optional[str], Optional[str], str -> Iterator[tuple[str, Optional[GitTreeLeaf], Optional[GitTreeLeaf]]]
+# Purpose: Yields (path, old leaf, new leaf) for every file that differs between two trees, in path order.
+#          A missing tree (None) is empty. Subtrees whose shas match are skipped without being read.
+def tree_diff(repo: 'GitRepository', old: Optional[str], new: Optional[str], prefix: str = "") -> Iterator[tuple[str, Optional['GitTreeLeaf'], Optional['GitTreeLeaf']]]:
+    if old == new:
+        return
+
+    # Entries are compared as raw bytes; leaves are only built for the few that differ.
+    old_entries: dict[bytes, tuple[bytes, bytes]] = tree_entries_raw(repo, old)
+    new_entries: dict[bytes, tuple[bytes, bytes]] = tree_entries_raw(repo, new)
+
+    # The symmetric difference of the item views keeps only the names whose entry changed. Byte order of UTF-8
+    # names is code point order, so sorting them gives path order.
+    for name in sorted({name for (name, _) in old_entries.items() ^ new_entries.items()}):
+        a_entry: Optional[tuple[bytes, bytes]] = old_entries.get(name)
+        b_entry: Optional[tuple[bytes, bytes]] = new_entries.get(name)
+        a: Optional['GitTreeLeaf'] = tree_leaf_from_raw(name, a_entry) if a_entry else None
+        b: Optional['GitTreeLeaf'] = tree_leaf_from_raw(name, b_entry) if b_entry else None
+
+        path: str = prefix + name.decode("utf8")
+        a_tree: bool = a is not None and a.mode.startswith(b'04')
+        b_tree: bool = b is not None and b.mode.startswith(b'04')
+        if a_tree or b_tree:
+            yield from tree_diff(repo, a.sha if a_tree else None, b.sha if b_tree else None, path + "/")
+
+        a_file: Optional['GitTreeLeaf'] = a if a and not a_tree else None
+        b_file: Optional['GitTreeLeaf'] = b if b and not b_tree else None
+        if a_file or b_file:
+            yield path, a_file, b_file
+
+# Signature: GitRepository, str, str -> Optional[GitTreeLeaf]
+# Purpose: Finds the entry at a slash separated path inside a tree, reading one tree per path component.
+def tree_lookup(repo: 'GitRepository', tree: str, path: str) -> Optional['GitTreeLeaf']:
+    leaf: Optional['GitTreeLeaf'] = None
+    for part in path.strip("/").split("/"):
+        if leaf is not None:
+            if not leaf.mode.startswith(b'04'):
+                return None
+            tree = leaf.sha
+        raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, tree)
+        if raw is None:
+            raise Exception(f"Missing object {tree}.")
+        leaf = tree_entry_find(raw[1], part)
+        if leaf is None:
+            return None
+    return leaf
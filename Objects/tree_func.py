@@ -1,4 +1,5 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
+import re
 
 from Objects.Trees.TreeLeafs.git_tree_leaf import GitTreeLeaf
 
@@ -33,17 +34,40 @@ def tree_parse(raw: bytes) -> list['GitTreeLeaf']:
     
     return ret
 
+# One raw tree entry: mode, name and the 20 byte binary sha. Matched back to back, an entry at a time, so a sha's
+# bytes are never mistaken for the start of the next entry.
+TREE_ENTRY_RE: re.Pattern = re.compile(rb'(\d{5,6}) ([^\x00]*)\x00(.{20})', re.DOTALL)
+
+# Signature: bytes -> dict[bytes, tuple[bytes, bytes]]
+# Purpose: Maps each entry's raw name to its raw (mode, binary sha), without building GitTreeLeafs or decoding
+#          anything, for callers that only need the few entries that differ between two trees.
+def tree_parse_raw(raw: bytes) -> dict[bytes, tuple[bytes, bytes]]:
+    return {path: (mode, sha) for (mode, path, sha) in TREE_ENTRY_RE.findall(raw)}
+
+def tree_entry_find(raw: bytes, name: str) -> Optional['GitTreeLeaf']:
+    """Find one entry of a raw tree by name, scanning entry boundaries without building the others."""
+    target: bytes = name.encode("utf8")
+    pos: int = 0
+    while pos < len(raw):
+        space_index: int = raw.find(b' ', pos)
+        null_index: int = raw.find(b'\x00', space_index)
+        if raw[space_index+1:null_index] == target:
+            return tree_parse_one(raw, pos)[1]
+        pos = null_index + 21
+    return None
+
 def tree_leaf_sort_key(leaf: 'GitTreeLeaf') -> str:
-    return leaf.path+'/' if not leaf.path.startswith(b'10') else leaf.path
+    return leaf.path+'/' if leaf.mode.startswith(b'04') else leaf.path
 
 def tree_serialize(obj: list['GitObject']) -> bytes:
     obj.items.sort(key=tree_leaf_sort_key)
     ret = b''
     for i in obj.items:
-        ret += i.mode
+        # Git writes tree modes without the leading zero tree_parse_one pads them with.
+        ret += i.mode.lstrip(b'0')
         ret += b' '
         ret += i.path.encode("utf8")
         ret += b"\x00"
-        sha += int(i.sha, 16)
+        sha = int(i.sha, 16)
         ret += sha.to_bytes(20, byteorder="big")
     return ret
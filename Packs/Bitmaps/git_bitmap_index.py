@@ -0,0 +1,18 @@
+class GitBitmapIndex:
+    def __init__(self, pack_sha: str = None, shas: list[str] = None, types: dict[bytes, int] = None, commits: dict[str, int] = None):
+        if shas is None:
+            shas = []
+        if types is None:
+            types = dict()
+        if commits is None:
+            commits = dict()
+
+        self.pack_sha = pack_sha
+        # Bit i of every bitmap stands for shas[i]: the pack's objects in pack order, then any object
+        # outside the pack that a query had to walk to (see ext_types).
+        self.shas = shas
+        self.positions = {sha: i for i, sha in enumerate(shas)}
+        self.pack_count = len(shas)
+        self.types = types
+        self.ext_types: list[bytes] = []
+        self.commits = commits
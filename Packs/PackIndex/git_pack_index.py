@@ -0,0 +1,14 @@
+class GitPackIndex:
+    def __init__(self, pack_path: str = None, pack_sha: str = None, shas: list[str] = None, offsets: list[int] = None, crcs: list[int] = None):
+        if shas is None:
+            shas = []
+        if offsets is None:
+            offsets = []
+        if crcs is None:
+            crcs = []
+
+        self.pack_path = pack_path
+        self.pack_sha = pack_sha
+        self.shas = shas
+        self.offsets = offsets
+        self.crcs = crcs
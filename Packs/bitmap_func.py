@@ -0,0 +1,283 @@
+from typing import TYPE_CHECKING, Iterator, Optional
+import hashlib
+import os
+import struct
+
+from Objects.object_func import object_read
+from Packs.Bitmaps.git_bitmap_index import GitBitmapIndex
+from Packs.pack_func import pack_indexes
+
+if TYPE_CHECKING:
+    from GitRepo.git_repository import GitRepository
+    from Objects.git_object import GitObject
+    from Packs.PackIndex.git_pack_index import GitPackIndex
+
+BITMAP_OPT_FULL_DAG: int = 0x1
+BITMAP_TYPES: list[bytes] = [b'commit', b'tree', b'blob', b'tag']
+
+EWAH_WORD_MASK: int = (1 << 64) - 1
+EWAH_MAX_RUN: int = (1 << 32) - 1
+EWAH_MAX_LITERALS: int = (1 << 31) - 1
+
+# Maps a .bitmap path to (mtime, GitBitmapIndex).
+bitmap_cache: dict[str, tuple[float, 'GitBitmapIndex']] = dict()
+
+# ------------------------------------------------[ewah]--------------------------------------------------
+
+# Signature: int, int -> bytes
+# Purpose: Serializes a bitmap (bit i of bits) the way git's ewah_serialize does: bit count, word count,
+#          64-bit words and the position of the last run-length word, all big-endian. Each run-length word
+#          holds the running bit (bit 0), the run length (bits 1-32) and the literal count (bits 33-63).
+def ewah_encode(bits: int, bit_size: int) -> bytes:
+    word_count: int = (bit_size + 63) // 64
+    raw: bytes = bits.to_bytes(word_count * 8, "little")
+    words: list[int] = [int.from_bytes(raw[i:i + 8], "little") for i in range(0, len(raw), 8)]
+
+    buffer: list[int] = []
+    rlw: int = 0
+    i: int = 0
+    while i < len(words) or not buffer:
+        run_bit: int = 0
+        run_length: int = 0
+        if i < len(words) and words[i] in (0, EWAH_WORD_MASK):
+            run_bit = 1 if words[i] == EWAH_WORD_MASK else 0
+            while i < len(words) and words[i] == (EWAH_WORD_MASK if run_bit else 0) and run_length < EWAH_MAX_RUN:
+                run_length += 1
+                i += 1
+
+        literals: list[int] = []
+        while i < len(words) and words[i] not in (0, EWAH_WORD_MASK) and len(literals) < EWAH_MAX_LITERALS:
+            literals.append(words[i])
+            i += 1
+
+        rlw = len(buffer)
+        buffer.append(run_bit | (run_length << 1) | (len(literals) << 33))
+        buffer.extend(literals)
+
+    return struct.pack(f">II{len(buffer)}QI", bit_size, len(buffer), *buffer, rlw)
+
+# Signature: bytes, int -> tuple[int, int]
+# Purpose: Reads the EWAH bitmap serialized at pos. Returns the bitmap and the position after it.
+def ewah_decode(raw: bytes, pos: int) -> tuple[int, int]:
+    _, word_count = struct.unpack_from(">II", raw, pos)
+    pos += 8
+    words = struct.unpack_from(f">{word_count}Q", raw, pos)
+    pos += 8 * word_count + 4
+
+    ret: bytearray = bytearray()
+    i: int = 0
+    while i < word_count:
+        rlw: int = words[i]
+        run_length: int = (rlw >> 1) & EWAH_MAX_RUN
+        literals: int = rlw >> 33
+        ret += (b'\xff' if rlw & 1 else b'\x00') * (8 * run_length)
+        for word in words[i + 1:i + 1 + literals]:
+            ret += word.to_bytes(8, "little")
+        i += 1 + literals
+
+    return int.from_bytes(ret, "little"), pos
+
+# ------------------------------------------------[bitmap buffers]--------------------------------------------------
+
+# Signature: bytearray, int -> bool
+# Purpose: Whether bit pos is set in a bytearray bitmap.
+def bitmap_test(buf: bytearray, pos: int) -> bool:
+    return (pos >> 3) < len(buf) and (buf[pos >> 3] >> (pos & 7)) & 1 == 1
+
+# Signature: bytearray, int -> None
+# Purpose: Sets bit pos of a bytearray bitmap, growing it as needed.
+def bitmap_set(buf: bytearray, pos: int) -> None:
+    if (pos >> 3) >= len(buf):
+        buf.extend(bytes((pos >> 3) + 1 - len(buf)))
+    buf[pos >> 3] |= 1 << (pos & 7)
+
+# Signature: bytearray, int -> None
+# Purpose: ORs a whole bitmap into a bytearray bitmap in one pass.
+def bitmap_or(buf: bytearray, bits: int) -> None:
+    size: int = max(len(buf), (bits.bit_length() + 7) // 8)
+    buf[:] = (int.from_bytes(buf, "little") | bits).to_bytes(size, "little")
+
+# Signature: GitBitmapIndex, str, bytes -> int
+# Purpose: Returns the bit standing for sha, giving objects outside the pack a position after the pack's.
+def bitmap_position(bitmap: 'GitBitmapIndex', sha: str, object_type: bytes) -> int:
+    pos: Optional[int] = bitmap.positions.get(sha)
+    if pos is None:
+        pos = len(bitmap.shas)
+        bitmap.shas.append(sha)
+        bitmap.positions[sha] = pos
+        bitmap.ext_types.append(object_type)
+    return pos
+
+# Signature: GitBitmapIndex, bytes -> int
+# Purpose: Returns the bits of every known object of a type, including objects outside the pack.
+def bitmap_type_mask(bitmap: 'GitBitmapIndex', object_type: bytes) -> int:
+    buf: bytearray = bytearray()
+    for i, ext_type in enumerate(bitmap.ext_types):
+        if ext_type == object_type:
+            bitmap_set(buf, bitmap.pack_count + i)
+    return bitmap.types.get(object_type, 0) | int.from_bytes(buf, "little")
+
+# Signature: GitBitmapIndex, int -> Iterator[str]
+# Purpose: Yields the object ids whose bit is set, in pack order.
+def bitmap_shas(bitmap: 'GitBitmapIndex', bits: int) -> Iterator[str]:
+    raw: bytes = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for i, byte in enumerate(raw):
+        while byte:
+            low: int = byte & -byte
+            yield bitmap.shas[i * 8 + low.bit_length() - 1]
+            byte ^= low
+
+# ------------------------------------------------[reachability]--------------------------------------------------
+
+# Signature: GitRepository, GitBitmapIndex, list[str] -> int
+# Purpose: Computes the bitmap of every object reachable from tips. Commits that have a stored bitmap are
+#          answered by a single OR; everything else is walked, skipping objects whose bit is already set.
+def bitmap_reachable(repo: 'GitRepository', bitmap: 'GitBitmapIndex', tips: list[str]) -> int:
+    seen: bytearray = bytearray()
+    pending: list[str] = list(tips)
+    trees: list[str] = []
+
+    while pending:
+        sha: str = pending.pop()
+        pos: Optional[int] = bitmap.positions.get(sha)
+        if pos is not None and bitmap_test(seen, pos):
+            continue
+        if sha in bitmap.commits:
+            bitmap_or(seen, bitmap.commits[sha])
+            continue
+
+        obj: Optional['GitObject'] = object_read(repo, sha)
+        if obj is None:
+            raise Exception(f"Missing object {sha}.")
+
+        match obj.object_type:
+            case b'commit':
+                bitmap_set(seen, bitmap_position(bitmap, sha, b'commit'))
+                trees.append(obj.kvlm[b'tree'].decode("ascii"))
+                parents = obj.kvlm.get(b'parent', [])
+                if type(parents) != list:
+                    parents = [parents]
+                for p in parents:
+                    pending.append(p.decode("ascii"))
+            case b'tag':
+                bitmap_set(seen, bitmap_position(bitmap, sha, b'tag'))
+                pending.append(obj.kvlm[b'object'].decode("ascii"))
+            case b'tree':
+                trees.append(sha)
+            case b'blob':
+                bitmap_set(seen, bitmap_position(bitmap, sha, b'blob'))
+
+    while trees:
+        sha = trees.pop()
+        pos = bitmap.positions.get(sha)
+        if pos is not None and bitmap_test(seen, pos):
+            continue
+
+        tree: Optional['GitObject'] = object_read(repo, sha)
+        if tree is None:
+            raise Exception(f"Missing object {sha}.")
+        bitmap_set(seen, bitmap_position(bitmap, sha, b'tree'))
+
+        for leaf in tree.items:
+            if leaf.mode.startswith(b'04'):
+                trees.append(leaf.sha)
+            elif not leaf.mode.startswith(b'16'):
+                bitmap_set(seen, bitmap_position(bitmap, leaf.sha, b'blob'))
+
+    return int.from_bytes(seen, "little")
+
+# Signature: GitRepository, GitBitmapIndex, list[str], list[str], bool -> int
+# Purpose: Returns the bitmap of what is reachable from include but not from exclude, restricted to commits
+#          unless objects is set.
+def bitmap_rev_list(repo: 'GitRepository', bitmap: 'GitBitmapIndex', include: list[str], exclude: list[str], objects: bool = False) -> int:
+    bits: int = bitmap_reachable(repo, bitmap, include)
+    if exclude:
+        bits &= ~bitmap_reachable(repo, bitmap, exclude)
+    if not objects:
+        bits &= bitmap_type_mask(bitmap, b'commit')
+    return bits
+
+# ------------------------------------------------[.bitmap files]--------------------------------------------------
+
+# Signature: GitRepository, GitPackIndex, dict[str, bytes], list[str] -> str
+# Purpose: Writes a git-compatible pack-<sha>.bitmap next to a pack that holds everything reachable from
+#          the selected commits. Commits are best listed oldest first, so each one reuses its ancestors' bitmaps.
+def bitmap_write(repo: 'GitRepository', index: 'GitPackIndex', types: dict[str, bytes], selected: list[str]) -> str:
+    pack_order: list[int] = sorted(range(len(index.shas)), key=lambda i: index.offsets[i])
+    bitmap: 'GitBitmapIndex' = GitBitmapIndex(pack_sha=index.pack_sha, shas=[index.shas[i] for i in pack_order])
+
+    type_bufs: dict[bytes, bytearray] = {t: bytearray() for t in BITMAP_TYPES}
+    for pos, sha in enumerate(bitmap.shas):
+        bitmap_set(type_bufs[types[sha]], pos)
+    bitmap.types = {t: int.from_bytes(buf, "little") for t, buf in type_bufs.items()}
+
+    for sha in selected:
+        bitmap.commits[sha] = bitmap_reachable(repo, bitmap, [sha])
+    if bitmap.ext_types:
+        raise Exception(f"Cannot write a bitmap: {index.pack_path} is not closed under reachability.")
+
+    idx_positions: dict[str, int] = {sha: i for i, sha in enumerate(index.shas)}
+    data: bytearray = bytearray(b'BITM')
+    data += (1).to_bytes(2, "big")
+    data += BITMAP_OPT_FULL_DAG.to_bytes(2, "big")
+    data += len(selected).to_bytes(4, "big")
+    data += bytes.fromhex(index.pack_sha)
+    for t in BITMAP_TYPES:
+        data += ewah_encode(bitmap.types[t], bitmap.pack_count)
+    for sha in selected:
+        data += idx_positions[sha].to_bytes(4, "big")
+        data += (0).to_bytes(1, "big") # xor offset
+        data += (0).to_bytes(1, "big") # flags
+        data += ewah_encode(bitmap.commits[sha], bitmap.pack_count)
+
+    path: str = index.pack_path[:-5] + ".bitmap"
+    with open(path, "wb") as f:
+        f.write(data)
+        f.write(hashlib.sha1(data).digest())
+    return path
+
+# Signature: str, GitPackIndex -> GitBitmapIndex
+# Purpose: Parses a .bitmap file, undoing the XOR compression git applies between entries.
+def bitmap_read(path: str, index: 'GitPackIndex') -> 'GitBitmapIndex':
+    with open(path, "rb") as f:
+        raw: bytes = f.read()
+
+    if raw[:4] != b'BITM' or int.from_bytes(raw[4:6], "big") != 1:
+        raise Exception(f"Unsupported bitmap {path}")
+    count: int = int.from_bytes(raw[8:12], "big")
+    if raw[12:32].hex() != index.pack_sha:
+        raise Exception(f"Bitmap {path} does not match its pack")
+
+    pack_order: list[int] = sorted(range(len(index.shas)), key=lambda i: index.offsets[i])
+    bitmap: 'GitBitmapIndex' = GitBitmapIndex(pack_sha=index.pack_sha, shas=[index.shas[i] for i in pack_order])
+
+    pos: int = 32
+    for t in BITMAP_TYPES:
+        bitmap.types[t], pos = ewah_decode(raw, pos)
+
+    entries: list[int] = []
+    for i in range(count):
+        sha: str = index.shas[int.from_bytes(raw[pos:pos + 4], "big")]
+        xor_offset: int = raw[pos + 4]
+        bits, pos = ewah_decode(raw, pos + 6)
+        if xor_offset:
+            bits ^= entries[i - xor_offset]
+        entries.append(bits)
+        bitmap.commits[sha] = bits
+
+    return bitmap
+
+# Signature: GitRepository -> Optional[GitBitmapIndex]
+# Purpose: Returns the bitmap of the first pack that has one, or None.
+def bitmap_load(repo: 'GitRepository') -> Optional['GitBitmapIndex']:
+    for index in pack_indexes(repo):
+        path: str = index.pack_path[:-5] + ".bitmap"
+        if not os.path.exists(path):
+            continue
+        mtime: float = os.stat(path).st_mtime
+        cached = bitmap_cache.get(path)
+        if not cached or cached[0] != mtime:
+            cached = (mtime, bitmap_read(path, index))
+            bitmap_cache[path] = cached
+        return cached[1]
+    return None
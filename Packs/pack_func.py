@@ -0,0 +1,541 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import BinaryIO, Iterable, Iterator, Optional
+import hashlib
+import os
+import threading
+import time
+import zlib
+
+from GitRepo.git_repository import GitRepository
+from Packs.PackIndex.git_pack_index import GitPackIndex
+
+OBJ_COMMIT: int = 1
+OBJ_TREE: int = 2
+OBJ_BLOB: int = 3
+OBJ_TAG: int = 4
+OBJ_OFS_DELTA: int = 6
+OBJ_REF_DELTA: int = 7
+
+PACK_TYPES: dict[int, bytes] = {OBJ_COMMIT: b'commit', OBJ_TREE: b'tree', OBJ_BLOB: b'blob', OBJ_TAG: b'tag'}
+PACK_TYPE_IDS: dict[bytes, int] = {v: k for k, v in PACK_TYPES.items()}
+
+CHUNK_SIZE: int = 64 * 1024
+
+# Maps an .idx path to (mtime, GitPackIndex) so lookups don't re-parse the index for every object.
+pack_index_cache: dict[str, tuple[float, 'GitPackIndex']] = dict()
+
+# Maps a pack directory to (its stat signature, the indexes of the packs in it).
+PACK_DIR_RACY_NS: int = 10**9
+pack_dir_cache: dict[str, tuple[tuple, list['GitPackIndex']]] = dict()
+
+# Resolved delta chain members by (pack path, offset), least recently used first. History walks read runs of
+# trees deltified against one another; keeping their bases saves re-inflating the whole chain for each one.
+PACK_BASE_CACHE_BYTES: int = 32 * 1024 * 1024
+pack_base_cache: OrderedDict[tuple[str, int], tuple[int, bytes]] = OrderedDict()
+pack_base_cache_size: int = 0
+# Held to reorder and evict, which are not atomic, when several threads read objects.
+pack_base_cache_lock: threading.Lock = threading.Lock()
+
+# ------------------------------------------------[pack writing]--------------------------------------------------
+
+# Signature: int, int -> bytes
+# Purpose: Encodes the type and inflated size of a pack entry (3 bit type, little-endian base 128 size).
+def pack_entry_header(type_id: int, size: int) -> bytes:
+    byte: int = (type_id << 4) | (size & 0x0f)
+    size >>= 4
+    ret: bytearray = bytearray()
+    while size:
+        ret.append(byte | 0x80)
+        byte = size & 0x7f
+        size >>= 7
+    ret.append(byte)
+    return bytes(ret)
+
+# Signature: Iterable[tuple[bytes, bytes]], int -> Iterator[bytes]
+# Purpose: Streams a version 2 pack holding count (type, data) objects. Objects are consumed one at a time,
+#          so only a single object is ever held in memory.
+def pack_stream(objects: Iterable[tuple[bytes, bytes]], count: int) -> Iterator[bytes]:
+    checksum = hashlib.sha1()
+
+    header: bytes = b'PACK' + (2).to_bytes(4, "big") + count.to_bytes(4, "big")
+    checksum.update(header)
+    yield header
+
+    written: int = 0
+    for (object_type, data) in objects:
+        chunk: bytes = pack_entry_header(PACK_TYPE_IDS[object_type], len(data)) + zlib.compress(data)
+        checksum.update(chunk)
+        written += 1
+        yield chunk
+
+    if written != count:
+        raise Exception(f"Pack announced {count} objects but {written} were streamed.")
+
+    yield checksum.digest()
+
+# Signature: GitRepository, Iterable[bytes] -> str
+# Purpose: Stores an incoming pack stream under objects/pack, verifies its checksum and indexes it.
+#          Returns the pack's sha.
+def pack_receive(repo: 'GitRepository', chunks: Iterable[bytes]) -> str:
+    pack_dir: str = GitRepository.repo_dir(repo, "objects", "pack", mkdir=True)
+    tmp_path: str = os.path.join(pack_dir, f"tmp_pack_{os.getpid()}")
+
+    checksum = hashlib.sha1()
+    tail: bytes = b''
+    with open(tmp_path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            # The last 20 bytes are the trailer, which is not part of what it hashes.
+            tail += chunk
+            checksum.update(tail[:-20])
+            tail = tail[-20:]
+
+    if checksum.digest() != tail:
+        os.unlink(tmp_path)
+        raise Exception("Received pack is corrupt: checksum mismatch")
+
+    pack_sha: str = tail.hex()
+    pack_path: str = os.path.join(pack_dir, f"pack-{pack_sha}.pack")
+    os.replace(tmp_path, pack_path)
+
+    index: 'GitPackIndex' = pack_index_build(pack_path)
+    pack_index_write(index, pack_path[:-5] + ".idx")
+    return pack_sha
+
+# Signature: GitRepository -> tuple[BinaryIO, str]
+# Purpose: Starts a pack that objects are appended to one at a time, for writers that do not know up front how many
+#          objects they will produce. Returns the open file and its temporary path; pack_append_finish completes it.
+def pack_append_open(repo: 'GitRepository') -> tuple[BinaryIO, str]:
+    pack_dir: str = GitRepository.repo_dir(repo, "objects", "pack", mkdir=True)
+    tmp_path: str = os.path.join(pack_dir, f"tmp_pack_{os.getpid()}_{time.time_ns()}")
+    f: BinaryIO = open(tmp_path, "w+b")
+    f.write(b'PACK' + (2).to_bytes(4, "big") + (0).to_bytes(4, "big"))
+    return f, tmp_path
+
+# Signature: BinaryIO, bytes, bytes -> tuple[int, int]
+# Purpose: Appends one whole (undeltified) object to a pack opened by pack_append_open. Returns its offset and the
+#          crc32 of its entry, which is what its index entry needs.
+def pack_append(f: BinaryIO, object_type: bytes, data: bytes) -> tuple[int, int]:
+    offset: int = f.seek(0, os.SEEK_END)
+    chunk: bytes = pack_entry_header(PACK_TYPE_IDS[object_type], len(data)) + zlib.compress(data)
+    f.write(chunk)
+    return offset, zlib.crc32(chunk)
+
+# Signature: GitRepository, BinaryIO, str, dict[str, tuple[int, int]] -> Optional[str]
+# Purpose: Completes a pack opened by pack_append_open holding entries ({sha: (offset, crc32)}): fixes the object
+#          count in its header, appends the checksum and moves it and its index into place. The index is built from
+#          entries rather than by re-reading the pack. Returns the pack's sha, or None (and no pack) if it is empty.
+def pack_append_finish(repo: 'GitRepository', f: BinaryIO, tmp_path: str, entries: dict[str, tuple[int, int]]) -> Optional[str]:
+    if not entries:
+        f.close()
+        os.unlink(tmp_path)
+        return None
+
+    f.seek(8)
+    f.write(len(entries).to_bytes(4, "big"))
+    f.seek(0)
+    checksum = hashlib.sha1()
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+        checksum.update(chunk)
+    f.write(checksum.digest())
+    f.close()
+
+    pack_sha: str = checksum.hexdigest()
+    pack_path: str = os.path.join(os.path.dirname(tmp_path), f"pack-{pack_sha}.pack")
+    os.replace(tmp_path, pack_path)
+
+    index: 'GitPackIndex' = GitPackIndex(pack_path=pack_path, pack_sha=pack_sha)
+    index.shas = sorted(entries.keys())
+    index.offsets = [entries[sha][0] for sha in index.shas]
+    index.crcs = [entries[sha][1] for sha in index.shas]
+    # Written aside then renamed, so a reader never finds a partial index next to the pack.
+    pack_index_write(index, tmp_path + "_idx")
+    os.replace(tmp_path + "_idx", pack_path[:-5] + ".idx")
+    return pack_sha
+
+# ------------------------------------------------[pack reading]--------------------------------------------------
+
+# Signature: BinaryIO, int -> tuple[int, int, Optional[int | str]]
+# Purpose: Reads the header of the entry starting at offset and leaves f on its compressed data. Returns its
+#          type id, its inflated size and the delta base (an offset for OFS_DELTA, a sha for REF_DELTA, None otherwise).
+def pack_entry_header_read(f: BinaryIO, offset: int) -> tuple[int, int, Optional[int | str]]:
+    f.seek(offset)
+    byte: int = f.read(1)[0]
+    type_id: int = (byte >> 4) & 0x07
+    size: int = byte & 0x0f
+    shift: int = 4
+    while byte & 0x80:
+        byte = f.read(1)[0]
+        size |= (byte & 0x7f) << shift
+        shift += 7
+
+    base = None
+    if type_id == OBJ_OFS_DELTA:
+        byte = f.read(1)[0]
+        distance: int = byte & 0x7f
+        while byte & 0x80:
+            byte = f.read(1)[0]
+            distance = ((distance + 1) << 7) | (byte & 0x7f)
+        base = offset - distance
+    elif type_id == OBJ_REF_DELTA:
+        base = f.read(20).hex()
+
+    return type_id, size, base
+
+# Signature: BinaryIO, int -> tuple[int, bytes, Optional[int | str], int]
+# Purpose: Reads the entry starting at offset. Returns its type id, its inflated payload, its delta base
+#          and the offset where the entry ends.
+def pack_entry_read(f: BinaryIO, offset: int) -> tuple[int, bytes, Optional[int | str], int]:
+    type_id, _, base = pack_entry_header_read(f, offset)
+
+    inflater = zlib.decompressobj()
+    parts: list[bytes] = []
+    while not inflater.eof:
+        chunk: bytes = f.read(CHUNK_SIZE)
+        if not chunk:
+            raise Exception(f"Truncated pack entry at offset {offset}")
+        parts.append(inflater.decompress(chunk))
+
+    end: int = f.tell() - len(inflater.unused_data)
+    return type_id, b''.join(parts), base, end
+
+# Signature: BinaryIO, int -> Iterator[bytes]
+# Purpose: Inflates the zlib stream at f's position, yielding at most chunk_size bytes at a time, so neither
+#          side of the stream is ever fully held in memory.
+def inflate_stream(f: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    inflater = zlib.decompressobj()
+    while not inflater.eof:
+        data: bytes = inflater.unconsumed_tail or f.read(chunk_size)
+        if not data:
+            raise Exception("Truncated zlib stream")
+        out: bytes = inflater.decompress(data, chunk_size)
+        if out:
+            yield out
+
+# Signature: bytes, int -> tuple[int, int]
+# Purpose: Reads a delta size (little-endian base 128) and returns it with the position after it.
+def pack_delta_size(delta: bytes, pos: int) -> tuple[int, int]:
+    size: int = 0
+    shift: int = 0
+    while True:
+        byte: int = delta[pos]
+        pos += 1
+        size |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+# Signature: bytes, bytes -> bytes
+# Purpose: Rebuilds an object from its base and a git delta (copy and insert instructions).
+def pack_delta_apply(base: bytes, delta: bytes) -> bytes:
+    base_size, pos = pack_delta_size(delta, 0)
+    if base_size != len(base):
+        raise Exception("Delta base size mismatch")
+    result_size, pos = pack_delta_size(delta, pos)
+
+    ret: bytearray = bytearray()
+    while pos < len(delta):
+        op: int = delta[pos]
+        pos += 1
+        if op & 0x80:
+            copy_offset: int = 0
+            copy_size: int = 0
+            for i in range(4):
+                if op & (1 << i):
+                    copy_offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    copy_size |= delta[pos] << (8 * i)
+                    pos += 1
+            if copy_size == 0:
+                copy_size = 0x10000
+            ret += base[copy_offset:copy_offset + copy_size]
+        elif op:
+            ret += delta[pos:pos + op]
+            pos += op
+        else:
+            raise Exception("Invalid delta opcode 0")
+
+    if len(ret) != result_size:
+        raise Exception("Delta result size mismatch")
+    return bytes(ret)
+
+# Signature: BinaryIO, int, GitPackIndex -> tuple[bytes, bytes]
+# Purpose: Returns the (type, data) of the object at offset, resolving delta chains inside the pack.
+def pack_object_at(f: BinaryIO, offset: int, index: 'GitPackIndex') -> tuple[bytes, bytes]:
+    chain: list[tuple[int, bytes]] = []
+    while True:
+        with pack_base_cache_lock:
+            cached: Optional[tuple[int, bytes]] = pack_base_cache.get((index.pack_path, offset))
+            if cached:
+                pack_base_cache.move_to_end((index.pack_path, offset))
+        if cached:
+            type_id, data = cached
+            break
+        type_id, data, base, _ = pack_entry_read(f, offset)
+        if type_id == OBJ_OFS_DELTA:
+            chain.append((offset, data))
+            offset = base
+        elif type_id == OBJ_REF_DELTA:
+            chain.append((offset, data))
+            offset = pack_index_find(index, base)
+            if offset is None:
+                raise Exception(f"Delta base {base} is not in {index.pack_path}")
+        elif type_id in PACK_TYPES:
+            if chain:
+                pack_base_cache_put(index.pack_path, offset, type_id, data)
+            break
+        else:
+            raise Exception(f"Unknown pack entry type {type_id} at offset {offset}")
+
+    for (delta_offset, delta) in reversed(chain):
+        data = pack_delta_apply(data, delta)
+        pack_base_cache_put(index.pack_path, delta_offset, type_id, data)
+    return PACK_TYPES[type_id], data
+
+# Signature: str, int, int, bytes -> None
+# Purpose: Remembers a resolved delta chain member, evicting the least recently used past PACK_BASE_CACHE_BYTES.
+def pack_base_cache_put(pack_path: str, offset: int, type_id: int, data: bytes) -> None:
+    global pack_base_cache_size
+    with pack_base_cache_lock:
+        if len(data) > PACK_BASE_CACHE_BYTES // 8 or (pack_path, offset) in pack_base_cache:
+            return
+        pack_base_cache[(pack_path, offset)] = (type_id, data)
+        pack_base_cache_size += len(data)
+        while pack_base_cache_size > PACK_BASE_CACHE_BYTES:
+            _, (_, evicted) = pack_base_cache.popitem(last=False)
+            pack_base_cache_size -= len(evicted)
+
+# ------------------------------------------------[pack index]--------------------------------------------------
+
+# Signature: str -> GitPackIndex
+# Purpose: Walks every entry of a pack and computes the object ids, offsets and crc32s that make up its index.
+def pack_index_build(pack_path: str) -> 'GitPackIndex':
+    found: dict[str, tuple[int, int]] = dict()
+    deltas: list[tuple[int, int]] = []
+
+    with open(pack_path, "rb") as f:
+        header: bytes = f.read(12)
+        if header[:4] != b'PACK' or int.from_bytes(header[4:8], "big") not in (2, 3):
+            raise Exception(f"Not a pack file {pack_path}")
+        count: int = int.from_bytes(header[8:12], "big")
+
+        offset: int = 12
+        for i in range(count):
+            type_id, data, base, end = pack_entry_read(f, offset)
+            f.seek(offset)
+            crc: int = zlib.crc32(f.read(end - offset))
+            if type_id in PACK_TYPES:
+                sha: str = object_sha(PACK_TYPES[type_id], data)
+                found[sha] = (offset, crc)
+            else:
+                deltas.append((offset, crc))
+            offset = end
+
+        pack_sha: str = f.read(20).hex()
+
+        # Deltas are resolved once every base they may point at has been seen.
+        partial: 'GitPackIndex' = GitPackIndex(pack_path=pack_path, pack_sha=pack_sha)
+        partial.shas = sorted(found.keys())
+        partial.offsets = [found[s][0] for s in partial.shas]
+        for (offset, crc) in deltas:
+            object_type, data = pack_object_at(f, offset, partial)
+            sha = object_sha(object_type, data)
+            found[sha] = (offset, crc)
+            i: int = bisect_left(partial.shas, sha)
+            partial.shas.insert(i, sha)
+            partial.offsets.insert(i, offset)
+
+    index: 'GitPackIndex' = GitPackIndex(pack_path=pack_path, pack_sha=pack_sha)
+    index.shas = sorted(found.keys())
+    index.offsets = [found[s][0] for s in index.shas]
+    index.crcs = [found[s][1] for s in index.shas]
+    return index
+
+# Signature: GitPackIndex, str -> None
+# Purpose: Writes a version 2 .idx file (fan-out table, sorted ids, crc32s, offsets, checksums).
+def pack_index_write(index: 'GitPackIndex', path: str) -> None:
+    fanout: list[int] = [0] * 256
+    for sha in index.shas:
+        fanout[int(sha[0:2], 16)] += 1
+    total: int = 0
+    for i in range(256):
+        total += fanout[i]
+        fanout[i] = total
+
+    large: list[int] = []
+    small: list[int] = []
+    for offset in index.offsets:
+        if offset < 0x80000000:
+            small.append(offset)
+        else:
+            small.append(0x80000000 | len(large))
+            large.append(offset)
+
+    body: bytearray = bytearray(b'\xfftOc' + (2).to_bytes(4, "big"))
+    for n in fanout:
+        body += n.to_bytes(4, "big")
+    for sha in index.shas:
+        body += bytes.fromhex(sha)
+    for crc in index.crcs:
+        body += crc.to_bytes(4, "big")
+    for offset in small:
+        body += offset.to_bytes(4, "big")
+    for offset in large:
+        body += offset.to_bytes(8, "big")
+    body += bytes.fromhex(index.pack_sha)
+
+    with open(path, "wb") as f:
+        f.write(body)
+        f.write(hashlib.sha1(body).digest())
+
+# Signature: str -> GitPackIndex
+# Purpose: Parses a version 2 .idx file.
+def pack_index_read(path: str) -> 'GitPackIndex':
+    with open(path, "rb") as f:
+        raw: bytes = f.read()
+
+    if raw[:4] != b'\xfftOc' or int.from_bytes(raw[4:8], "big") != 2:
+        raise Exception(f"Unsupported pack index {path}")
+
+    count: int = int.from_bytes(raw[8 + 255 * 4:8 + 256 * 4], "big")
+    names_start: int = 8 + 256 * 4
+    crcs_start: int = names_start + 20 * count
+    offsets_start: int = crcs_start + 4 * count
+    large_start: int = offsets_start + 4 * count
+
+    names: bytes = raw[names_start:crcs_start]
+    shas: list[str] = [names[i:i + 20].hex() for i in range(0, len(names), 20)]
+    crcs: list[int] = [int.from_bytes(raw[i:i + 4], "big") for i in range(crcs_start, offsets_start, 4)]
+
+    offsets: list[int] = []
+    for i in range(offsets_start, large_start, 4):
+        offset: int = int.from_bytes(raw[i:i + 4], "big")
+        if offset & 0x80000000:
+            pos: int = large_start + 8 * (offset & 0x7fffffff)
+            offset = int.from_bytes(raw[pos:pos + 8], "big")
+        offsets.append(offset)
+
+    pack_sha: str = raw[-40:-20].hex()
+    return GitPackIndex(pack_path=path[:-4] + ".pack", pack_sha=pack_sha, shas=shas, offsets=offsets, crcs=crcs)
+
+# Signature: GitPackIndex, str -> Optional[int]
+# Purpose: Binary searches the index for sha and returns its offset in the pack.
+def pack_index_find(index: 'GitPackIndex', sha: str) -> Optional[int]:
+    i: int = bisect_left(index.shas, sha)
+    if i < len(index.shas) and index.shas[i] == sha:
+        return index.offsets[i]
+    return None
+
+# Signature: GitRepository -> list[GitPackIndex]
+# Purpose: Returns the indexes of every pack in the repository, re-reading only the ones that changed.
+def pack_indexes(repo: 'GitRepository') -> list['GitPackIndex']:
+    pack_dir: str = GitRepository.repo_path(repo, "objects", "pack")
+    # Packs are only ever added, replaced or removed by renaming or unlinking, all of which touch the directory,
+    # so an unchanged directory means an unchanged list and per-object lookups skip the listdir and stats.
+    signature: Optional[tuple] = GitRepository.file_signature(pack_dir)
+    if signature is None:
+        return []
+    cached_dir = pack_dir_cache.get(pack_dir)
+    if cached_dir and cached_dir[0] == signature:
+        return cached_dir[1]
+
+    ret: list['GitPackIndex'] = []
+    for name in sorted(os.listdir(pack_dir)):
+        if not name.endswith(".idx"):
+            continue
+        path: str = os.path.join(pack_dir, name)
+        mtime: float = os.stat(path).st_mtime
+        cached = pack_index_cache.get(path)
+        if not cached or cached[0] != mtime:
+            cached = (mtime, pack_index_read(path))
+            pack_index_cache[path] = cached
+        ret.append(cached[1])
+    # Directory timestamps are coarse: a pack added within the same tick as this listing would leave the signature
+    # unchanged, so a listing is only trusted once the directory has been quiet for a while.
+    if time.time_ns() - signature[0] > PACK_DIR_RACY_NS:
+        pack_dir_cache[pack_dir] = (signature, ret)
+    return ret
+
+# Signature: GitRepository, str -> bool
+# Purpose: Whether any pack of the repository holds sha.
+def pack_contains(repo: 'GitRepository', sha: str) -> bool:
+    for index in pack_indexes(repo):
+        if pack_index_find(index, sha) is not None:
+            return True
+    return False
+
+# Signature: GitRepository, str -> list[str]
+# Purpose: Returns the packed object ids starting with prefix (lowercase hex).
+def pack_resolve_prefix(repo: 'GitRepository', prefix: str) -> list[str]:
+    ret: list[str] = []
+    for index in pack_indexes(repo):
+        i: int = bisect_left(index.shas, prefix)
+        while i < len(index.shas) and index.shas[i].startswith(prefix):
+            ret.append(index.shas[i])
+            i += 1
+    return ret
+
+# Signature: GitRepository, str -> Optional[tuple[bytes, bytes]]
+# Purpose: Reads sha from the repository's packs and returns its (type, data), or None if no pack has it.
+def pack_object_read(repo: 'GitRepository', sha: str) -> Optional[tuple[bytes, bytes]]:
+    for index in pack_indexes(repo):
+        offset: Optional[int] = pack_index_find(index, sha)
+        if offset is not None:
+            with open(index.pack_path, "rb") as f:
+                return pack_object_at(f, offset, index)
+    return None
+
+# Signature: GitRepository, str -> Optional[tuple[bytes, int]]
+# Purpose: Returns the type and size of a packed object from entry headers alone, following delta chains
+#          to the base for the type and reading only the delta's own header for the size.
+def pack_object_header(repo: 'GitRepository', sha: str) -> Optional[tuple[bytes, int]]:
+    for index in pack_indexes(repo):
+        offset: Optional[int] = pack_index_find(index, sha)
+        if offset is None:
+            continue
+        with open(index.pack_path, "rb") as f:
+            type_id, size, base = pack_entry_header_read(f, offset)
+            if type_id in PACK_TYPES:
+                return PACK_TYPES[type_id], size
+            # A delta's header holds the delta's size; the object's size is the second varint of the delta.
+            delta_head: bytes = next(inflate_stream(f, 32))
+            _, pos = pack_delta_size(delta_head, 0)
+            size, _ = pack_delta_size(delta_head, pos)
+            while type_id not in PACK_TYPES:
+                offset = base if type_id == OBJ_OFS_DELTA else pack_index_find(index, base)
+                if offset is None:
+                    raise Exception(f"Delta base {base} is not in {index.pack_path}")
+                type_id, _, base = pack_entry_header_read(f, offset)
+            return PACK_TYPES[type_id], size
+    return None
+
+# Signature: GitRepository, str -> Optional[tuple[bytes, int, Iterator[bytes]]]
+# Purpose: Returns the type, size and payload chunks of a packed object. Whole objects are inflated straight
+#          from the pack; deltas have to be rebuilt in memory first.
+def pack_object_stream(repo: 'GitRepository', sha: str) -> Optional[tuple[bytes, int, Iterator[bytes]]]:
+    for index in pack_indexes(repo):
+        offset: Optional[int] = pack_index_find(index, sha)
+        if offset is None:
+            continue
+        f = open(index.pack_path, "rb")
+        type_id, size, _ = pack_entry_header_read(f, offset)
+        if type_id in PACK_TYPES:
+            return PACK_TYPES[type_id], size, pack_stream_entry(f)
+        with f:
+            object_type, data = pack_object_at(f, offset, index)
+        return object_type, len(data), iter([data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)])
+    return None
+
+# Signature: BinaryIO -> Iterator[bytes]
+# Purpose: Inflates the entry f is positioned on and closes f once done.
+def pack_stream_entry(f: BinaryIO) -> Iterator[bytes]:
+    with f:
+        yield from inflate_stream(f)
+
+# Signature: bytes, bytes -> str
+# Purpose: Computes the object id of a payload the same way object_write does.
+def object_sha(object_type: bytes, data: bytes) -> str:
+    return hashlib.sha1(object_type + b' ' + str(len(data)).encode() + b'\x00' + data).hexdigest()
@@ -0,0 +1,75 @@
+from typing import TYPE_CHECKING, Optional
+import os
+
+from GitRepo.git_repository import GitRepository
+from Objects.object_func import objects_raw
+from Objects.object_index_func import object_loose_index_clear
+from Objects.reachable_func import objects_reachable
+from Packs.bitmap_func import bitmap_write
+from Packs.pack_func import pack_index_cache, pack_index_find, pack_indexes, pack_receive, pack_stream
+from Refs.ref_func import ref_list, ref_resolve, refs_flatten
+
+if TYPE_CHECKING:
+    from Packs.PackIndex.git_pack_index import GitPackIndex
+
+# One commit in this many gets a stored bitmap; queries walk at most that far before reaching one.
+BITMAP_COMMIT_INTERVAL: int = 100
+
+# Signature: GitRepository -> list[str]
+# Purpose: Returns what every ref and HEAD point at.
+def repack_tips(repo: 'GitRepository') -> list[str]:
+    tips: set[str] = set(refs_flatten(ref_list(repo)).values())
+    head: Optional[str] = ref_resolve(repo, "HEAD")
+    if head:
+        tips.add(head)
+    return sorted(tips)
+
+# Signature: GitRepository, bool, bool -> Optional[str]
+# Purpose: Packs everything reachable from the refs into a single pack, optionally with a reachability bitmap,
+#          and optionally removes the loose objects and packs it makes redundant. Returns the new pack's sha.
+def repack(repo: 'GitRepository', delete_redundant: bool = False, write_bitmap: bool = False) -> Optional[str]:
+    tips: list[str] = repack_tips(repo)
+    objects: list[tuple[str, bytes]] = objects_reachable(repo, tips)
+    if not objects:
+        return None
+
+    pack_sha: str = pack_receive(repo, pack_stream(objects_raw(repo, [sha for (sha, _) in objects]), len(objects)))
+    index: 'GitPackIndex' = next(i for i in pack_indexes(repo) if i.pack_sha == pack_sha)
+
+    if write_bitmap:
+        types: dict[str, bytes] = dict(objects)
+        commits: list[str] = [sha for (sha, object_type) in objects if object_type == b'commit']
+        selected: set[str] = set(commits[::BITMAP_COMMIT_INTERVAL])
+        selected.update(tip for tip in tips if types.get(tip) == b'commit')
+        # Commits come out of the walk newest first; bitmaps are cheapest to build oldest first.
+        bitmap_write(repo, index, types, [sha for sha in reversed(commits) if sha in selected])
+
+    if delete_redundant:
+        repack_prune(repo, index)
+
+    return pack_sha
+
+# Signature: GitRepository, GitPackIndex -> None
+# Purpose: Deletes the loose objects and the other packs whose content is entirely held by index's pack.
+def repack_prune(repo: 'GitRepository', index: 'GitPackIndex') -> None:
+    for other in pack_indexes(repo):
+        if other.pack_sha == index.pack_sha:
+            continue
+        if all(pack_index_find(index, sha) is not None for sha in other.shas):
+            base: str = other.pack_path[:-5]
+            for ext in (".pack", ".idx", ".bitmap"):
+                if os.path.exists(base + ext):
+                    os.unlink(base + ext)
+            pack_index_cache.pop(base + ".idx", None)
+
+    objects_dir: str = GitRepository.repo_path(repo, "objects")
+    for prefix in os.listdir(objects_dir):
+        if len(prefix) != 2:
+            continue
+        fanout: str = os.path.join(objects_dir, prefix)
+        for name in os.listdir(fanout):
+            if pack_index_find(index, prefix + name) is not None:
+                os.unlink(os.path.join(fanout, name))
+        if not os.listdir(fanout):
+            os.rmdir(fanout)
+    object_loose_index_clear(repo)
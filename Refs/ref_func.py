@@ -1,19 +1,44 @@
 from http.client import CannotSendHeader
 import os
+import threading
 from typing import Optional, Union
 
 from GitRepo.git_repository import GitRepository
+from Trace2.trace2_func import trace2_count
 
 DictRefs = dict[str, Union[str, 'DictRefs']]
 
+# Maps a ref file to (stat signature, contents) so unchanged refs are not re-read.
+ref_cache: dict[str, tuple[tuple, str]] = dict()
+
+# Maps a packed-refs file to (stat signature, {ref: sha}).
+ref_packed_cache: dict[str, tuple[tuple, dict[str, str]]] = dict()
+
+# Held to look an entry up or store one in either cache, when several threads resolve refs; files are read outside it.
+ref_cache_lock: threading.Lock = threading.Lock()
+
+# The header git writes atop packed-refs. Tags are not peeled here, so the file does not claim to be.
+REF_PACKED_HEADER: str = "# pack-refs with: sorted \n"
+
 def ref_resolve(repo: 'GitRepository', ref: str) -> str:
     path = GitRepository.repo_file(repo, ref)
 
-    if not os.path.isfile(path):
-        return None
-    
-    with open(path, 'r') as file_pointer:
-        data = file_pointer.read()[:-1]
+    signature: Optional[tuple] = GitRepository.file_signature(path)
+    if signature is None or not os.path.isfile(path):
+        # A ref with no file of its own may still be in packed-refs.
+        name: str = os.path.relpath(path, repo.gitdir).replace(os.sep, "/")
+        return ref_packed(repo).get(name) if name.startswith("refs/") else None
+
+    with ref_cache_lock:
+        cached = ref_cache.get(path)
+    if cached and cached[0] == signature:
+        data = cached[1]
+        trace2_count("ref_cache_hits")
+    else:
+        with open(path, 'r') as file_pointer:
+            data = file_pointer.read()[:-1]
+        with ref_cache_lock:
+            ref_cache[path] = (signature, data)
 
     if data.startswith("ref: "):
         return ref_resolve(repo, data[5:])
@@ -21,6 +46,7 @@ def ref_resolve(repo: 'GitRepository', ref: str) -> str:
         return data
 
 def ref_list(repo: 'GitRepository', path: Optional[str] = None) -> DictRefs:
+    top: bool = not path
     if not path:
         path = GitRepository.repo_dir(repo, "refs")
     
@@ -32,6 +58,103 @@ def ref_list(repo: 'GitRepository', path: Optional[str] = None) -> DictRefs:
             ret[entry] = ref_list(repo, full_path)
         else:
             ret[entry] = ref_resolve(repo, full_path)
+
+    if top:
+        packed: dict[str, str] = ref_packed(repo)
+        if packed:
+            # A loose ref overrides a packed one of the same name.
+            for (name, sha) in packed.items():
+                node: DictRefs = ret
+                parts: list[str] = name.split("/")[1:]
+                for part in parts[:-1]:
+                    node = node.setdefault(part, dict())
+                node.setdefault(parts[-1], sha)
+            ret = ref_sorted(ret)
     
     return ret
 
+# Signature: DictRefs -> DictRefs
+# Purpose: refs with every level ordered by name, as listing the directories gives them.
+def ref_sorted(refs: DictRefs) -> DictRefs:
+    return {k: ref_sorted(v) if isinstance(v, dict) else v for (k, v) in sorted(refs.items())}
+
+# Signature: DictRefs, str -> dict[str, str]
+# Purpose: Flattens the nested output of ref_list into {"refs/heads/master": sha, ...}.
+def refs_flatten(refs: dict, prefix: str = "refs") -> dict[str, str]:
+    ret: dict[str, str] = dict()
+    for k, v in refs.items():
+        if isinstance(v, dict):
+            ret.update(refs_flatten(v, f"{prefix}/{k}"))
+        elif v:
+            ret[f"{prefix}/{k}"] = v
+    return ret
+
+# ------------------------------------------------[packed refs]--------------------------------------------------
+
+# Signature: GitRepository -> dict[str, str]
+# Purpose: The refs in .git/packed-refs, as {"refs/heads/master": sha, ...}, re-read only when the file changes.
+#          Peeled lines ("^sha" after an annotated tag) are skipped: nothing here needs them.
+def ref_packed(repo: 'GitRepository') -> dict[str, str]:
+    path: str = GitRepository.repo_path(repo, "packed-refs")
+    signature: Optional[tuple] = GitRepository.file_signature(path)
+    if signature is None:
+        return dict()
+    with ref_cache_lock:
+        cached = ref_packed_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    refs: dict[str, str] = dict()
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith("#") or line.startswith("^"):
+                continue
+            sha, _, name = line.rstrip("\n").partition(" ")
+            if name:
+                refs[name] = sha
+    with ref_cache_lock:
+        ref_packed_cache[path] = (signature, refs)
+    return refs
+
+# Signature: GitRepository -> dict[str, str]
+# Purpose: Every loose ref file that holds an object id (symbolic refs excluded), as {"refs/heads/master": sha, ...}.
+def ref_loose(repo: 'GitRepository') -> dict[str, str]:
+    ret: dict[str, str] = dict()
+    refs_dir: str = GitRepository.repo_path(repo, "refs")
+    for (directory, _, files) in os.walk(refs_dir):
+        for name in files:
+            with open(os.path.join(directory, name), "r") as f:
+                data: str = f.read().strip()
+            if data and not data.startswith("ref: "):
+                ret[os.path.relpath(os.path.join(directory, name), repo.gitdir).replace(os.sep, "/")] = data
+    return ret
+
+# Signature: GitRepository -> int
+# Purpose: Moves every loose ref into packed-refs, as git pack-refs --all does, so listing or resolving refs reads one
+#          file instead of one per ref. The new file is written aside and renamed into place; a loose ref is then
+#          only removed if it still holds what was packed, so one updated meanwhile keeps its new value. The
+#          directories are left in place for the refs written there next. Returns how many refs were packed.
+def ref_pack(repo: 'GitRepository') -> int:
+    loose: dict[str, str] = ref_loose(repo)
+    if not loose:
+        return 0
+    refs: dict[str, str] = dict(ref_packed(repo))
+    refs.update(loose)
+
+    path: str = GitRepository.repo_path(repo, "packed-refs")
+    with open(path + ".lock", "w") as f:
+        f.write(REF_PACKED_HEADER)
+        for name in sorted(refs):
+            f.write(f"{refs[name]} {name}\n")
+    os.replace(path + ".lock", path)
+
+    for (name, sha) in loose.items():
+        ref_path: str = GitRepository.repo_path(repo, *name.split("/"))
+        with open(ref_path, "r") as f:
+            if f.read().strip() != sha:
+                continue
+        os.unlink(ref_path)
+        with ref_cache_lock:
+            ref_cache.pop(ref_path, None)
+    trace2_count("refs_packed", len(loose))
+    return len(loose)
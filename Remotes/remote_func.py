@@ -0,0 +1,108 @@
+from typing import Optional
+import os
+
+from GitRepo.git_repository import GitRepository
+from Objects.object_func import object_exists, objects_raw
+from Objects.reachable_func import objects_reachable
+from Packs.pack_func import pack_receive, pack_stream
+from Refs.ref_func import ref_list, ref_resolve, refs_flatten
+
+# Signature: str -> GitRepository
+# Purpose: Opens the repository behind a file:// url or a plain path.
+def remote_open(url: str) -> 'GitRepository':
+    if url.startswith("file://"):
+        url = url[len("file://"):]
+    return GitRepository(os.path.realpath(url))
+
+# Signature: GitRepository, str -> str
+# Purpose: Looks up the url configured for a remote name.
+def remote_url(repo: 'GitRepository', name: str) -> str:
+    section: str = f'remote "{name}"'
+    if not repo.config.has_option(section, "url"):
+        raise Exception(f"No such remote {name}.")
+    return repo.config.get(section, "url")
+
+# Signature: GitRepository, str, str -> None
+# Purpose: Records a remote in the repository's config, the same way git does.
+def remote_add(repo: 'GitRepository', name: str, url: str) -> None:
+    section: str = f'remote "{name}"'
+    if repo.config.has_section(section):
+        raise Exception(f"Remote {name} already exists.")
+    repo.config.add_section(section)
+    repo.config.set(section, "url", url)
+    repo.config.set(section, "fetch", f"+refs/heads/*:refs/remotes/{name}/*")
+    with open(GitRepository.repo_file(repo, "config"), "w") as f:
+        repo.config.write(f)
+
+# Signature: GitRepository, GitRepository, list[str] -> list[str]
+# Purpose: Walks everything reachable from wants in remote and returns the objects repo lacks.
+#          The walk stops at any object repo already has: a commit or tree that exists locally
+#          comes with its whole history or subtree, so none of it is visited.
+def objects_missing(remote: 'GitRepository', repo: 'GitRepository', wants: list[str]) -> list[str]:
+    reachable: list[tuple[str, bytes]] = objects_reachable(remote, wants, stop=lambda sha: object_exists(repo, sha))
+    return [sha for (sha, _) in reachable]
+
+# Signature: GitRepository, str -> dict[str, str]
+# Purpose: Fetches the branches and tags of a remote. Only the objects the local repository lacks are
+#          streamed across, as a single pack. Branches land under refs/remotes/<name>/, new tags under
+#          refs/tags/. Returns the refs that were updated.
+def fetch(repo: 'GitRepository', name: str) -> dict[str, str]:
+    remote: 'GitRepository' = remote_open(remote_url(repo, name))
+    remote_refs: dict[str, str] = refs_flatten(ref_list(remote))
+
+    updates: dict[str, str] = dict()
+    for ref, sha in remote_refs.items():
+        if ref.startswith("refs/heads/"):
+            local_ref: str = f"refs/remotes/{name}/{ref[len('refs/heads/'):]}"
+        elif ref.startswith("refs/tags/"):
+            local_ref = ref
+            if os.path.exists(GitRepository.repo_path(repo, local_ref)):
+                continue
+        else:
+            continue
+
+        if ref_resolve(repo, local_ref) != sha:
+            updates[local_ref] = sha
+
+    missing: list[str] = objects_missing(remote, repo, list(updates.values()))
+    if missing:
+        pack_receive(repo, pack_stream(objects_raw(remote, missing), len(missing)))
+
+    for local_ref, sha in updates.items():
+        path: str = GitRepository.repo_file(repo, *local_ref.split("/"), mkdir=True)
+        with open(path, "w") as f:
+            f.write(sha + "\n")
+
+    return updates
+
+# Signature: str -> Optional[str]
+# Purpose: Returns the branch the remote's HEAD points at, or None if it is detached.
+def remote_head_branch(url: str) -> Optional[str]:
+    remote: 'GitRepository' = remote_open(url)
+    with open(GitRepository.repo_file(remote, "HEAD"), "r") as f:
+        head: str = f.read().strip()
+    if head.startswith("ref: refs/heads/"):
+        return head[len("ref: refs/heads/"):]
+    return None
+
+# Signature: str, str -> GitRepository
+# Purpose: Creates a repository at path, registers url as "origin", fetches it and points HEAD at a local
+#          branch tracking the remote's HEAD. Checking out the worktree is left to the caller.
+def clone(url: str, path: str) -> 'GitRepository':
+    if not url.startswith("file://"):
+        url = os.path.realpath(url)
+    repo: 'GitRepository' = GitRepository.repo_create(path)
+    repo = GitRepository(repo.worktree)
+    remote_add(repo, "origin", url)
+    fetch(repo, "origin")
+
+    branch: Optional[str] = remote_head_branch(url)
+    if branch:
+        sha: Optional[str] = ref_resolve(repo, f"refs/remotes/origin/{branch}")
+        if sha:
+            with open(GitRepository.repo_file(repo, "refs", "heads", *branch.split("/"), mkdir=True), "w") as f:
+                f.write(sha + "\n")
+        with open(GitRepository.repo_file(repo, "HEAD"), "w") as f:
+            f.write(f"ref: refs/heads/{branch}\n")
+
+    return repo
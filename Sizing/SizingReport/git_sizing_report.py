@@ -0,0 +1,21 @@
+class GitSizingReport:
+    def __init__(self):
+        # Per object type: how many there are, their inflated bytes and the bytes they take on disk.
+        self.counts: dict[bytes, int] = {b'commit': 0, b'tree': 0, b'blob': 0, b'tag': 0}
+        self.sizes: dict[bytes, int] = {b'commit': 0, b'tree': 0, b'blob': 0, b'tag': 0}
+        self.disk: dict[bytes, int] = {b'commit': 0, b'tree': 0, b'blob': 0, b'tag': 0}
+        self.loose: int = 0
+        self.packs: int = 0
+        self.deltas: int = 0
+        # Min-heaps of the top entries, smallest first: (size, sha), (entries, sha), (chain length, sha).
+        self.largest_blobs: list[tuple[int, str]] = []
+        self.widest_trees: list[tuple[int, str]] = []
+        self.longest_chains: list[tuple[int, str]] = []
+        # (directories deep, path), deepest first.
+        self.deepest_paths: list[tuple[int, str]] = []
+        self.refs: int = 0
+        self.loose_refs: int = 0
+        self.index_entries: int = 0
+        self.index_size: int = 0
+        # Where the objects in the top lists are in HEAD, for those that are.
+        self.names: dict[str, str] = dict()
@@ -0,0 +1,10 @@
+from array import array
+
+class GitSizingTrees:
+    def __init__(self):
+        # Trees are numbered as they are first seen, by binary id, so the graph below costs 4 bytes an edge.
+        self.ids: dict[bytes, int] = dict()
+        # Tree number -> numbers of its subtrees, for the trees that have any.
+        self.children: dict[int, array] = dict()
+        # Numbers of the trees commits point at.
+        self.roots: set[int] = set()
@@ -0,0 +1,352 @@
+from array import array
+from typing import TYPE_CHECKING, BinaryIO, Optional
+import heapq
+import os
+
+from GitRepo.git_repository import GitRepository
+from Maintenance.maintenance_func import MAINTENANCE_LOOSE_OBJECTS, MAINTENANCE_LOOSE_REFS, MAINTENANCE_PACKS
+from Objects.object_func import object_header, object_read_raw
+from Objects.tree_diff_func import tree_entries_raw
+from Objects.tree_func import TREE_ENTRY_RE
+from Packs.pack_func import OBJ_COMMIT, OBJ_OFS_DELTA, OBJ_REF_DELTA, OBJ_TREE, PACK_TYPES, inflate_stream, pack_contains, pack_delta_size, pack_entry_header_read, pack_entry_read, pack_index_find, pack_indexes, pack_object_at
+from Refs.ref_func import ref_loose, ref_packed, ref_resolve
+from Sizing.SizingReport.git_sizing_report import GitSizingReport
+from Sizing.SizingTrees.git_sizing_trees import GitSizingTrees
+from StageIndex.stage_index_func import index_read, index_shared_path
+from Trace2.trace2_func import trace2_count
+
+if TYPE_CHECKING:
+    from Packs.PackIndex.git_pack_index import GitPackIndex
+    from StageIndex.GitIndex.git_index import GitIndex
+
+# How many entries each top list of the report keeps.
+SIZING_TOP: int = 10
+
+# Past these, the report calls something out as a hotspot. Chains as long as git's default pack.depth, and an index
+# the size where status starts to be felt.
+SIZING_BLOB_WARN: int = 10 * 1024 * 1024
+SIZING_TREE_WARN: int = 5000
+SIZING_DEPTH_WARN: int = 20
+SIZING_CHAIN_WARN: int = 50
+SIZING_INDEX_WARN: int = 100000
+
+# Files git itself keeps next to packs; anything else in objects/pack is garbage to count-objects.
+SIZING_PACK_FILES: tuple[str, ...] = (".pack", ".idx", ".bitmap", ".rev", ".keep", ".promisor", ".mtimes")
+
+# ------------------------------------------------[count-objects]--------------------------------------------------
+
+# Signature: GitRepository -> dict[str, int]
+# Purpose: What git count-objects -v prints, from directory listings, stats and the pack indexes alone: no object is
+#          read. Loose sizes are disk usage in KiB, as git counts them.
+def sizing_count_objects(repo: 'GitRepository') -> dict[str, int]:
+    ret: dict[str, int] = {"count": 0, "size": 0, "in-pack": 0, "packs": 0, "size-pack": 0, "prune-packable": 0, "garbage": 0, "size-garbage": 0}
+    objects_dir: str = GitRepository.repo_path(repo, "objects")
+    loose_bytes: int = 0
+    garbage_bytes: int = 0
+    for prefix in sorted(os.listdir(objects_dir)):
+        fanout: str = os.path.join(objects_dir, prefix)
+        if len(prefix) != 2 or not os.path.isdir(fanout):
+            continue
+        for name in os.listdir(fanout):
+            st: os.stat_result = os.stat(os.path.join(fanout, name))
+            if len(name) != 38:
+                ret["garbage"] += 1
+                garbage_bytes += st.st_blocks * 512
+                continue
+            ret["count"] += 1
+            loose_bytes += st.st_blocks * 512
+            if pack_contains(repo, prefix + name):
+                ret["prune-packable"] += 1
+
+    pack_dir: str = os.path.join(objects_dir, "pack")
+    if os.path.isdir(pack_dir):
+        for name in os.listdir(pack_dir):
+            if not name.endswith(SIZING_PACK_FILES):
+                ret["garbage"] += 1
+                garbage_bytes += os.stat(os.path.join(pack_dir, name)).st_blocks * 512
+    pack_bytes: int = 0
+    for index in pack_indexes(repo):
+        ret["packs"] += 1
+        ret["in-pack"] += len(index.shas)
+        pack_bytes += os.path.getsize(index.pack_path) + os.path.getsize(index.pack_path[:-5] + ".idx")
+
+    ret["size"] = loose_bytes // 1024
+    ret["size-pack"] = pack_bytes // 1024
+    ret["size-garbage"] = garbage_bytes // 1024
+    return ret
+
+# ------------------------------------------------[pass]--------------------------------------------------
+
+# Signature: list[tuple], int, tuple -> None
+# Purpose: Offers item to a min-heap holding the k largest items seen, so a top list never holds more than k.
+def sizing_push(heap: list[tuple], k: int, item: tuple) -> None:
+    if len(heap) < k:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+# Signature: GitSizingReport, GitSizingTrees, int, str, bytes, int, int, Optional[bytes] -> None
+# Purpose: Accounts for one object. Trees (and commits, for their root tree) come with their payload; a tree's
+#          subtrees are recorded in trees for working out path depths once the pass is done.
+def sizing_object(report: 'GitSizingReport', trees: 'GitSizingTrees', k: int, sha: str, object_type: bytes, size: int, disk: int, data: Optional[bytes]) -> None:
+    report.counts[object_type] += 1
+    report.sizes[object_type] += size
+    report.disk[object_type] += disk
+    if object_type == b'blob':
+        sizing_push(report.largest_blobs, k, (size, sha))
+    elif object_type == b'tree':
+        entries: list[tuple[bytes, bytes, bytes]] = TREE_ENTRY_RE.findall(data)
+        sizing_push(report.widest_trees, k, (len(entries), sha))
+        subtrees: list[bytes] = [entry[2] for entry in entries if entry[0] == b'40000']
+        if subtrees:
+            ids: dict[bytes, int] = trees.ids
+            trees.children[ids.setdefault(bytes.fromhex(sha), len(ids))] = array("I", [ids.setdefault(raw_sha, len(ids)) for raw_sha in subtrees])
+    elif object_type == b'commit':
+        trees.roots.add(trees.ids.setdefault(bytes.fromhex(data[5:45].decode("ascii")), len(trees.ids)))
+
+# Signature: BinaryIO, GitPackIndex, int | str, int, dict[int, tuple[int, int]] -> tuple[int, int]
+# Purpose: The type id and chain length of a delta's base, from entry headers alone. Answers are remembered by
+#          offset; a base read out of order (a REF_DELTA to a later entry) has its own chain remembered on the way.
+def sizing_chain(f: BinaryIO, index: 'GitPackIndex', base: int | str, type_id: int, chains: dict[int, tuple[int, int]]) -> tuple[int, int]:
+    path: list[int] = []
+    offset: Optional[int] = base if type_id == OBJ_OFS_DELTA else pack_index_find(index, base)
+    while offset not in chains:
+        if offset is None:
+            raise Exception(f"Delta base {base} is not in {index.pack_path}")
+        type_id, _, base = pack_entry_header_read(f, offset)
+        if type_id in PACK_TYPES:
+            chains[offset] = (type_id, 0)
+            break
+        path.append(offset)
+        offset = base if type_id == OBJ_OFS_DELTA else pack_index_find(index, base)
+    type_id, depth = chains[offset]
+    for delta in reversed(path):
+        depth += 1
+        chains[delta] = (type_id, depth)
+    return type_id, depth
+
+# Signature: GitRepository, GitSizingReport, GitPackIndex, list[GitPackIndex], GitSizingTrees, int -> None
+# Purpose: Accounts for every object of one pack, reading it front to back. Blobs and tags cost an entry header (plus
+#          the first bytes of a delta, which give the object's size); only trees and commits are inflated. Objects an
+#          earlier pack already had are skipped.
+def sizing_pack(repo: 'GitRepository', report: 'GitSizingReport', index: 'GitPackIndex', earlier: list['GitPackIndex'],
+                trees: 'GitSizingTrees', k: int) -> None:
+    entries: list[tuple[int, str]] = sorted(zip(index.offsets, index.shas))
+    # (base type id, chain length) by offset, for this pack only.
+    chains: dict[int, tuple[int, int]] = dict()
+    with open(index.pack_path, "rb") as f:
+        ends: list[int] = [offset for (offset, _) in entries[1:]] + [os.fstat(f.fileno()).st_size - 20]
+        for ((offset, sha), end) in zip(entries, ends):
+            if any(pack_index_find(other, sha) is not None for other in earlier):
+                continue
+            type_id, size, base = pack_entry_header_read(f, offset)
+            depth: int = 0
+            if type_id in (OBJ_OFS_DELTA, OBJ_REF_DELTA):
+                # A delta's header holds the delta's size; the object's size is the second varint of the delta.
+                delta_head: bytes = next(inflate_stream(f, 32))
+                _, pos = pack_delta_size(delta_head, 0)
+                size, _ = pack_delta_size(delta_head, pos)
+                type_id, depth = sizing_chain(f, index, base, type_id, chains)
+                depth += 1
+                report.deltas += 1
+                sizing_push(report.longest_chains, k, (depth, sha))
+            chains[offset] = (type_id, depth)
+
+            data: Optional[bytes] = None
+            if type_id in (OBJ_TREE, OBJ_COMMIT):
+                data = pack_object_at(f, offset, index)[1] if depth else pack_entry_read(f, offset)[1]
+            sizing_object(report, trees, k, sha, PACK_TYPES[type_id], size, end - offset, data)
+    trace2_count("sizing_packed_objects", len(entries))
+
+# Signature: GitRepository, GitSizingReport, GitSizingTrees, int -> None
+# Purpose: Accounts for the loose objects no pack has, reading just the header of each blob and tag.
+def sizing_loose(repo: 'GitRepository', report: 'GitSizingReport', trees: 'GitSizingTrees', k: int) -> None:
+    objects_dir: str = GitRepository.repo_path(repo, "objects")
+    for prefix in sorted(os.listdir(objects_dir)):
+        fanout: str = os.path.join(objects_dir, prefix)
+        if len(prefix) != 2 or not os.path.isdir(fanout):
+            continue
+        for name in sorted(os.listdir(fanout)):
+            sha: str = prefix + name
+            if len(name) != 38 or pack_contains(repo, sha):
+                continue
+            header: Optional[tuple[bytes, int]] = object_header(repo, sha)
+            if header is None:
+                continue
+            data: Optional[bytes] = None
+            if header[0] in (b'tree', b'commit'):
+                data = object_read_raw(repo, sha)[1]
+            report.loose += 1
+            sizing_object(report, trees, k, sha, header[0], header[1], os.path.getsize(os.path.join(fanout, name)), data)
+
+# Signature: GitRepository, GitSizingTrees, int -> list[tuple[int, str]]
+# Purpose: The k deepest directory paths in any commit's tree, deepest first. Each tree's height (how many
+#          directories deep it goes) is worked out once, without recursion, from the graph the pass recorded. Paths are
+#          then followed down from the tallest root trees, through the tallest subtree at each level, until k distinct
+#          paths are found and no root left could go deeper; only the trees on those paths are read again, for their
+#          names. The same path in many commits counts once.
+def sizing_deepest(repo: 'GitRepository', trees: 'GitSizingTrees', k: int) -> list[tuple[int, str]]:
+    # Trees without subtrees, and subtrees missing from the store, have height 0.
+    heights: list[int] = [-1] * len(trees.ids)
+    for tree in trees.children:
+        stack: list[int] = [tree]
+        while stack:
+            tree_id: int = stack[-1]
+            if heights[tree_id] >= 0:
+                stack.pop()
+                continue
+            kids: array = trees.children[tree_id]
+            pending: list[int] = [kid for kid in kids if heights[kid] < 0 and kid in trees.children]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            heights[tree_id] = 1 + max(max(map(heights.__getitem__, kids)), 0)
+
+    # A path is first found as the subtree positions taken at each level, which costs no reads; most commits share
+    # theirs with many others. Only a new one is read back from the trees for its names.
+    shas: dict[int, bytes] = {tree_id: raw_sha for (raw_sha, tree_id) in trees.ids.items()}
+    seen: set[tuple[int, ...]] = set()
+    paths: dict[str, int] = dict()
+    for root in sorted((root for root in trees.roots if root in trees.children), key=heights.__getitem__, reverse=True):
+        if len(paths) >= k and heights[root] <= heapq.nlargest(k, paths.values())[-1]:
+            break
+        steps: list[tuple[int, int]] = []
+        tree_id = root
+        while tree_id in trees.children:
+            kids = trees.children[tree_id]
+            kid: int = max(kids, key=heights.__getitem__)
+            steps.append((tree_id, kids.index(kid)))
+            tree_id = kid
+        positions: tuple[int, ...] = tuple(position for (_, position) in steps)
+        if positions in seen:
+            continue
+        seen.add(positions)
+        parts: list[bytes] = []
+        for (tree_id, position) in steps:
+            entries: list[tuple[bytes, bytes, bytes]] = TREE_ENTRY_RE.findall(object_read_raw(repo, shas[tree_id].hex())[1])
+            parts.append([entry for entry in entries if entry[0] == b'40000'][position][1])
+        paths[b'/'.join(parts).decode("utf8", errors="replace")] = len(parts)
+    return heapq.nlargest(k, ((depth, path) for (path, depth) in paths.items()))
+
+# Signature: GitRepository, set[str] -> dict[str, str]
+# Purpose: Where each of shas is in HEAD's tree, for those that are. Only trees are read, each at most once, and the
+#          walk stops as soon as every sha has been found.
+def sizing_names(repo: 'GitRepository', shas: set[str]) -> dict[str, str]:
+    head: Optional[str] = ref_resolve(repo, "HEAD")
+    raw: Optional[tuple[bytes, bytes]] = object_read_raw(repo, head) if head else None
+    if raw is None or raw[0] != b'commit':
+        return dict()
+    root: str = raw[1][5:45].decode("ascii")
+    ret: dict[str, str] = {root: "/"} if root in shas else dict()
+    seen: set[str] = {root}
+    stack: list[tuple[str, str]] = [(root, "")]
+    while stack and len(ret) < len(shas):
+        tree, prefix = stack.pop()
+        for (name, (mode, raw_sha)) in tree_entries_raw(repo, tree).items():
+            sha: str = raw_sha.hex()
+            path: str = prefix + name.decode("utf8", errors="replace")
+            if sha in shas and sha not in ret:
+                ret[sha] = path
+            if mode == b'40000' and sha not in seen:
+                seen.add(sha)
+                stack.append((sha, path + "/"))
+    return ret
+
+# Signature: GitRepository, int -> GitSizingReport
+# Purpose: Sizes up the repository in one pass over its object store: every pack front to back, then the loose
+#          objects, each object counted once. Only trees and commits are inflated; what is kept besides the totals is
+#          the top k of each list and the graph of trees, at 4 bytes an edge, which path depths need. Refs and the
+#          index are counted from packed-refs, the ref files and the index file.
+def sizing_report(repo: 'GitRepository', k: int = SIZING_TOP) -> 'GitSizingReport':
+    report: 'GitSizingReport' = GitSizingReport()
+    trees: 'GitSizingTrees' = GitSizingTrees()
+
+    indexes: list['GitPackIndex'] = pack_indexes(repo)
+    report.packs = len(indexes)
+    for (i, index) in enumerate(indexes):
+        sizing_pack(repo, report, index, indexes[:i], trees, k)
+    sizing_loose(repo, report, trees, k)
+    report.deepest_paths = sizing_deepest(repo, trees, k)
+
+    loose: dict[str, str] = ref_loose(repo)
+    report.loose_refs = len(loose)
+    report.refs = len(loose.keys() | ref_packed(repo).keys())
+    index_file: str = GitRepository.repo_path(repo, "index")
+    if os.path.exists(index_file):
+        index: 'GitIndex' = index_read(repo)
+        report.index_entries = len(index.entries)
+        report.index_size = os.path.getsize(index_file)
+        if index.shared:
+            report.index_size += os.path.getsize(index_shared_path(repo, index.shared))
+
+    report.largest_blobs.sort(reverse=True)
+    report.widest_trees.sort(reverse=True)
+    report.longest_chains.sort(reverse=True)
+    report.names = sizing_names(repo, {sha for (_, sha) in report.largest_blobs + report.widest_trees + report.longest_chains})
+    return report
+
+# ------------------------------------------------[output]--------------------------------------------------
+
+# Signature: int -> str
+def sizing_human(size: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+# Signature: GitSizingReport, str -> str
+# Purpose: How the report shows an object: its path in HEAD, else its id.
+def sizing_label(report: 'GitSizingReport', sha: str) -> str:
+    return f"{sha}  {report.names[sha]}" if sha in report.names else sha
+
+# Signature: GitSizingReport -> list[str]
+# Purpose: What stands out as slowing the repository down, each with what to do about it.
+def sizing_hotspots(report: 'GitSizingReport') -> list[str]:
+    ret: list[str] = []
+    for (size, sha) in report.largest_blobs:
+        if size > SIZING_BLOB_WARN:
+            ret.append(f"blob {report.names.get(sha, sha)} is {sizing_human(size)}: every clone carries it and diffs of it are slow; keep files like it out of history.")
+    for (entries, sha) in report.widest_trees:
+        if entries > SIZING_TREE_WARN:
+            ret.append(f"tree {report.names.get(sha, sha)} has {entries} entries: each commit touching it rewrites the whole tree; split the directory.")
+    if report.deepest_paths and report.deepest_paths[0][0] > SIZING_DEPTH_WARN:
+        ret.append(f"paths go {report.deepest_paths[0][0]} directories deep ({report.deepest_paths[0][1]}): each level is another tree to read on every lookup.")
+    if report.longest_chains and report.longest_chains[0][0] > SIZING_CHAIN_WARN:
+        ret.append(f"delta chains reach {report.longest_chains[0][0]}: reading such an object applies as many deltas; repack them shorter.")
+    if report.loose > MAINTENANCE_LOOSE_OBJECTS:
+        ret.append(f"{report.loose} loose objects: each costs a file; run maintenance to pack them.")
+    if report.packs > MAINTENANCE_PACKS:
+        ret.append(f"{report.packs} packs: each lookup searches every one; run maintenance to consolidate them.")
+    if report.loose_refs > MAINTENANCE_LOOSE_REFS:
+        ret.append(f"{report.loose_refs} loose refs: listing refs reads a file per ref; run maintenance to pack them.")
+    if report.index_entries > SIZING_INDEX_WARN:
+        ret.append(f"the index has {report.index_entries} entries: status and commit go through all of them; consider a sparse checkout or core.splitIndex.")
+    return ret
+
+# Signature: GitSizingReport -> list[str]
+def sizing_format(report: 'GitSizingReport') -> list[str]:
+    ret: list[str] = [f"{'objects':<10}{'count':>12}{'size':>14}{'on disk':>14}"]
+    for object_type in (b'commit', b'tree', b'blob', b'tag'):
+        ret.append(f"{object_type.decode('ascii') + 's':<10}{report.counts[object_type]:>12}{sizing_human(report.sizes[object_type]):>14}{sizing_human(report.disk[object_type]):>14}")
+    ret.append(f"{'total':<10}{sum(report.counts.values()):>12}{sizing_human(sum(report.sizes.values())):>14}{sizing_human(sum(report.disk.values())):>14}")
+    ret.append("")
+    ret.append(f"storage: {report.packs} packs, {report.loose} loose objects, {report.deltas} deltas")
+    ret.append(f"refs: {report.refs} ({report.loose_refs} loose, {report.refs - report.loose_refs} packed)")
+    ret.append(f"index: {report.index_entries} entries, {sizing_human(report.index_size)}")
+
+    ret.append("")
+    ret.append("largest blobs:")
+    ret.extend(f"  {sizing_human(size):>10}  {sizing_label(report, sha)}" for (size, sha) in report.largest_blobs)
+    ret.append("widest trees:")
+    ret.extend(f"  {entries:>10}  {sizing_label(report, sha)}" for (entries, sha) in report.widest_trees)
+    ret.append("deepest paths:")
+    ret.extend(f"  {depth:>10}  {path}" for (depth, path) in report.deepest_paths)
+    ret.append("longest delta chains:")
+    ret.extend(f"  {depth:>10}  {sizing_label(report, sha)}" for (depth, sha) in report.longest_chains)
+
+    ret.append("")
+    hotspots: list[str] = sizing_hotspots(report)
+    ret.append("hotspots:" if hotspots else "hotspots: none found")
+    ret.extend(f"  * {hotspot}" for hotspot in hotspots)
+    return ret
@@ -0,0 +1,6 @@
+class GitSparseCone:
+    def __init__(self, recursive: set[str] = None, parents: set[str] = None):
+        # Directories checked out with everything under them, e.g. "src/app".
+        self.recursive = recursive if recursive is not None else set()
+        # Their ancestors, whose files but not subdirectories are checked out. The root ("") always is.
+        self.parents = parents if parents is not None else {""}
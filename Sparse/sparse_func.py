@@ -0,0 +1,135 @@
+from typing import TYPE_CHECKING, Iterable, Optional
+import os
+import posixpath
+
+from Sparse.SparseCone.git_sparse_cone import GitSparseCone
+
+if TYPE_CHECKING:
+    from GitRepo.git_repository import GitRepository
+
+# ------------------------------------------------[patterns]--------------------------------------------------
+
+# Signature: Iterable[str] -> GitSparseCone
+# Purpose: Parses the cone mode patterns of .git/info/sparse-checkout, as git writes them:
+#              /*            files at the root
+#              !/*/          but no directory at the root...
+#              /src/         ...except src,
+#              !/src/*/      whose files but not subdirectories are included...
+#              /src/app/     ...except src/app, included with everything under it.
+def sparse_cone_parse(lines: Iterable[str]) -> 'GitSparseCone':
+    directories: set[str] = set()
+    partial: set[str] = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#") or line in ("/*", "!/*/"):
+            continue
+        if line.startswith("!/") and line.endswith("/*/"):
+            partial.add(sparse_unescape(line[2:-3]))
+        elif line.startswith("/") and line.endswith("/") and not line.endswith("*/"):
+            directories.add(sparse_unescape(line[1:-1]))
+        else:
+            raise Exception(f"Not a cone mode sparse-checkout pattern: {line}")
+    cone: 'GitSparseCone' = sparse_cone_from_dirs(directories - partial)
+    for directory in directories & partial:
+        while directory not in cone.parents:
+            cone.parents.add(directory)
+            directory = posixpath.dirname(directory)
+    return cone
+
+# Signature: str -> str
+# Purpose: Drops the backslashes git puts before glob characters in cone patterns.
+def sparse_unescape(pattern: str) -> str:
+    ret: list[str] = []
+    escaped: bool = False
+    for char in pattern:
+        if char == "\\" and not escaped:
+            escaped = True
+            continue
+        ret.append(char)
+        escaped = False
+    return "".join(ret)
+
+# Signature: Iterable[str] -> GitSparseCone
+# Purpose: The cone including the given directories recursively, plus the files of each of their ancestors.
+#          A directory under another one given is redundant and dropped.
+def sparse_cone_from_dirs(directories: Iterable[str]) -> 'GitSparseCone':
+    cone: 'GitSparseCone' = GitSparseCone()
+    for directory in sorted({d.strip("/") for d in directories if d.strip("/")}):
+        if sparse_under_recursive(cone, directory):
+            continue
+        cone.recursive.add(directory)
+        parent: str = posixpath.dirname(directory)
+        while parent not in cone.parents:
+            cone.parents.add(parent)
+            parent = posixpath.dirname(parent)
+    return cone
+
+# Signature: GitSparseCone -> str
+# Purpose: The patterns file for cone, in the order and form git writes it.
+def sparse_cone_serialize(cone: 'GitSparseCone') -> str:
+    lines: list[str] = ["/*", "!/*/"]
+    for directory in sorted((cone.parents - {""}) | cone.recursive):
+        escaped: str = "".join("\\" + char if char in "*?[\\" else char for char in directory)
+        lines.append(f"/{escaped}/")
+        if directory not in cone.recursive:
+            lines.append(f"!/{escaped}/*/")
+    return "\n".join(lines) + "\n"
+
+# ------------------------------------------------[matching]--------------------------------------------------
+
+# Signature: GitSparseCone, str -> bool
+# Purpose: Whether directory is one of the recursive directories or below one: one hash lookup per depth.
+def sparse_under_recursive(cone: 'GitSparseCone', directory: str) -> bool:
+    end: int = directory.find("/")
+    while end != -1:
+        if directory[:end] in cone.recursive:
+            return True
+        end = directory.find("/", end + 1)
+    return directory in cone.recursive
+
+# Signature: GitSparseCone, str, dict[str, bool] -> bool
+# Purpose: Whether the files directly in directory ("" for the root) are checked out. Answers are cached per
+#          directory, so walking a sorted index costs a lookup per file.
+def sparse_dir_included(cone: 'GitSparseCone', directory: str, cache: dict[str, bool]) -> bool:
+    included: Optional[bool] = cache.get(directory)
+    if included is None:
+        included = directory in cone.parents or sparse_under_recursive(cone, directory)
+        cache[directory] = included
+    return included
+
+# Signature: GitSparseCone, str, dict[str, bool] -> bool
+# Purpose: Whether the file at path (relative to the worktree) is checked out.
+def sparse_path_included(cone: 'GitSparseCone', path: str, cache: dict[str, bool]) -> bool:
+    return sparse_dir_included(cone, posixpath.dirname(path), cache)
+
+# ------------------------------------------------[config]--------------------------------------------------
+
+# Signature: GitRepository -> str
+def sparse_file(repo: 'GitRepository') -> str:
+    return repo.repo_path("info", "sparse-checkout")
+
+# Signature: GitRepository -> Optional[GitSparseCone]
+# Purpose: The repository's sparse checkout cone, or None when core.sparseCheckout is off and everything is
+#          checked out. Only cone mode is supported: its patterns can be matched by prefix lookups alone.
+def sparse_read(repo: 'GitRepository') -> Optional['GitSparseCone']:
+    if not repo.config.has_option("core", "sparsecheckout") or not repo.config.getboolean("core", "sparsecheckout"):
+        return None
+    if repo.config.has_option("core", "sparsecheckoutcone") and not repo.config.getboolean("core", "sparsecheckoutcone"):
+        raise Exception("Only cone mode sparse checkouts are supported (core.sparseCheckoutCone is false).")
+    if not os.path.exists(sparse_file(repo)):
+        return None
+    with open(sparse_file(repo)) as f:
+        return sparse_cone_parse(f)
+
+# Signature: GitRepository, Optional[GitSparseCone] -> None
+# Purpose: Saves cone as the repository's sparse checkout, or turns sparse checkout off when cone is None.
+#          The patterns file is kept when turning it off, as git does, so it can be turned back on.
+def sparse_write(repo: 'GitRepository', cone: Optional['GitSparseCone']) -> None:
+    if cone is not None:
+        os.makedirs(repo.repo_path("info"), exist_ok=True)
+        with open(sparse_file(repo), "w") as f:
+            f.write(sparse_cone_serialize(cone))
+        repo.config.set("core", "sparsecheckoutcone", "true")
+    repo.config.set("core", "sparsecheckout", "true" if cone is not None else "false")
+    with open(repo.repo_file("config"), "w") as f:
+        repo.config.write(f)
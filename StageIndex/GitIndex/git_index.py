@@ -1,9 +1,13 @@
+from typing import Optional
+
 from StageIndex.IndexEntry.git_index_entry import GitIndexEntry
 
 class GitIndex:
-    def __init__(self, version: int = 2, entries: list['GitIndexEntry'] = None):
+    def __init__(self, version: int = 2, entries: list['GitIndexEntry'] = None, shared: Optional[str] = None):
         if entries is None:
             entries = []
         
         self.version = version
-        self.entries = entries
\ No newline at end of file
+        self.entries = entries
+        # The checksum of the shared index this one was split from, if it was read from a split index.
+        self.shared = shared
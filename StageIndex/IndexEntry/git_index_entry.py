@@ -1,7 +1,7 @@
 class GitIndexEntry:
     def __init__(self, ctime: tuple[int, int] = None, mtime: tuple[int, int] = None, dev: int = None, ino: int = None,
                 mode_type: bytes = None, mode_perms: int = None, uid: int = None, gid: int = None, fsize: int = None, sha: bytes = None,
-                flag_assume_valid: int = None, flag_stage: int = None, name: str = None):
+                flag_assume_valid: int = None, flag_stage: int = None, name: str = None, flag_skip_worktree: bool = False):
 
         self.ctime = ctime
         self.mtime = mtime
@@ -15,4 +15,6 @@ class GitIndexEntry:
         self.sha = sha
         self.flag_assume_valid = flag_assume_valid
         self.flag_stage = flag_stage
-        self.name = name
\ No newline at end of file
+        self.name = name
+        # Outside the sparse checkout: the worktree has no file for this entry and nothing should look for one.
+        self.flag_skip_worktree = flag_skip_worktree
@@ -1,113 +1,254 @@
-import math
+from bisect import bisect_left
+import copy
+import gc
+import hashlib
+import io
 import os
+import struct
+import threading
+import time
 from time import ctime
+from typing import Iterable, Iterator, Optional
 
 from GitRepo.git_repository import GitRepository
+from Packs.bitmap_func import bitmap_set, ewah_decode, ewah_encode
 from StageIndex.GitIndex.git_index import GitIndex
 from StageIndex.IndexEntry.git_index_entry import GitIndexEntry
+from Trace2.trace2_func import trace2_count, trace2_region
+
+# Maps an index file to (stat signature, GitIndex) so an unchanged index is parsed only once per process.
+index_cache: dict[str, tuple[tuple, 'GitIndex']] = dict()
+
+# Parsed shared indexes (see index_write_split) by path. Their content is fixed by the checksum in their name.
+index_shared_cache: dict[str, 'GitIndex'] = dict()
+
+# Held to look an entry up or store one in either cache, when several threads read the index; files are read and
+# parsed outside it.
+index_cache_lock: threading.Lock = threading.Lock()
+
+# An index entry's fixed size fields, up to its name: ctime and mtime (seconds, nanoseconds), dev, ino, 16 unused
+# bits, mode, uid, gid, size, sha and flags.
+INDEX_ENTRY_STRUCT: struct.Struct = struct.Struct(">6I2H3I20sH")
+
+# Flag bits of an index entry: the flags word's "extended" bit, and skip-worktree in the extended flags that follow it.
+INDEX_EXTENDED: int = 0x4000
+INDEX_SKIP_WORKTREE: int = 0x4000
+
+# Like git's splitIndex.maxPercentChange: a split index whose delta exceeds this share of the shared index's
+# entries is folded back into a new shared index.
+SPLIT_INDEX_MAX_PERCENT: int = 20
+
+# Like git's splitIndex.sharedIndexExpire: shared indexes unused for two weeks are deleted.
+SPLIT_INDEX_EXPIRE: int = 14 * 24 * 3600
 
 def index_read(repo: 'GitRepository') -> 'GitIndex':
+    with trace2_region("index_read"):
+        return index_read_file(repo)
+
+def index_read_file(repo: 'GitRepository') -> 'GitIndex':
     index_file: str = GitRepository.repo_file(repo, "index")
-    if not os.path.exists(index_file):
+    signature: Optional[tuple] = GitRepository.file_signature(index_file)
+    if signature is None:
         return GitIndex()
+
+    with index_cache_lock:
+        cached = index_cache.get(index_file)
+    if cached and cached[0] == signature:
+        # Callers replace entries rather than editing them, so sharing the entry objects is safe.
+        trace2_count("index_cache_hits")
+        return GitIndex(version=cached[1].version, entries=list(cached[1].entries), shared=cached[1].shared)
     
     with open(index_file, 'rb') as f:
         raw: bytes = f.read()
 
+    version, entries, extensions = index_parse(raw)
+    trace2_count("index_entries_read", len(entries))
+    index: 'GitIndex' = GitIndex(version=version, entries=entries)
+    if b'link' in extensions:
+        index = index_link_resolve(repo, index, extensions[b'link'])
+
+    with index_cache_lock:
+        index_cache[index_file] = (signature, index)
+    return GitIndex(version=index.version, entries=list(index.entries), shared=index.shared)
+
+# Signature: bytes -> tuple[int, list[GitIndexEntry], dict[bytes, bytes]]
+# Purpose: Parses an index file into its version, its entries in file order and its extensions by signature.
+def index_parse(raw: bytes) -> tuple[int, list['GitIndexEntry'], dict[bytes, bytes]]:
     header: bytes = raw[:12]
     signature: bytes = header[:4]
     assert signature == b"DIRC" # Stands for "DirCache"
 
     version: int = int.from_bytes(header[4:8], "big")
-    assert version == 2 # Bootgit only supports index file version 2
+    assert version in (2, 3) # Bootgit only supports index file versions 2 and 3 (2 plus extended flags)
     count: int = int.from_bytes(header[8:12], "big")
 
     entries: list = []
     content: bytes = raw[12:]
     idx: int = 0
-    for i in range(0, count):
-        ctime_s = int.from_bytes(content[idx:idx+4], "big")
-        ctime_ns = int.from_bytes(content[idx+4:idx+8], "big")
-        mtime_s = int.from_bytes(content[idx+8:idx+12], "big")
-        mtime_ns = int.from_bytes(content[idx+12:idx+16], "big")
-        dev = int.from_bytes(content[idx+16:idx+20], "big")
-        ino = int.from_bytes(content[idx+20:idx+24], "big")
-        unused = int.from_bytes(content[idx+24:idx+26], "big")
-        assert 0 == unused
-
-        mode = int.from_bytes(content[idx+26:idx+28], "big")
-        mode_type = mode >> 12
-        assert mode_type in [0b1000, 0b1010, 0b1110]
-
-        mode_perms = mode & 0b0000000111111111
-        uid = int.from_bytes(content[idx+28:idx+32], "big")
-        gid = int.from_bytes(content[idx+32:idx+36], "big")
-        fsize = int.from_bytes(content[idx+36:idx+40], "big")
-        sha = format(int.from_bytes(content[idx+40:idx+60], "big"), "040x")
-        flags = int.from_bytes(content[idx+60:idx+62], "big")
-        flag_assume_valid = (flags & 0b1000000000000000) != 0
-        flag_extended = (flags & 0b0100000000000000) != 0
-        assert not flag_extended
-
-        flag_stage = flags & 0b0011000000000000
-        name_length = flags & 0b0000111111111111
-        idx += 62
-        if name_length < 0xFFF:
-            assert content[idx+name_length] == 0x00
-            raw_name = content[idx:idx+name_length]
-            idx += name_length + 1
-        else:
-            print(f"Notice: Name is 0x{name_length:X} bytes long.")
-            null_idx = content.find(b"\x00", idx+ 0xFFF)
-            raw_name = content[idx:null_idx]
-            idx = null_idx + 1
-        
-        name = raw_name.decode("utf8")
-
-        idx = 8 * math.ceil(idx/8)
-
-        entries.append(GitIndexEntry(ctime=(ctime_s, ctime_ns),
-                                    mtime=(mtime_s, mtime_ns),
-                                    dev=dev,
-                                    ino=ino,
-                                    mode_type=mode_type,
-                                    mode_perms=mode_perms,
-                                    uid=uid,
-                                    gid=gid,
-                                    fsize=fsize,
-                                    sha=sha,
-                                    flag_assume_valid=flag_assume_valid,
-                                    flag_stage=flag_stage,
-                                    name=name))
-        
-    return GitIndex(version=version, entries=entries)
+    # Entries hold no reference cycles, so the collector has nothing to find among them; left enabled it would
+    # rescan the growing list again and again, a third of the parse time for a large index.
+    gc_enabled: bool = gc.isenabled()
+    gc.disable()
+    try:
+        for i in range(0, count):
+            # The fixed size fields in one call: times, dev, ino, the 16 unused bits and the mode, uid, gid, size,
+            # the binary sha and the flags.
+            (ctime_s, ctime_ns, mtime_s, mtime_ns, dev, ino, unused, mode, uid, gid, fsize, raw_sha,
+             flags) = INDEX_ENTRY_STRUCT.unpack_from(content, idx)
+            assert 0 == unused
+
+            mode_type = mode >> 12
+            assert mode_type in [0b1000, 0b1010, 0b1110]
+
+            mode_perms = mode & 0b0000000111111111
+            sha = raw_sha.hex()
+            flag_assume_valid = (flags & 0b1000000000000000) != 0
+            flag_extended = (flags & 0b0100000000000000) != 0
+
+            flag_stage = flags & 0b0011000000000000
+            name_length = flags & 0b0000111111111111
+            idx += 62
+            flag_skip_worktree = False
+            if flag_extended:
+                extended_flags = int.from_bytes(content[idx:idx+2], "big")
+                flag_skip_worktree = (extended_flags & INDEX_SKIP_WORKTREE) != 0
+                idx += 2
+            if name_length < 0xFFF:
+                assert content[idx+name_length] == 0x00
+                raw_name = content[idx:idx+name_length]
+                idx += name_length + 1
+            else:
+                print(f"Notice: Name is 0x{name_length:X} bytes long.")
+                null_idx = content.find(b"\x00", idx+ 0xFFF)
+                raw_name = content[idx:null_idx]
+                idx = null_idx + 1
+
+            name = raw_name.decode("utf8")
+
+            idx = (idx + 7) & ~7
+
+            entries.append(GitIndexEntry(ctime=(ctime_s, ctime_ns),
+                                        mtime=(mtime_s, mtime_ns),
+                                        dev=dev,
+                                        ino=ino,
+                                        mode_type=mode_type,
+                                        mode_perms=mode_perms,
+                                        uid=uid,
+                                        gid=gid,
+                                        fsize=fsize,
+                                        sha=sha,
+                                        flag_assume_valid=flag_assume_valid,
+                                        flag_stage=flag_stage,
+                                        name=name,
+                                        flag_skip_worktree=flag_skip_worktree))
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    # Extensions follow the entries, each a signature and a size, up to the trailing checksum.
+    extensions: dict[bytes, bytes] = dict()
+    end: int = len(content) - 20
+    while idx + 8 <= end:
+        size: int = int.from_bytes(content[idx+4:idx+8], "big")
+        extensions[content[idx:idx+4]] = content[idx+8:idx+8+size]
+        idx += 8 + size
+
+    return version, entries, extensions
+
+# Signature: GitIndexEntry -> tuple[str, int]
+# Purpose: The order git requires of index entries: by path bytes, then stage. Comparing str names orders them
+#          by code point, which for UTF-8 is the same as comparing their bytes, so nothing needs encoding.
+def index_entry_key(entry: 'GitIndexEntry') -> tuple[str, int]:
+    return entry.name, int(entry.flag_stage)
+
+# Signature: GitIndex, str -> int
+# Purpose: The position of name's first entry in index, or where it would be inserted.
+def index_position(index: 'GitIndex', name: str, lo: int = 0) -> int:
+    return bisect_left(index.entries, (name, 0), lo=lo, key=index_entry_key)
+
+# Signature: GitIndex, str -> list[GitIndexEntry]
+# Purpose: The entries of name, one per stage: none if it is not staged, several if it is conflicted.
+def index_find(index: 'GitIndex', name: str) -> list['GitIndexEntry']:
+    start: int = index_position(index, name)
+    end: int = start
+    while end < len(index.entries) and index.entries[end].name == name:
+        end += 1
+    return index.entries[start:end]
+
+# Signature: GitIndex, str -> list[GitIndexEntry]
+# Purpose: The entries under a directory ("" for all of them), found by bisecting on its bounds: every path in
+#          "dir/" sorts at or after "dir/" and before "dir0", '0' being the byte after '/'.
+def index_entries_under(index: 'GitIndex', directory: str) -> list['GitIndexEntry']:
+    if not directory:
+        return list(index.entries)
+    start: int = index_position(index, directory + "/")
+    return index.entries[start:index_position(index, directory + "0", lo=start)]
+
+# Signature: GitIndex, Iterable[GitIndexEntry], Iterable[str] -> list[str]
+# Purpose: Applies a batch of changes in one pass over the sorted entries: every entry of a name in removes or
+#          among the adds is dropped, then the adds are inserted in order. Costs one copy of the entries plus a
+#          bisection per changed name, however many there are. Returns the names that had entries.
+def index_apply(index: 'GitIndex', adds: Iterable['GitIndexEntry'], removes: Iterable[str] = ()) -> list[str]:
+    changes: dict[str, list['GitIndexEntry']] = {name: [] for name in removes}
+    for entry in adds:
+        changes.setdefault(entry.name, []).append(entry)
+
+    entries: list['GitIndexEntry'] = index.entries
+    merged: list['GitIndexEntry'] = []
+    found: list[str] = []
+    start: int = 0
+    for name in sorted(changes):
+        position: int = index_position(index, name, lo=start)
+        merged.extend(entries[start:position])
+        end: int = position
+        while end < len(entries) and entries[end].name == name:
+            end += 1
+        if end > position:
+            found.append(name)
+        merged.extend(sorted(changes[name], key=index_entry_key))
+        start = end
+    merged.extend(entries[start:])
+
+    index.entries = merged
+    return found
 
 # Signature: GitRepository, GitIndex -> None
-# Purpose: Serializes all of the Git entries back into binary.
+# Purpose: Serializes all of the Git entries back into binary, as a split index when the repository uses one.
 def index_write(repo: 'GitRepository', index: 'GitIndex') -> None:
-    with open(GitRepository.repo_find(repo, "index"), "wb") as f:
-        f.write(b'DIRC')
-        f.write(index.version.to_bytes(4, "big"))
-        f.write(len(index.entries).to_bytes(4, "big"))
-
-        idx: int = 0
-        for entry in index.entries:
-            f.write(entry.ctime[0].to_bytes(4, "big"))
-            f.write(entry.ctime[1].to_bytes(4, "big"))
-            f.write(entry.mtime[0].to_bytes(4, "big"))
-            f.write(entry.mtime[1].to_bytes(4, "big"))
-            f.write(entry.dev.to_bytes(4, "big"))
-            f.write(entry.dev.to_bytes(4, "big"))
+    with trace2_region("index_write"):
+        if index_split_enabled(repo, index):
+            index_write_split(repo, index)
+        else:
+            index.shared = None
+            index_write_file(repo, index_serialize(index.version, index.entries))
+            trace2_count("index_entries_written", len(index.entries))
 
-            mode = (entry.mode_type << 12) | entry.mode_perms
-            f.write(mode.to_bytes(4, "big"))
+        # What was just written is what the next read in this process would parse, so it is cached as is.
+        index_file: str = GitRepository.repo_file(repo, "index")
+        with index_cache_lock:
+            index_cache[index_file] = (GitRepository.file_signature(index_file),
+                                       GitIndex(version=index.version, entries=list(index.entries), shared=index.shared))
 
-            f.write(entry.uid.to_bytes(4, "big"))
-            f.write(entry.gid.to_bytes(4, "big"))
+# Signature: GitRepository, bytes -> None
+def index_write_file(repo: 'GitRepository', data: bytes) -> None:
+    index_file: str = GitRepository.repo_file(repo, "index")
+    with index_cache_lock:
+        index_cache.pop(index_file, None)
+    with open(index_file, "wb") as out:
+        out.write(data)
 
-            f.write(entry.fsize.to_bytes(4, "big"))
-            f.write(int(entry.sha, 16).to_bytes(20, "big"))
+# Signature: int, list[GitIndexEntry], bytes -> bytes
+# Purpose: The index file holding entries, in order, then the already serialized extensions and the checksum.
+def index_serialize(version: int, entries: list['GitIndexEntry'], extensions: bytes = b'') -> bytes:
+    with io.BytesIO() as f:
+        f.write(b'DIRC')
+        f.write(version.to_bytes(4, "big"))
+        f.write(len(entries).to_bytes(4, "big"))
 
+        idx: int = 0
+        extended: bool = False
+        for entry in entries:
+            mode = (entry.mode_type << 12) | entry.mode_perms
             flag_assume_valid = 0x1 << 15 if entry.flag_assume_valid else 0
 
             name_bytes = entry.name.encode("utf8")
@@ -116,8 +257,18 @@ def index_write(repo: 'GitRepository', index: 'GitIndex') -> None:
                 name_length = 0xFFF
             else:
                 name_length = bytes_len
-            
-            f.write((flag_assume_valid | entry.flag_stage | name_length).to_bytes(2, "big"))
+
+            flags = flag_assume_valid | entry.flag_stage | name_length
+            if entry.flag_skip_worktree:
+                flags |= INDEX_EXTENDED
+            f.write(INDEX_ENTRY_STRUCT.pack(entry.ctime[0], entry.ctime[1], entry.mtime[0], entry.mtime[1],
+                                            entry.dev & 0xFFFFFFFF, entry.ino & 0xFFFFFFFF, 0, mode,
+                                            entry.uid & 0xFFFFFFFF, entry.gid & 0xFFFFFFFF, entry.fsize & 0xFFFFFFFF,
+                                            bytes.fromhex(entry.sha), flags))
+            if entry.flag_skip_worktree:
+                f.write(INDEX_SKIP_WORKTREE.to_bytes(2, "big"))
+                idx += 2
+                extended = True
 
             f.write(name_bytes)
             f.write((0).to_bytes(1, "big"))
@@ -128,3 +279,175 @@ def index_write(repo: 'GitRepository', index: 'GitIndex') -> None:
                 f.write((0).to_bytes(pad, "big"))
                 idx += pad
 
+        f.write(extensions)
+
+        # Extended flags need version 3; an index without them stays at the version it was read as.
+        if extended and version < 3:
+            f.seek(4)
+            f.write((3).to_bytes(4, "big"))
+
+        # Git refuses an index whose trailing checksum is missing.
+        data: bytes = f.getvalue()
+        return data + hashlib.sha1(data).digest()
+
+# ------------------------------------------------[split index]--------------------------------------------------
+
+# Signature: GitRepository, str -> str
+def index_shared_path(repo: 'GitRepository', shared: str) -> str:
+    return GitRepository.repo_path(repo, f"sharedindex.{shared}")
+
+# Signature: GitRepository, str -> Optional[GitIndex]
+# Purpose: Reads the shared index named by its checksum, or None if it is gone. Shared indexes never change once
+#          written, so each is parsed at most once per process.
+def index_shared_read(repo: 'GitRepository', shared: str) -> Optional['GitIndex']:
+    path: str = index_shared_path(repo, shared)
+    with index_cache_lock:
+        cached: Optional['GitIndex'] = index_shared_cache.get(path)
+    if cached:
+        return cached
+    try:
+        with open(path, "rb") as f:
+            raw: bytes = f.read()
+    except FileNotFoundError:
+        return None
+    version, entries, _ = index_parse(raw)
+    trace2_count("index_entries_read", len(entries))
+    index: 'GitIndex' = GitIndex(version=version, entries=entries)
+    with index_cache_lock:
+        index_shared_cache[path] = index
+    return index
+
+# Signature: bytearray -> Iterator[int]
+# Purpose: The positions of the set bits of a bytearray bitmap, in increasing order.
+def index_bit_positions(buf: bytes) -> Iterator[int]:
+    for (i, byte) in enumerate(buf):
+        if byte:
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield i * 8 + bit
+
+# Signature: GitRepository, GitIndex, bytes -> GitIndex
+# Purpose: Rebuilds the full index from a split one and its link extension: the shared index's checksum, then
+#          two EWAH bitmaps over the shared entries, deleted ones and replaced ones. The split index holds the
+#          replacements first, in order and with their names left out, then the entries it adds.
+def index_link_resolve(repo: 'GitRepository', split: 'GitIndex', link: bytes) -> 'GitIndex':
+    shared: str = link[:20].hex()
+    base: Optional['GitIndex'] = index_shared_read(repo, shared)
+    if base is None:
+        raise Exception(f"Missing shared index sharedindex.{shared}.")
+
+    entries: list[Optional['GitIndexEntry']] = list(base.entries)
+    replaced: int = 0
+    if len(link) > 20:
+        deleted_bits, pos = ewah_decode(link, 20)
+        replaced_bits, _ = ewah_decode(link, pos)
+        for position in index_bit_positions(replaced_bits.to_bytes((replaced_bits.bit_length() + 7) // 8, "little")):
+            entry: 'GitIndexEntry' = split.entries[replaced]
+            entry.name = base.entries[position].name
+            entries[position] = entry
+            replaced += 1
+        for position in index_bit_positions(deleted_bits.to_bytes((deleted_bits.bit_length() + 7) // 8, "little")):
+            entries[position] = None
+
+    index: 'GitIndex' = GitIndex(version=split.version, entries=[entry for entry in entries if entry is not None], shared=shared)
+    index_apply(index, split.entries[replaced:])
+    return index
+
+# Signature: GitRepository, GitIndex -> bool
+# Purpose: Whether to write index split. core.splitIndex decides when set; otherwise an index read from a split
+#          index stays split, as git does.
+def index_split_enabled(repo: 'GitRepository', index: 'GitIndex') -> bool:
+    if repo.config.has_option("core", "splitindex"):
+        return repo.config.getboolean("core", "splitindex")
+    return index.shared is not None
+
+# Signature: list[GitIndexEntry], list[GitIndexEntry] -> tuple[bytearray, bytearray, list[GitIndexEntry], list[GitIndexEntry], int]
+# Purpose: Compares two sorted entry lists in one pass: returns the bitmaps of the base positions deleted and
+#          replaced, the replacing entries, the added entries and the number deleted. Entries read from the base
+#          are shared, unchanged, with the index built from it, so most compare by identity alone.
+def index_split_delta(base: list['GitIndexEntry'], entries: list['GitIndexEntry']) -> tuple[bytearray, bytearray, list['GitIndexEntry'], list['GitIndexEntry'], int]:
+    deleted: bytearray = bytearray()
+    replaced: bytearray = bytearray()
+    replacements: list['GitIndexEntry'] = []
+    added: list['GitIndexEntry'] = []
+    deleted_count: int = 0
+
+    i: int = 0
+    j: int = 0
+    while i < len(base) or j < len(entries):
+        if i < len(base) and j < len(entries) and base[i] is entries[j]:
+            i += 1
+            j += 1
+            continue
+        base_key: Optional[tuple[str, int]] = index_entry_key(base[i]) if i < len(base) else None
+        key: Optional[tuple[str, int]] = index_entry_key(entries[j]) if j < len(entries) else None
+        if key is None or (base_key is not None and base_key < key):
+            bitmap_set(deleted, i)
+            deleted_count += 1
+            i += 1
+        elif base_key is None or key < base_key:
+            added.append(entries[j])
+            j += 1
+        else:
+            if vars(base[i]) != vars(entries[j]):
+                bitmap_set(replaced, i)
+                replacements.append(entries[j])
+            i += 1
+            j += 1
+
+    return deleted, replaced, replacements, added, deleted_count
+
+# Signature: GitRepository, GitIndex -> str
+# Purpose: Writes index's entries as a new shared index, named by its checksum, and returns that checksum.
+#          Shared indexes no split index has used for SPLIT_INDEX_EXPIRE seconds are deleted.
+def index_shared_write(repo: 'GitRepository', index: 'GitIndex') -> str:
+    data: bytes = index_serialize(index.version, index.entries)
+    shared: str = data[-20:].hex()
+    path: str = index_shared_path(repo, shared)
+    tmp_path: str = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    trace2_count("index_entries_written", len(index.entries))
+    with index_cache_lock:
+        index_shared_cache[path] = GitIndex(version=index.version, entries=list(index.entries))
+
+    expired: float = time.time() - SPLIT_INDEX_EXPIRE
+    git_dir: str = os.path.dirname(path)
+    for name in os.listdir(git_dir):
+        other: str = os.path.join(git_dir, name)
+        if name.startswith("sharedindex.") and other != path and os.path.getmtime(other) < expired:
+            os.unlink(other)
+            with index_cache_lock:
+                index_shared_cache.pop(other, None)
+    return shared
+
+# Signature: GitRepository, GitIndex -> None
+# Purpose: Writes index as a split index: only what differs from its shared index, plus a link extension. When that
+#          delta grows past SPLIT_INDEX_MAX_PERCENT of the shared entries, they are folded into a new shared index
+#          and the split index starts out empty again.
+def index_write_split(repo: 'GitRepository', index: 'GitIndex') -> None:
+    base: Optional['GitIndex'] = index_shared_read(repo, index.shared) if index.shared else None
+    if base is not None:
+        deleted, replaced, replacements, added, deleted_count = index_split_delta(base.entries, index.entries)
+        changed: int = deleted_count + len(replacements) + len(added)
+    if base is None or changed * 100 > SPLIT_INDEX_MAX_PERCENT * len(base.entries):
+        index.shared = index_shared_write(repo, index)
+        trace2_count("shared_index_written")
+        deleted, replaced, replacements, added = bytearray(), bytearray(), [], []
+    else:
+        # Keep the shared index from expiring while a split index uses it.
+        os.utime(index_shared_path(repo, index.shared))
+
+    stripped: list['GitIndexEntry'] = []
+    for entry in replacements:
+        entry = copy.copy(entry)
+        entry.name = ""
+        stripped.append(entry)
+
+    bit_size: int = len(base.entries) if base else 0
+    link: bytes = (bytes.fromhex(index.shared) + ewah_encode(int.from_bytes(deleted, "little"), bit_size)
+                   + ewah_encode(int.from_bytes(replaced, "little"), bit_size))
+    extension: bytes = b'link' + len(link).to_bytes(4, "big") + link
+    index_write_file(repo, index_serialize(index.version, stripped + added, extension))
+    trace2_count("index_entries_written", len(stripped) + len(added))
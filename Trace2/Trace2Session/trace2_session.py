@@ -0,0 +1,16 @@
+import os
+import time
+
+class Trace2Session:
+    def __init__(self, target: str, command: str):
+        self.target = target
+        self.command = command
+        self.sid = f"{os.getpid()}-{time.time_ns()}"
+        self.start = time.perf_counter()
+        # Names of the regions currently open, outermost first.
+        self.stack: list[str] = []
+        self.counters: dict[str, int] = dict()
+        # name -> [total seconds, intervals]
+        self.timers: dict[str, list] = dict()
+        # Buffered until the command exits, then written with a single append.
+        self.events: list[dict] = []
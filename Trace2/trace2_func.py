@@ -0,0 +1,111 @@
+from typing import Callable, Iterator, Optional
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+
+from Trace2.Trace2Session.trace2_session import Trace2Session
+
+# Kept free of bootgit imports: the object, index and ignore layers all call into this module.
+
+# Path of the file the events are appended to, or of a directory to create one file per command in.
+TRACE2_ENV: str = "BOOTGIT_TRACE2_PERF"
+
+# The session of the command running in this process, or None when tracing is off. Every hook checks this
+# first, so untraced commands pay one global lookup per hook.
+trace2_session: Optional['Trace2Session'] = None
+
+# Signature: str, int -> None
+# Purpose: Adds n to one of the current command's counters.
+def trace2_count(name: str, n: int = 1) -> None:
+    session: Optional['Trace2Session'] = trace2_session
+    if session is not None:
+        session.counters[name] = session.counters.get(name, 0) + n
+
+# Signature: str -> Iterator[None]
+# Purpose: Times a phase of the current command as a region nested in the regions already open.
+#          Each region becomes one event.
+@contextlib.contextmanager
+def trace2_region(name: str) -> Iterator[None]:
+    session: Optional['Trace2Session'] = trace2_session
+    if session is None:
+        yield
+        return
+
+    session.stack.append(name)
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        session.events.append({"event": "region", "sid": session.sid, "name": "/".join(session.stack), "depth": len(session.stack),
+                               "t_rel": round(start - session.start, 6), "elapsed": round(time.perf_counter() - start, 6)})
+        session.stack.pop()
+
+# Signature: str -> Iterator[None]
+# Purpose: Accumulates time spent in a step that repeats too often to be a region, like hashing one file.
+#          Reported once per command as a total and a count.
+@contextlib.contextmanager
+def trace2_timer(name: str) -> Iterator[None]:
+    session: Optional['Trace2Session'] = trace2_session
+    if session is None:
+        yield
+        return
+
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer: list = session.timers.setdefault(name, [0.0, 0])
+        timer[0] += time.perf_counter() - start
+        timer[1] += 1
+
+# Signature: Trace2Session, str -> None
+# Purpose: Writes a finished command's events, counters, timers and exit event as JSON lines.
+#          Tracing must never fail a command, so write errors are ignored.
+def trace2_flush(session: 'Trace2Session', status: str) -> None:
+    events: list[dict] = session.events
+    timers: dict = {name: {"elapsed": round(total, 6), "count": count} for (name, (total, count)) in session.timers.items()}
+    events.append({"event": "counters", "sid": session.sid, "cmd": session.command, "counters": session.counters, "timers": timers})
+    events.append({"event": "exit", "sid": session.sid, "cmd": session.command, "argv": sys.argv[1:], "pid": os.getpid(),
+                   "status": status, "elapsed": round(time.perf_counter() - session.start, 6)})
+
+    path: str = session.target
+    if os.path.isdir(path):
+        path = os.path.join(path, f"bootgit-{session.sid}.json")
+    try:
+        with open(path, "a") as f:
+            f.write("".join(json.dumps(event) + "\n" for event in events))
+    except OSError:
+        pass
+
+# Signature: str -> Callable
+# Purpose: Decorates a cmd_* function so that, when BOOTGIT_TRACE2_PERF is set, it runs as a traced command
+#          with its own top-level region. A command called from inside another one becomes a nested region.
+def trace2_command(name: str) -> Callable:
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def traced(*args, **kwargs):
+            global trace2_session
+            target: Optional[str] = os.environ.get(TRACE2_ENV)
+            if trace2_session is not None or not target:
+                with trace2_region(name):
+                    return fn(*args, **kwargs)
+
+            session: 'Trace2Session' = Trace2Session(target, name)
+            trace2_session = session
+            status: str = "error"
+            try:
+                with trace2_region(name):
+                    ret = fn(*args, **kwargs)
+                status = "ok"
+                return ret
+            except SystemExit as e:
+                status = "ok" if not e.code else "error"
+                raise
+            finally:
+                trace2_session = None
+                trace2_flush(session, status)
+        return traced
+    return decorate
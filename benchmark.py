@@ -0,0 +1,3 @@
+from Benchmarks.benchmark_func import benchmark_main
+
+benchmark_main()
@@ -1,3 +1,8 @@
-import Libraries.bootgit_libary as bootgit
+import sys
 
-bootgit.main()
\ No newline at end of file
+import Daemon.daemon_client as daemon_client
+
+if not daemon_client.daemon_forward(sys.argv[1:]):
+    import Libraries.bootgit_libary as bootgit
+
+    bootgit.main()